@@ -4,8 +4,9 @@ from .cdp import CDP, DEFAULT_HOST, DEFAULT_PORT, DEFAULT_URL, connect
 from .cdp_session import CDPSession
 from .client import Client, ClientDynamic
 from .connection import Connection
-from .errors import ClientError, NetworkError, ProtocolError
+from .errors import ClientError, EvaluationError, NetworkError, ProtocolError
 from .events import ConnectionEvents, SessionEvents
+from .object_group import HandleTracker, ObjectGroup
 from .target_session import TargetSession, TargetSessionDynamic
 
 ConnectionType = Union[Client, Connection, ClientDynamic]
@@ -24,7 +25,10 @@ __all__ = [
     "DEFAULT_HOST",
     "DEFAULT_PORT",
     "DEFAULT_URL",
+    "EvaluationError",
+    "HandleTracker",
     "NetworkError",
+    "ObjectGroup",
     "ProtocolError",
     "SessionEvents",
     "SessionType",
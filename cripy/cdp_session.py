@@ -7,6 +7,7 @@ from pyee2 import EventEmitterS
 from .cdp_result_future import CDPResultFuture
 from .errors import NetworkError, create_protocol_error
 from .events import SessionEvents
+from .object_group import HandleTracker, ObjectGroup
 
 if TYPE_CHECKING:  # pragma: no cover
     from cripy import ConnectionType, SessionType  # noqa: F401
@@ -21,6 +22,7 @@ class CDPSession(EventEmitterS):
         "_flat_session",
         "_callbacks",
         "_sessions",
+        "_handles",
     ]
 
     Events: ClassVar[Type[SessionEvents]] = SessionEvents
@@ -51,6 +53,7 @@ class CDPSession(EventEmitterS):
         self._flat_session: bool = flat_session
         self._callbacks: Dict[int, CDPResultFuture] = {}
         self._sessions: Dict[str, SessionType] = {}
+        self._handles: Optional[HandleTracker] = None
 
     @property
     def loop(self) -> AbstractEventLoop:
@@ -72,6 +75,22 @@ class CDPSession(EventEmitterS):
         """Returns the type of the target"""
         return self._target_type
 
+    @property
+    def handles(self) -> HandleTracker:
+        """Returns the tracker of the object groups, and their remote objects, of this instance"""
+        if self._handles is None:
+            self._handles = HandleTracker(self)
+        return self._handles
+
+    def object_group(self, name: Optional[str] = None) -> ObjectGroup:
+        """Returns a new Runtime object group. Its remote objects are released
+        together once the group, used as an async context manager, exits
+
+        :param name: Optional name of the group, defaults to a unique generated name
+        :return: The object group
+        """
+        return self.handles.group(name)
+
     def send(self, method: str, params: Optional[Dict] = None) -> CDPResultFuture:
         """Send message to the connected session.
 
@@ -183,6 +202,9 @@ class CDPSession(EventEmitterS):
         for session in self._sessions.values():
             session.on_closed()
         self._sessions.clear()
+        if self._handles is not None:
+            self._handles.stop()
+            self._handles = None
         self._connection = None
         self.emit(SessionEvents.Disconnected)
 
@@ -12,6 +12,7 @@ from .cdp_result_future import CDPResultFuture
 from .cdp_session import CDPSession
 from .errors import NetworkError, create_protocol_error
 from .events import ConnectionEvents
+from .object_group import HandleTracker, ObjectGroup
 
 if TYPE_CHECKING:  # pragma: no cover
     from cripy import ConnectionType, SessionType  # noqa: F401
@@ -33,6 +34,7 @@ class Connection(EventEmitterS):
         "_closed",
         "_connected",
         "_flatten_sessions",
+        "_handles",
         "_lastId",
         "_recv_task",
         "_sessions",
@@ -69,6 +71,7 @@ class Connection(EventEmitterS):
         self._ws: Optional[WebSocketClientProtocol] = None
         self._recv_task: Optional[Task] = None
         self._closeCallback: Optional[Callable[[], Any]] = None
+        self._handles: Optional[HandleTracker] = None
 
     @staticmethod
     def from_session(session: "SessionType") -> "ConnectionType":
@@ -106,6 +109,22 @@ class Connection(EventEmitterS):
         """
         self._sessions[session.session_id] = session
 
+    @property
+    def handles(self) -> HandleTracker:
+        """Returns the tracker of the object groups, and their remote objects, of this instance"""
+        if self._handles is None:
+            self._handles = HandleTracker(self)
+        return self._handles
+
+    def object_group(self, name: Optional[str] = None) -> ObjectGroup:
+        """Returns a new Runtime object group. Its remote objects are released
+        together once the group, used as an async context manager, exits
+
+        :param name: Optional name of the group, defaults to a unique generated name
+        :return: The object group
+        """
+        return self.handles.group(name)
+
     def set_close_callback(self, callback: Callable[[], Any]) -> None:
         """Set closed callback."""
         self._closeCallback = callback
@@ -258,6 +277,10 @@ class Connection(EventEmitterS):
             session.on_closed()
         self._sessions.clear()
 
+        if self._handles is not None:
+            self._handles.stop()
+            self._handles = None
+
         # close connection
         if self._ws and not self._ws.closed:
             try:
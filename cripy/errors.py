@@ -1,6 +1,6 @@
 from typing import Dict
 
-__all__ = ["ClientError", "NetworkError", "ProtocolError"]
+__all__ = ["ClientError", "EvaluationError", "NetworkError", "ProtocolError"]
 
 
 class NetworkError(Exception):
@@ -15,6 +15,16 @@ class ProtocolError(Exception):
     """Exception used to indicate that a CDP command has received an error"""
 
 
+class EvaluationError(Exception):
+    """Exception used to indicate that evaluated JavaScript threw"""
+
+
+def create_evaluation_error(details: Dict) -> EvaluationError:
+    exception = details.get("exception") or {}
+    description = exception.get("description") or details.get("text", "")
+    return EvaluationError(f"Evaluation Error: {description}")
+
+
 def create_protocol_error(method: str, msg: Dict) -> ProtocolError:
     error = msg["error"]
     data = error.get("data")
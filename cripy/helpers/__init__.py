@@ -0,0 +1,79 @@
+from .batch_eval import BatchEvaluator
+from .begin_frame import BeginFrameController, RenderedFrame
+from .binding_channel import BindingChannel
+from .body_fetcher import BodyFetcher, BodyMetrics
+from .coverage import CoverageAggregator, IntervalSet
+from .cpu_profile import CPUProfileStore
+from .dom_mirror import DOMMirror, MirrorNode
+from .dom_snapshot import DocumentSnapshot
+from .execution_contexts import ExecutionContext, ExecutionContextRegistry
+from .export import DocumentExporter, ExportResult
+from .full_page import FullPageScreenshot, PNGStitcher
+from .har import HARExporter
+from .heap_snapshot import HeapSnapshot, HeapSnapshotParser, HeapSnapshotRecorder
+from .interception import Decision, InterceptionEngine, Rule
+from .network_tracker import NetworkTracker, RequestRecord
+from .replay import CDXIndex, CDXWriter, WARCReplayer
+from .resource_dumper import ResourceDumper, ResourceRecord
+from .response_cache import CacheEntry, ResponseCache
+from .screencast import Screencast, ScreencastFrame
+from .selectors import Selector, SelectorError, compile_selector
+from .streams import BodySpool, IOStream
+from .tracing import TraceEventParser, TraceRecorder
+from .warc import WARCArchiver, WARCRecord, WARCWriter
+from .virtual_time import VirtualTimeController, VirtualTimeReport
+from .waiters import PageWaiter
+from .workers import WorkerPool
+
+__all__ = [
+    "BatchEvaluator",
+    "BeginFrameController",
+    "BindingChannel",
+    "BodyFetcher",
+    "BodyMetrics",
+    "BodySpool",
+    "CDXIndex",
+    "CDXWriter",
+    "CPUProfileStore",
+    "CoverageAggregator",
+    "CacheEntry",
+    "DOMMirror",
+    "Decision",
+    "DocumentExporter",
+    "DocumentSnapshot",
+    "ExecutionContext",
+    "ExecutionContextRegistry",
+    "ExportResult",
+    "FullPageScreenshot",
+    "HARExporter",
+    "HeapSnapshot",
+    "HeapSnapshotParser",
+    "HeapSnapshotRecorder",
+    "IOStream",
+    "InterceptionEngine",
+    "IntervalSet",
+    "MirrorNode",
+    "NetworkTracker",
+    "PNGStitcher",
+    "PageWaiter",
+    "RenderedFrame",
+    "RequestRecord",
+    "ResourceDumper",
+    "ResourceRecord",
+    "ResponseCache",
+    "Rule",
+    "Screencast",
+    "ScreencastFrame",
+    "Selector",
+    "SelectorError",
+    "TraceEventParser",
+    "TraceRecorder",
+    "VirtualTimeController",
+    "VirtualTimeReport",
+    "WARCArchiver",
+    "WARCRecord",
+    "WARCReplayer",
+    "WARCWriter",
+    "WorkerPool",
+    "compile_selector",
+]
@@ -0,0 +1,259 @@
+import logging
+from asyncio import AbstractEventLoop, Future, gather
+from typing import Any, Dict, List, Optional, TYPE_CHECKING, Tuple, Union
+
+from ujson import dumps, loads
+
+from ..errors import EvaluationError, create_evaluation_error
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["BatchEvaluator"]
+
+logger = logging.getLogger(__name__)
+
+#: The expression evaluated and the future resolved with its value
+Item = Tuple[str, Future]
+
+BATCH_START: str = (
+    "(async () => {\n"
+    "const stringify = JSON.stringify, results = [];\n"
+    "const ok = (value) => { const json = stringify(value); return json === undefined ? '[0,null]' : `[0,${json}]`; };\n"
+    "const fail = (e) => { try { return `[1,${stringify(e instanceof Error ? e.stack || String(e) : String(e))}]`; } "
+    "catch (_) { return '[1,\"Unserializable exception\"]'; } };\n"
+)
+#: Each item is serialized in its own try/catch so one unserializable value fails only its item
+BATCH_ITEM: str = "try { results[%d] = ok(await (%s\n)); } catch (e) { results[%d] = fail(e); }\n"
+BATCH_END: str = "return `[${results.join(',')}]`;\n})()"
+
+
+class BatchEvaluator:
+    """Evaluates many small expressions, or function calls, in a single
+    Runtime.evaluate round trip.
+
+    Expressions and calls submitted during the same iteration of the event
+    loop are packed into one async function returning the value, or the
+    exception, of each by value. The results are demultiplexed back to the
+    future returned for each item. Batches are split once they would exceed
+    max_items or max_payload characters.
+
+    Each value is serialized as JSON in the page by its own item, so an item
+    that throws or returns an unserializable value only fails its own future.
+    Expressions must be expressions, an item containing statements makes its
+    whole batch a syntax error, in which case nothing ran and the items are
+    retried individually so that only the offending item fails. A batch that
+    fails after it ran is never retried, as that would repeat the side effects
+    of its items, its items fail instead.
+
+    Example:
+
+    ```python
+    batch = BatchEvaluator(client)
+    title, links = await asyncio.gather(
+        batch.evaluate("document.title"),
+        batch.call("(sel) => [...document.querySelectorAll(sel)].map(a => a.href)", "a"),
+    )
+    ```
+    """
+
+    __slots__ = [
+        "_client",
+        "_context_id",
+        "_flush_scheduled",
+        "_pending",
+        "batches",
+        "fallbacks",
+        "items",
+        "max_items",
+        "max_payload",
+        "round_trips",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        context_id: Optional[int] = None,
+        max_items: int = 256,
+        max_payload: int = 2 ** 18,
+    ) -> None:
+        """Construct a new BatchEvaluator
+
+        :param client: The client or session used to evaluate
+        :param context_id: Optional id of the execution context to evaluate in
+        :param max_items: The maximum number of items per batch
+        :param max_payload: The maximum number of characters of a batch's expression
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._context_id: Optional[int] = context_id
+        self._pending: List[Item] = []
+        self._flush_scheduled: bool = False
+        self.max_items: int = max_items
+        self.max_payload: int = max_payload
+        #: The number of items evaluated
+        self.items: int = 0
+        self.batches: int = 0
+        #: The number of Runtime.evaluate commands sent, including retries
+        self.round_trips: int = 0
+        #: The number of batches that did not compile whose items were retried individually
+        self.fallbacks: int = 0
+
+    @property
+    def loop(self) -> AbstractEventLoop:
+        return self._client.loop
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of items waiting to be sent"""
+        return len(self._pending)
+
+    def evaluate(self, expression: str) -> Future:
+        """Queue an expression for evaluation
+
+        :param expression: The JavaScript expression
+        :return: A future resolving with the value of the expression, or
+        failing with an EvaluationError if it throws
+        """
+        future = self.loop.create_future()
+        self._pending.append((expression, future))
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.loop.call_soon(self._schedule_flush)
+        return future
+
+    def call(self, function_declaration: str, *args: Any) -> Future:
+        """Queue a function call for evaluation
+
+        :param function_declaration: The declaration of the function, e.g. `(a, b) => a + b`
+        :param args: The arguments of the call, serialized as JSON
+        :return: A future resolving with the return value of the function
+        """
+        arguments = ", ".join(dumps(arg) for arg in args)
+        return self.evaluate(f"({function_declaration})({arguments})")
+
+    async def evaluate_many(self, expressions: List[str]) -> List[Any]:
+        """Evaluate the expressions and return their values, raising the
+        EvaluationError of the first expression that throws"""
+        return await gather(*[self.evaluate(expression) for expression in expressions])
+
+    async def flush(self) -> None:
+        """Send the pending items now and wait for their results"""
+        self._flush_scheduled = False
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        await gather(*[self._run_batch(batch) for batch in self._split(pending)])
+
+    def _schedule_flush(self) -> None:
+        if self._flush_scheduled:
+            self.loop.create_task(self.flush())
+
+    def _split(self, items: List[Item]) -> List[List[Item]]:
+        """Splits the items into batches of at most max_items items and
+        max_payload characters, an oversized item is a batch of its own"""
+        batches: List[List[Item]] = []
+        batch: List[Item] = []
+        size = len(BATCH_START) + len(BATCH_END)
+        base = size
+        for item in items:
+            item_size = len(BATCH_ITEM) + len(item[0])
+            if batch and (
+                len(batch) >= self.max_items or size + item_size > self.max_payload
+            ):
+                batches.append(batch)
+                batch = []
+                size = base
+            batch.append(item)
+            size += item_size
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _params(self, expression: str) -> Dict[str, Any]:
+        params = {"expression": expression, "returnByValue": True, "awaitPromise": True}
+        if self._context_id is not None:
+            params["contextId"] = self._context_id
+        return params
+
+    async def _run_batch(self, batch: List[Item]) -> None:
+        expression = "".join(
+            [
+                BATCH_START,
+                *(BATCH_ITEM % (i, source, i) for i, (source, _) in enumerate(batch)),
+                BATCH_END,
+            ]
+        )
+        self.batches += 1
+        self.round_trips += 1
+        self.items += len(batch)
+        try:
+            result = await self._client.send("Runtime.evaluate", self._params(expression))
+        except Exception as e:
+            # the batch may have run, so its items are not retried
+            self._fail(batch, e)
+            return
+        details = result.get("exceptionDetails")
+        if details is not None:
+            if _is_syntax_error(details):
+                logger.info(f"Batch of {len(batch)} items did not compile, retrying individually")
+                self.items -= len(batch)
+                self.fallbacks += 1
+                await gather(*[self._run_item(item) for item in batch])
+            else:
+                self._fail(batch, create_evaluation_error(details))
+            return
+        try:
+            values = loads(result["result"].get("value"))
+        except (TypeError, ValueError):
+            values = None
+        if not isinstance(values, list) or len(values) != len(batch):
+            # e.g. the page replaced the builtins the batch relies on
+            self._fail(
+                batch, EvaluationError("Evaluation Error: malformed batch result")
+            )
+            return
+        for (_, future), (threw, value) in zip(batch, values):
+            if future.done():
+                continue
+            if threw:
+                future.set_exception(EvaluationError(f"Evaluation Error: {value}"))
+            else:
+                future.set_result(value)
+
+    @staticmethod
+    def _fail(batch: List[Item], error: Exception) -> None:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _run_item(self, item: Item) -> None:
+        source, future = item
+        self.round_trips += 1
+        self.items += 1
+        try:
+            result = await self._client.send("Runtime.evaluate", self._params(source))
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if future.done():
+            return
+        if "exceptionDetails" in result:
+            future.set_exception(create_evaluation_error(result["exceptionDetails"]))
+        else:
+            future.set_result(result["result"].get("value"))
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(items={self.items}, batches={self.batches}, round_trips={self.round_trips})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def _is_syntax_error(details: Dict) -> bool:
+    """Returns T/F indicating if the exceptionDetails are of a batch that did not compile"""
+    exception = details.get("exception") or {}
+    if exception.get("className") == "SyntaxError":
+        return True
+    description = exception.get("description") or details.get("text", "")
+    return description.startswith("SyntaxError")
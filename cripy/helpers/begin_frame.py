@@ -0,0 +1,192 @@
+from asyncio import Lock
+from binascii import a2b_base64
+from concurrent.futures import Executor
+from typing import Any, Dict, Optional, TYPE_CHECKING, Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["BeginFrameController", "RenderedFrame"]
+
+
+class RenderedFrame:
+    """The result of a HeadlessExperimental.beginFrame"""
+
+    __slots__ = ["elapsed_ms", "frame_time_ticks", "has_damage", "index", "screenshot"]
+
+    def __init__(
+        self,
+        index: int,
+        frame_time_ticks: float,
+        has_damage: bool,
+        screenshot: Optional[bytes],
+        elapsed_ms: float,
+    ) -> None:
+        self.index: int = index
+        #: The renderer time ticks, in milliseconds, the frame was issued for
+        self.frame_time_ticks: float = frame_time_ticks
+        #: Whether the frame changed what is displayed
+        self.has_damage: bool = has_damage
+        #: The decoded screenshot, if requested and the frame had damage
+        self.screenshot: Optional[bytes] = screenshot
+        #: The wall-clock milliseconds taken to produce, and decode, the frame
+        self.elapsed_ms: float = elapsed_ms
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(index={self.index}, damage={self.has_damage}, elapsed_ms={self.elapsed_ms:.2f})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class BeginFrameController:
+    """Produces frames on demand using HeadlessExperimental.beginFrame.
+
+    The target must have been created with BeginFrame control enabled, i.e.
+    `Target.createTarget` with `enableBeginFrameControl`, in a headless browser
+    launched with `--deterministic-mode` or `--enable-begin-frame-control`, so
+    that the compositor only produces the frames requested. Frame time ticks
+    advance by interval_ms per frame, independently of the wall-clock, and
+    frames are issued one at a time.
+
+    Example:
+
+    ```python
+    frames = await BeginFrameController(session).start()
+    await session.Page.navigate("https://example.com")
+    await frames.settle()
+    frame = await frames.render_frame(screenshot=True)
+    ```
+    """
+
+    __slots__ = [
+        "_client",
+        "_executor",
+        "_lock",
+        "_screenshot",
+        "damaged",
+        "frame_time_ticks",
+        "frames",
+        "interval_ms",
+        "max_ms",
+        "needs_begin_frames",
+        "total_ms",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        interval_ms: float = 1000 / 60,
+        format: str = "png",
+        quality: Optional[int] = None,
+        start_ticks: float = 0.0,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        """Construct a new BeginFrameController
+
+        :param client: The session of the target
+        :param interval_ms: The frame interval, in milliseconds, frame time ticks advance by
+        :param format: The format of screenshots, png or jpeg
+        :param quality: Compression quality from range [0..100] (jpeg only)
+        :param start_ticks: The frame time ticks of the first frame, 0 for the time of the first frame
+        :param executor: The executor screenshots are decoded in. Defaults to the loops default executor
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._executor: Optional[Executor] = executor
+        self._lock: Lock = Lock()
+        self._screenshot: Dict[str, Any] = {"format": format}
+        if quality is not None:
+            self._screenshot["quality"] = quality
+        self.interval_ms: float = interval_ms
+        #: The frame time ticks of the next frame
+        self.frame_time_ticks: float = start_ticks
+        #: Whether the renderer reported that it needs frames, e.g. for animations
+        self.needs_begin_frames: bool = False
+        self.frames: int = 0
+        #: The number of frames that had damage
+        self.damaged: int = 0
+        self.total_ms: float = 0.0
+        self.max_ms: float = 0.0
+
+    @property
+    def mean_ms(self) -> float:
+        """Returns the mean wall-clock milliseconds taken per frame"""
+        return self.total_ms / self.frames if self.frames else 0.0
+
+    async def start(self) -> "BeginFrameController":
+        """Enable the HeadlessExperimental domain"""
+        self._client.on(
+            "HeadlessExperimental.needsBeginFramesChanged", self._on_needs_begin_frames
+        )
+        await self._client.send("HeadlessExperimental.enable")
+        return self
+
+    async def stop(self) -> None:
+        self._client.remove_listener(
+            "HeadlessExperimental.needsBeginFramesChanged", self._on_needs_begin_frames
+        )
+        await self._client.send("HeadlessExperimental.disable")
+
+    async def render_frame(
+        self, screenshot: bool = False, no_display_updates: bool = False
+    ) -> RenderedFrame:
+        """Issue the next frame and wait for it to be produced
+
+        :param screenshot: Capture a screenshot of the frame, returned only if it had damage
+        :param no_display_updates: Run the frame without updating the display, e.g. to only run animations
+        :return: The rendered frame
+        """
+        loop = self._client.loop
+        async with self._lock:
+            if not self.frame_time_ticks:
+                self.frame_time_ticks = loop.time() * 1000
+            params: Dict[str, Any] = {
+                "frameTimeTicks": self.frame_time_ticks,
+                "interval": self.interval_ms,
+            }
+            if no_display_updates:
+                params["noDisplayUpdates"] = True
+            if screenshot:
+                params["screenshot"] = self._screenshot
+            started = loop.time()
+            result = await self._client.send("HeadlessExperimental.beginFrame", params)
+            data = result.get("screenshotData")
+            decoded = (
+                await loop.run_in_executor(self._executor, a2b_base64, data)
+                if data
+                else None
+            )
+            elapsed_ms = (loop.time() - started) * 1000
+            has_damage = result.get("hasDamage", False)
+            frame = RenderedFrame(
+                self.frames, params["frameTimeTicks"], has_damage, decoded, elapsed_ms
+            )
+            self.frames += 1
+            self.frame_time_ticks += self.interval_ms
+            if has_damage:
+                self.damaged += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+        return frame
+
+    async def settle(self, max_frames: int = 10) -> int:
+        """Render frames until one has no damage, e.g. once a page finished
+        laying out, or max_frames were rendered
+
+        :param max_frames: The maximum number of frames rendered
+        :return: The number of frames rendered
+        """
+        for rendered in range(1, max_frames + 1):
+            frame = await self.render_frame()
+            if not frame.has_damage:
+                return rendered
+        return max_frames
+
+    def _on_needs_begin_frames(self, event: Dict) -> None:
+        self.needs_begin_frames = event.get("needsBeginFrames", False)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(frames={self.frames}, damaged={self.damaged}, mean_ms={self.mean_ms:.2f})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
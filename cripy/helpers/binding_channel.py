@@ -0,0 +1,258 @@
+import logging
+from asyncio import Event
+from collections import deque
+from string import Template
+from typing import Any, Deque, Dict, Optional, Set, TYPE_CHECKING, Union
+
+from ujson import dumps, loads
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["BindingChannel"]
+
+logger = logging.getLogger(__name__)
+
+CLIENT_SOURCE: Template = Template(
+    """(() => {
+  const binding = globalThis[$name];
+  const channelName = $channel;
+  if (typeof binding !== "function" || globalThis[channelName]) return;
+  const maxCount = $max_count, maxBytes = $max_bytes, interval = $interval;
+  let buffer = [], bytes = 0, timer = null, paused = false, waiters = [];
+  const flush = (force) => {
+    if (timer !== null) { clearTimeout(timer); timer = null; }
+    if ((paused && force !== true) || buffer.length === 0) return;
+    const payload = "[" + buffer.join(",") + "]";
+    buffer = [];
+    bytes = 0;
+    binding(payload);
+  };
+  globalThis[channelName] = {
+    send(data) {
+      const message = JSON.stringify(data === undefined ? null : data);
+      buffer.push(message);
+      bytes += message.length;
+      if (buffer.length >= maxCount || bytes >= maxBytes) flush();
+      else if (timer === null && !paused) timer = setTimeout(flush, interval);
+      return !paused;
+    },
+    flush() { flush(); },
+    get paused() { return paused; },
+    ready() { return paused ? new Promise(resolve => waiters.push(resolve)) : Promise.resolve(); },
+    pause() {
+      paused = true;
+      if (timer !== null) { clearTimeout(timer); timer = null; }
+    },
+    resume() {
+      paused = false;
+      const resolved = waiters;
+      waiters = [];
+      resolved.forEach(resolve => resolve());
+      flush();
+    },
+  };
+  // the buffer would be lost with the document, so it is sent even while paused
+  addEventListener("pagehide", () => flush(true));
+})();"""
+)
+
+
+class BindingChannel:
+    """A channel carrying JSON messages from the page to Python using
+    Runtime.addBinding.
+
+    A small client is injected into every document. Page scripts call
+    `globalThis[channel_name].send(data)` and the client batches messages,
+    sending a batch through the binding once it holds max_count messages,
+    max_bytes characters or after interval milliseconds.
+
+    Messages are consumed by iterating the channel. Once queue_size
+    messages are waiting, the clients of the pages that sent them are paused:
+    `send` returns false and `ready()` returns a promise resolving once
+    resumed, which happens when half of the queue has been consumed. Paused
+    clients keep buffering, and send their buffer regardless when their page
+    is hidden, so no message is dropped.
+
+    Example:
+
+    ```python
+    async with BindingChannel(client) as channel:
+        await client.Page.navigate("https://example.com")
+        async for message in channel:
+            ...
+    ```
+    """
+
+    __slots__ = [
+        "_client",
+        "_contexts",
+        "_queue",
+        "_ready",
+        "_script_id",
+        "_started",
+        "batches",
+        "bytes",
+        "channel_name",
+        "messages",
+        "name",
+        "paused",
+        "pauses",
+        "queue_size",
+        "source",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        name: str = "__cripyBinding",
+        max_count: int = 256,
+        max_bytes: int = 2 ** 16,
+        interval: int = 50,
+        queue_size: int = 4096,
+    ) -> None:
+        """Construct a new BindingChannel
+
+        :param client: The client or session of the page
+        :param name: The name of the binding, the page side client is named `${name}Channel`
+        :param max_count: The number of messages the page batches before sending
+        :param max_bytes: The number of characters the page batches before sending
+        :param interval: The maximum number of milliseconds a message waits in the page
+        :param queue_size: The number of waiting messages that pauses the page clients
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self.name: str = name
+        self.channel_name: str = f"{name}Channel"
+        #: The injected client
+        self.source: str = CLIENT_SOURCE.substitute(
+            name=dumps(name),
+            channel=dumps(self.channel_name),
+            max_count=max_count,
+            max_bytes=max_bytes,
+            interval=interval,
+        )
+        self.queue_size: int = queue_size
+        self._queue: Deque[Any] = deque()
+        self._ready: Event = Event()
+        self._contexts: Set[int] = set()
+        self._script_id: Optional[str] = None
+        self._started: bool = False
+        self.paused: bool = False
+        self.messages: int = 0
+        #: The number of binding calls received
+        self.batches: int = 0
+        self.bytes: int = 0
+        self.pauses: int = 0
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of messages waiting to be consumed"""
+        return len(self._queue)
+
+    async def start(self) -> "BindingChannel":
+        """Add the binding and inject the client into the current and future documents"""
+        client = self._client
+        client.on("Runtime.bindingCalled", self._on_binding_called)
+        self._started = True
+        await client.send("Runtime.enable")
+        await client.send("Runtime.addBinding", {"name": self.name})
+        result = await client.send(
+            "Page.addScriptToEvaluateOnNewDocument", {"source": self.source}
+        )
+        self._script_id = result.get("identifier")
+        await client.send("Runtime.evaluate", {"expression": self.source})
+        return self
+
+    async def close(self) -> None:
+        """Remove the binding and the injected client. Messages waiting to
+        be consumed remain available."""
+        if not self._started:
+            return
+        self._started = False
+        self._client.remove_listener("Runtime.bindingCalled", self._on_binding_called)
+        self._ready.set()
+        await self._client.send("Runtime.removeBinding", {"name": self.name})
+        if self._script_id is not None:
+            await self._client.send(
+                "Page.removeScriptToEvaluateOnNewDocument",
+                {"identifier": self._script_id},
+            )
+
+    def _on_binding_called(self, event: Dict) -> None:
+        if event.get("name") != self.name:
+            return
+        payload = event.get("payload", "")
+        try:
+            messages = loads(payload)
+        except ValueError:
+            logger.warning(f"Malformed batch received by binding {self.name}")
+            return
+        self.batches += 1
+        self.bytes += len(payload)
+        self.messages += len(messages)
+        self._queue.extend(messages)
+        context_id = event.get("executionContextId")
+        if context_id is not None and context_id not in self._contexts:
+            self._contexts.add(context_id)
+            if self.paused:
+                self._client.loop.create_task(self._call_client("pause", context_id))
+        self._ready.set()
+        if not self.paused and len(self._queue) >= self.queue_size:
+            self.paused = True
+            self.pauses += 1
+            self._signal("pause")
+
+    def _signal(self, method: str) -> None:
+        """Calls pause or resume on the clients of the contexts that sent messages"""
+        contexts = self._contexts
+        if method == "resume":
+            self._contexts = set()
+        for context_id in contexts:
+            self._client.loop.create_task(self._call_client(method, context_id))
+
+    async def _call_client(self, method: str, context_id: int) -> None:
+        try:
+            await self._client.send(
+                "Runtime.evaluate",
+                {
+                    "expression": f"globalThis[{dumps(self.channel_name)}].{method}()",
+                    "contextId": context_id,
+                },
+            )
+        except Exception as e:
+            # the context may have been destroyed since it sent messages
+            logger.debug(f"Could not {method} the channel of context {context_id}: {e}")
+
+    async def get(self) -> Any:
+        """Returns the next message, raises EOFError once closed and drained"""
+        while not self._queue:
+            if not self._started:
+                raise EOFError(f"Channel {self.name} is closed")
+            self._ready.clear()
+            await self._ready.wait()
+        message = self._queue.popleft()
+        if self.paused and len(self._queue) <= self.queue_size // 2:
+            self.paused = False
+            self._signal("resume")
+        return message
+
+    def __aiter__(self) -> "BindingChannel":
+        return self
+
+    async def __anext__(self) -> Any:
+        try:
+            return await self.get()
+        except EOFError:
+            raise StopAsyncIteration
+
+    async def __aenter__(self) -> "BindingChannel":
+        return await self.start()
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        await self.close()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(name={self.name}, messages={self.messages}, batches={self.batches}, pending={self.pending})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,320 @@
+import logging
+from typing import Any, BinaryIO, Dict, List, Optional, TYPE_CHECKING, Union
+
+from .streams import (
+    BodySpool,
+    DEFAULT_CHUNK_SIZE,
+    encode_body,
+    IOStream,
+    iter_decoded,
+)
+from .workers import WorkerPool
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = [
+    "BodyFetcher",
+    "BodyMetrics",
+    "BodySink",
+    "STRIPPED_RESPONSE_HEADERS",
+    "paused_content_length",
+]
+
+logger = logging.getLogger(__name__)
+
+#: HTTP headers that no longer describe the body once Chrome has decoded it
+STRIPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+#: Where a body is written to: the path of a file, a BodySpool or a binary file like object
+BodySink = Union[str, BodySpool, BinaryIO]
+
+
+def paused_content_length(event: Dict) -> Optional[int]:
+    """Returns the value of the Content-Length header of a response
+    paused by the Fetch domain if present
+
+    :param event: The Fetch.requestPaused event
+    :return: The content length or None
+    """
+    headers: List[Dict[str, str]] = event.get("responseHeaders") or []
+    for header in headers:
+        if header["name"].lower() == "content-length":
+            try:
+                return int(header["value"])
+            except ValueError:
+                return None
+    return None
+
+
+class BodyMetrics:
+    """The metrics of a retrieved body"""
+
+    __slots__ = ["chunks", "duration", "request_id", "size", "streamed"]
+
+    def __init__(self, request_id: str, streamed: bool) -> None:
+        self.request_id: str = request_id
+        self.streamed: bool = streamed
+        self.size: int = 0
+        self.chunks: int = 0
+        self.duration: float = 0.0
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(requestId={self.request_id}, size={self.size}, duration={self.duration:.3f}, streamed={self.streamed})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class BodyFetcher:
+    """Retrieves response bodies using a bounded pool of workers, decoding
+    each body incrementally into a sink.
+
+    Responses paused by the Fetch domain at the response stage whose size
+    is unknown or larger than `stream_threshold` are streamed using
+    Fetch.takeResponseBodyAsStream and IO.read, all other bodies are retrieved
+    in a single message using Network.getResponseBody or Fetch.getResponseBody.
+    The threshold applies to the size on the wire, the Content-Length of the
+    response, so a compressed body may decode to many times the threshold.
+
+    A streamed response can only be released to the page by fulfilling it
+    with the whole body in a single Fetch.fulfillRequest, so fulfilling
+    holds the base64 encoded body in memory and is limited to bodies of at
+    most `max_fulfill_size` bytes.
+    """
+
+    __slots__ = [
+        "_chunk_size",
+        "_client",
+        "_pool",
+        "_stream_threshold",
+        "bodies",
+        "bytes",
+        "errors",
+        "max_fulfill_size",
+        "seconds",
+        "streamed",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        workers: int = 4,
+        queue_size: int = 64,
+        stream_threshold: int = 2 ** 20,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_fulfill_size: int = 2 ** 25,
+    ) -> None:
+        """Construct a new BodyFetcher
+
+        :param client: The client or session the bodies are retrieved from
+        :param workers: Maximum number of bodies retrieved concurrently
+        :param queue_size: Maximum number of bodies waiting to be retrieved
+        :param stream_threshold: The Content-Length in bytes above which paused bodies are streamed
+        :param chunk_size: The number of bytes decoded, or read, per chunk
+        :param max_fulfill_size: The size in bytes above which streamed bodies are not fulfilled
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._pool: WorkerPool = WorkerPool(workers, queue_size, loop=client.loop)
+        self._stream_threshold: int = stream_threshold
+        self._chunk_size: int = chunk_size
+        #: Streamed bodies larger than this are failed rather than fulfilled
+        self.max_fulfill_size: int = max_fulfill_size
+        self.bodies: int = 0
+        self.streamed: int = 0
+        self.bytes: int = 0
+        self.seconds: float = 0.0
+        self.errors: int = 0
+
+    @property
+    def pool(self) -> WorkerPool:
+        """Returns the worker pool used to retrieve bodies"""
+        return self._pool
+
+    async def fetch(self, request_id: str, sink: BodySink) -> BodyMetrics:
+        """Retrieve the body of a finished request using Network.getResponseBody
+
+        :param request_id: The Network requestId of the request
+        :param sink: Where the body is written to
+        :return: The metrics of the retrieved body
+        """
+        try:
+            return await self._pool.run(self._fetch, request_id, sink)
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def fetch_paused(
+        self, event: Dict, sink: BodySink, release: Optional[str] = "fail"
+    ) -> BodyMetrics:
+        """Retrieve the body of a response paused by the Fetch domain at the
+        response stage.
+
+        Once a body has been streamed the request can not be continued, it is
+        released according to `release`:
+         - "fulfill": fulfilled using the body written to the sink, requires a
+         path or BodySpool sink. The whole body is base64 encoded in memory, a
+         body larger than `max_fulfill_size` is failed instead
+         - "fail": failed with the Aborted error reason
+         - None: left paused for the caller to resolve
+
+        Bodies that were not streamed are continued unless release is None.
+
+        :param event: The Fetch.requestPaused event
+        :param sink: Where the body is written to
+        :param release: How to release the request once the body was streamed
+        :return: The metrics of the retrieved body
+        """
+        if release == "fulfill" and not isinstance(sink, (str, BodySpool)):
+            raise ValueError(
+                "Fulfilling a streamed body requires a path or BodySpool sink"
+            )
+        try:
+            return await self._pool.run(self._fetch_paused, event, sink, release)
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def close(self) -> None:
+        """Wait for queued bodies to be retrieved and stop the workers"""
+        await self._pool.close()
+
+    async def _fetch(self, request_id: str, sink: BodySink) -> BodyMetrics:
+        metrics = BodyMetrics(request_id, False)
+        start = self._client.loop.time()
+        result = await self._client.send(
+            "Network.getResponseBody", {"requestId": request_id}
+        )
+        await self._decode_into(result, sink, metrics)
+        self._record(metrics, start)
+        return metrics
+
+    async def _fetch_paused(
+        self, event: Dict, sink: BodySink, release: Optional[str]
+    ) -> BodyMetrics:
+        send = self._client.send
+        request_id = event["requestId"]
+        content_length = paused_content_length(event)
+        start = self._client.loop.time()
+        if content_length is not None and content_length <= self._stream_threshold:
+            metrics = BodyMetrics(request_id, False)
+            result = await send("Fetch.getResponseBody", {"requestId": request_id})
+            await self._decode_into(result, sink, metrics)
+            if release is not None:
+                await send("Fetch.continueRequest", {"requestId": request_id})
+            self._record(metrics, start)
+            return metrics
+        metrics = BodyMetrics(request_id, True)
+        run_in_executor = self._client.loop.run_in_executor
+        result = await send("Fetch.takeResponseBodyAsStream", {"requestId": request_id})
+        out: Any = None
+        owned = False
+        try:
+            async with IOStream(
+                self._client, result["stream"], self._chunk_size
+            ) as stream:
+                out, owned = await run_in_executor(None, self._open_sink, sink)
+                async for chunk in stream:
+                    await run_in_executor(None, out.write, chunk)
+                    metrics.size += len(chunk)
+                    metrics.chunks += 1
+        except Exception:
+            if release is not None:
+                await send(
+                    "Fetch.failRequest",
+                    {"requestId": request_id, "errorReason": "Aborted"},
+                )
+            raise
+        finally:
+            if owned:
+                await run_in_executor(None, out.close)
+        if release == "fulfill" and metrics.size > self.max_fulfill_size:
+            logger.warning(
+                f"Failing {request_id} as its body of {metrics.size} bytes is too large to fulfill"
+            )
+            release = "fail"
+        if release == "fulfill":
+            body = await self._client.loop.run_in_executor(
+                None, encode_body, sink, self._chunk_size
+            )
+            await send(
+                "Fetch.fulfillRequest",
+                {
+                    "requestId": request_id,
+                    "responseCode": event.get("responseStatusCode", 200),
+                    # the body was decoded, its encoding and length no longer apply
+                    "responseHeaders": [
+                        header
+                        for header in event.get("responseHeaders") or []
+                        if header["name"].lower() not in STRIPPED_RESPONSE_HEADERS
+                    ],
+                    "body": body,
+                },
+            )
+        elif release == "fail":
+            await send(
+                "Fetch.failRequest", {"requestId": request_id, "errorReason": "Aborted"}
+            )
+        self.streamed += 1
+        self._record(metrics, start)
+        return metrics
+
+    async def _decode_into(
+        self, result: Dict, sink: BodySink, metrics: BodyMetrics
+    ) -> None:
+        """Incrementally decodes the body of a getResponseBody result into the sink.
+        Large bodies, and bodies written to a file, are decoded in the default executor.
+
+        :param result: The result of the getResponseBody command
+        :param sink: Where the body is written to
+        :param metrics: The metrics of the body
+        """
+        data = result.get("body", "")
+        base64_encoded = result.get("base64Encoded", False)
+        if len(data) > self._stream_threshold or isinstance(sink, str):
+            await self._client.loop.run_in_executor(
+                None, self._write_decoded, data, base64_encoded, sink, metrics
+            )
+        else:
+            self._write_decoded(data, base64_encoded, sink, metrics)
+
+    def _write_decoded(
+        self, data: str, base64_encoded: bool, sink: BodySink, metrics: BodyMetrics
+    ) -> None:
+        out, owned = self._open_sink(sink)
+        try:
+            for chunk in iter_decoded(data, base64_encoded, self._chunk_size):
+                out.write(chunk)
+                metrics.size += len(chunk)
+                metrics.chunks += 1
+        finally:
+            if owned:
+                out.close()
+
+    def _open_sink(self, sink: BodySink) -> Any:
+        """Returns the writable object for the supplied sink and T/F
+        indicating if it was opened by the fetcher
+
+        :param sink: Where the body is written to
+        :return: The writable object and T/F indicating if it must be closed
+        """
+        if isinstance(sink, str):
+            return open(sink, "wb"), True
+        return sink, False
+
+    def _record(self, metrics: BodyMetrics, start: float) -> None:
+        """Records the metrics of a retrieved body
+
+        :param metrics: The metrics of the body
+        :param start: The loop time the retrieval started
+        """
+        metrics.duration = self._client.loop.time() - start
+        self.bodies += 1
+        self.bytes += metrics.size
+        self.seconds += metrics.duration
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(bodies={self.bodies}, bytes={self.bytes}, streamed={self.streamed})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
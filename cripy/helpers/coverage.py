@@ -0,0 +1,384 @@
+import logging
+from array import array
+from asyncio import CancelledError, Task, sleep
+from hashlib import sha1
+from heapq import merge
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    TYPE_CHECKING,
+    Tuple,
+    Union,
+)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["CoverageAggregator", "IntervalSet", "ResourceCoverage", "used_ranges"]
+
+logger = logging.getLogger(__name__)
+
+Range = Tuple[int, int]
+
+
+class IntervalSet:
+    """A set of disjoint half open intervals kept sorted in a flat
+    array of start and end offsets"""
+
+    __slots__ = ["_bounds"]
+
+    def __init__(self, ranges: Optional[Iterable[Range]] = None) -> None:
+        self._bounds: array = array("I")
+        if ranges is not None:
+            self.add(ranges)
+
+    @property
+    def size(self) -> int:
+        """Returns the number of offsets covered by the intervals"""
+        bounds = self._bounds
+        return sum(bounds[1::2]) - sum(bounds[0::2])
+
+    def add(self, ranges: Iterable[Range]) -> None:
+        """Union the supplied ranges into the set. Only the new ranges are
+        sorted, they are then merged in a single pass with the already sorted
+        intervals, coalescing overlapping or adjacent ones
+
+        :param ranges: The start and end offsets of the ranges
+        """
+        added = sorted(r for r in ranges if r[1] > r[0])
+        if not added:
+            return
+        merged = array("I")
+        current_start = current_end = -1
+        for start, end in merge(self, added):
+            if start <= current_end:
+                if end > current_end:
+                    current_end = end
+                continue
+            if current_end != -1:
+                merged.append(current_start)
+                merged.append(current_end)
+            current_start = start
+            current_end = end
+        if current_end != -1:
+            merged.append(current_start)
+            merged.append(current_end)
+        self._bounds = merged
+
+    def __iter__(self) -> Iterator[Range]:
+        bounds = self._bounds
+        for i in range(0, len(bounds), 2):
+            yield bounds[i], bounds[i + 1]
+
+    def __len__(self) -> int:
+        return len(self._bounds) // 2
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(intervals={len(self)}, size={self.size})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def used_ranges(functions: List[Dict]) -> List[Range]:
+    """Returns the used ranges of a Profiler.ScriptCoverage's functions.
+
+    The ranges of a script are nested, the count of the innermost range
+    applies to each offset, so the ranges are swept in start order with a
+    stack of the ranges containing the current offset.
+
+    :param functions: The Profiler.FunctionCoverages of a script
+    :return: The disjoint ranges with a non zero count
+    """
+    ranges = sorted(
+        (r["startOffset"], -r["endOffset"], r["count"])
+        for function in functions
+        for r in function["ranges"]
+    )
+    used: List[Range] = []
+    stack: List[Tuple[int, int]] = []
+    pos = 0
+    for start, neg_end, count in ranges:
+        while stack and stack[-1][0] <= start:
+            end, active = stack.pop()
+            if active and pos < end:
+                used.append((pos, end))
+            pos = max(pos, end)
+        if stack and stack[-1][1] and pos < start:
+            used.append((pos, start))
+        pos = start
+        stack.append((-neg_end, count))
+    while stack:
+        end, active = stack.pop()
+        if active and pos < end:
+            used.append((pos, end))
+        pos = max(pos, end)
+    return used
+
+
+class ResourceCoverage:
+    """The union of the used ranges of a script or style sheet, identified by its content hash"""
+
+    __slots__ = ["content_hash", "kind", "length", "ranges", "urls"]
+
+    def __init__(self, content_hash: str, kind: str, length: int) -> None:
+        self.content_hash: str = content_hash
+        #: js or css
+        self.kind: str = kind
+        self.length: int = length
+        self.urls: Set[str] = set()
+        self.ranges: IntervalSet = IntervalSet()
+
+    @property
+    def used(self) -> int:
+        """Returns the number of bytes used"""
+        return self.ranges.size
+
+    @property
+    def unused(self) -> int:
+        """Returns the number of bytes never used"""
+        return max(self.length - self.used, 0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "hash": self.content_hash,
+            "type": self.kind,
+            "urls": sorted(self.urls),
+            "length": self.length,
+            "used": self.used,
+            "unused": self.unused,
+        }
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(type={self.kind}, urls={len(self.urls)}, used={self.used}, length={self.length})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class CoverageAggregator:
+    """Collects the precise JS coverage and the CSS rule usage of a target and
+    unions the used ranges of each script and style sheet, identified by the
+    hash of its content, across page loads.
+
+    Coverage can be taken on demand with `poll` or periodically while the
+    target is used, see `start_polling`. Each poll only merges the coverage
+    accumulated since the previous one.
+    """
+
+    __slots__ = [
+        "_client",
+        "_css",
+        "_js",
+        "_poller",
+        "_scripts",
+        "_sheets",
+        "call_count",
+        "polls",
+        "resources",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        js: bool = True,
+        css: bool = True,
+        call_count: bool = False,
+    ) -> None:
+        """Construct a new CoverageAggregator
+
+        :param client: The client or session whose coverage is collected
+        :param js: Collect the precise coverage of scripts
+        :param css: Collect the rule usage of style sheets
+        :param call_count: Collect execution counts rather than a binary used flag
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._js: bool = js
+        self._css: bool = css
+        self.call_count: bool = call_count
+        #: scriptId to the url, content hash and length of the script
+        self._scripts: Dict[str, Tuple[str, str, int]] = {}
+        #: styleSheetId to the url and length of the sheet, then its hash once known
+        self._sheets: Dict[str, Tuple[str, Optional[str], int]] = {}
+        self._poller: Optional[Task] = None
+        self.resources: Dict[str, ResourceCoverage] = {}
+        self.polls: int = 0
+
+    async def start(self) -> "CoverageAggregator":
+        """Enable the domains needed and start collecting coverage"""
+        client = self._client
+        if self._js:
+            client.on("Debugger.scriptParsed", self._on_script_parsed)
+            await client.send("Profiler.enable")
+            await client.send("Debugger.enable")
+            await client.send(
+                "Profiler.startPreciseCoverage",
+                {"callCount": self.call_count, "detailed": True},
+            )
+        if self._css:
+            client.on("CSS.styleSheetAdded", self._on_style_sheet_added)
+            await client.send("DOM.enable")
+            await client.send("CSS.enable")
+            await client.send("CSS.startRuleUsageTracking")
+        return self
+
+    def start_polling(self, interval: float = 5.0) -> None:
+        """Poll for coverage every interval seconds until stopped
+
+        :param interval: The number of seconds between polls
+        """
+        if self._poller is None:
+            self._poller = self._client.loop.create_task(self._poll_loop(interval))
+
+    async def stop(self) -> None:
+        """Stop polling, merge the remaining coverage and stop collecting it"""
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except CancelledError:
+                pass
+            self._poller = None
+        await self.poll()
+        client = self._client
+        if self._js:
+            client.remove_listener("Debugger.scriptParsed", self._on_script_parsed)
+            await client.send("Profiler.stopPreciseCoverage")
+            await client.send("Debugger.disable")
+            await client.send("Profiler.disable")
+        if self._css:
+            client.remove_listener("CSS.styleSheetAdded", self._on_style_sheet_added)
+            await client.send("CSS.stopRuleUsageTracking")
+
+    async def poll(self) -> int:
+        """Take the coverage accumulated since the previous poll and merge it
+
+        :return: The number of used ranges merged
+        """
+        merged = 0
+        if self._js:
+            result = await self._client.send("Profiler.takePreciseCoverage")
+            merged += self._merge_js(result.get("result", []))
+        if self._css:
+            result = await self._client.send("CSS.takeCoverageDelta")
+            merged += await self._merge_css(result.get("coverage", []))
+        self.polls += 1
+        return merged
+
+    def report(self) -> List[Dict[str, Any]]:
+        """Returns the used and unused bytes of every resource, most unused first"""
+        return sorted(
+            (resource.to_dict() for resource in self.resources.values()),
+            key=lambda item: item["unused"],
+            reverse=True,
+        )
+
+    @property
+    def used(self) -> int:
+        """Returns the number of bytes used across all resources"""
+        return sum(resource.used for resource in self.resources.values())
+
+    @property
+    def total(self) -> int:
+        """Returns the number of bytes of all resources"""
+        return sum(resource.length for resource in self.resources.values())
+
+    def _resource(self, content_hash: str, kind: str, length: int, url: str) -> ResourceCoverage:
+        resource = self.resources.get(content_hash)
+        if resource is None:
+            resource = self.resources[content_hash] = ResourceCoverage(
+                content_hash, kind, length
+            )
+        if url:
+            resource.urls.add(url)
+        return resource
+
+    def _merge_js(self, scripts: List[Dict]) -> int:
+        """Merges the Profiler.ScriptCoverages of a poll"""
+        merged = 0
+        pending: Dict[str, List[Range]] = {}
+        for script in scripts:
+            info = self._scripts.get(script["scriptId"])
+            if info is None:
+                continue
+            url, content_hash, length = info
+            ranges = used_ranges(script["functions"])
+            self._resource(content_hash, "js", length, url or script.get("url", ""))
+            pending.setdefault(content_hash, []).extend(ranges)
+            merged += len(ranges)
+        for content_hash, ranges in pending.items():
+            self.resources[content_hash].ranges.add(ranges)
+        return merged
+
+    async def _merge_css(self, usages: List[Dict]) -> int:
+        """Merges the CSS.RuleUsages of a poll, hashing newly seen style sheets"""
+        by_sheet: Dict[str, List[Range]] = {}
+        for usage in usages:
+            if usage.get("used", True):
+                by_sheet.setdefault(usage["styleSheetId"], []).append(
+                    (usage["startOffset"], usage["endOffset"])
+                )
+        merged = 0
+        for sheet_id, ranges in by_sheet.items():
+            info = await self._sheet_info(sheet_id)
+            if info is None:
+                continue
+            url, content_hash, length = info
+            self._resource(content_hash, "css", length, url).ranges.add(ranges)
+            merged += len(ranges)
+        return merged
+
+    async def _sheet_info(self, sheet_id: str) -> Optional[Tuple[str, str, int]]:
+        """Returns the url, content hash and length of a style sheet,
+        retrieving its text the first time it is seen"""
+        info = self._sheets.get(sheet_id)
+        url = info[0] if info is not None else ""
+        if info is not None and info[1] is not None:
+            return info
+        try:
+            result = await self._client.send(
+                "CSS.getStyleSheetText", {"styleSheetId": sheet_id}
+            )
+        except Exception as e:
+            logger.info(f"Could not retrieve the text of style sheet {sheet_id}: {e}")
+            return None
+        text = result.get("text", "")
+        info = (url, sha1(text.encode("utf-8")).hexdigest(), len(text))
+        self._sheets[sheet_id] = info
+        return info
+
+    def _on_script_parsed(self, event: Dict) -> None:
+        self._scripts[event["scriptId"]] = (
+            event.get("url", ""),
+            event.get("hash") or event["scriptId"],
+            event.get("length", 0),
+        )
+
+    def _on_style_sheet_added(self, event: Dict) -> None:
+        header = event["header"]
+        self._sheets[header["styleSheetId"]] = (
+            header.get("sourceURL", ""),
+            None,
+            header.get("length", 0),
+        )
+
+    async def _poll_loop(self, interval: float) -> None:
+        while 1:
+            await sleep(interval)
+            try:
+                await self.poll()
+            except CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed to poll coverage")
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(resources={len(self.resources)}, used={self.used}, total={self.total})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,262 @@
+from array import array
+from asyncio import AbstractEventLoop, get_event_loop
+from typing import Dict, List, Optional, TextIO, Tuple, Union
+
+__all__ = ["CPUProfileStore"]
+
+FrameKey = Tuple[int, int, int, int]
+
+
+class CPUProfileStore:
+    """Aggregates the Profiler.Profiles of any number of targets into compact
+    global tables.
+
+    Call frames are interned, by function name, url, line and column, into
+    frame ids whose strings are interned once across all profiles. Each
+    profile added is converted into columnar arrays and merged into the per
+    frame self and total times and into the time spent in each distinct stack,
+    from which a flamegraph ready collapsed stack file can be written.
+
+    Times are in microseconds. Recursive frames contribute their total time once.
+    """
+
+    __slots__ = [
+        "_frame_keys",
+        "_loop",
+        "_stack_keys",
+        "_string_ids",
+        "frame_column",
+        "frame_line",
+        "frame_name",
+        "frame_self",
+        "frame_total",
+        "frame_url",
+        "profiles",
+        "samples",
+        "stack_frame",
+        "stack_parent",
+        "stack_time",
+        "strings",
+    ]
+
+    def __init__(self, loop: Optional[AbstractEventLoop] = None) -> None:
+        """Construct a new CPUProfileStore
+
+        :param loop: Optional event loop used by export_collapsed. Defaults to asyncio.get_event_loop
+        """
+        self._loop: Optional[AbstractEventLoop] = loop
+        self.strings: List[str] = []
+        self._string_ids: Dict[str, int] = {}
+        self._frame_keys: Dict[FrameKey, int] = {}
+        self.frame_name: array = array("I")
+        self.frame_url: array = array("I")
+        self.frame_line: array = array("i")
+        self.frame_column: array = array("i")
+        self.frame_self: array = array("q")
+        self.frame_total: array = array("q")
+        self._stack_keys: Dict[Tuple[int, int], int] = {}
+        self.stack_parent: array = array("i")
+        self.stack_frame: array = array("I")
+        self.stack_time: array = array("q")
+        self.profiles: int = 0
+        self.samples: int = 0
+
+    @property
+    def frame_count(self) -> int:
+        """Returns the number of distinct call frames"""
+        return len(self.frame_name)
+
+    @property
+    def stack_count(self) -> int:
+        """Returns the number of distinct stacks"""
+        return len(self.stack_frame)
+
+    def add(self, profile: Dict) -> None:
+        """Merge a profile, as returned by Profiler.stop, into the store
+
+        :param profile: The Profiler.Profile
+        """
+        nodes = profile["nodes"]
+        count = len(nodes)
+        index: Dict[int, int] = {}
+        frames = array("I")
+        intern_frame = self._intern_frame
+        for i, node in enumerate(nodes):
+            index[node["id"]] = i
+            frames.append(intern_frame(node["callFrame"]))
+        parents = array("i", [-1]) * count
+        child_counts = array("I", [0]) * count
+        for i, node in enumerate(nodes):
+            children = node.get("children")
+            if children:
+                child_counts[i] = len(children)
+                for child in children:
+                    parents[index[child]] = i
+        self_times = array("q", [0]) * count
+        samples = profile.get("samples") or []
+        deltas = profile.get("timeDeltas") or []
+        if samples:
+            # a sample lasts until the next one, the last until the end of the profile
+            timestamp = profile.get("startTime", 0)
+            for delta in deltas:
+                timestamp += delta
+            durations = list(deltas[1:])
+            durations.append(profile.get("endTime", timestamp) - timestamp)
+            for sample, duration in zip(samples, durations):
+                if duration > 0:
+                    self_times[index[sample]] += duration
+            self.samples += len(samples)
+        self._merge(frames, parents, child_counts, nodes, index, self_times)
+        self.profiles += 1
+
+    def _merge(
+        self,
+        frames: array,
+        parents: array,
+        child_counts: array,
+        nodes: List[Dict],
+        index: Dict[int, int],
+        self_times: array,
+    ) -> None:
+        """Merges the columnar form of a profile into the global tables
+        using an iterative depth first traversal of its nodes"""
+        count = len(frames)
+        totals = array("q", self_times)
+        stack_ids = array("i", [-1]) * count
+        on_path: Dict[int, int] = {}
+        frame_self = self.frame_self
+        frame_total = self.frame_total
+        stack_time = self.stack_time
+        intern_stack = self._intern_stack
+        # positive entries are nodes to enter, negative entries nodes to leave
+        pending = [i + 1 for i in range(count) if parents[i] == -1]
+        while pending:
+            entry = pending.pop()
+            if entry > 0:
+                node = entry - 1
+                frame = frames[node]
+                parent = parents[node]
+                stack = intern_stack(stack_ids[parent] if parent != -1 else -1, frame)
+                stack_ids[node] = stack
+                stack_time[stack] += self_times[node]
+                frame_self[frame] += self_times[node]
+                on_path[frame] = on_path.get(frame, 0) + 1
+                pending.append(-entry)
+                if child_counts[node]:
+                    pending.extend(index[child] + 1 for child in nodes[node]["children"])
+                continue
+            node = -entry - 1
+            frame = frames[node]
+            depth = on_path[frame] - 1
+            on_path[frame] = depth
+            if depth == 0:
+                frame_total[frame] += totals[node]
+            parent = parents[node]
+            if parent != -1:
+                totals[parent] += totals[node]
+
+    def _intern_string(self, value: str) -> int:
+        string_id = self._string_ids.get(value)
+        if string_id is None:
+            string_id = self._string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def _intern_frame(self, call_frame: Dict) -> int:
+        key = (
+            self._intern_string(call_frame.get("functionName", "")),
+            self._intern_string(call_frame.get("url", "")),
+            call_frame.get("lineNumber", -1),
+            call_frame.get("columnNumber", -1),
+        )
+        frame = self._frame_keys.get(key)
+        if frame is None:
+            frame = self._frame_keys[key] = len(self.frame_name)
+            self.frame_name.append(key[0])
+            self.frame_url.append(key[1])
+            self.frame_line.append(key[2])
+            self.frame_column.append(key[3])
+            self.frame_self.append(0)
+            self.frame_total.append(0)
+        return frame
+
+    def _intern_stack(self, parent: int, frame: int) -> int:
+        key = (parent, frame)
+        stack = self._stack_keys.get(key)
+        if stack is None:
+            stack = self._stack_keys[key] = len(self.stack_frame)
+            self.stack_parent.append(parent)
+            self.stack_frame.append(frame)
+            self.stack_time.append(0)
+        return stack
+
+    def frame_label(self, frame: int) -> str:
+        """Returns the display label of a frame, e.g. `render app.js:12`
+
+        :param frame: The frame id
+        :return: The label of the frame
+        """
+        name = self.strings[self.frame_name[frame]] or "(anonymous)"
+        url = self.strings[self.frame_url[frame]]
+        if not url:
+            return name
+        return f"{name} {url}:{self.frame_line[frame] + 1}"
+
+    def top(self, n: int = 20, by: str = "self") -> List[Tuple[str, int, int]]:
+        """Returns the frames with the most self, or total, time
+
+        :param n: The number of frames returned
+        :param by: Order by self or total time
+        :return: The label, self time and total time of each frame
+        """
+        times = self.frame_self if by == "self" else self.frame_total
+        frames = sorted(range(self.frame_count), key=times.__getitem__, reverse=True)[:n]
+        return [
+            (self.frame_label(frame), self.frame_self[frame], self.frame_total[frame])
+            for frame in frames
+        ]
+
+    def write_collapsed(self, out: Union[str, TextIO]) -> int:
+        """Writes the time spent in each stack in the collapsed stack format,
+        `frame;frame;frame microseconds` per line, read by flamegraph tools.
+        Blocks, see `export_collapsed`.
+
+        :param out: The path of the file or a text file like object
+        :return: The number of lines written
+        """
+        if isinstance(out, str):
+            with open(out, "w", encoding="utf-8") as file:
+                return self.write_collapsed(file)
+        labels: Dict[int, str] = {}
+        paths: Dict[int, str] = {}
+        stack_parent = self.stack_parent
+        stack_frame = self.stack_frame
+        written = 0
+        for stack, time in enumerate(self.stack_time):
+            frame = stack_frame[stack]
+            label = labels.get(frame)
+            if label is None:
+                label = labels[frame] = self.frame_label(frame).replace(";", ":")
+            parent = stack_parent[stack]
+            # parents are always interned before their children
+            path = f"{paths[parent]};{label}" if parent != -1 else label
+            paths[stack] = path
+            if time > 0:
+                out.write(f"{path} {time}\n")
+                written += 1
+        return written
+
+    async def export_collapsed(self, path: str) -> int:
+        """Write the collapsed stack file in the default executor
+
+        :param path: The path of the file
+        :return: The number of lines written
+        """
+        loop = self._loop if self._loop is not None else get_event_loop()
+        return await loop.run_in_executor(None, self.write_collapsed, path)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(profiles={self.profiles}, frames={self.frame_count}, stacks={self.stack_count})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,451 @@
+import logging
+from asyncio import Future
+from typing import Dict, Iterator, List, Optional, TYPE_CHECKING, Union
+
+from .selectors import Selector, SelectorError, compile_selector
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["DOMMirror", "MirrorNode"]
+
+logger = logging.getLogger(__name__)
+
+TEXT_NODE: int = 3
+
+
+class MirrorNode:
+    """A node of the mirrored document"""
+
+    __slots__ = [
+        "attributes",
+        "backend_node_id",
+        "child_node_count",
+        "children",
+        "content_document",
+        "frame_id",
+        "local_name",
+        "node_id",
+        "node_name",
+        "node_type",
+        "node_value",
+        "parent",
+        "shadow_roots",
+    ]
+
+    def __init__(self, node: Dict, parent: Optional["MirrorNode"] = None) -> None:
+        """Construct a new MirrorNode
+
+        :param node: The DOM.Node, its children are not used
+        :param parent: The parent of the node
+        """
+        self.node_id: int = node["nodeId"]
+        self.backend_node_id: int = node.get("backendNodeId", 0)
+        self.node_type: int = node["nodeType"]
+        self.node_name: str = node["nodeName"]
+        self.local_name: str = node.get("localName", "")
+        self.node_value: str = node.get("nodeValue", "")
+        self.frame_id: Optional[str] = node.get("frameId")
+        self.child_node_count: int = node.get("childNodeCount", 0)
+        attributes = node.get("attributes") or []
+        self.attributes: Dict[str, str] = {
+            attributes[i]: attributes[i + 1] for i in range(0, len(attributes), 2)
+        }
+        self.parent: Optional[MirrorNode] = parent
+        self.children: List[MirrorNode] = []
+        self.shadow_roots: List[MirrorNode] = []
+        self.content_document: Optional[MirrorNode] = None
+
+    @property
+    def text(self) -> str:
+        """Returns the text content of the node"""
+        if self.node_type == TEXT_NODE:
+            return self.node_value
+        parts: List[str] = []
+        pending = list(reversed(self.children))
+        while pending:
+            node = pending.pop()
+            if node.node_type == TEXT_NODE:
+                parts.append(node.node_value)
+            elif node.children:
+                pending.extend(reversed(node.children))
+        return "".join(parts)
+
+    def get_attribute(self, name: str) -> Optional[str]:
+        """Returns the value of the named attribute"""
+        return self.attributes.get(name)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(node_id={self.node_id}, name={self.node_name}, children={len(self.children)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class DOMMirror:
+    """Keeps a local copy of the DOM of a target in sync with the browser.
+
+    The document is retrieved once, with DOM.getDocument, and then kept
+    up to date by applying the DOM domain's mutation events. Nodes are
+    indexed by nodeId and backendNodeId, and CSS selectors supported by the
+    local engine are matched against the mirror without a round trip. Other
+    selectors are sent to the browser, see `query_selector_all`.
+
+    Example:
+
+    ```python
+    mirror = await DOMMirror(client).start()
+    for link in mirror.select("nav a[href]"):
+        print(link.attributes["href"], link.text)
+    ```
+    """
+
+    __slots__ = [
+        "_by_backend_id",
+        "_client",
+        "_generation",
+        "_loading",
+        "_nodes",
+        "_pierce",
+        "_selectors",
+        "document",
+        "local_queries",
+        "reloads",
+        "remote_queries",
+        "updates",
+    ]
+
+    def __init__(
+        self, client: Union["ConnectionType", "SessionType"], pierce: bool = False
+    ) -> None:
+        """Construct a new DOMMirror
+
+        :param client: The client or session whose DOM is mirrored
+        :param pierce: Include the documents of iframes and the shadow roots
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._pierce: bool = pierce
+        self._nodes: Dict[int, MirrorNode] = {}
+        self._by_backend_id: Dict[int, MirrorNode] = {}
+        self._selectors: Dict[str, Selector] = {}
+        self._loading: Optional[Future] = None
+        #: Incremented each time the document is retrieved or replaced
+        self._generation: int = 0
+        self.document: Optional[MirrorNode] = None
+        #: The number of mutation events applied
+        self.updates: int = 0
+        #: The number of times the document was retrieved
+        self.reloads: int = 0
+        self.local_queries: int = 0
+        self.remote_queries: int = 0
+
+    async def start(self) -> "DOMMirror":
+        """Enable the DOM domain and retrieve the document"""
+        client = self._client
+        client.on("DOM.documentUpdated", self._on_document_updated)
+        client.on("DOM.setChildNodes", self._on_set_child_nodes)
+        client.on("DOM.childNodeInserted", self._on_child_node_inserted)
+        client.on("DOM.childNodeRemoved", self._on_child_node_removed)
+        client.on("DOM.childNodeCountUpdated", self._on_child_node_count_updated)
+        client.on("DOM.attributeModified", self._on_attribute_modified)
+        client.on("DOM.attributeRemoved", self._on_attribute_removed)
+        client.on("DOM.characterDataModified", self._on_character_data_modified)
+        client.on("DOM.shadowRootPushed", self._on_shadow_root_pushed)
+        client.on("DOM.shadowRootPopped", self._on_shadow_root_popped)
+        await client.send("DOM.enable")
+        await self.reload()
+        return self
+
+    def stop(self) -> None:
+        """Stop applying mutation events, the mirror keeps its last state"""
+        client = self._client
+        client.remove_listener("DOM.documentUpdated", self._on_document_updated)
+        client.remove_listener("DOM.setChildNodes", self._on_set_child_nodes)
+        client.remove_listener("DOM.childNodeInserted", self._on_child_node_inserted)
+        client.remove_listener("DOM.childNodeRemoved", self._on_child_node_removed)
+        client.remove_listener(
+            "DOM.childNodeCountUpdated", self._on_child_node_count_updated
+        )
+        client.remove_listener("DOM.attributeModified", self._on_attribute_modified)
+        client.remove_listener("DOM.attributeRemoved", self._on_attribute_removed)
+        client.remove_listener(
+            "DOM.characterDataModified", self._on_character_data_modified
+        )
+        client.remove_listener("DOM.shadowRootPushed", self._on_shadow_root_pushed)
+        client.remove_listener("DOM.shadowRootPopped", self._on_shadow_root_popped)
+
+    async def reload(self) -> MirrorNode:
+        """Retrieve the whole document, replacing the mirror"""
+        if self._loading is not None and not self._loading.done():
+            return await self._loading
+        self._generation += 1
+        self._loading = self._client.loop.create_future()
+        return await self._retrieve(self._generation, self._loading)
+
+    async def _retrieve(self, generation: int, loading: Future) -> MirrorNode:
+        """Retrieve the document for a generation of the mirror. A retrieval
+        made stale by a DOM.documentUpdated received while it was pending is
+        dropped and waits for the retrieval of the newer generation instead.
+
+        :param generation: The generation the document is retrieved for
+        :param loading: The future resolved with the document of the newest generation
+        :return: The document
+        """
+        try:
+            result = await self._client.send(
+                "DOM.getDocument", {"depth": -1, "pierce": self._pierce}
+            )
+        except Exception as e:
+            if generation != self._generation:
+                return await loading
+            loading.set_exception(e)
+            # retrieved so that a reload not awaited by anyone is not reported
+            loading.exception()
+            raise
+        if generation != self._generation:
+            return await loading
+        self._nodes.clear()
+        self._by_backend_id.clear()
+        self.document = self._build(result["root"], None)
+        self.reloads += 1
+        loading.set_result(self.document)
+        return self.document
+
+    async def ready(self) -> MirrorNode:
+        """Wait for a pending reload of the document, if any"""
+        if self._loading is not None:
+            return await self._loading
+        return await self.reload()
+
+    def node(self, node_id: int) -> Optional[MirrorNode]:
+        """Returns the node with the supplied nodeId"""
+        return self._nodes.get(node_id)
+
+    def by_backend_id(self, backend_node_id: int) -> Optional[MirrorNode]:
+        """Returns the node with the supplied backendNodeId"""
+        return self._by_backend_id.get(backend_node_id)
+
+    def compile(self, selector: str) -> Selector:
+        """Returns the compiled selector, compiled selectors are cached
+
+        :param selector: The CSS selector list
+        :return: The compiled selector
+        """
+        compiled = self._selectors.get(selector)
+        if compiled is None:
+            compiled = self._selectors[selector] = compile_selector(selector)
+        return compiled
+
+    def select(self, selector: str, root: Optional[MirrorNode] = None) -> List[MirrorNode]:
+        """Returns the elements below root, defaulting to the document, that
+        match the selector using the local engine only. Raises SelectorError
+        if the selector is not supported.
+
+        :param selector: The CSS selector list
+        :param root: Optional node the search is restricted to
+        :return: The matching elements in document order
+        """
+        compiled = self.compile(selector)
+        root = root if root is not None else self.document
+        if root is None:
+            return []
+        self.local_queries += 1
+        return list(compiled.select(root))
+
+    def select_one(self, selector: str, root: Optional[MirrorNode] = None) -> Optional[MirrorNode]:
+        """Returns the first element below root that matches the selector, see `select`"""
+        compiled = self.compile(selector)
+        root = root if root is not None else self.document
+        if root is None:
+            return None
+        self.local_queries += 1
+        return next(compiled.select(root), None)
+
+    async def query_selector_all(
+        self, selector: str, root: Optional[MirrorNode] = None
+    ) -> List[MirrorNode]:
+        """Returns the elements below root that match the selector. Selectors
+        the local engine does not support are sent to the browser using
+        DOM.querySelectorAll.
+
+        :param selector: The CSS selector list
+        :param root: Optional node the search is restricted to
+        :return: The matching elements in document order
+        """
+        await self.ready()
+        try:
+            return self.select(selector, root)
+        except SelectorError:
+            pass
+        root = root if root is not None else self.document
+        self.remote_queries += 1
+        result = await self._client.send(
+            "DOM.querySelectorAll", {"nodeId": root.node_id, "selector": selector}
+        )
+        nodes = self._nodes
+        return [nodes[node_id] for node_id in result["nodeIds"] if node_id in nodes]
+
+    async def query_selector(
+        self, selector: str, root: Optional[MirrorNode] = None
+    ) -> Optional[MirrorNode]:
+        """Returns the first element below root that matches the selector, see `query_selector_all`"""
+        await self.ready()
+        try:
+            return self.select_one(selector, root)
+        except SelectorError:
+            pass
+        found = await self.query_selector_all(selector, root)
+        return found[0] if found else None
+
+    def walk(self, root: Optional[MirrorNode] = None) -> Iterator[MirrorNode]:
+        """Yields root, defaulting to the document, and its descendants in document order"""
+        root = root if root is not None else self.document
+        if root is None:
+            return
+        pending = [root]
+        while pending:
+            node = pending.pop()
+            yield node
+            pending.extend(reversed(node.children))
+
+    def _build(self, root: Dict, parent: Optional[MirrorNode]) -> MirrorNode:
+        """Creates and indexes the nodes of a DOM.Node tree, iteratively as
+        documents can be deeper than the recursion limit"""
+        top = self._index(MirrorNode(root, parent))
+        pending = [(root, top)]
+        while pending:
+            node, mirrored = pending.pop()
+            for child in node.get("children") or ():
+                child_mirror = self._index(MirrorNode(child, mirrored))
+                mirrored.children.append(child_mirror)
+                pending.append((child, child_mirror))
+            for shadow in node.get("shadowRoots") or ():
+                shadow_mirror = self._index(MirrorNode(shadow, mirrored))
+                mirrored.shadow_roots.append(shadow_mirror)
+                pending.append((shadow, shadow_mirror))
+            content = node.get("contentDocument")
+            if content is not None:
+                mirrored.content_document = self._index(MirrorNode(content, mirrored))
+                pending.append((content, mirrored.content_document))
+        return top
+
+    def _index(self, node: MirrorNode) -> MirrorNode:
+        self._nodes[node.node_id] = node
+        if node.backend_node_id:
+            self._by_backend_id[node.backend_node_id] = node
+        return node
+
+    def _unindex(self, root: MirrorNode) -> None:
+        pending = [root]
+        while pending:
+            node = pending.pop()
+            self._nodes.pop(node.node_id, None)
+            if self._by_backend_id.get(node.backend_node_id) is node:
+                del self._by_backend_id[node.backend_node_id]
+            pending.extend(node.children)
+            pending.extend(node.shadow_roots)
+            if node.content_document is not None:
+                pending.append(node.content_document)
+
+    def _on_document_updated(self, event: Dict) -> None:
+        # every nodeId is invalidated, events for the old ids are ignored until reloaded
+        self._nodes.clear()
+        self._by_backend_id.clear()
+        self.document = None
+        self.updates += 1
+        self._generation += 1
+        if self._loading is None or self._loading.done():
+            self._loading = self._client.loop.create_future()
+        task = self._client.loop.create_task(
+            self._retrieve(self._generation, self._loading)
+        )
+        task.add_done_callback(self._on_reloaded)
+
+    def _on_reloaded(self, task: Future) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Failed to reload the mirrored document: {task.exception()}")
+
+    def _on_set_child_nodes(self, event: Dict) -> None:
+        parent = self._nodes.get(event["parentId"])
+        if parent is None:
+            return
+        for child in parent.children:
+            self._unindex(child)
+        parent.children = [self._build(node, parent) for node in event["nodes"]]
+        parent.child_node_count = len(parent.children)
+        self.updates += 1
+
+    def _on_child_node_inserted(self, event: Dict) -> None:
+        parent = self._nodes.get(event["parentNodeId"])
+        if parent is None:
+            return
+        node = self._build(event["node"], parent)
+        previous_id = event.get("previousNodeId", 0)
+        position = 0
+        if previous_id:
+            for i, child in enumerate(parent.children):
+                if child.node_id == previous_id:
+                    position = i + 1
+                    break
+            else:
+                position = len(parent.children)
+        parent.children.insert(position, node)
+        parent.child_node_count += 1
+        self.updates += 1
+
+    def _on_child_node_removed(self, event: Dict) -> None:
+        node = self._nodes.get(event["nodeId"])
+        parent = self._nodes.get(event["parentNodeId"])
+        if node is None or parent is None:
+            return
+        try:
+            parent.children.remove(node)
+        except ValueError:
+            pass
+        parent.child_node_count = max(parent.child_node_count - 1, 0)
+        node.parent = None
+        self._unindex(node)
+        self.updates += 1
+
+    def _on_child_node_count_updated(self, event: Dict) -> None:
+        node = self._nodes.get(event["nodeId"])
+        if node is not None:
+            node.child_node_count = event["childNodeCount"]
+
+    def _on_attribute_modified(self, event: Dict) -> None:
+        node = self._nodes.get(event["nodeId"])
+        if node is not None:
+            node.attributes[event["name"]] = event["value"]
+            self.updates += 1
+
+    def _on_attribute_removed(self, event: Dict) -> None:
+        node = self._nodes.get(event["nodeId"])
+        if node is not None:
+            node.attributes.pop(event["name"], None)
+            self.updates += 1
+
+    def _on_character_data_modified(self, event: Dict) -> None:
+        node = self._nodes.get(event["nodeId"])
+        if node is not None:
+            node.node_value = event["characterData"]
+            self.updates += 1
+
+    def _on_shadow_root_pushed(self, event: Dict) -> None:
+        host = self._nodes.get(event["hostId"])
+        if host is not None:
+            host.shadow_roots.append(self._build(event["root"], host))
+            self.updates += 1
+
+    def _on_shadow_root_popped(self, event: Dict) -> None:
+        host = self._nodes.get(event["hostId"])
+        root = self._nodes.get(event["rootId"])
+        if host is not None and root is not None and root in host.shadow_roots:
+            host.shadow_roots.remove(root)
+            self._unindex(root)
+            self.updates += 1
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(nodes={len(self._nodes)}, updates={self.updates}, reloads={self.reloads})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,335 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Sequence, TYPE_CHECKING, Tuple, Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["DocumentSnapshot", "StringTable"]
+
+Rect = Tuple[float, float, float, float]
+
+TEXT_NODE: int = 3
+
+
+def _ints(values: Optional[Iterable[int]]) -> array:
+    return array("i", values if values is not None else ())
+
+
+class StringTable:
+    """The string table shared by the documents of a snapshot, with a
+    lazily built reverse index used to turn query strings into indexes"""
+
+    __slots__ = ["_index", "strings"]
+
+    def __init__(self, strings: List[str]) -> None:
+        self.strings: List[str] = strings
+        self._index: Optional[Dict[str, int]] = None
+
+    def get(self, index: int) -> Optional[str]:
+        """Returns the string at the supplied index, None for -1
+
+        :param index: The index of the string
+        :return: The string
+        """
+        return self.strings[index] if index >= 0 else None
+
+    def index(self, value: str) -> int:
+        """Returns the index of the supplied string, -1 if it is not in the table
+
+        :param value: The string
+        :return: The index of the string
+        """
+        if self._index is None:
+            self._index = {string: i for i, string in enumerate(self.strings)}
+        return self._index.get(value, -1)
+
+    def __len__(self) -> int:
+        return len(self.strings)
+
+
+class _RareStrings:
+    """A DOMSnapshot.RareStringData as two sorted arrays"""
+
+    __slots__ = ["index", "value"]
+
+    def __init__(self, data: Optional[Dict]) -> None:
+        data = data or {}
+        self.index: array = _ints(data.get("index"))
+        self.value: array = _ints(data.get("value"))
+
+    def get(self, node: int) -> int:
+        i = bisect_left(self.index, node)
+        if i < len(self.index) and self.index[i] == node:
+            return self.value[i]
+        return -1
+
+
+class DocumentSnapshot:
+    """A columnar view over a document of DOMSnapshot.captureSnapshot.
+
+    The node and layout tables of the document are kept as
+    typed arrays indexed by node, or layout, index and share the string
+    table of the snapshot. Accessors are per node index, queries return
+    node indexes, no object is created per node.
+    """
+
+    __slots__ = [
+        "_attr_offsets",
+        "_attr_values",
+        "_child_offsets",
+        "_children",
+        "_node_layout",
+        "_sizes",
+        "backend_node_id",
+        "document_url",
+        "frame_id",
+        "input_value",
+        "layout_bounds",
+        "layout_node",
+        "layout_styles",
+        "layout_text",
+        "node_name",
+        "node_type",
+        "node_value",
+        "parent",
+        "strings",
+        "style_names",
+        "text_value",
+    ]
+
+    def __init__(
+        self,
+        document: Dict,
+        strings: Union[StringTable, List[str]],
+        style_names: Sequence[str] = (),
+    ) -> None:
+        """Construct a new DocumentSnapshot
+
+        :param document: The DOMSnapshot.DocumentSnapshot
+        :param strings: The string table of the snapshot
+        :param style_names: The computed styles requested when capturing the snapshot
+        """
+        self.strings: StringTable = (
+            strings if isinstance(strings, StringTable) else StringTable(strings)
+        )
+        self.style_names: List[str] = list(style_names)
+        self.document_url: Optional[str] = self.strings.get(document.get("documentURL", -1))
+        self.frame_id: Optional[str] = self.strings.get(document.get("frameId", -1))
+        nodes = document.get("nodes", {})
+        self.parent: array = _ints(nodes.get("parentIndex"))
+        self.node_type: array = _ints(nodes.get("nodeType"))
+        self.node_name: array = _ints(nodes.get("nodeName"))
+        self.node_value: array = _ints(nodes.get("nodeValue"))
+        self.backend_node_id: array = _ints(nodes.get("backendNodeId"))
+        self.text_value: _RareStrings = _RareStrings(nodes.get("textValue"))
+        self.input_value: _RareStrings = _RareStrings(nodes.get("inputValue"))
+        attr_offsets = array("i", [0])
+        attr_values = array("i")
+        for attributes in nodes.get("attributes") or ():
+            attr_values.extend(attributes)
+            attr_offsets.append(len(attr_values))
+        self._attr_offsets: array = attr_offsets
+        self._attr_values: array = attr_values
+        layout = document.get("layout", {})
+        self.layout_node: array = _ints(layout.get("nodeIndex"))
+        self.layout_bounds: array = array(
+            "d", (v for rect in layout.get("bounds") or () for v in rect)
+        )
+        self.layout_text: array = _ints(layout.get("text"))
+        self.layout_styles: array = _ints(
+            v for styles in layout.get("styles") or () for v in styles
+        )
+        self._node_layout: Optional[array] = None
+        self._sizes: Optional[array] = None
+        self._child_offsets: Optional[array] = None
+        self._children: Optional[array] = None
+
+    @classmethod
+    async def capture(
+        cls,
+        client: Union["ConnectionType", "SessionType"],
+        computed_styles: Sequence[str] = (),
+    ) -> List["DocumentSnapshot"]:
+        """Capture a snapshot of the documents of the target
+
+        :param client: The client or session whose documents are captured
+        :param computed_styles: The computed styles to be captured for each layout node
+        :return: The document snapshots, sharing a single string table
+        """
+        result = await client.send(
+            "DOMSnapshot.captureSnapshot", {"computedStyles": list(computed_styles)}
+        )
+        strings = StringTable(result.get("strings", []))
+        return [
+            cls(document, strings, computed_styles)
+            for document in result.get("documents", [])
+        ]
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def name(self, node: int) -> Optional[str]:
+        """Returns the node name of the node at the supplied index"""
+        return self.strings.get(self.node_name[node])
+
+    def value(self, node: int) -> Optional[str]:
+        """Returns the node value of the node at the supplied index"""
+        return self.strings.get(self.node_value[node])
+
+    def attributes(self, node: int) -> Dict[str, str]:
+        """Returns the attributes of the node at the supplied index"""
+        strings = self.strings.strings
+        values = self._attr_values
+        start = self._attr_offsets[node]
+        end = self._attr_offsets[node + 1]
+        return {
+            strings[values[i]]: strings[values[i + 1]] for i in range(start, end, 2)
+        }
+
+    def attribute(self, node: int, name: str) -> Optional[str]:
+        """Returns the value of the named attribute of the node at the supplied index"""
+        name_index = self.strings.index(name)
+        if name_index == -1 or node + 1 >= len(self._attr_offsets):
+            return None
+        values = self._attr_values
+        for i in range(self._attr_offsets[node], self._attr_offsets[node + 1], 2):
+            if values[i] == name_index:
+                return self.strings.get(values[i + 1])
+        return None
+
+    def layout_index(self, node: int) -> int:
+        """Returns the index of the layout node of the node at the supplied
+        index, -1 if it is not rendered"""
+        if self._node_layout is None:
+            node_layout = array("i", [-1]) * len(self)
+            for layout, node_index in enumerate(self.layout_node):
+                if node_layout[node_index] == -1:
+                    node_layout[node_index] = layout
+            self._node_layout = node_layout
+        return self._node_layout[node]
+
+    def bounds(self, node: int) -> Optional[Rect]:
+        """Returns the x, y, width and height of the layout of the node at the supplied index"""
+        layout = self.layout_index(node)
+        if layout == -1:
+            return None
+        b = self.layout_bounds
+        i = layout * 4
+        return b[i], b[i + 1], b[i + 2], b[i + 3]
+
+    def style(self, node: int, name: str) -> Optional[str]:
+        """Returns the value of a computed style, requested when capturing, of
+        the node at the supplied index"""
+        layout = self.layout_index(node)
+        if layout == -1 or name not in self.style_names:
+            return None
+        width = len(self.style_names)
+        return self.strings.get(
+            self.layout_styles[layout * width + self.style_names.index(name)]
+        )
+
+    def children(self, node: int) -> array:
+        """Returns the indexes of the children of the node at the supplied index"""
+        if self._children is None:
+            parent = self.parent
+            counts = array("i", [0]) * (len(self) + 1)
+            for p in parent:
+                if p >= 0:
+                    counts[p + 1] += 1
+            for i in range(len(self)):
+                counts[i + 1] += counts[i]
+            fill = array("i", counts)
+            children = array("i", [0]) * (counts[len(self)] if len(self) else 0)
+            for child, p in enumerate(parent):
+                if p >= 0:
+                    children[fill[p]] = child
+                    fill[p] += 1
+            self._child_offsets = counts
+            self._children = children
+        return self._children[self._child_offsets[node] : self._child_offsets[node + 1]]
+
+    def subtree(self, node: int) -> range:
+        """Returns the indexes of the nodes of the subtree rooted at the supplied
+        index. Nodes are in document order so a subtree is a contiguous range"""
+        if self._sizes is None:
+            sizes = array("i", [1]) * len(self)
+            parent = self.parent
+            for child in range(len(self) - 1, 0, -1):
+                p = parent[child]
+                if p >= 0:
+                    sizes[p] += sizes[child]
+            self._sizes = sizes
+        return range(node, node + self._sizes[node])
+
+    def find_by_name(self, name: str) -> List[int]:
+        """Returns the indexes of the nodes with the supplied node name, e.g. DIV"""
+        index = self.strings.index(name)
+        if index == -1:
+            return []
+        return [node for node, value in enumerate(self.node_name) if value == index]
+
+    def find_by_attribute(self, name: str, value: Optional[str] = None) -> List[int]:
+        """Returns the indexes of the nodes having the named attribute, with
+        the supplied value if not None"""
+        name_index = self.strings.index(name)
+        value_index = self.strings.index(value) if value is not None else -1
+        if name_index == -1 or (value is not None and value_index == -1):
+            return []
+        values = self._attr_values
+        offsets = self._attr_offsets
+        found: List[int] = []
+        for node in range(len(offsets) - 1):
+            for i in range(offsets[node], offsets[node + 1], 2):
+                if values[i] == name_index and (
+                    value is None or values[i + 1] == value_index
+                ):
+                    found.append(node)
+                    break
+        return found
+
+    def find_in_rect(self, x: float, y: float, width: float, height: float) -> List[int]:
+        """Returns the indexes of the rendered nodes whose layout bounds
+        intersect the supplied rectangle, in document order"""
+        view = memoryview(self.layout_bounds)
+        right = x + width
+        bottom = y + height
+        nodes = set()
+        layout_node = self.layout_node
+        for layout, (bx, by, bw, bh) in enumerate(
+            zip(view[0::4], view[1::4], view[2::4], view[3::4])
+        ):
+            if bx < right and bx + bw > x and by < bottom and by + bh > y:
+                nodes.add(layout_node[layout])
+        return sorted(nodes)
+
+    def text(self, node: int = 0, rendered: bool = False) -> str:
+        """Returns the text content of the subtree rooted at the supplied index
+
+        :param node: The index of the root of the subtree. Defaults to the document
+        :param rendered: Only include the text of rendered text nodes, as laid out
+        :return: The concatenated text
+        """
+        if not len(self):
+            return ""
+        strings = self.strings.strings
+        node_type = self.node_type
+        parts: List[str] = []
+        if rendered:
+            for i in self.subtree(node):
+                if node_type[i] == TEXT_NODE:
+                    layout = self.layout_index(i)
+                    if layout != -1 and self.layout_text[layout] >= 0:
+                        parts.append(strings[self.layout_text[layout]])
+            return "".join(parts)
+        node_value = self.node_value
+        for i in self.subtree(node):
+            if node_type[i] == TEXT_NODE and node_value[i] >= 0:
+                parts.append(strings[node_value[i]])
+        return "".join(parts)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(url={self.document_url}, nodes={len(self)}, layout={len(self.layout_node)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,287 @@
+from asyncio import Future, shield, wait_for
+from typing import Any, Dict, List, Optional, TYPE_CHECKING, Tuple, Union
+
+from ..errors import create_evaluation_error
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["ExecutionContext", "ExecutionContextRegistry"]
+
+#: The frameId and world name of a context, the main world's name is the empty string
+ContextKey = Tuple[str, str]
+
+
+class ExecutionContext:
+    """A Runtime.ExecutionContextDescription"""
+
+    __slots__ = ["frame_id", "id", "is_default", "name", "origin", "type"]
+
+    def __init__(self, description: Dict) -> None:
+        """Construct a new ExecutionContext
+
+        :param description: The Runtime.ExecutionContextDescription
+        """
+        aux_data = description.get("auxData") or {}
+        self.id: int = description["id"]
+        self.origin: str = description.get("origin", "")
+        self.name: str = description.get("name", "")
+        self.frame_id: Optional[str] = aux_data.get("frameId")
+        self.is_default: bool = aux_data.get("isDefault", False)
+        #: default, isolated or worker
+        self.type: str = aux_data.get("type", "default" if self.is_default else "isolated")
+
+    @property
+    def world(self) -> str:
+        """Returns the name of the world of the context, the empty string for the main world"""
+        return "" if self.is_default else self.name
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(id={self.id}, frame={self.frame_id}, world={self.world!r})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ExecutionContextRegistry:
+    """Tracks the execution contexts of a target by frame and world.
+
+    Contexts are indexed by their id and by their frameId and world name, so
+    finding the context to evaluate in is a dictionary lookup. Waiting for
+    the context of a frame resolves as soon as it is created. Isolated worlds
+    are created once with Page.createIsolatedWorld and created again, on
+    their next use, after a navigation destroyed them.
+
+    Example:
+
+    ```python
+    contexts = await ExecutionContextRegistry(client).start()
+    await contexts.evaluate("document.title", frame_id=iframe_id, world="crawler")
+    ```
+    """
+
+    __slots__ = [
+        "_by_id",
+        "_by_key",
+        "_client",
+        "_creating",
+        "_waiters",
+        "isolated_worlds_created",
+        "main_frame_id",
+    ]
+
+    def __init__(self, client: Union["ConnectionType", "SessionType"]) -> None:
+        """Construct a new ExecutionContextRegistry
+
+        :param client: The client or session whose execution contexts are tracked
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._by_id: Dict[int, ExecutionContext] = {}
+        self._by_key: Dict[ContextKey, ExecutionContext] = {}
+        self._waiters: Dict[ContextKey, List[Future]] = {}
+        self._creating: Dict[ContextKey, Future] = {}
+        self.main_frame_id: Optional[str] = None
+        #: The number of Page.createIsolatedWorld commands sent
+        self.isolated_worlds_created: int = 0
+
+    async def start(self) -> "ExecutionContextRegistry":
+        """Start tracking, the existing contexts are reported by Runtime.enable"""
+        client = self._client
+        client.on("Runtime.executionContextCreated", self._on_context_created)
+        client.on("Runtime.executionContextDestroyed", self._on_context_destroyed)
+        client.on("Runtime.executionContextsCleared", self._on_contexts_cleared)
+        client.on("Page.frameNavigated", self._on_frame_navigated)
+        result = await client.send("Page.getFrameTree")
+        self.main_frame_id = result["frameTree"]["frame"]["id"]
+        await client.send("Runtime.enable")
+        return self
+
+    def stop(self) -> None:
+        """Stop tracking, pending waits are cancelled"""
+        client = self._client
+        client.remove_listener("Runtime.executionContextCreated", self._on_context_created)
+        client.remove_listener(
+            "Runtime.executionContextDestroyed", self._on_context_destroyed
+        )
+        client.remove_listener("Runtime.executionContextsCleared", self._on_contexts_cleared)
+        client.remove_listener("Page.frameNavigated", self._on_frame_navigated)
+        for waiters in self._waiters.values():
+            for waiter in waiters:
+                waiter.cancel()
+        self._waiters.clear()
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def get(self, frame_id: Optional[str] = None, world: str = "") -> Optional[ExecutionContext]:
+        """Returns the context of the world of a frame, if it exists
+
+        :param frame_id: The id of the frame, defaults to the main frame
+        :param world: The name of the isolated world, defaults to the main world
+        :return: The execution context
+        """
+        return self._by_key.get((frame_id or self.main_frame_id, world))
+
+    def by_id(self, context_id: int) -> Optional[ExecutionContext]:
+        """Returns the context with the supplied id"""
+        return self._by_id.get(context_id)
+
+    def contexts(self, frame_id: str) -> List[ExecutionContext]:
+        """Returns the contexts of a frame"""
+        return [context for context in self._by_id.values() if context.frame_id == frame_id]
+
+    async def wait_for(
+        self,
+        frame_id: Optional[str] = None,
+        world: str = "",
+        timeout: Optional[float] = None,
+    ) -> ExecutionContext:
+        """Wait for the context of the world of a frame to exist
+
+        :param frame_id: The id of the frame, defaults to the main frame
+        :param world: The name of the world, defaults to the main world
+        :param timeout: Optional maximum number of seconds to wait
+        :return: The execution context
+        """
+        key = (frame_id or self.main_frame_id, world)
+        context = self._by_key.get(key)
+        if context is not None:
+            return context
+        waiter = self._client.loop.create_future()
+        self._waiters.setdefault(key, []).append(waiter)
+        try:
+            return await wait_for(waiter, timeout)
+        finally:
+            waiters = self._waiters.get(key)
+            if waiters is not None and waiter in waiters:
+                waiters.remove(waiter)
+                if not waiters:
+                    del self._waiters[key]
+
+    async def isolated_world(
+        self,
+        world: str,
+        frame_id: Optional[str] = None,
+        grant_universal_access: bool = False,
+    ) -> ExecutionContext:
+        """Returns the context of an isolated world of a frame, creating the
+        world if it does not exist
+
+        :param world: The name of the isolated world
+        :param frame_id: The id of the frame, defaults to the main frame
+        :param grant_universal_access: Grant the world universal access
+        :return: The execution context of the world
+        """
+        key = (frame_id or self.main_frame_id, world)
+        context = self._by_key.get(key)
+        if context is not None:
+            return context
+        creating = self._creating.get(key)
+        if creating is None:
+            # created by a task of its own so that cancelling one of the
+            # callers does not cancel the creation awaited by the others
+            creating = self._creating[key] = self._client.loop.create_task(
+                self._create_isolated_world(key, grant_universal_access)
+            )
+            creating.add_done_callback(self._on_isolated_world_created)
+        return await shield(creating)
+
+    async def _create_isolated_world(
+        self, key: ContextKey, grant_universal_access: bool
+    ) -> ExecutionContext:
+        try:
+            self.isolated_worlds_created += 1
+            result = await self._client.send(
+                "Page.createIsolatedWorld",
+                {
+                    "frameId": key[0],
+                    "worldName": key[1],
+                    "grantUniveralAccess": grant_universal_access,
+                },
+            )
+            context = self._by_id.get(result["executionContextId"])
+            if context is None:
+                context = await self.wait_for(key[0], key[1])
+            return context
+        finally:
+            del self._creating[key]
+
+    @staticmethod
+    def _on_isolated_world_created(task: Future) -> None:
+        # retrieved so that a creation no longer awaited by anyone is not reported
+        if not task.cancelled():
+            task.exception()
+
+    async def context_id(self, frame_id: Optional[str] = None, world: str = "") -> int:
+        """Returns the id of the context of the world of a frame, waiting for
+        the main world or creating the isolated world if needed"""
+        context = self._by_key.get((frame_id or self.main_frame_id, world))
+        if context is None:
+            if world:
+                context = await self.isolated_world(world, frame_id)
+            else:
+                context = await self.wait_for(frame_id)
+        return context.id
+
+    async def evaluate(
+        self,
+        expression: str,
+        frame_id: Optional[str] = None,
+        world: str = "",
+        return_by_value: bool = True,
+        **params: Any,
+    ) -> Any:
+        """Evaluate an expression in the world of a frame
+
+        :param expression: The expression to evaluate
+        :param frame_id: The id of the frame, defaults to the main frame
+        :param world: The name of the isolated world, defaults to the main world
+        :param return_by_value: Return the value of the result rather than the remote object
+        :param params: Any other parameters of Runtime.evaluate
+        :return: The value, or the Runtime.RemoteObject, of the result
+        """
+        params.update(
+            expression=expression,
+            contextId=await self.context_id(frame_id, world),
+            returnByValue=return_by_value,
+        )
+        result = await self._client.send("Runtime.evaluate", params)
+        if "exceptionDetails" in result:
+            raise create_evaluation_error(result["exceptionDetails"])
+        if return_by_value:
+            return result["result"].get("value")
+        return result["result"]
+
+    def _on_context_created(self, event: Dict) -> None:
+        context = ExecutionContext(event["context"])
+        self._by_id[context.id] = context
+        if context.frame_id is None:
+            return
+        key = (context.frame_id, context.world)
+        self._by_key[key] = context
+        for waiter in self._waiters.pop(key, ()):
+            if not waiter.done():
+                waiter.set_result(context)
+
+    def _on_context_destroyed(self, event: Dict) -> None:
+        context = self._by_id.pop(event["executionContextId"], None)
+        if context is None or context.frame_id is None:
+            return
+        key = (context.frame_id, context.world)
+        if self._by_key.get(key) is context:
+            del self._by_key[key]
+
+    def _on_contexts_cleared(self, event: Optional[Dict] = None) -> None:
+        self._by_id.clear()
+        self._by_key.clear()
+
+    def _on_frame_navigated(self, event: Dict) -> None:
+        frame = event["frame"]
+        if not frame.get("parentId"):
+            self.main_frame_id = frame["id"]
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(contexts={len(self)}, main_frame={self.main_frame_id})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
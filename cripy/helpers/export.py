@@ -0,0 +1,187 @@
+import logging
+from concurrent.futures import Executor
+from typing import Any, BinaryIO, Dict, Optional, TYPE_CHECKING, Union
+
+from .streams import DEFAULT_CHUNK_SIZE, IOStream, iter_decoded
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["DocumentExporter", "ExportResult"]
+
+logger = logging.getLogger(__name__)
+
+
+class ExportResult:
+    """The outcome of exporting a document"""
+
+    __slots__ = ["elapsed_ms", "format", "length", "path", "streamed"]
+
+    def __init__(
+        self,
+        format: str,
+        path: Optional[str],
+        length: int,
+        elapsed_ms: float,
+        streamed: bool,
+    ) -> None:
+        #: pdf or mhtml
+        self.format: str = format
+        #: The path written to, None if written to a file like object
+        self.path: Optional[str] = path
+        #: The number of bytes written
+        self.length: int = length
+        self.elapsed_ms: float = elapsed_ms
+        #: Whether the document was read from an IO stream rather than decoded from the result
+        self.streamed: bool = streamed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "format": self.format,
+            "path": self.path,
+            "length": self.length,
+            "elapsed_ms": self.elapsed_ms,
+            "streamed": self.streamed,
+        }
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(format={self.format}, length={self.length}, elapsed_ms={self.elapsed_ms:.2f}, streamed={self.streamed})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class DocumentExporter:
+    """Exports the document of a page as PDF, using Page.printToPDF, or as
+    MHTML, using Page.captureSnapshot, directly to a file.
+
+    PDFs are requested with the ReturnAsStream transfer mode and read from
+    the returned IO stream a chunk at a time. Browsers that do not support
+    the transfer mode return the document in the result, as do MHTML
+    snapshots, which is then decoded and written in chunks in an executor
+    so the event loop is not blocked and the decoded document is never
+    held in memory as a whole.
+
+    Example:
+
+    ```python
+    exporter = DocumentExporter(client)
+    result = await exporter.print_to_pdf("page.pdf", printBackground=True)
+    await exporter.capture_mhtml("page.mhtml")
+    ```
+    """
+
+    __slots__ = [
+        "_chunk_size",
+        "_client",
+        "_executor",
+        "exports",
+        "stream",
+        "total_bytes",
+        "total_ms",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        stream: bool = True,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        """Construct a new DocumentExporter
+
+        :param client: The client or session of the page
+        :param stream: Request that PDFs are returned as an IO stream
+        :param chunk_size: The number of bytes read from streams, or decoded, at a time
+        :param executor: The executor documents are decoded and written in. Defaults to the loops default executor
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._chunk_size: int = chunk_size
+        self._executor: Optional[Executor] = executor
+        self.stream: bool = stream
+        self.exports: int = 0
+        self.total_bytes: int = 0
+        self.total_ms: float = 0.0
+
+    async def print_to_pdf(
+        self, path_or_file: Union[str, BinaryIO], **params: Any
+    ) -> ExportResult:
+        """Print the page to a PDF
+
+        :param path_or_file: The path of the file or a binary file like object
+        :param params: Any parameters of Page.printToPDF
+        :return: The result of the export
+        """
+        if self.stream:
+            params.setdefault("transferMode", "ReturnAsStream")
+        return await self._export("pdf", "Page.printToPDF", params, path_or_file, True)
+
+    async def capture_mhtml(self, path_or_file: Union[str, BinaryIO]) -> ExportResult:
+        """Capture the page as an MHTML snapshot
+
+        :param path_or_file: The path of the file or a binary file like object
+        :return: The result of the export
+        """
+        return await self._export(
+            "mhtml", "Page.captureSnapshot", {"format": "mhtml"}, path_or_file, False
+        )
+
+    async def _export(
+        self,
+        format: str,
+        method: str,
+        params: Dict[str, Any],
+        path_or_file: Union[str, BinaryIO],
+        base64_encoded: bool,
+    ) -> ExportResult:
+        loop = self._client.loop
+        started = loop.time()
+        owned = isinstance(path_or_file, str)
+        # opened first so that a stream handle is never left open in the browser
+        # because the destination could not be opened
+        out = (
+            await loop.run_in_executor(self._executor, open, path_or_file, "wb")
+            if owned
+            else path_or_file
+        )
+        try:
+            result = await self._client.send(method, params)
+            handle = result.get("stream")
+            if handle is not None:
+                length = 0
+                async with IOStream(self._client, handle, self._chunk_size) as stream:
+                    async for chunk in stream:
+                        await loop.run_in_executor(self._executor, out.write, chunk)
+                        length += len(chunk)
+            else:
+                data = result.get("data", "")
+                # the result is no longer needed once its data is being written
+                del result
+                length = await loop.run_in_executor(
+                    self._executor, self._write_decoded, out, data, base64_encoded
+                )
+        finally:
+            if owned:
+                await loop.run_in_executor(self._executor, out.close)
+        elapsed_ms = (loop.time() - started) * 1000
+        self.exports += 1
+        self.total_bytes += length
+        self.total_ms += elapsed_ms
+        export = ExportResult(
+            format, path_or_file if owned else None, length, elapsed_ms, handle is not None
+        )
+        logger.debug(f"Exported {export}")
+        return export
+
+    def _write_decoded(self, out: BinaryIO, data: str, base64_encoded: bool) -> int:
+        length = 0
+        for chunk in iter_decoded(data, base64_encoded, self._chunk_size):
+            out.write(chunk)
+            length += len(chunk)
+        return length
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(exports={self.exports}, total_bytes={self.total_bytes}, total_ms={self.total_ms:.2f})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,444 @@
+import logging
+import os
+import struct
+import zlib
+from asyncio import Future
+from binascii import a2b_base64
+from collections import deque
+from concurrent.futures import Executor
+from math import ceil
+from typing import (
+    Any,
+    AsyncIterator,
+    BinaryIO,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    TYPE_CHECKING,
+    Tuple,
+    Union,
+)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["FullPageScreenshot", "PNGStitcher"]
+
+logger = logging.getLogger(__name__)
+
+PNG_SIGNATURE: bytes = b"\x89PNG\r\n\x1a\n"
+
+#: The bytes per pixel of the 8 bit depth color types: grayscale, RGB, grayscale alpha and RGBA
+BYTES_PER_PIXEL: Dict[int, int] = {0: 1, 2: 3, 4: 2, 6: 4}
+
+#: The number of bytes inflated or deflated at a time
+CHUNK_SIZE: int = 2 ** 16
+
+
+def read_png(data: bytes) -> Tuple[Tuple[int, ...], bytes]:
+    """Returns the IHDR fields, i.e. width, height, bit depth, color type,
+    compression, filter and interlace method, and the zlib stream of the
+    IDAT chunks of a PNG"""
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError("Not a PNG")
+    header: Optional[Tuple[int, ...]] = None
+    idat: List[bytes] = []
+    view = memoryview(data)
+    offset = 8
+    end = len(data)
+    while offset + 8 <= end:
+        length, kind = struct.unpack_from(">I4s", data, offset)
+        start = offset + 8
+        if kind == b"IHDR":
+            header = struct.unpack_from(">IIBBBBB", data, start)
+        elif kind == b"IDAT":
+            idat.append(view[start : start + length])
+        elif kind == b"IEND":
+            break
+        offset = start + length + 4
+    if header is None:
+        raise ValueError("PNG has no IHDR chunk")
+    return header, b"".join(idat)
+
+
+def unfilter_first_row(row: bytes, bpp: int) -> bytes:
+    """Returns the first scanline of an image, filter byte included,
+    re-encoded with filter type None.
+
+    The Up, Average and Paeth filters of the first scanline of an image
+    predict from a row of zeros. Once the scanlines of a tile follow those
+    of the tile above, they would predict from its last row instead.
+    """
+    kind = row[0]
+    if kind == 0 or kind == 1:
+        # the Sub filter only uses the pixel to the left
+        return row
+    if kind == 2:
+        return b"\x00" + row[1:]
+    recon = bytearray(row[1:])
+    if kind == 3:
+        for i in range(bpp, len(recon)):
+            recon[i] = (recon[i] + (recon[i - bpp] >> 1)) & 0xFF
+    elif kind == 4:
+        # paeth(left, 0, 0) is always left
+        for i in range(bpp, len(recon)):
+            recon[i] = (recon[i] + recon[i - bpp]) & 0xFF
+    else:
+        raise ValueError(f"Unknown PNG filter type {kind}")
+    return b"\x00" + bytes(recon)
+
+
+def inflate(data: bytes) -> Iterator[bytes]:
+    """Inflates a zlib stream CHUNK_SIZE bytes at a time"""
+    inflater = zlib.decompressobj()
+    chunk = inflater.decompress(data, CHUNK_SIZE)
+    while chunk:
+        yield chunk
+        chunk = inflater.decompress(inflater.unconsumed_tail, CHUNK_SIZE)
+    tail = inflater.flush()
+    if tail:
+        yield tail
+
+
+class PNGStitcher:
+    """Writes the PNG tiles of an image, from top to bottom, into a single PNG.
+
+    Tiles must have the width, bit depth and color type of the first tile.
+    The scanlines of each tile are inflated and deflated again into the
+    output a chunk at a time, so only the compressed tile being appended and
+    a chunk of scanlines are held in memory. The height of the image is
+    written to the IHDR chunk once the last tile was appended.
+
+    Example:
+
+    ```python
+    with PNGStitcher(open("page.png", "wb")) as stitcher:
+        for tile in tiles:
+            stitcher.append(tile)
+    ```
+    """
+
+    __slots__ = [
+        "_deflater",
+        "_header",
+        "_ihdr_offset",
+        "_out",
+        "_pending",
+        "bytes_written",
+        "height",
+        "tiles",
+        "width",
+    ]
+
+    def __init__(self, out: BinaryIO, level: int = 6) -> None:
+        """Construct a new PNGStitcher
+
+        :param out: The seekable binary file the PNG is written to
+        :param level: The zlib compression level of the output
+        """
+        self._out: BinaryIO = out
+        self._deflater: Any = zlib.compressobj(level)
+        self._pending: bytearray = bytearray()
+        self._header: Optional[Tuple[int, ...]] = None
+        self._ihdr_offset: int = 0
+        self.width: int = 0
+        self.height: int = 0
+        self.tiles: int = 0
+        self.bytes_written: int = 0
+
+    def append(self, png: bytes) -> None:
+        """Append the scanlines of a PNG tile to the image"""
+        header, stream = read_png(png)
+        width, height, depth, color_type, _, _, interlace = header
+        if depth != 8 or color_type not in BYTES_PER_PIXEL or interlace:
+            raise ValueError(
+                f"Unsupported PNG tile, bit depth {depth}, color type {color_type}, interlace {interlace}"
+            )
+        if self._header is None:
+            self._header = header
+            self.width = width
+            self._ihdr_offset = self._out.tell() + len(PNG_SIGNATURE)
+            self._out.write(PNG_SIGNATURE)
+            self._write_chunk(b"IHDR", self._ihdr(0))
+        elif (width, color_type) != (self.width, self._header[3]):
+            raise ValueError(
+                f"PNG tile of width {width} and color type {color_type} does not match"
+                f" the image of width {self.width} and color type {self._header[3]}"
+            )
+        row_size = width * BYTES_PER_PIXEL[color_type] + 1
+        first: Optional[bytearray] = bytearray()
+        inflated = 0
+        for chunk in inflate(stream):
+            inflated += len(chunk)
+            if first is not None:
+                first += chunk
+                if len(first) < row_size:
+                    continue
+                chunk = unfilter_first_row(
+                    bytes(first[:row_size]), BYTES_PER_PIXEL[color_type]
+                ) + bytes(first[row_size:])
+                first = None
+            self._deflate(chunk)
+        if inflated != row_size * height:
+            raise ValueError(
+                f"PNG tile has {inflated} bytes of scanlines, expected {row_size * height}"
+            )
+        self.height += height
+        self.tiles += 1
+
+    def close(self) -> None:
+        """Finish the image, writing its height into the IHDR chunk. The file
+        is not closed."""
+        if self._header is None:
+            raise ValueError("No tiles were appended")
+        self._pending += self._deflater.flush()
+        self._write_chunk(b"IDAT", bytes(self._pending))
+        self._pending = bytearray()
+        self._write_chunk(b"IEND", b"")
+        end = self._out.tell()
+        self._out.seek(self._ihdr_offset)
+        data = self._ihdr(self.height)
+        self._out.write(struct.pack(">I4s", len(data), b"IHDR") + data)
+        self._out.write(struct.pack(">I", zlib.crc32(b"IHDR" + data)))
+        self._out.seek(end)
+
+    def _ihdr(self, height: int) -> bytes:
+        return struct.pack(">II", self.width, height) + bytes(self._header[2:])
+
+    def _deflate(self, data: bytes) -> None:
+        self._pending += self._deflater.compress(data)
+        if len(self._pending) >= CHUNK_SIZE:
+            self._write_chunk(b"IDAT", bytes(self._pending))
+            self._pending = bytearray()
+
+    def _write_chunk(self, kind: bytes, data: bytes) -> None:
+        self._out.write(struct.pack(">I4s", len(data), kind))
+        self._out.write(data)
+        self._out.write(struct.pack(">I", zlib.crc32(kind + data)))
+        self.bytes_written += len(data) + 12
+
+    def __enter__(self) -> "PNGStitcher":
+        return self
+
+    def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        if exc_type is None:
+            self.close()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(width={self.width}, height={self.height}, tiles={self.tiles})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class FullPageScreenshot:
+    """Captures screenshots of the full height of a page as horizontal tiles.
+
+    The size of the page is taken from Page.getLayoutMetrics and the page is
+    captured as clips of at most tile_height CSS pixels, with at most
+    concurrency tiles being captured or waiting to be written at a time.
+    Tiles are base64 decoded, and written, in an executor. With the png
+    format the tiles are stitched into a single PNG by the PNGStitcher, with
+    the jpeg format each tile is written to its own file since there is no
+    way to append to a JPEG without re-encoding it.
+
+    Every clip is captured with captureBeyondViewport, so the viewport never
+    has to be as tall as the page, which for very long pages would exceed the
+    maximum texture size of the compositor and produce blank or repeated
+    tiles. While capturing, the viewport is resized to the width of the page
+    and the height of a tile with Emulation.setDeviceMetricsOverride, the
+    override is cleared afterwards.
+
+    Example:
+
+    ```python
+    screenshot = FullPageScreenshot(client, tile_height=4096)
+    await screenshot.capture("page.png")
+    ```
+    """
+
+    __slots__ = [
+        "_client",
+        "_executor",
+        "captures",
+        "concurrency",
+        "height",
+        "level",
+        "resize_viewport",
+        "scale",
+        "tile_height",
+        "tiles",
+        "width",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        tile_height: int = 4096,
+        concurrency: int = 4,
+        scale: float = 1,
+        resize_viewport: bool = True,
+        level: int = 6,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        """Construct a new FullPageScreenshot
+
+        :param client: The client or session of the page
+        :param tile_height: The height, in CSS pixels, of the tiles
+        :param concurrency: The number of tiles captured, or waiting to be written, at a time
+        :param scale: The scale of the captured tiles
+        :param resize_viewport: Resize the viewport to the width of the page and the height of a tile while capturing
+        :param level: The zlib compression level of stitched PNGs
+        :param executor: The executor tiles are decoded and written in. Defaults to the loops default executor
+        """
+        if tile_height <= 0 or concurrency <= 0:
+            raise ValueError("tile_height and concurrency must be positive")
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._executor: Optional[Executor] = executor
+        self.tile_height: int = tile_height
+        self.concurrency: int = concurrency
+        self.scale: float = scale
+        self.resize_viewport: bool = resize_viewport
+        self.level: int = level
+        #: The width and height, in pixels, of the last stitched screenshot
+        self.width: int = 0
+        self.height: int = 0
+        self.captures: int = 0
+        #: The number of tiles captured
+        self.tiles: int = 0
+
+    async def content_size(self) -> Tuple[int, int]:
+        """Returns the width and height, in CSS pixels, of the page"""
+        metrics = await self._client.send("Page.getLayoutMetrics")
+        content = metrics["contentSize"]
+        return int(ceil(content["width"])), int(ceil(content["height"]))
+
+    def clips(self, width: int, height: int) -> List[Dict[str, Any]]:
+        """Returns the Page.Viewport of each tile of a page"""
+        return [
+            {
+                "x": 0,
+                "y": y,
+                "width": width,
+                "height": min(self.tile_height, height - y),
+                "scale": self.scale,
+            }
+            for y in range(0, height, self.tile_height)
+        ]
+
+    async def capture(self, path: str) -> str:
+        """Capture the page as a single PNG. If capturing fails the partially
+        written PNG is removed.
+
+        :param path: The path of the PNG
+        :return: The path of the PNG
+        """
+        loop = self._client.loop
+        out = await loop.run_in_executor(self._executor, open, path, "wb")
+        stitcher = PNGStitcher(out, self.level)
+        tiles = self._tiles("png", None)
+        completed = False
+        try:
+            async for tile in tiles:
+                await loop.run_in_executor(self._executor, stitcher.append, tile)
+            await loop.run_in_executor(self._executor, stitcher.close)
+            completed = True
+        finally:
+            await tiles.aclose()
+            await loop.run_in_executor(self._executor, out.close)
+            if not completed:
+                await loop.run_in_executor(self._executor, os.remove, path)
+        self.width = stitcher.width
+        self.height = stitcher.height
+        self.captures += 1
+        logger.debug(f"Captured {stitcher} to {path}")
+        return path
+
+    async def capture_tiles(
+        self, directory: str, format: str = "jpeg", quality: Optional[int] = None
+    ) -> List[str]:
+        """Capture the page as a sequence of tiles, named tile-00000.<format>
+        from top to bottom
+
+        :param directory: The directory the tiles are written to
+        :param format: Image compression format, jpeg or png
+        :param quality: Compression quality from range [0..100] (jpeg only)
+        :return: The paths of the tiles
+        """
+        loop = self._client.loop
+        await loop.run_in_executor(
+            self._executor, lambda: os.makedirs(directory, exist_ok=True)
+        )
+        extension = "jpg" if format == "jpeg" else format
+        paths: List[str] = []
+        tiles = self._tiles(format, quality)
+        try:
+            async for tile in tiles:
+                path = os.path.join(directory, f"tile-{len(paths):05d}.{extension}")
+                await loop.run_in_executor(self._executor, _write_file, path, tile)
+                paths.append(path)
+        finally:
+            await tiles.aclose()
+        self.captures += 1
+        return paths
+
+    async def _tiles(self, format: str, quality: Optional[int]) -> AsyncIterator[bytes]:
+        """Yields the decoded tiles of the page in order, capturing up to
+        concurrency tiles ahead of the consumer"""
+        client = self._client
+        width, height = await self.content_size()
+        if self.resize_viewport:
+            await client.send(
+                "Emulation.setDeviceMetricsOverride",
+                {
+                    "width": width,
+                    "height": min(self.tile_height, height),
+                    "deviceScaleFactor": 0,
+                    "mobile": False,
+                },
+            )
+        params: Dict[str, Any] = {"format": format, "captureBeyondViewport": True}
+        if quality is not None:
+            params["quality"] = quality
+        clips = iter(self.clips(width, height))
+        pending: Deque[Future] = deque()
+        try:
+            for clip in clips:
+                pending.append(client.loop.create_task(self._capture_tile(params, clip)))
+                if len(pending) == self.concurrency:
+                    break
+            while pending:
+                tile = await pending.popleft()
+                clip = next(clips, None)
+                if clip is not None:
+                    pending.append(
+                        client.loop.create_task(self._capture_tile(params, clip))
+                    )
+                yield tile
+        finally:
+            for task in pending:
+                task.cancel()
+            if self.resize_viewport:
+                await client.send("Emulation.clearDeviceMetricsOverride")
+
+    async def _capture_tile(self, params: Dict[str, Any], clip: Dict[str, Any]) -> bytes:
+        result = await self._client.send(
+            "Page.captureScreenshot", dict(params, clip=clip)
+        )
+        self.tiles += 1
+        return await self._client.loop.run_in_executor(
+            self._executor, a2b_base64, result["data"]
+        )
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(tile_height={self.tile_height}, concurrency={self.concurrency}, captures={self.captures})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def _write_file(path: str, data: bytes) -> None:
+    with open(path, "wb") as out:
+        out.write(data)
@@ -0,0 +1,357 @@
+import logging
+from asyncio import AbstractEventLoop, Queue, Task
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, IO, List, Optional, TYPE_CHECKING, Union
+from urllib.parse import parse_qsl, urlsplit
+
+from ujson import dumps
+
+from .network_tracker import NetworkTracker, RequestRecord
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["HARExporter", "har_entry", "har_timings"]
+
+logger = logging.getLogger(__name__)
+
+HARDict = Dict[str, Any]
+
+CREATOR: HARDict = {"name": "cripy", "version": "1.5.0"}
+
+
+def _iso_date(timestamp: float) -> str:
+    """Returns the ISO 8601 representation, with milliseconds, of the supplied
+    unix timestamp
+
+    :param timestamp: Seconds since the epoch
+    :return: The formatted date
+    """
+    dt = datetime.fromtimestamp(timestamp, timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+def _http_version(protocol: Optional[str]) -> str:
+    """Returns the HAR httpVersion for the supplied protocol response protocol
+
+    :param protocol: The protocol used to fetch the response
+    :return: The HTTP version
+    """
+    if not protocol:
+        return "HTTP/1.1"
+    if protocol == "h2":
+        return "HTTP/2.0"
+    return protocol.upper()
+
+
+def _har_headers(headers: Optional[Dict[str, str]]) -> List[HARDict]:
+    """Returns the HAR representation of the supplied protocol headers object
+
+    :param headers: The protocol headers object
+    :return: The list of HAR headers
+    """
+    if not headers:
+        return []
+    return [
+        {"name": name, "value": part}
+        for name, value in headers.items()
+        for part in str(value).split("\n")
+    ]
+
+
+def har_timings(record: RequestRecord) -> HARDict:
+    """Computes the HAR timings of the supplied record from its Network.ResourceTiming.
+
+    All values are in milliseconds, timings that do not apply are -1.
+
+    :param record: The record of the request
+    :return: The HAR timings object
+    """
+    response = record.response
+    timing = response.get("timing") if response is not None else None
+    end = record.end_timestamp if record.end_timestamp is not None else record.timestamp
+    if timing is None:
+        total = max((end - record.timestamp) * 1000, 0)
+        return {
+            "blocked": -1,
+            "dns": -1,
+            "connect": -1,
+            "ssl": -1,
+            "send": 0,
+            "wait": 0,
+            "receive": total,
+        }
+    dns_start = timing["dnsStart"]
+    connect_start = timing["connectStart"]
+    ssl_start = timing["sslStart"]
+    send_start = timing["sendStart"]
+    send_end = timing["sendEnd"]
+    headers_end = timing["receiveHeadersEnd"]
+    if dns_start >= 0:
+        blocked = dns_start
+    elif connect_start >= 0:
+        blocked = connect_start
+    else:
+        blocked = send_start
+    # the requestTime of a timing is relative to the start of the request
+    blocked += (timing["requestTime"] - record.timestamp) * 1000
+    return {
+        "blocked": max(blocked, 0),
+        "dns": timing["dnsEnd"] - dns_start if dns_start >= 0 else -1,
+        "connect": timing["connectEnd"] - connect_start if connect_start >= 0 else -1,
+        "ssl": timing["sslEnd"] - ssl_start if ssl_start >= 0 else -1,
+        "send": max(send_end - send_start, 0),
+        "wait": max(headers_end - send_end, 0),
+        "receive": max((end - timing["requestTime"]) * 1000 - headers_end, 0),
+    }
+
+
+def har_entry(record: RequestRecord, pageref: Optional[str] = None) -> HARDict:
+    """Returns the HAR entry for the supplied record
+
+    :param record: The record of the request
+    :param pageref: The id of the page of the log the request belongs to
+    :return: The HAR entry
+    """
+    request = record.request
+    response = record.response if record.response is not None else {}
+    timings = har_timings(record)
+    http_version = _http_version(response.get("protocol"))
+    response_headers = response.get("headers")
+    request_headers = response.get("requestHeaders") or request.get("headers")
+    har_request = {
+        "method": request.get("method"),
+        "url": request.get("url"),
+        "httpVersion": http_version,
+        "cookies": [],
+        "headers": _har_headers(request_headers),
+        "queryString": [
+            {"name": name, "value": value}
+            for name, value in parse_qsl(
+                urlsplit(request.get("url")).query, keep_blank_values=True
+            )
+        ],
+        "headersSize": -1,
+        "bodySize": 0,
+    }
+    post_data = request.get("postData")
+    if post_data is not None:
+        har_request["bodySize"] = len(post_data)
+        har_request["postData"] = {
+            "mimeType": (request.get("headers") or {}).get("Content-Type", ""),
+            "text": post_data,
+        }
+    redirect_url = ""
+    if response_headers:
+        redirect_url = response_headers.get("Location") or response_headers.get(
+            "location", ""
+        )
+    entry = {
+        "startedDateTime": _iso_date(record.wall_time),
+        "time": sum(
+            value for name, value in timings.items() if name != "ssl" and value > 0
+        ),
+        "request": har_request,
+        "response": {
+            "status": response.get("status", 0),
+            "statusText": response.get("statusText", ""),
+            "httpVersion": http_version,
+            "cookies": [],
+            "headers": _har_headers(response_headers),
+            "content": {
+                "size": record.data_length,
+                "mimeType": response.get("mimeType", "x-unknown"),
+            },
+            "redirectURL": redirect_url,
+            "headersSize": -1,
+            "bodySize": record.encoded_data_length if record.finished else -1,
+        },
+        "cache": {},
+        "timings": timings,
+        "_resourceType": record.resource_type,
+    }
+    if pageref is not None:
+        entry["pageref"] = pageref
+    if response.get("remoteIPAddress"):
+        entry["serverIPAddress"] = response["remoteIPAddress"].strip("[]")
+    if response.get("connectionId") is not None:
+        entry["connection"] = str(response["connectionId"])
+    if record.failed:
+        entry["_errorText"] = record.error_text
+    return entry
+
+
+class HARExporter:
+    """Exports the requests made by a target as a HAR 1.2 log.
+
+    Entries are serialized as each request is finalized and handed to a
+    write-behind queue whose task writes them to the file in the default
+    executor, so only the pages of the log are kept in memory and writing
+    never blocks the event loop. Entries reference a page only if its
+    navigation request was exported.
+    """
+
+    __slots__ = [
+        "_client",
+        "_file",
+        "_listeners",
+        "_owns_tracker",
+        "_pages",
+        "_path",
+        "_queue",
+        "_remove_finalize",
+        "_task",
+        "_tracker",
+        "entries_written",
+        "errors",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        path: str,
+        tracker: Optional[NetworkTracker] = None,
+    ) -> None:
+        """Construct a new HARExporter
+
+        :param client: The client or session to be exported
+        :param path: The path of the HAR file to be written
+        :param tracker: Optional tracker supplying finalized requests. If not
+        supplied, one is created and managed by the exporter
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._path: str = path
+        self._owns_tracker: bool = tracker is None
+        self._tracker: NetworkTracker = (
+            tracker
+            if tracker is not None
+            else NetworkTracker(client, retain_finished=False)
+        )
+        self._file: Optional[IO[str]] = None
+        self._queue: Queue = Queue()
+        self._task: Optional[Task] = None
+        self._pages: Dict[str, HARDict] = {}
+        self._remove_finalize: Optional[Callable[[], None]] = None
+        self._listeners: List = [
+            ("Page.domContentEventFired", self._on_dom_content),
+            ("Page.loadEventFired", self._on_load),
+        ]
+        self.entries_written: int = 0
+        #: The number of failed writes to the HAR file
+        self.errors: int = 0
+
+    @property
+    def loop(self) -> AbstractEventLoop:
+        return self._client.loop
+
+    @property
+    def path(self) -> str:
+        """Returns the path of the HAR file"""
+        return self._path
+
+    def start(self) -> "HARExporter":
+        """Start exporting, the HAR file is opened by the writer task"""
+        self._queue.put_nowait(
+            '{"log":{"version":"1.2","creator":'
+            + dumps(CREATOR, escape_forward_slashes=False)
+            + ',"entries":['
+        )
+        self._task = self.loop.create_task(self._write_loop())
+        if self._owns_tracker:
+            self._tracker.start()
+        self._remove_finalize = self._tracker.on_finalize(self._on_finalize)
+        for event, listener in self._listeners:
+            self._client.on(event, listener)
+        return self
+
+    async def close(self) -> None:
+        """Stop exporting and finish the HAR file by writing its pages"""
+        if self._task is None:
+            return
+        if self._remove_finalize is not None:
+            self._remove_finalize()
+            self._remove_finalize = None
+        if self._owns_tracker:
+            self._tracker.stop()
+        for event, listener in self._listeners:
+            self._client.remove_listener(event, listener)
+        self._queue.put_nowait(
+            '],"pages":'
+            + dumps(list(self._pages.values()), escape_forward_slashes=False)
+            + "}}"
+        )
+        self._queue.put_nowait(None)
+        task, self._task = self._task, None
+        self._pages.clear()
+        await task
+
+    async def _write_loop(self) -> None:
+        """Opens the HAR file and writes the queued text until None is dequeued"""
+        run_in_executor = self.loop.run_in_executor
+        try:
+            self._file = await run_in_executor(
+                None, lambda: open(self._path, "w", encoding="utf-8", buffering=2 ** 16)
+            )
+            done = False
+            while not done:
+                parts = [await self._queue.get()]
+                # written together with everything queued meanwhile
+                while not self._queue.empty():
+                    parts.append(self._queue.get_nowait())
+                if parts[-1] is None:
+                    parts.pop()
+                    done = True
+                await run_in_executor(None, self._file.write, "".join(parts))
+        except Exception:
+            self.errors += 1
+            logger.exception(f"Failed to write the HAR file {self._path}")
+        finally:
+            if self._file is not None:
+                await run_in_executor(None, self._file.close)
+                self._file = None
+
+    def _on_finalize(self, record: RequestRecord) -> None:
+        if record.loader_id is not None and record.loader_id == record.request_id:
+            # navigation requests have the same id as their loader
+            if record.redirected_from is None and record.loader_id not in self._pages:
+                self._pages[record.loader_id] = {
+                    "startedDateTime": _iso_date(record.wall_time),
+                    "id": record.loader_id,
+                    "title": record.url,
+                    "pageTimings": {"onContentLoad": -1, "onLoad": -1},
+                    "_timestamp": record.timestamp,
+                }
+        # e.g. requests of workers or of pages loaded before the export started
+        pageref = record.loader_id if record.loader_id in self._pages else None
+        entry = dumps(har_entry(record, pageref), escape_forward_slashes=False)
+        self._queue.put_nowait("," + entry if self.entries_written else entry)
+        self.entries_written += 1
+
+    def _page_timing(self, name: str, timestamp: float) -> None:
+        """Sets the page timing of the most recent page
+
+        :param name: The name of the page timing
+        :param timestamp: The monotonic timestamp of the event
+        """
+        if not self._pages:
+            return
+        page = list(self._pages.values())[-1]
+        page["pageTimings"][name] = max((timestamp - page["_timestamp"]) * 1000, 0)
+
+    def _on_dom_content(self, event: Dict) -> None:
+        self._page_timing("onContentLoad", event["timestamp"])
+
+    def _on_load(self, event: Dict) -> None:
+        self._page_timing("onLoad", event["timestamp"])
+
+    async def __aenter__(self) -> "HARExporter":
+        return self.start()
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        await self.close()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(path={self._path}, entries={self.entries_written})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
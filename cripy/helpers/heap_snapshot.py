@@ -0,0 +1,643 @@
+import re
+from array import array
+from asyncio import Queue, Task
+from codecs import getincrementaldecoder
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    TYPE_CHECKING,
+    Tuple,
+    Union,
+)
+
+from ujson import loads
+
+from .streams import DEFAULT_CHUNK_SIZE
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = [
+    "HeapSnapshot",
+    "HeapSnapshotParser",
+    "HeapSnapshotRecorder",
+    "parse_heap_snapshot",
+]
+
+ProgressCallback = Callable[[int, int], Any]
+
+#: The top level arrays of a snapshot loaded into typed arrays
+NUMERIC_ARRAYS = {"nodes", "edges", "trace_function_infos", "samples", "locations"}
+
+KEY_RE: Pattern = re.compile(r'[\s{,]*"([^"\\]*)"\s*:\s*(\S)')
+END_RE: Pattern = re.compile(r"[\s,]*}")
+STRING_ITEM_RE: Pattern = re.compile(r'[\s,]*"((?:[^"\\]|\\.)*)"', re.DOTALL)
+ARRAY_END_RE: Pattern = re.compile(r"[\s,]*]")
+SCALAR_END_RE: Pattern = re.compile(r"[,}]")
+NESTING_RE: Pattern = re.compile(r'[\[\]{}"]')
+STRING_RE: Pattern = re.compile(r'["\\]')
+
+
+class HeapSnapshot:
+    """A parsed heap snapshot whose nodes and edges are kept in flat typed arrays.
+
+    Fields of the nodes and edges can be accessed as strided memoryviews
+    without copying, using `node_column` and `edge_column`.
+    """
+
+    __slots__ = [
+        "_dominators",
+        "_first_edges",
+        "_retained",
+        "arrays",
+        "edge_fields",
+        "edge_types",
+        "meta",
+        "node_fields",
+        "node_types",
+        "strings",
+    ]
+
+    def __init__(self, meta: Dict, arrays: Dict[str, array], strings: List[str]) -> None:
+        """Construct a new HeapSnapshot
+
+        :param meta: The snapshot object of the snapshot, including its meta
+        :param arrays: The numeric arrays of the snapshot
+        :param strings: The strings of the snapshot
+        """
+        self.meta: Dict = meta
+        self.arrays: Dict[str, array] = arrays
+        self.strings: List[str] = strings
+        field_meta = meta.get("meta", {})
+        self.node_fields: List[str] = field_meta.get("node_fields", [])
+        self.node_types: List[Any] = field_meta.get("node_types", [])
+        self.edge_fields: List[str] = field_meta.get("edge_fields", [])
+        self.edge_types: List[Any] = field_meta.get("edge_types", [])
+        self._first_edges: Optional[array] = None
+        self._dominators: Optional[array] = None
+        self._retained: Optional[array] = None
+
+    @property
+    def nodes(self) -> array:
+        """Returns the flat array of node fields"""
+        return self.arrays.get("nodes", array("I"))
+
+    @property
+    def edges(self) -> array:
+        """Returns the flat array of edge fields"""
+        return self.arrays.get("edges", array("I"))
+
+    @property
+    def node_count(self) -> int:
+        """Returns the number of nodes"""
+        return len(self.nodes) // len(self.node_fields) if self.node_fields else 0
+
+    @property
+    def edge_count(self) -> int:
+        """Returns the number of edges"""
+        return len(self.edges) // len(self.edge_fields) if self.edge_fields else 0
+
+    def node_column(self, field: str) -> memoryview:
+        """Returns the values of the named field of every node
+
+        :param field: The name of the node field, e.g. self_size
+        :return: A strided view over the nodes array
+        """
+        return memoryview(self.nodes)[self.node_fields.index(field) :: len(self.node_fields)]
+
+    def edge_column(self, field: str) -> memoryview:
+        """Returns the values of the named field of every edge
+
+        :param field: The name of the edge field, e.g. to_node
+        :return: A strided view over the edges array
+        """
+        return memoryview(self.edges)[self.edge_fields.index(field) :: len(self.edge_fields)]
+
+    def node_type(self, node: int) -> str:
+        """Returns the type of the node at the supplied index
+
+        :param node: The index of the node
+        :return: The type of the node
+        """
+        nodes = self.nodes
+        offset = node * len(self.node_fields) + self.node_fields.index("type")
+        return self.node_types[0][nodes[offset]]
+
+    def node_name(self, node: int) -> str:
+        """Returns the name of the node at the supplied index
+
+        :param node: The index of the node
+        :return: The name of the node
+        """
+        offset = node * len(self.node_fields) + self.node_fields.index("name")
+        return self.strings[self.nodes[offset]]
+
+    def class_name(self, node: int) -> str:
+        """Returns the name of the constructor of the node at the supplied
+        index, or its type in parentheses if it is not an object
+
+        :param node: The index of the node
+        :return: The class name of the node
+        """
+        node_type = self.node_type(node)
+        if node_type in ("object", "native"):
+            return self.node_name(node)
+        return f"({node_type})"
+
+    def retained_sizes(self) -> array:
+        """Returns the retained size of every node, computed from the
+        dominator tree of the nodes reachable from the root, ignoring weak edges.
+        Unreachable nodes retain only their own size.
+
+        :return: The retained sizes indexed by node
+        """
+        if self._retained is None:
+            self._compute_dominators()
+        return self._retained
+
+    def dominators(self) -> array:
+        """Returns the index of the immediate dominator of every node, the
+        root and unreachable nodes are their own dominator
+
+        :return: The immediate dominators indexed by node
+        """
+        if self._dominators is None:
+            self._compute_dominators()
+        return self._dominators
+
+    def top_constructors(self, n: int = 10) -> List[Tuple[str, int, int, int]]:
+        """Returns the classes retaining the most memory.
+
+        The retained size of a class is the sum of the retained sizes of its
+        objects that are not immediately dominated by an object of the same class.
+
+        :param n: The number of classes returned
+        :return: The name, object count, self size and retained size of each class
+        """
+        self_sizes = self.node_column("self_size")
+        retained = self.retained_sizes()
+        dominators = self._dominators
+        stats: Dict[str, List[int]] = {}
+        names = [self.class_name(node) for node in range(self.node_count)]
+        for node, name in enumerate(names):
+            entry = stats.get(name)
+            if entry is None:
+                entry = stats[name] = [0, 0, 0]
+            entry[0] += 1
+            entry[1] += self_sizes[node]
+            dominator = dominators[node]
+            if dominator == node or names[dominator] != name:
+                entry[2] += retained[node]
+        top = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:n]
+        return [(name, count, size, kept) for name, (count, size, kept) in top]
+
+    def first_edges(self) -> array:
+        """Returns the index in the edges array of the first edge of every node,
+        plus a final entry for the end of the edges array"""
+        if self._first_edges is None:
+            edge_field_count = len(self.edge_fields)
+            first = array("I", [0]) * (self.node_count + 1)
+            position = 0
+            for node, count in enumerate(self.node_column("edge_count")):
+                first[node] = position
+                position += count * edge_field_count
+            first[self.node_count] = position
+            self._first_edges = first
+        return self._first_edges
+
+    def _compute_dominators(self) -> None:
+        """Computes the dominator tree, using the iterative algorithm of
+        Cooper, Harvey and Kennedy, and the retained sizes"""
+        count = self.node_count
+        node_field_count = len(self.node_fields)
+        edge_field_count = len(self.edge_fields)
+        edges = self.edges
+        first = self.first_edges()
+        to_offset = self.edge_fields.index("to_node")
+        type_offset = self.edge_fields.index("type")
+        edge_type_names = self.edge_types[0] if self.edge_types else []
+        weak = edge_type_names.index("weak") if "weak" in edge_type_names else -1
+        unvisited = count
+        # depth first post order numbering from the root
+        post_order = array("I", [unvisited]) * count
+        order = array("I")
+        visited = bytearray(count)
+        stack = [(0, first[0])]
+        if count:
+            visited[0] = 1
+        while stack:
+            node, cursor = stack[-1]
+            end = first[node + 1]
+            while cursor < end:
+                target = edges[cursor + to_offset] // node_field_count
+                kind = edges[cursor + type_offset]
+                cursor += edge_field_count
+                if kind != weak and not visited[target]:
+                    visited[target] = 1
+                    stack[-1] = (node, cursor)
+                    stack.append((target, first[target]))
+                    break
+            else:
+                stack.pop()
+                post_order[node] = len(order)
+                order.append(node)
+        reachable = len(order)
+        # predecessors of each reachable node, by post order number
+        in_degree = array("I", [0]) * (reachable + 1)
+        for node in order:
+            for cursor in range(first[node], first[node + 1], edge_field_count):
+                if edges[cursor + type_offset] == weak:
+                    continue
+                in_degree[post_order[edges[cursor + to_offset] // node_field_count]] += 1
+        starts = array("I", [0]) * (reachable + 1)
+        total = 0
+        for i in range(reachable):
+            starts[i] = total
+            total += in_degree[i]
+        starts[reachable] = total
+        fill = array("I", starts)
+        predecessors = array("I", [0]) * total
+        for node in order:
+            source = post_order[node]
+            for cursor in range(first[node], first[node + 1], edge_field_count):
+                if edges[cursor + type_offset] == weak:
+                    continue
+                target = post_order[edges[cursor + to_offset] // node_field_count]
+                predecessors[fill[target]] = source
+                fill[target] += 1
+        undefined = reachable
+        doms = array("I", [undefined]) * reachable
+        root = reachable - 1
+        if reachable:
+            doms[root] = root
+        changed = True
+        while changed:
+            changed = False
+            for b in range(root - 1, -1, -1):
+                new_idom = undefined
+                for i in range(starts[b], starts[b + 1]):
+                    p = predecessors[i]
+                    if doms[p] == undefined:
+                        continue
+                    if new_idom == undefined:
+                        new_idom = p
+                        continue
+                    finger1 = p
+                    finger2 = new_idom
+                    while finger1 != finger2:
+                        while finger1 < finger2:
+                            finger1 = doms[finger1]
+                        while finger2 < finger1:
+                            finger2 = doms[finger2]
+                    new_idom = finger1
+                if new_idom != undefined and doms[b] != new_idom:
+                    doms[b] = new_idom
+                    changed = True
+        dominators = array("I", range(count))
+        retained = array("Q", self.node_column("self_size"))
+        for po in range(root):
+            node = order[po]
+            dominator = order[doms[po]]
+            dominators[node] = dominator
+            retained[dominator] += retained[node]
+        self._dominators = dominators
+        self._retained = retained
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(nodes={self.node_count}, edges={self.edge_count}, strings={len(self.strings)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class HeapSnapshotParser:
+    """Incrementally parses a heap snapshot as its chunks are fed.
+
+    The numeric arrays (nodes, edges, ...) are decoded directly into typed
+    arrays and the strings into a list, so that no more than the current
+    chunk and one partial value are buffered. Unknown values are skipped.
+    """
+
+    __slots__ = [
+        "_buffer",
+        "_decoder",
+        "_depth",
+        "_in_string",
+        "_key",
+        "_mode",
+        "_pos",
+        "_start",
+        "arrays",
+        "done",
+        "meta",
+        "strings",
+    ]
+
+    KEY: str = "key"
+    NUMBERS: str = "numbers"
+    STRINGS: str = "strings"
+    VALUE: str = "value"
+
+    def __init__(self) -> None:
+        self._decoder: Any = getincrementaldecoder("utf-8")()
+        self._buffer: str = ""
+        self._pos: int = 0
+        self._mode: str = self.KEY
+        self._key: str = ""
+        self._start: int = 0
+        self._depth: int = 0
+        self._in_string: bool = False
+        self.meta: Dict = {}
+        self.arrays: Dict[str, array] = {}
+        self.strings: List[str] = []
+        self.done: bool = False
+
+    def feed(self, data: Union[bytes, str]) -> None:
+        """Feed the next chunk of the snapshot
+
+        :param data: The chunk of the snapshot
+        """
+        if isinstance(data, bytes):
+            data = self._decoder.decode(data)
+        if self.done:
+            return
+        buf = self._buffer + data
+        pos = self._pos
+        progressed = True
+        while progressed and not self.done:
+            mode = self._mode
+            if mode == self.KEY:
+                pos, progressed = self._parse_key(buf, pos)
+            elif mode == self.NUMBERS:
+                pos, progressed = self._parse_numbers(buf, pos)
+            elif mode == self.STRINGS:
+                pos, progressed = self._parse_strings(buf, pos)
+            else:
+                pos, progressed = self._parse_value(buf, pos)
+        if self._mode == self.VALUE:
+            keep = self._start
+            self._start = 0
+        else:
+            keep = pos
+        self._buffer = buf[keep:]
+        self._pos = pos - keep
+
+    def close(self) -> HeapSnapshot:
+        """Finish parsing the snapshot
+
+        :return: The parsed snapshot
+        """
+        if not self.done:
+            raise ValueError("The heap snapshot ended before it was complete")
+        return HeapSnapshot(self.meta, self.arrays, self.strings)
+
+    def _parse_key(self, buf: str, pos: int) -> Tuple[int, bool]:
+        match = KEY_RE.match(buf, pos)
+        if match is None:
+            end = END_RE.match(buf, pos)
+            if end is not None:
+                self.done = True
+                return end.end(), False
+            return pos, False
+        key = match.group(1)
+        value_start = match.start(2)
+        self._key = key
+        if match.group(2) == "[" and key in NUMERIC_ARRAYS:
+            self._mode = self.NUMBERS
+            self.arrays[key] = array("I")
+            return value_start + 1, True
+        if match.group(2) == "[" and key == "strings":
+            self._mode = self.STRINGS
+            return value_start + 1, True
+        self._mode = self.VALUE
+        self._start = value_start
+        self._depth = 0
+        self._in_string = False
+        return value_start, True
+
+    def _parse_numbers(self, buf: str, pos: int) -> Tuple[int, bool]:
+        end = buf.find("]", pos)
+        target = self.arrays[self._key]
+        if end != -1:
+            segment = buf[pos:end]
+            if segment.strip():
+                target.extend(map(int, segment.split(",")))
+            self._mode = self.KEY
+            return end + 1, True
+        # the value after the last comma may be incomplete
+        last = buf.rfind(",", pos)
+        if last == -1:
+            return pos, False
+        target.extend(map(int, buf[pos:last].split(",")))
+        return last + 1, False
+
+    def _parse_strings(self, buf: str, pos: int) -> Tuple[int, bool]:
+        strings = self.strings
+        match_item = STRING_ITEM_RE.match
+        while 1:
+            match = match_item(buf, pos)
+            if match is None:
+                break
+            value = match.group(1)
+            strings.append(loads(f'"{value}"') if "\\" in value else value)
+            pos = match.end()
+        end = ARRAY_END_RE.match(buf, pos)
+        if end is not None:
+            self._mode = self.KEY
+            return end.end(), True
+        return pos, False
+
+    def _parse_value(self, buf: str, pos: int) -> Tuple[int, bool]:
+        """Scans a value, tracking nesting and strings, until it is complete"""
+        if pos == self._start and not self._depth and not self._in_string:
+            first = buf[pos] if pos < len(buf) else ""
+            if first == '"':
+                self._in_string = True
+                pos += 1
+            elif first and first not in "[{":
+                match = SCALAR_END_RE.search(buf, pos)
+                if match is None:
+                    return pos, False
+                return self._finish_value(buf, match.start())
+        depth = self._depth
+        in_string = self._in_string
+        length = len(buf)
+        while pos < length:
+            if in_string:
+                match = STRING_RE.search(buf, pos)
+                if match is None:
+                    pos = length
+                    break
+                pos = match.end()
+                if match.group() == "\\":
+                    # the escaped character may be the first of the next chunk
+                    pos += 1
+                    continue
+                in_string = False
+                if depth == 0:
+                    return self._finish_value(buf, pos)
+                continue
+            match = NESTING_RE.search(buf, pos)
+            if match is None:
+                pos = length
+                break
+            c = match.group()
+            pos = match.end()
+            if c == '"':
+                in_string = True
+            elif c in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return self._finish_value(buf, pos)
+        self._depth = depth
+        self._in_string = in_string
+        return pos, False
+
+    def _finish_value(self, buf: str, end: int) -> Tuple[int, bool]:
+        """Completes the value ending at the supplied position"""
+        if self._key == "snapshot":
+            self.meta = loads(buf[self._start : end])
+        self._depth = 0
+        self._in_string = False
+        self._mode = self.KEY
+        return end, True
+
+
+def _iter_file_chunks(snapshot: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    while 1:
+        chunk = snapshot.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def parse_heap_snapshot(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> HeapSnapshot:
+    """Parses the heap snapshot file at the supplied path chunk by chunk.
+    Blocks, call it in an executor.
+
+    :param path: The path of the snapshot, such as one written by HeapSnapshotRecorder
+    :param chunk_size: The number of bytes read at a time
+    :return: The parsed snapshot
+    """
+    parser = HeapSnapshotParser()
+    with open(path, "rb") as snapshot:
+        for chunk in _iter_file_chunks(snapshot, chunk_size):
+            parser.feed(chunk)
+    return parser.close()
+
+
+class HeapSnapshotRecorder:
+    """Takes heap snapshots writing the HeapProfiler.addHeapSnapshotChunk
+    chunks straight to a file, rather than concatenating them in memory.
+
+    Chunks are written in the default executor by a single writer task, so
+    that the file is written in order while the snapshot is being taken.
+    """
+
+    __slots__ = [
+        "_client",
+        "_on_progress",
+        "_out",
+        "_queue",
+        "_writer",
+        "bytes_written",
+        "chunks",
+        "done",
+        "total",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        on_progress: Optional[ProgressCallback] = None,
+    ) -> None:
+        """Construct a new HeapSnapshotRecorder
+
+        :param client: The client or session whose heap is snapshot
+        :param on_progress: Optional callback called with the done and total
+        counts of each HeapProfiler.reportHeapSnapshotProgress event
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._on_progress: Optional[ProgressCallback] = on_progress
+        self._queue: Optional[Queue] = None
+        self._writer: Optional[Task] = None
+        self._out: Optional[BinaryIO] = None
+        self.chunks: int = 0
+        self.bytes_written: int = 0
+        #: The progress of the snapshot being taken
+        self.done: int = 0
+        self.total: int = 0
+
+    async def take(self, path: str, report_progress: bool = True) -> int:
+        """Take a heap snapshot writing it to the supplied path
+
+        :param path: The path of the snapshot file
+        :param report_progress: Should progress be reported while taking the snapshot
+        :return: The number of bytes written
+        """
+        loop = self._client.loop
+        self.chunks = self.bytes_written = self.done = self.total = 0
+        self._out = await loop.run_in_executor(None, open, path, "wb")
+        self._queue = Queue()
+        self._writer = loop.create_task(self._write_loop())
+        self._client.on("HeapProfiler.addHeapSnapshotChunk", self._on_chunk)
+        self._client.on("HeapProfiler.reportHeapSnapshotProgress", self._on_progress_event)
+        try:
+            await self._client.send(
+                "HeapProfiler.takeHeapSnapshot", {"reportProgress": report_progress}
+            )
+        finally:
+            self._client.remove_listener("HeapProfiler.addHeapSnapshotChunk", self._on_chunk)
+            self._client.remove_listener(
+                "HeapProfiler.reportHeapSnapshotProgress", self._on_progress_event
+            )
+            self._queue.put_nowait(None)
+            try:
+                await self._writer
+            finally:
+                await loop.run_in_executor(None, self._out.close)
+                self._out = None
+                self._writer = None
+        return self.bytes_written
+
+    def _on_chunk(self, event: Dict) -> None:
+        self.chunks += 1
+        self._queue.put_nowait(event["chunk"].encode("utf-8"))
+
+    def _on_progress_event(self, event: Dict) -> None:
+        self.done = event.get("done", self.done)
+        self.total = event.get("total", self.total)
+        if self._on_progress is not None:
+            self._on_progress(self.done, self.total)
+
+    async def _write_loop(self) -> None:
+        """Writes the queued chunks until None is dequeued, batching the
+        chunks queued while the previous write was in progress"""
+        queue = self._queue
+        run_in_executor = self._client.loop.run_in_executor
+        finished = False
+        while not finished:
+            batch = [await queue.get()]
+            while not queue.empty():
+                batch.append(queue.get_nowait())
+            if batch[-1] is None:
+                finished = True
+                batch.pop()
+            if batch:
+                data = b"".join(batch)
+                await run_in_executor(None, self._out.write, data)
+                self.bytes_written += len(data)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(chunks={self.chunks}, written={self.bytes_written})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
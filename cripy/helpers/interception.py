@@ -0,0 +1,581 @@
+import logging
+import re
+from asyncio import QueueFull
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Pattern,
+    Set,
+    TYPE_CHECKING,
+    Union,
+)
+from urllib.parse import urlsplit
+
+from .workers import WorkerPool
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = [
+    "Decision",
+    "DecisionStats",
+    "InterceptionEngine",
+    "Rule",
+    "RuleIndex",
+    "compile_glob",
+]
+
+logger = logging.getLogger(__name__)
+
+DecisionHandler = Callable[[Dict], Awaitable[Optional["Decision"]]]
+
+#: matches URL globs whose host can be indexed: an optional scheme, and a
+#: literal host optionally prefixed with a "*." wildcard for any subdomain
+INDEXABLE_GLOB: Pattern = re.compile(
+    r"^(?P<scheme>[a-z*]+)://(?P<wild>\*\.)?(?P<host>[^*?/\\:]+)(?P<port>:\d+)?(?P<path>/.*)?$",
+    re.IGNORECASE,
+)
+
+GLOB_SPECIALS: Pattern = re.compile(r"[*?\\]")
+
+
+def compile_glob(glob: str) -> Pattern:
+    """Compiles a URL glob, using the same syntax as Fetch.RequestPattern
+    (`*` matches zero or more characters, `?` matches one, `\\` escapes),
+    into a regular expression matching the whole URL
+
+    :param glob: The URL glob
+    :return: The compiled regular expression
+    """
+    parts: List[str] = []
+    i = 0
+    length = len(glob)
+    while i < length:
+        c = glob[i]
+        if c == "*":
+            parts.append(".*")
+        elif c == "?":
+            parts.append(".")
+        elif c == "\\" and i + 1 < length:
+            i += 1
+            parts.append(re.escape(glob[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return re.compile("".join(parts) + r"\Z", re.DOTALL)
+
+
+class Decision:
+    """How a paused request is resolved: continued, fulfilled or failed,
+    with the parameters of the corresponding Fetch command"""
+
+    __slots__ = ["action", "params"]
+
+    CONTINUE: str = "continue"
+    FULFILL: str = "fulfill"
+    FAIL: str = "fail"
+
+    COMMANDS: Dict[str, str] = {
+        "continue": "Fetch.continueRequest",
+        "fulfill": "Fetch.fulfillRequest",
+        "fail": "Fetch.failRequest",
+    }
+
+    def __init__(self, action: str, params: Optional[Dict[str, Any]] = None) -> None:
+        """Construct a new Decision
+
+        :param action: One of continue, fulfill or fail
+        :param params: The parameters of the command, excluding the requestId
+        """
+        if action not in self.COMMANDS:
+            raise ValueError(f"Unknown interception action {action}")
+        self.action: str = action
+        self.params: Dict[str, Any] = params if params is not None else {}
+
+    @classmethod
+    def proceed(cls, **overrides: Any) -> "Decision":
+        """Continue the request, optionally overriding its url, method, postData or headers"""
+        return cls(cls.CONTINUE, overrides)
+
+    @classmethod
+    def fulfill(
+        cls,
+        response_code: int = 200,
+        headers: Optional[List[Dict[str, str]]] = None,
+        body: Optional[str] = None,
+        phrase: Optional[str] = None,
+    ) -> "Decision":
+        """Fulfill the request with the supplied response
+
+        :param response_code: The HTTP status of the response
+        :param headers: The response headers as a list of name/value objects
+        :param body: The base64 encoded body of the response
+        :param phrase: Optional status text of the response
+        """
+        params: Dict[str, Any] = {
+            "responseCode": response_code,
+            "responseHeaders": headers if headers is not None else [],
+        }
+        if body is not None:
+            params["body"] = body
+        if phrase is not None:
+            params["responsePhrase"] = phrase
+        return cls(cls.FULFILL, params)
+
+    @classmethod
+    def fail(cls, error_reason: str = "BlockedByClient") -> "Decision":
+        """Fail the request with the supplied Network.ErrorReason"""
+        return cls(cls.FAIL, {"errorReason": error_reason})
+
+    @property
+    def command(self) -> str:
+        """Returns the Fetch command used to resolve the request"""
+        return self.COMMANDS[self.action]
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(action={self.action})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class Rule:
+    """A declarative interception rule matched against paused requests.
+
+    A rule matches a URL glob or regular expression and optionally a set of
+    resource types, methods and the stage of the request. When a rule matches
+    the request is resolved using its decision, or, if it has a handler, using
+    the decision returned by the handler which runs on the worker pool.
+    """
+
+    __slots__ = [
+        "_url_re",
+        "decision",
+        "glob",
+        "handler",
+        "hits",
+        "index",
+        "methods",
+        "path_prefix",
+        "regex",
+        "resource_types",
+        "stage",
+    ]
+
+    def __init__(
+        self,
+        glob: Optional[str] = "*",
+        regex: Optional[Union[str, Pattern]] = None,
+        resource_types: Optional[Iterable[str]] = None,
+        methods: Optional[Iterable[str]] = None,
+        stage: str = "Request",
+        decision: Optional[Decision] = None,
+        handler: Optional[DecisionHandler] = None,
+    ) -> None:
+        """Construct a new Rule
+
+        :param glob: URL glob the rule matches, ignored if regex is supplied
+        :param regex: Regular expression the URL must match
+        :param resource_types: The Network.ResourceTypes the rule matches. Defaults to all
+        :param methods: The HTTP methods the rule matches. Defaults to all
+        :param stage: The Fetch.RequestStage the rule matches
+        :param decision: How matched requests are resolved. Defaults to continuing
+        :param handler: Coroutine function called with the Fetch.requestPaused event
+        returning the decision for the request. If it returns None, the rules
+        decision is used
+        """
+        self.glob: Optional[str] = glob if regex is None else None
+        self.regex: Optional[Pattern] = (
+            re.compile(regex) if isinstance(regex, str) else regex
+        )
+        self.resource_types: Optional[Set[str]] = (
+            set(resource_types) if resource_types is not None else None
+        )
+        self.methods: Optional[Set[str]] = (
+            {method.upper() for method in methods} if methods is not None else None
+        )
+        self.stage: str = stage
+        self.decision: Decision = decision if decision is not None else Decision.proceed()
+        self.handler: Optional[DecisionHandler] = handler
+        #: The number of paused requests matched by this rule
+        self.hits: int = 0
+        #: The position of the rule in its index, earlier rules take precedence
+        self.index: int = -1
+        #: The literal prefix, starting at the path, of an indexed glob
+        self.path_prefix: str = ""
+        self._url_re: Pattern = (
+            self.regex if self.regex is not None else compile_glob(self.glob)
+        )
+
+    def matches(
+        self, url: str, method: str, resource_type: str, stage: str
+    ) -> bool:
+        """Returns T/F indicating if the rule matches the supplied request
+
+        :param url: The URL of the request
+        :param method: The HTTP method of the request
+        :param resource_type: The resource type of the request
+        :param stage: The stage the request is paused at
+        :return: T/F indicating if the rule matches
+        """
+        if stage != self.stage:
+            return False
+        if self.methods is not None and method not in self.methods:
+            return False
+        if self.resource_types is not None and resource_type not in self.resource_types:
+            return False
+        return self._url_re.match(url) is not None
+
+    def request_patterns(self) -> List[Dict[str, str]]:
+        """Returns the Fetch.RequestPatterns that pause every request
+        this rule could match"""
+        url_pattern = self.glob if self.glob is not None else "*"
+        if self.resource_types is None:
+            return [{"urlPattern": url_pattern, "requestStage": self.stage}]
+        return [
+            {"urlPattern": url_pattern, "resourceType": rt, "requestStage": self.stage}
+            for rt in sorted(self.resource_types)
+        ]
+
+    def __str__(self) -> str:
+        matcher = self.glob if self.glob is not None else self.regex.pattern
+        return f"{self.__class__.__name__}(url={matcher}, stage={self.stage}, decision={self.decision.action}, hits={self.hits})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class _HostNode:
+    """A node of the host trie, keyed by reversed host labels"""
+
+    __slots__ = ["children", "rules", "subdomain_rules"]
+
+    def __init__(self) -> None:
+        self.children: Dict[str, "_HostNode"] = {}
+        #: rules for exactly this host
+        self.rules: List[Rule] = []
+        #: rules for any subdomain of this host
+        self.subdomain_rules: List[Rule] = []
+
+
+class RuleIndex:
+    """Indexes rules by the host of their URL glob so that matching a
+    request only considers the rules that could apply to its host.
+
+    Globs with a literal host (optionally `*.` prefixed) are placed in a trie
+    of reversed host labels, all other rules are checked for every request.
+    Within a host, the literal path prefix of a glob is checked before the
+    full glob.
+    """
+
+    __slots__ = ["_generic", "_root", "_rules"]
+
+    def __init__(self, rules: Optional[Iterable[Rule]] = None) -> None:
+        self._root: _HostNode = _HostNode()
+        self._generic: List[Rule] = []
+        self._rules: List[Rule] = []
+        if rules is not None:
+            for rule in rules:
+                self.add(rule)
+
+    @property
+    def rules(self) -> List[Rule]:
+        """Returns the indexed rules in precedence order"""
+        return list(self._rules)
+
+    def add(self, rule: Rule) -> Rule:
+        """Add the supplied rule to the index, it has the lowest precedence
+
+        :param rule: The rule to be added
+        :return: The added rule
+        """
+        rule.index = len(self._rules)
+        self._rules.append(rule)
+        match = INDEXABLE_GLOB.match(rule.glob) if rule.glob is not None else None
+        if match is None:
+            self._generic.append(rule)
+            return rule
+        path = match.group("path") or ""
+        special = GLOB_SPECIALS.search(path)
+        rule.path_prefix = path if special is None else path[: special.start()]
+        node = self._root
+        for label in reversed(match.group("host").lower().split(".")):
+            child = node.children.get(label)
+            if child is None:
+                child = node.children[label] = _HostNode()
+            node = child
+        if match.group("wild"):
+            node.subdomain_rules.append(rule)
+        else:
+            node.rules.append(rule)
+        return rule
+
+    def candidates(self, host: str) -> List[Rule]:
+        """Returns the rules that could match a URL with the supplied host,
+        in precedence order
+
+        :param host: The host of the URL
+        :return: The list of candidate rules
+        """
+        found: List[Rule] = list(self._generic)
+        labels = host.lower().split(".")
+        node = self._root
+        remaining = len(labels)
+        for label in reversed(labels):
+            node = node.children.get(label)
+            if node is None:
+                break
+            remaining -= 1
+            if remaining > 0:
+                found.extend(node.subdomain_rules)
+            else:
+                found.extend(node.rules)
+        if len(found) > 1:
+            found.sort(key=_rule_index)
+        return found
+
+    def match(
+        self, url: str, method: str, resource_type: str, stage: str
+    ) -> Optional[Rule]:
+        """Returns the rule with the highest precedence matching the supplied request
+
+        :param url: The URL of the request
+        :param method: The HTTP method of the request
+        :param resource_type: The resource type of the request
+        :param stage: The stage the request is paused at
+        :return: The matching rule if one exists
+        """
+        parts = urlsplit(url)
+        path = url[url.find(parts.netloc) + len(parts.netloc) :] if parts.netloc else ""
+        for rule in self.candidates(parts.hostname or ""):
+            if rule.path_prefix and not path.startswith(rule.path_prefix):
+                continue
+            if rule.matches(url, method, resource_type, stage):
+                return rule
+        return None
+
+    def __len__(self) -> int:
+        return len(self._rules)
+
+
+def _rule_index(rule: Rule) -> int:
+    return rule.index
+
+
+class DecisionStats:
+    """Count and latency, in seconds, of the decisions of one action"""
+
+    __slots__ = ["count", "errors", "max_latency", "total_latency"]
+
+    def __init__(self) -> None:
+        self.count: int = 0
+        self.errors: int = 0
+        self.total_latency: float = 0.0
+        self.max_latency: float = 0.0
+
+    @property
+    def mean_latency(self) -> float:
+        """Returns the mean latency of the decisions"""
+        return self.total_latency / self.count if self.count else 0.0
+
+    def record(self, latency: float) -> None:
+        """Record the latency of a decision
+
+        :param latency: The time taken to resolve the request
+        """
+        self.count += 1
+        self.total_latency += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(count={self.count}, mean={self.mean_latency:.6f}, max={self.max_latency:.6f})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class InterceptionEngine:
+    """Resolves the requests paused by the Fetch domain using declarative rules.
+
+    Requests matching a rule with a static decision, or no rule, are resolved
+    directly from the event listener. Requests matching a rule with a handler
+    are dispatched to a bounded pool of workers, if its queue is full the
+    request is resolved using the decision of the rule.
+
+    Per rule hit counts are available from `Rule.hits` and the per action
+    decision latency, from the request being paused until the browser
+    acknowledges the decision, from `stats`.
+    """
+
+    __slots__ = [
+        "_client",
+        "_default",
+        "_enabled",
+        "_index",
+        "_pool",
+        "overflowed",
+        "stats",
+        "unmatched",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        rules: Optional[Iterable[Rule]] = None,
+        default: Optional[Decision] = None,
+        workers: int = 8,
+        queue_size: int = 256,
+    ) -> None:
+        """Construct a new InterceptionEngine
+
+        :param client: The client or session whose requests are intercepted
+        :param rules: The initial rules, in precedence order
+        :param default: The decision for requests not matching any rule.
+        Defaults to continuing the request
+        :param workers: The number of workers executing rule handlers
+        :param queue_size: Maximum number of paused requests waiting for a worker
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._index: RuleIndex = RuleIndex(rules)
+        self._default: Decision = default if default is not None else Decision.proceed()
+        self._pool: WorkerPool = WorkerPool(workers, queue_size, loop=client.loop)
+        self._enabled: bool = False
+        self.stats: Dict[str, DecisionStats] = {
+            action: DecisionStats() for action in Decision.COMMANDS
+        }
+        #: The number of paused requests not matching any rule
+        self.unmatched: int = 0
+        #: The number of paused requests resolved with the decision of their
+        #: rule, rather than its handler, because the queue was full
+        self.overflowed: int = 0
+
+    @property
+    def client(self) -> Union["ConnectionType", "SessionType"]:
+        """Returns the client or session whose requests are intercepted"""
+        return self._client
+
+    @property
+    def rules(self) -> List[Rule]:
+        """Returns the rules in precedence order"""
+        return self._index.rules
+
+    def add_rule(self, rule: Rule) -> Rule:
+        """Add a rule with the lowest precedence. Rules added once the engine
+        is enabled only apply to the requests that are paused, see `request_patterns`
+
+        :param rule: The rule to be added
+        :return: The added rule
+        """
+        return self._index.add(rule)
+
+    def request_patterns(self) -> List[Dict[str, str]]:
+        """Returns the Fetch.RequestPatterns the engine enables Fetch with.
+
+        If the default decision continues requests unmodified, only the requests
+        the rules could match need to be paused.
+        """
+        default = self._default
+        if default.action == Decision.CONTINUE and not default.params:
+            patterns: List[Dict[str, str]] = []
+            for rule in self._index.rules:
+                for pattern in rule.request_patterns():
+                    if pattern not in patterns:
+                        patterns.append(pattern)
+            return patterns
+        stages = {rule.stage for rule in self._index.rules} | {"Request"}
+        return [{"urlPattern": "*", "requestStage": stage} for stage in sorted(stages)]
+
+    async def enable(self) -> None:
+        """Start intercepting requests by enabling the Fetch domain"""
+        if not self._enabled:
+            self._client.on("Fetch.requestPaused", self._on_request_paused)
+            self._enabled = True
+        await self._client.send("Fetch.enable", {"patterns": self.request_patterns()})
+
+    async def disable(self) -> None:
+        """Stop intercepting requests, waiting for handlers to finish"""
+        if self._enabled:
+            self._client.remove_listener("Fetch.requestPaused", self._on_request_paused)
+            self._enabled = False
+        await self._pool.close()
+        await self._client.send("Fetch.disable")
+
+    def _on_request_paused(self, event: Dict) -> None:
+        start = self._client.loop.time()
+        request = event["request"]
+        stage = (
+            "Response"
+            if "responseStatusCode" in event or "responseErrorReason" in event
+            else "Request"
+        )
+        rule = self._index.match(
+            request["url"], request["method"], event.get("resourceType"), stage
+        )
+        if rule is None:
+            self.unmatched += 1
+            self._resolve(event, self._default, start)
+            return
+        rule.hits += 1
+        if rule.handler is None:
+            self._resolve(event, rule.decision, start)
+            return
+        try:
+            self._pool.submit_nowait(self._handle, event, rule, start)
+        except QueueFull:
+            self.overflowed += 1
+            self._resolve(event, rule.decision, start)
+
+    async def _handle(self, event: Dict, rule: Rule, start: float) -> None:
+        """Resolves the paused request using the decision of the rules handler
+
+        :param event: The Fetch.requestPaused event
+        :param rule: The rule matching the request
+        :param start: The loop time the request was received
+        """
+        try:
+            decision = await rule.handler(event)
+        except Exception:
+            logger.exception(f"The handler of {rule} raised, using the rules decision")
+            decision = None
+        if decision is None:
+            decision = rule.decision
+        try:
+            await self._resolve(event, decision, start)
+        except Exception:
+            # counted as an error of the decision by _resolve
+            pass
+
+    def _resolve(self, event: Dict, decision: Decision, start: float) -> Awaitable:
+        """Sends the command resolving the paused request
+
+        :param event: The Fetch.requestPaused event
+        :param decision: The decision for the request
+        :param start: The loop time the request was received
+        :return: The future of the command
+        """
+        params = dict(decision.params)
+        params["requestId"] = event["requestId"]
+        stats = self.stats[decision.action]
+        loop = self._client.loop
+
+        def done(future: Any) -> None:
+            if future.cancelled() or future.exception() is not None:
+                stats.errors += 1
+            else:
+                stats.record(loop.time() - start)
+
+        future = self._client.send(decision.command, params)
+        future.add_done_callback(done)
+        return future
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(rules={len(self._index)}, enabled={self._enabled})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,423 @@
+from asyncio import ensure_future
+from collections import OrderedDict
+from inspect import isawaitable
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    TYPE_CHECKING,
+    Tuple,
+    Union,
+)
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["NetworkTracker", "RequestRecord"]
+
+FinalizeCallback = Callable[["RequestRecord"], Any]
+
+
+class RequestRecord:
+    """Compact record of a single network request/response exchange.
+
+    Redirects re-use the requestId of the original request, each hop
+    of a redirect chain is its own record linked via `redirected_from`
+    """
+
+    __slots__ = [
+        "request_id",
+        "loader_id",
+        "frame_id",
+        "document_url",
+        "resource_type",
+        "request",
+        "response",
+        "timestamp",
+        "wall_time",
+        "response_timestamp",
+        "end_timestamp",
+        "data_length",
+        "encoded_data_length",
+        "from_cache",
+        "finished",
+        "failed",
+        "error_text",
+        "canceled",
+        "redirected_from",
+    ]
+
+    def __init__(
+        self,
+        request_id: str,
+        loader_id: Optional[str],
+        frame_id: Optional[str],
+        document_url: Optional[str],
+        resource_type: Optional[str],
+        request: Dict,
+        timestamp: float,
+        wall_time: float,
+        redirected_from: Optional["RequestRecord"] = None,
+    ) -> None:
+        self.request_id: str = request_id
+        self.loader_id: Optional[str] = loader_id
+        self.frame_id: Optional[str] = frame_id
+        self.document_url: Optional[str] = document_url
+        self.resource_type: Optional[str] = resource_type
+        self.request: Dict = request
+        self.response: Optional[Dict] = None
+        self.timestamp: float = timestamp
+        self.wall_time: float = wall_time
+        self.response_timestamp: Optional[float] = None
+        self.end_timestamp: Optional[float] = None
+        self.data_length: int = 0
+        self.encoded_data_length: int = 0
+        self.from_cache: bool = False
+        self.finished: bool = False
+        self.failed: bool = False
+        self.error_text: Optional[str] = None
+        self.canceled: bool = False
+        self.redirected_from: Optional["RequestRecord"] = redirected_from
+
+    @property
+    def url(self) -> str:
+        """Returns the URL of the request"""
+        return self.request.get("url")
+
+    @property
+    def method(self) -> str:
+        """Returns the HTTP method of the request"""
+        return self.request.get("method")
+
+    @property
+    def status(self) -> Optional[int]:
+        """Returns the HTTP status of the response if one was received"""
+        if self.response is None:
+            return None
+        return self.response.get("status")
+
+    @property
+    def done(self) -> bool:
+        """Returns T/F indicating if the request has finished or failed"""
+        return self.finished or self.failed
+
+    @property
+    def redirect_chain(self) -> List["RequestRecord"]:
+        """Returns the records of the redirect chain that lead to this
+        record, oldest first"""
+        chain: List["RequestRecord"] = []
+        prev = self.redirected_from
+        while prev is not None:
+            chain.append(prev)
+            prev = prev.redirected_from
+        chain.reverse()
+        return chain
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(requestId={self.request_id}, url={self.url}, status={self.status})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class NetworkTracker:
+    """Tracks the requests made by a target using the Network domain events.
+
+    Records are indexed by requestId, frameId and URL. The number of records
+    kept is bounded by `max_records`, once exceeded the least recently
+    used record is evicted. Finalize callbacks are called once a record
+    has finished, failed or been redirected.
+
+    Note: The tracker does not enable the Network domain, that is left to
+    the user so that the tracker can be started before navigation.
+    """
+
+    __slots__ = [
+        "_by_frame",
+        "_by_id",
+        "_by_url",
+        "_client",
+        "_finalize_callbacks",
+        "_inflight",
+        "_listeners",
+        "_max_records",
+        "_retain_finished",
+        "evicted",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        max_records: Optional[int] = 10000,
+        retain_finished: bool = True,
+    ) -> None:
+        """Construct a new NetworkTracker
+
+        :param client: The client or session whose Network events are tracked
+        :param max_records: Maximum number of requests to keep records for.
+        If None, no records are evicted
+        :param retain_finished: Should records be kept after they have been finalized
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._max_records: Optional[int] = max_records
+        self._retain_finished: bool = retain_finished
+        self._by_id: "OrderedDict[str, RequestRecord]" = OrderedDict()
+        self._by_frame: Dict[str, Dict[str, RequestRecord]] = {}
+        self._by_url: Dict[str, Dict[str, RequestRecord]] = {}
+        self._finalize_callbacks: List[FinalizeCallback] = []
+        self._inflight: int = 0
+        self._listeners: List[Tuple[str, Callable[[Dict], None]]] = [
+            ("Network.requestWillBeSent", self._on_request_will_be_sent),
+            ("Network.requestServedFromCache", self._on_served_from_cache),
+            ("Network.responseReceived", self._on_response_received),
+            ("Network.dataReceived", self._on_data_received),
+            ("Network.loadingFinished", self._on_loading_finished),
+            ("Network.loadingFailed", self._on_loading_failed),
+        ]
+        self.evicted: int = 0
+
+    @property
+    def client(self) -> Union["ConnectionType", "SessionType"]:
+        """Returns the client or session being tracked"""
+        return self._client
+
+    @property
+    def inflight(self) -> int:
+        """Returns the number of requests that have not yet finished or failed"""
+        return self._inflight
+
+    def start(self) -> "NetworkTracker":
+        """Start listening for the Network domain events"""
+        client_on = self._client.on
+        for event, listener in self._listeners:
+            client_on(event, listener)
+        return self
+
+    def stop(self) -> None:
+        """Stop listening for the Network domain events"""
+        remove_listener = self._client.remove_listener
+        for event, listener in self._listeners:
+            remove_listener(event, listener)
+
+    def on_finalize(self, callback: FinalizeCallback) -> Callable[[], None]:
+        """Register a callback that is called with each record once
+        it has finished, failed or been redirected.
+
+        If the callback returns an awaitable it is scheduled on the clients loop.
+
+        :param callback: The callback to be registered
+        :return: A callable that will remove the supplied callback
+        """
+        self._finalize_callbacks.append(callback)
+        return lambda: self._finalize_callbacks.remove(callback)
+
+    def get(self, request_id: str) -> Optional[RequestRecord]:
+        """Returns the latest record for the supplied request id if it exists
+
+        :param request_id: The id of the request
+        :return: The record associated with the request id
+        """
+        record = self._by_id.get(request_id)
+        if record is not None:
+            self._by_id.move_to_end(request_id)
+        return record
+
+    def by_frame(self, frame_id: str) -> List[RequestRecord]:
+        """Returns the records of the requests made by the supplied frame
+
+        :param frame_id: The id of the frame
+        :return: The list of records for the frame
+        """
+        records = self._by_frame.get(frame_id)
+        if records is None:
+            return []
+        return list(records.values())
+
+    def by_url(self, url: str) -> List[RequestRecord]:
+        """Returns the records of the requests made for the supplied URL,
+        including redirect hops
+
+        :param url: The URL of the requests
+        :return: The list of records for the URL
+        """
+        records = self._by_url.get(url)
+        if records is None:
+            return []
+        return list(records.values())
+
+    def clear(self) -> None:
+        """Removes all tracked records"""
+        self._by_id.clear()
+        self._by_frame.clear()
+        self._by_url.clear()
+        self._inflight = 0
+
+    def _add(self, record: RequestRecord) -> None:
+        """Adds the record to the indexes, evicting the least recently
+        used records if the max number of records was exceeded
+
+        :param record: The record to be added
+        """
+        request_id = record.request_id
+        self._by_id[request_id] = record
+        self._by_id.move_to_end(request_id)
+        if record.frame_id is not None:
+            frame_records = self._by_frame.get(record.frame_id)
+            if frame_records is None:
+                frame_records = self._by_frame[record.frame_id] = {}
+            frame_records[request_id] = record
+        url_records = self._by_url.get(record.url)
+        if url_records is None:
+            url_records = self._by_url[record.url] = {}
+        url_records[request_id] = record
+        if self._max_records is not None:
+            while len(self._by_id) > self._max_records:
+                _, evicted = self._by_id.popitem(last=False)
+                self._unindex(evicted)
+                if not evicted.done:
+                    self._inflight -= 1
+                self.evicted += 1
+
+    def _unindex(self, record: RequestRecord) -> None:
+        """Removes the record, and every hop of its redirect chain,
+        from the frame and URL indexes
+
+        :param record: The record to be removed
+        """
+        request_id = record.request_id
+        frame_records = self._by_frame.get(record.frame_id)
+        if frame_records is not None:
+            frame_records.pop(request_id, None)
+            if not frame_records:
+                del self._by_frame[record.frame_id]
+        hop: Optional[RequestRecord] = record
+        while hop is not None:
+            url_records = self._by_url.get(hop.url)
+            if url_records is not None and url_records.get(request_id) is hop:
+                del url_records[request_id]
+                if not url_records:
+                    del self._by_url[hop.url]
+            hop = hop.redirected_from
+
+    def _remove(self, record: RequestRecord) -> None:
+        """Removes the record from all indexes
+
+        :param record: The record to be removed
+        """
+        if self._by_id.get(record.request_id) is record:
+            del self._by_id[record.request_id]
+            self._unindex(record)
+
+    def _finalize(self, record: RequestRecord) -> None:
+        """Calls the finalize callbacks for the supplied record
+
+        :param record: The finalized record
+        """
+        for callback in list(self._finalize_callbacks):
+            ret = callback(record)
+            if isawaitable(ret):
+                ensure_future(ret, loop=self._client.loop)
+
+    def _on_request_will_be_sent(self, event: Dict) -> None:
+        request_id = event["requestId"]
+        previous = self._by_id.get(request_id)
+        redirect_response = event.get("redirectResponse")
+        if previous is not None and redirect_response is not None:
+            previous.response = redirect_response
+            previous.response_timestamp = previous.end_timestamp = event["timestamp"]
+            previous.encoded_data_length = redirect_response.get(
+                "encodedDataLength", 0
+            )
+            previous.finished = True
+            self._inflight -= 1
+            self._finalize(previous)
+        elif previous is not None:
+            # the request was restarted, the record it replaces is dropped
+            self._unindex(previous)
+            if not previous.done:
+                self._inflight -= 1
+            previous = None
+        record = RequestRecord(
+            request_id,
+            event.get("loaderId"),
+            event.get("frameId"),
+            event.get("documentURL"),
+            event.get("type"),
+            event["request"],
+            event["timestamp"],
+            event.get("wallTime"),
+            previous,
+        )
+        self._inflight += 1
+        self._add(record)
+
+    def _on_served_from_cache(self, event: Dict) -> None:
+        record = self._by_id.get(event["requestId"])
+        if record is not None:
+            record.from_cache = True
+
+    def _on_response_received(self, event: Dict) -> None:
+        record = self._by_id.get(event["requestId"])
+        if record is None:
+            return
+        response = event["response"]
+        record.response = response
+        record.response_timestamp = event["timestamp"]
+        if record.resource_type is None:
+            record.resource_type = event.get("type")
+        if response.get("fromDiskCache"):
+            record.from_cache = True
+
+    def _on_data_received(self, event: Dict) -> None:
+        record = self._by_id.get(event["requestId"])
+        if record is not None:
+            record.data_length += event.get("dataLength", 0)
+
+    def _on_loading_finished(self, event: Dict) -> None:
+        record = self._by_id.get(event["requestId"])
+        if record is None or record.done:
+            return
+        record.finished = True
+        record.end_timestamp = event["timestamp"]
+        record.encoded_data_length = event.get(
+            "encodedDataLength", record.encoded_data_length
+        )
+        self._done(record)
+
+    def _on_loading_failed(self, event: Dict) -> None:
+        record = self._by_id.get(event["requestId"])
+        if record is None or record.done:
+            return
+        record.failed = True
+        record.end_timestamp = event["timestamp"]
+        record.error_text = event.get("errorText")
+        record.canceled = event.get("canceled", False)
+        self._done(record)
+
+    def _done(self, record: RequestRecord) -> None:
+        """Finalizes a finished or failed record
+
+        :param record: The record that is done
+        """
+        self._inflight -= 1
+        self._finalize(record)
+        if not self._retain_finished:
+            self._remove(record)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[RequestRecord]:
+        return iter(list(self._by_id.values()))
+
+    def __contains__(self, request_id: str) -> bool:
+        return request_id in self._by_id
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(records={len(self._by_id)}, inflight={self._inflight})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,824 @@
+import logging
+import mmap
+import os
+import re
+from asyncio import AbstractEventLoop, get_event_loop
+from binascii import b2a_base64
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    TYPE_CHECKING,
+)
+from urllib.parse import urlsplit
+from zlib import decompressobj
+
+from .body_fetcher import STRIPPED_RESPONSE_HEADERS
+from .interception import Decision, Rule
+from .streams import DEFAULT_CHUNK_SIZE
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .interception import InterceptionEngine  # noqa: F401
+    from .warc import WARCRecord, WARCWriter  # noqa: F401
+
+__all__ = [
+    "CDXEntry",
+    "CDXIndex",
+    "CDXWriter",
+    "WARCReplayer",
+    "dechunk",
+    "index_warc",
+    "read_response",
+    "surt",
+]
+
+logger = logging.getLogger(__name__)
+
+#: The header line of the CDX files written, it sorts before every entry
+CDX_HEADER: bytes = b" CDX N b a m s k S V g\n"
+
+#: The maximum number of bytes of a record inspected while indexing it
+MAX_HEAD_SIZE: int = 2 ** 16
+
+#: The wbits decoding the content encodings undone when replaying, others are replayed as is
+CONTENT_ENCODING_WBITS: Dict[str, int] = {"gzip": 31, "x-gzip": 31, "deflate": 15}
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+UNSAFE_KEY_CHARS: Pattern = re.compile(r"[\x00-\x20]")
+
+
+def _escape(match: Any) -> str:
+    return "%{:02X}".format(ord(match.group()))
+
+
+def surt(url: str) -> str:
+    """Returns the Sort-friendly URI Reordering Transform of the supplied URL,
+    the key of its CDX entries. `https://www.Example.com/a?b=1&a=2` becomes
+    `com,example)/a?a=2&b=1`
+
+    :param url: The URL to be transformed
+    :return: The SURT of the URL
+    """
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower().strip(".")
+    if host.startswith("www."):
+        host = host[4:]
+    key = ",".join(reversed(host.split(".")))
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    if port is not None and port != DEFAULT_PORTS.get(parts.scheme):
+        key = f"{key}:{port}"
+    key = f"{key}){parts.path or '/'}"
+    if parts.query:
+        key = f"{key}?{'&'.join(sorted(parts.query.split('&')))}"
+    return UNSAFE_KEY_CHARS.sub(_escape, key.lower())
+
+
+def timestamp14(warc_date: str) -> str:
+    """Returns the 14 digit CDX timestamp of a WARC-Date
+
+    :param warc_date: The WARC-Date, e.g. 2019-01-01T00:00:00Z
+    :return: The timestamp, e.g. 20190101000000
+    """
+    return "".join(c for c in warc_date if c.isdigit())[:14].ljust(14, "0")
+
+
+class CDXEntry:
+    """A line of a CDX index locating a response record in a WARC file"""
+
+    __slots__ = [
+        "digest",
+        "filename",
+        "length",
+        "mime",
+        "offset",
+        "status",
+        "timestamp",
+        "url",
+        "urlkey",
+    ]
+
+    def __init__(
+        self,
+        urlkey: str,
+        timestamp: str,
+        url: str,
+        mime: str,
+        status: str,
+        digest: str,
+        length: int,
+        offset: int,
+        filename: str,
+    ) -> None:
+        self.urlkey: str = urlkey
+        self.timestamp: str = timestamp
+        self.url: str = url
+        self.mime: str = mime
+        self.status: str = status
+        self.digest: str = digest
+        self.length: int = length
+        self.offset: int = offset
+        self.filename: str = filename
+
+    @classmethod
+    def parse(cls, line: bytes) -> "CDXEntry":
+        """Returns the entry of the supplied CDX line
+
+        :param line: The line without its newline
+        :return: The parsed entry
+        """
+        urlkey, timestamp, url, mime, status, digest, length, offset, filename = (
+            line.decode("utf-8").split(" ", 8)
+        )
+        return cls(
+            urlkey, timestamp, url, mime, status, digest, int(length), int(offset), filename
+        )
+
+    def to_line(self) -> bytes:
+        """Returns the CDX line of the entry including its newline"""
+        fields = (
+            self.urlkey,
+            self.timestamp,
+            UNSAFE_KEY_CHARS.sub(_escape, self.url),
+            self.mime or "-",
+            self.status or "-",
+            self.digest or "-",
+            str(self.length),
+            str(self.offset),
+            self.filename,
+        )
+        return (" ".join(fields) + "\n").encode("utf-8")
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(url={self.url}, timestamp={self.timestamp}, filename={self.filename}, offset={self.offset})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class CDXIndex:
+    """A sorted CDX file memory mapped and binary searched, so that finding
+    the captures of a URL neither reads the whole index nor any WARC file"""
+
+    __slots__ = ["_file", "_mmap", "_path"]
+
+    def __init__(self, path: str) -> None:
+        """Construct a new CDXIndex
+
+        :param path: The path of the sorted CDX file
+        """
+        self._path: str = path
+        self._file: Optional[BinaryIO] = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    @property
+    def path(self) -> str:
+        """Returns the path of the CDX file"""
+        return self._path
+
+    def open(self) -> "CDXIndex":
+        """Memory map the CDX file"""
+        self._file = open(self._path, "rb")
+        if os.fstat(self._file.fileno()).st_size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def close(self) -> None:
+        """Unmap and close the CDX file"""
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def lookup(self, url: str) -> List[CDXEntry]:
+        """Returns the captures of the supplied URL in timestamp order
+
+        :param url: The URL whose captures are to be found
+        :return: The list of captures
+        """
+        mm = self._mmap
+        if mm is None:
+            return []
+        key = surt(url).encode("utf-8")
+        pos = self._bisect(key)
+        size = len(mm)
+        entries: List[CDXEntry] = []
+        while pos < size:
+            end = mm.find(b"\n", pos)
+            if end == -1:
+                end = size
+            line = mm[pos:end]
+            if line[: line.find(b" ")] != key:
+                break
+            entries.append(CDXEntry.parse(line))
+            pos = end + 1
+        return entries
+
+    def closest(self, url: str, timestamp: Optional[str] = None) -> Optional[CDXEntry]:
+        """Returns the capture of the supplied URL closest to the timestamp
+
+        :param url: The URL whose capture is to be found
+        :param timestamp: The 14 digit timestamp. Defaults to the latest capture
+        :return: The capture if one exists
+        """
+        entries = self.lookup(url)
+        if not entries:
+            return None
+        if timestamp is None:
+            return entries[-1]
+        target = int(timestamp14(timestamp))
+        return min(entries, key=lambda entry: abs(int(entry.timestamp) - target))
+
+    def _bisect(self, key: bytes) -> int:
+        """Returns the offset of the first line whose key is not less than the supplied key
+
+        :param key: The SURT key
+        :return: The offset of the line
+        """
+        mm = self._mmap
+        lo = 0
+        hi = len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b"\n", 0, mid) + 1
+            end = mm.find(b"\n", start)
+            if end == -1:
+                end = len(mm)
+            space = mm.find(b" ", start, end)
+            line_key = mm[start : space if space != -1 else end]
+            if line_key < key:
+                lo = end + 1
+            else:
+                hi = start
+        return lo
+
+    def __enter__(self) -> "CDXIndex":
+        return self.open()
+
+    def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        self.close()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(path={self._path})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def _parse_fields(head: bytes) -> Tuple[str, Dict[str, str]]:
+    """Returns the first line and lower cased headers of a WARC or HTTP head
+
+    :param head: The head without its terminating blank line
+    :return: The first line and the headers
+    """
+    lines = head.decode("utf-8", "replace").split("\r\n")
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if sep:
+            headers[name.strip().lower()] = value.strip()
+    return lines[0], headers
+
+
+def _entry_from_head(head: bytes, offset: int, length: int, filename: str) -> Optional[CDXEntry]:
+    """Returns the CDX entry of a response record from the beginning of its bytes
+
+    :param head: The first bytes of the decompressed record
+    :param offset: The offset of the record in the WARC
+    :param length: The length of the record in the WARC
+    :param filename: The name of the WARC
+    :return: The entry or None if the record is not a response
+    """
+    end = head.find(b"\r\n\r\n")
+    if end == -1:
+        return None
+    _, warc_headers = _parse_fields(head[:end])
+    if warc_headers.get("warc-type") != "response":
+        return None
+    url = warc_headers.get("warc-target-uri", "").strip("<>")
+    if not url:
+        return None
+    status = "-"
+    mime = "-"
+    http_end = head.find(b"\r\n\r\n", end + 4)
+    if http_end != -1:
+        status_line, http_headers = _parse_fields(head[end + 4 : http_end])
+        parts = status_line.split(" ", 2)
+        if len(parts) > 1:
+            status = parts[1]
+        mime = http_headers.get("content-type", "-").split(";", 1)[0].strip() or "-"
+    return CDXEntry(
+        surt(url),
+        timestamp14(warc_headers.get("warc-date", "")),
+        url,
+        mime,
+        status,
+        warc_headers.get("warc-payload-digest", "-"),
+        length,
+        offset,
+        filename,
+    )
+
+
+def _scan_gzip(warc: BinaryIO, chunk_size: int) -> Iterator[Tuple[int, int, bytes]]:
+    """Yields the offset, length and first bytes of each gzip member of a WARC.
+    Every member is decompressed but at most MAX_HEAD_SIZE bytes of each are kept.
+
+    :param warc: The WARC file
+    :param chunk_size: The number of bytes read at a time
+    """
+    offset = 0
+    pending = b""
+    while 1:
+        data = pending or warc.read(chunk_size)
+        if not data:
+            return
+        decompressor = decompressobj(31)
+        head = bytearray()
+        read = len(data)
+        while 1:
+            out = decompressor.decompress(data, chunk_size)
+            if len(head) < MAX_HEAD_SIZE:
+                head += out[: MAX_HEAD_SIZE - len(head)]
+            if decompressor.eof:
+                pending = decompressor.unused_data
+                break
+            data = decompressor.unconsumed_tail
+            if not data:
+                data = warc.read(chunk_size)
+                if not data:
+                    raise ValueError(f"Truncated gzip member at offset {offset}")
+                read += len(data)
+        length = read - len(pending)
+        yield offset, length, bytes(head)
+        offset += length
+
+
+def _scan_plain(warc: BinaryIO) -> Iterator[Tuple[int, int, bytes]]:
+    """Yields the offset, length and first bytes of each record of an
+    uncompressed WARC, seeking over the blocks of the records
+
+    :param warc: The WARC file
+    """
+    offset = 0
+    while 1:
+        warc.seek(offset)
+        head = bytearray()
+        while 1:
+            line = warc.readline()
+            if not line:
+                return
+            head += line
+            if line == b"\r\n" and len(head) > 2:
+                break
+        _, headers = _parse_fields(bytes(head).strip(b"\r\n"))
+        content_length = int(headers.get("content-length", "0"))
+        head += warc.read(min(content_length, MAX_HEAD_SIZE))
+        length = len(head) - min(content_length, MAX_HEAD_SIZE) + content_length + 4
+        yield offset, length, bytes(head)
+        offset += length
+
+
+def index_warc(path: str, filename: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[CDXEntry]:
+    """Returns the CDX entries of the response records of a WARC.
+    Blocks, call it in an executor.
+
+    :param path: The path of the WARC
+    :param filename: The name of the WARC in the entries. Defaults to its basename
+    :param chunk_size: The number of bytes read at a time
+    :return: The entries of the WARC in file order
+    """
+    if filename is None:
+        filename = os.path.basename(path)
+    entries: List[CDXEntry] = []
+    with open(path, "rb") as warc:
+        records = _scan_gzip(warc, chunk_size) if path.endswith(".gz") else _scan_plain(warc)
+        for offset, length, head in records:
+            entry = _entry_from_head(head, offset, length, filename)
+            if entry is not None:
+                entries.append(entry)
+    return entries
+
+
+class CDXWriter:
+    """Collects CDX entries, from WARC files or the records of a WARCWriter as
+    they are written, and merges them into a sorted CDX file"""
+
+    __slots__ = ["_entries", "_loop", "_path"]
+
+    def __init__(self, path: str, loop: Optional[AbstractEventLoop] = None) -> None:
+        """Construct a new CDXWriter
+
+        :param path: The path of the CDX file
+        :param loop: Optional event loop to use. Defaults to asyncio.get_event_loop
+        """
+        self._loop: AbstractEventLoop = loop if loop is not None else get_event_loop()
+        self._path: str = path
+        self._entries: List[CDXEntry] = []
+
+    @property
+    def path(self) -> str:
+        """Returns the path of the CDX file"""
+        return self._path
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of entries not yet written"""
+        return len(self._entries)
+
+    def add(self, entry: CDXEntry) -> None:
+        """Add an entry to be written
+
+        :param entry: The entry
+        """
+        self._entries.append(entry)
+
+    def add_record(self, record: "WARCRecord", filename: str) -> None:
+        """Add the entry of a record written by a WARCWriter
+
+        :param record: The written record, its offset and length are set
+        :param filename: The name of the WARC
+        """
+        if record.warc_type != "response":
+            return
+        entry = _entry_from_head(
+            record.head() + record.http_head, record.offset, record.length, filename
+        )
+        if entry is not None:
+            self._entries.append(entry)
+
+    def attach(self, writer: "WARCWriter") -> None:
+        """Index the records of the supplied writer as they are written
+
+        :param writer: The writer of the WARC
+        """
+        filename = os.path.basename(writer.path)
+        writer.on_record_written(lambda record: self.add_record(record, filename))
+
+    async def add_warc(self, path: str) -> int:
+        """Index the WARC at the supplied path in the default executor
+
+        :param path: The path of the WARC
+        :return: The number of entries added
+        """
+        entries = await self._loop.run_in_executor(None, index_warc, path)
+        self._entries.extend(entries)
+        return len(entries)
+
+    async def flush(self) -> None:
+        """Merge the added entries into the CDX file in the default executor"""
+        lines = [entry.to_line() for entry in self._entries]
+        self._entries = []
+        await self._loop.run_in_executor(None, self._merge, lines)
+
+    def _merge(self, lines: List[bytes]) -> None:
+        """Merges the supplied lines with those of the CDX file, runs in the executor"""
+        if os.path.exists(self._path):
+            with open(self._path, "rb") as cdx:
+                lines.extend(line for line in cdx if line != CDX_HEADER)
+        lines.sort()
+        tmp_path = f"{self._path}.tmp"
+        with open(tmp_path, "wb") as cdx:
+            cdx.write(CDX_HEADER)
+            cdx.writelines(lines)
+        os.replace(tmp_path, self._path)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(path={self._path}, pending={len(self._entries)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def _iter_record(path: str, offset: int, length: int, chunk_size: int) -> Iterator[bytes]:
+    """Yields the decompressed bytes of the record at the supplied offset
+
+    :param path: The path of the WARC
+    :param offset: The offset of the record
+    :param length: The length of the record in the WARC
+    :param chunk_size: The number of bytes read at a time
+    """
+    gzipped = path.endswith(".gz")
+    with open(path, "rb") as warc:
+        warc.seek(offset)
+        remaining = length
+        decompressor = decompressobj(31) if gzipped else None
+        while remaining > 0:
+            data = warc.read(min(chunk_size, remaining))
+            if not data:
+                return
+            remaining -= len(data)
+            if decompressor is None:
+                yield data
+                continue
+            while data:
+                out = decompressor.decompress(data, chunk_size)
+                if out:
+                    yield out
+                if decompressor.eof:
+                    return
+                data = decompressor.unconsumed_tail
+
+
+def _read_head(chunks: Iterator[bytes], buffer: bytearray) -> bytes:
+    """Reads from chunks into buffer until it contains a head terminated by
+    a blank line, returns the head removing it from the buffer
+
+    :param chunks: The decompressed chunks of the record
+    :param buffer: The bytes read but not consumed
+    :return: The head without its terminating blank line
+    """
+    while 1:
+        end = buffer.find(b"\r\n\r\n")
+        if end != -1:
+            head = bytes(buffer[:end])
+            del buffer[: end + 4]
+            return head
+        chunk = next(chunks, None)
+        if chunk is None:
+            raise ValueError("Truncated record head")
+        buffer += chunk
+
+
+def dechunk(pieces: Iterator[bytes]) -> Iterator[bytes]:
+    """Removes the chunked transfer coding from a body, as stored by WARCs
+    of responses received with `Transfer-Encoding: chunked`. A body that
+    does not start with a chunk size line is passed through unchanged, and
+    one missing its last chunk ends with the data available.
+
+    :param pieces: The pieces of the chunked body
+    :return: An iterator yielding the pieces of the de-chunked body
+    """
+    buffer = bytearray()
+
+    def fill() -> bool:
+        data = next(pieces, None)
+        if data is None:
+            return False
+        buffer.extend(data)
+        return True
+
+    first = True
+    while 1:
+        end = buffer.find(b"\r\n")
+        while end < 0:
+            if not fill():
+                if first and buffer:
+                    yield bytes(buffer)
+                return
+            end = buffer.find(b"\r\n")
+        try:
+            size = int(bytes(buffer[:end]).split(b";", 1)[0].strip(), 16)
+        except ValueError:
+            if not first:
+                raise ValueError("Malformed chunk size in chunked body")
+            # stored without its chunk framing
+            yield bytes(buffer)
+            yield from pieces
+            return
+        first = False
+        del buffer[: end + 2]
+        if size == 0:
+            return
+        while size > 0:
+            if not buffer and not fill():
+                return
+            take = min(size, len(buffer))
+            yield bytes(buffer[:take])
+            del buffer[:take]
+            size -= take
+        while len(buffer) < 2:
+            if not fill():
+                return
+        del buffer[:2]
+
+
+def _inflate(pieces: Iterator[bytes], wbits: int) -> Iterator[bytes]:
+    """Yields the decompressed bytes of a content encoded body
+
+    :param pieces: The pieces of the encoded body
+    :param wbits: The wbits of the content encoding
+    :return: The decoded pieces of the body
+    """
+    decompressor = decompressobj(wbits)
+    for piece in pieces:
+        data = decompressor.decompress(piece)
+        if data:
+            yield data
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+def read_response(
+    path: str,
+    offset: int,
+    length: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_size: Optional[int] = None,
+) -> Tuple[int, str, List[Dict[str, str]], str]:
+    """Reads the response record at the supplied offset of a WARC, base64 encoding
+    its body chunk by chunk as it is decompressed. Blocks, call it in an executor.
+
+    The record is read chunk by chunk, but the body is returned as a single
+    base64 string, as needed by Fetch.fulfillRequest, so it is held in memory
+    as a whole. Chunked and gzip or deflate content encoded bodies are decoded,
+    and their Transfer-Encoding, Content-Encoding and Content-Length dropped.
+
+    :param path: The path of the WARC
+    :param offset: The offset of the record
+    :param length: The length of the record in the WARC
+    :param chunk_size: The number of bytes read at a time
+    :param max_size: Optional maximum size, in bytes, of the decoded body.
+    Reading a larger body raises ValueError
+    :return: The status, status text, headers and base64 encoded body of the response
+    """
+    chunks = _iter_record(path, offset, length, chunk_size)
+    buffer = bytearray()
+    _, warc_headers = _parse_fields(_read_head(chunks, buffer))
+    block_length = int(warc_headers.get("content-length", "0"))
+    http_head = _read_head(chunks, buffer)
+    remaining = block_length - len(http_head) - 4
+    lines = http_head.decode("iso-8859-1").split("\r\n")
+    parts = lines[0].split(" ", 2)
+    status = int(parts[1])
+    status_text = parts[2] if len(parts) > 2 else ""
+    fields: List[Tuple[str, str]] = []
+    chunked = False
+    content_encoding: Optional[str] = None
+    for line in lines[1:]:
+        name, sep, value = line.partition(":")
+        if not sep:
+            continue
+        fields.append((name.strip(), value.strip()))
+        lowered = name.strip().lower()
+        if lowered == "transfer-encoding" and "chunked" in value.lower():
+            chunked = True
+        elif lowered == "content-encoding":
+            content_encoding = value.strip().lower()
+    wbits = CONTENT_ENCODING_WBITS.get(content_encoding or "")
+    stripped = STRIPPED_RESPONSE_HEADERS
+    if content_encoding and wbits is None:
+        # e.g. br, the body is replayed encoded
+        stripped = stripped - {"content-encoding"}
+    headers: List[Dict[str, str]] = [
+        {"name": name, "value": value}
+        for name, value in fields
+        if name.lower() not in stripped
+    ]
+
+    def body() -> Iterator[bytes]:
+        nonlocal remaining
+        data: Optional[bytes] = bytes(buffer)
+        while remaining > 0 and data is not None:
+            data = data[:remaining]
+            remaining -= len(data)
+            yield data
+            data = next(chunks, None) if remaining > 0 else None
+        if remaining > 0:
+            raise ValueError(f"Truncated record body at offset {offset} of {path}")
+
+    pieces = dechunk(body()) if chunked else body()
+    if wbits is not None:
+        pieces = _inflate(pieces, wbits)
+    encoded: List[str] = []
+    size = 0
+    # a multiple of three bytes encodes without padding
+    carry = bytearray()
+    step = max(chunk_size // 3, 1) * 3
+    for data in pieces:
+        size += len(data)
+        if max_size is not None and size > max_size:
+            raise ValueError(
+                f"The body of the record at offset {offset} of {path} exceeds {max_size} bytes"
+            )
+        carry += data
+        usable = len(carry) - len(carry) % 3
+        for i in range(0, usable, step):
+            encoded.append(
+                b2a_base64(carry[i : min(i + step, usable)], newline=False).decode("ascii")
+            )
+        del carry[:usable]
+    if carry:
+        encoded.append(b2a_base64(carry, newline=False).decode("ascii"))
+    return status, status_text, headers, "".join(encoded)
+
+
+class WARCReplayer:
+    """Answers every intercepted request from a collection of WARC files.
+
+    The capture of a URL is located by binary searching a sorted CDX index,
+    its response record is read from its offset in the WARC and decompressed,
+    and base64 encoded, chunk by chunk in the default executor. Requests
+    without a capture are resolved using `not_found`.
+
+    Fetch.fulfillRequest takes the whole body in one message, so each replayed
+    body is held in memory base64 encoded. Bodies larger than
+    `max_fulfill_size` are not replayed and resolved using `not_found`.
+    """
+
+    __slots__ = [
+        "_chunk_size",
+        "_directory",
+        "_index",
+        "_loop",
+        "_max_fulfill_size",
+        "_not_found",
+        "_timestamp",
+        "bytes_served",
+        "errors",
+        "missed",
+        "served",
+    ]
+
+    def __init__(
+        self,
+        index: CDXIndex,
+        directory: str,
+        timestamp: Optional[str] = None,
+        not_found: Optional[Decision] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_fulfill_size: int = 2 ** 25,
+        loop: Optional[AbstractEventLoop] = None,
+    ) -> None:
+        """Construct a new WARCReplayer
+
+        :param index: The open CDX index of the collection
+        :param directory: The directory containing the WARC files of the collection
+        :param timestamp: Replay the captures closest to this timestamp. Defaults to the latest
+        :param not_found: The decision for requests without a capture.
+        Defaults to failing them with InternetDisconnected
+        :param chunk_size: The number of bytes read at a time
+        :param max_fulfill_size: The maximum size, in bytes, of a replayed body
+        :param loop: Optional event loop to use. Defaults to asyncio.get_event_loop
+        """
+        self._loop: AbstractEventLoop = loop if loop is not None else get_event_loop()
+        self._index: CDXIndex = index
+        self._max_fulfill_size: int = max_fulfill_size
+        self._directory: str = directory
+        self._timestamp: Optional[str] = timestamp
+        self._not_found: Decision = (
+            not_found if not_found is not None else Decision.fail("InternetDisconnected")
+        )
+        self._chunk_size: int = chunk_size
+        self.served: int = 0
+        self.missed: int = 0
+        self.errors: int = 0
+        self.bytes_served: int = 0
+
+    def rules(self) -> List[Rule]:
+        """Returns the interception rule answering requests from the collection"""
+        return [Rule("*", handler=self._replay, decision=self._not_found)]
+
+    def attach(self, engine: "InterceptionEngine") -> None:
+        """Add the rule of the replayer to the supplied engine
+
+        :param engine: The engine intercepting the requests of a client or session
+        """
+        for rule in self.rules():
+            engine.add_rule(rule)
+
+    async def _replay(self, event: Dict) -> Optional[Decision]:
+        entry = self._index.closest(event["request"]["url"], self._timestamp)
+        if entry is None:
+            self.missed += 1
+            return None
+        try:
+            status, status_text, headers, body = await self._loop.run_in_executor(
+                None,
+                read_response,
+                os.path.join(self._directory, entry.filename),
+                entry.offset,
+                entry.length,
+                self._chunk_size,
+                self._max_fulfill_size,
+            )
+        except ValueError as e:
+            # e.g. a truncated or too large body
+            self.errors += 1
+            logger.warning(f"Could not replay {entry}: {e}")
+            return None
+        except Exception:
+            self.errors += 1
+            logger.exception(f"Could not read {entry}")
+            return None
+        self.served += 1
+        self.bytes_served += len(body) * 3 // 4 - body[-2:].count("=")
+        return Decision.fulfill(status, headers, body, status_text or None)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(index={self._index}, served={self.served}, missed={self.missed})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
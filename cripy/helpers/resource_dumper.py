@@ -0,0 +1,361 @@
+import logging
+import os
+from asyncio import AbstractEventLoop, Future, gather, get_event_loop, shield
+from typing import Dict, List, Optional, TYPE_CHECKING, Tuple, Union
+
+from ujson import dumps, loads
+
+from .streams import BodySpool, iter_decoded
+from .workers import WorkerPool
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["ResourceDumper", "ResourceRecord"]
+
+logger = logging.getLogger(__name__)
+
+#: The frameId and Page.FrameResource of a resource of the resource tree
+TreeResource = Tuple[str, Dict]
+
+
+class ResourceRecord:
+    """A resource of a page whose content is stored, by digest, in the dump directory"""
+
+    __slots__ = ["digest", "frame_id", "mime_type", "page", "size", "type", "url"]
+
+    def __init__(
+        self,
+        page: str,
+        frame_id: str,
+        url: str,
+        type: str,
+        mime_type: str,
+        digest: str,
+        size: int,
+    ) -> None:
+        #: The URL of the main frame of the page the resource was dumped from
+        self.page: str = page
+        self.frame_id: str = frame_id
+        self.url: str = url
+        #: The Page.ResourceType of the resource
+        self.type: str = type
+        self.mime_type: str = mime_type
+        self.digest: str = digest
+        self.size: int = size
+
+    def to_json(self) -> List:
+        return [
+            self.page,
+            self.frame_id,
+            self.url,
+            self.type,
+            self.mime_type,
+            self.digest,
+            self.size,
+        ]
+
+    @classmethod
+    def from_json(cls, data: List) -> "ResourceRecord":
+        return cls(*data)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(url={self.url}, type={self.type}, size={self.size})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ResourceDumper:
+    """Dumps the resources of pages, as reported by Page.getResourceTree,
+    to a content addressed store.
+
+    The contents of the resources of every frame are fetched with
+    Page.getResourceContent by a WorkerPool, so at most `concurrency`
+    requests are in flight, and are decoded, hashed and written in the
+    default executor. A URL present in several frames is fetched once, a
+    URL already dumped from a previous page is not fetched again unless
+    requested, and identical contents are stored once whatever their URL.
+    Every resource seen is recorded in the index of the store.
+
+    Example:
+
+    ```python
+    dumper = await ResourceDumper("resources").open()
+    for url in urls:
+        await client.Page.navigate(url)
+        ...
+        await dumper.dump(client)
+    await dumper.close()
+    ```
+    """
+
+    __slots__ = [
+        "_by_url",
+        "_directory",
+        "_loop",
+        "_pool",
+        "_records",
+        "_sizes",
+        "_writing",
+        "bytes_stored",
+        "duplicates",
+        "failures",
+        "fetched",
+        "reused",
+        "stored",
+    ]
+
+    def __init__(
+        self,
+        directory: str,
+        concurrency: int = 8,
+        loop: Optional[AbstractEventLoop] = None,
+    ) -> None:
+        """Construct a new ResourceDumper
+
+        :param directory: The directory the store is kept in
+        :param concurrency: The maximum number of Page.getResourceContent commands in flight
+        :param loop: Optional event loop to use. Defaults to asyncio.get_event_loop
+        """
+        self._loop: AbstractEventLoop = loop if loop is not None else get_event_loop()
+        self._directory: str = directory
+        self._pool: WorkerPool = WorkerPool(concurrency, loop=self._loop)
+        self._records: List[ResourceRecord] = []
+        #: URL to the digest of its most recently dumped content
+        self._by_url: Dict[str, str] = {}
+        #: digest to the size of the stored contents
+        self._sizes: Dict[str, int] = {}
+        #: digest to a future resolving with T/F indicating if the content being written was stored
+        self._writing: Dict[str, Future] = {}
+        #: The number of Page.getResourceContent commands that returned content
+        self.fetched: int = 0
+        #: The number of URLs not fetched as their content was dumped from a previous page
+        self.reused: int = 0
+        #: The number of fetched contents that were already stored
+        self.duplicates: int = 0
+        self.stored: int = 0
+        self.bytes_stored: int = 0
+        self.failures: int = 0
+
+    @property
+    def directory(self) -> str:
+        """Returns the directory the store is kept in"""
+        return self._directory
+
+    @property
+    def records(self) -> List[ResourceRecord]:
+        """Returns the records of the resources dumped"""
+        return self._records
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    def content_path(self, digest: str) -> str:
+        """Returns the path of the stored content with the supplied digest
+
+        :param digest: The hex SHA-1 digest of the content
+        :return: The path of the content
+        """
+        return os.path.join(self._directory, "contents", digest[:2], digest)
+
+    async def open(self) -> "ResourceDumper":
+        """Create the store directory and load its index if present"""
+        await self._loop.run_in_executor(None, self._load)
+        return self
+
+    async def save(self) -> None:
+        """Write the index of the store to its directory"""
+        data = dumps(
+            [record.to_json() for record in self._records], escape_forward_slashes=False
+        )
+        await self._loop.run_in_executor(None, self._write_index, data)
+
+    async def close(self) -> None:
+        """Stop the workers and save the index"""
+        await self._pool.close()
+        await self.save()
+
+    async def dump(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        page: Optional[str] = None,
+        refetch: bool = False,
+    ) -> List[ResourceRecord]:
+        """Dump the resources of the page of a client
+
+        :param client: The client or session of the page
+        :param page: The URL the records are filed under, defaults to the URL of the main frame
+        :param refetch: Fetch URLs already dumped from previous pages
+        :return: The records of the resources of the page that were dumped
+        """
+        result = await client.send("Page.getResourceTree")
+        tree = result["frameTree"]
+        if page is None:
+            page = tree["frame"]["url"]
+        resources: Dict[str, List[TreeResource]] = {}
+        for frame_id, resource in self.walk(tree):
+            resources.setdefault(resource["url"], []).append((frame_id, resource))
+        jobs: List[Future] = []
+        urls: List[str] = []
+        for url, seen in resources.items():
+            if not refetch and url in self._by_url:
+                self.reused += 1
+                continue
+            jobs.append(await self._pool.submit(self._fetch, client, seen[0][0], url))
+            urls.append(url)
+        for url, digest in zip(urls, await gather(*jobs)):
+            if digest is not None:
+                self._by_url[url] = digest
+        records: List[ResourceRecord] = []
+        for url, seen in resources.items():
+            digest = self._by_url.get(url)
+            if digest is None:
+                continue
+            for frame_id, resource in seen:
+                records.append(
+                    ResourceRecord(
+                        page,
+                        frame_id,
+                        url,
+                        resource.get("type", ""),
+                        resource.get("mimeType", ""),
+                        digest,
+                        self._sizes[digest],
+                    )
+                )
+        self._records.extend(records)
+        logger.debug(f"Dumped {len(records)} resources of {page}")
+        return records
+
+    @staticmethod
+    def walk(tree: Dict) -> List[TreeResource]:
+        """Returns the frameId and Page.FrameResource of the documents and
+        resources of a Page.FrameResourceTree, excluding failed and canceled
+        resources
+
+        :param tree: The Page.FrameResourceTree
+        :return: The resources of every frame of the tree
+        """
+        found: List[TreeResource] = []
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            frame = node["frame"]
+            frame_id = frame["id"]
+            found.append(
+                (
+                    frame_id,
+                    {
+                        "url": frame["url"],
+                        "type": "Document",
+                        "mimeType": frame.get("mimeType", ""),
+                    },
+                )
+            )
+            for resource in node.get("resources", ()):
+                if not resource.get("failed") and not resource.get("canceled"):
+                    found.append((frame_id, resource))
+            stack.extend(reversed(node.get("childFrames", ())))
+        return found
+
+    async def _fetch(
+        self, client: Union["ConnectionType", "SessionType"], frame_id: str, url: str
+    ) -> Optional[str]:
+        """Fetch, and store if new, the content of a resource
+
+        :return: The digest of the content or None if it could not be fetched
+        """
+        try:
+            result = await client.send(
+                "Page.getResourceContent", {"frameId": frame_id, "url": url}
+            )
+        except Exception as e:
+            # e.g. the content was evicted or the frame detached
+            self.failures += 1
+            logger.debug(f"Could not get the content of {url}: {e}")
+            return None
+        self.fetched += 1
+        body = await self._loop.run_in_executor(
+            None, _spool, result.get("content", ""), result.get("base64Encoded", False)
+        )
+        try:
+            digest = body.digest.hex()
+            if digest in self._sizes:
+                self.duplicates += 1
+                return digest
+            writing = self._writing.get(digest)
+            if writing is not None:
+                # identical content fetched concurrently is only recorded once its write succeeded
+                if not await shield(writing):
+                    return None
+                self.duplicates += 1
+                return digest
+            writing = self._writing[digest] = self._loop.create_future()
+            try:
+                await self._loop.run_in_executor(
+                    None, _write_body, self.content_path(digest), body
+                )
+            except Exception as e:
+                self.failures += 1
+                logger.warning(f"Could not store the content of {url}: {e}")
+                return None
+            else:
+                self._sizes[digest] = body.length
+            finally:
+                del self._writing[digest]
+                writing.set_result(digest in self._sizes)
+            self.stored += 1
+            self.bytes_stored += body.length
+            return digest
+        finally:
+            body.close()
+
+    def _load(self) -> None:
+        """Creates the store directory and loads the index, runs in the executor"""
+        os.makedirs(os.path.join(self._directory, "contents"), exist_ok=True)
+        index_path = os.path.join(self._directory, "index.json")
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, "r", encoding="utf-8") as index:
+            data = loads(index.read())
+        for item in data:
+            record = ResourceRecord.from_json(item)
+            if record.digest in self._sizes or os.path.exists(
+                self.content_path(record.digest)
+            ):
+                self._sizes[record.digest] = record.size
+                self._by_url[record.url] = record.digest
+                self._records.append(record)
+
+    def _write_index(self, data: str) -> None:
+        """Atomically replaces the index of the store, runs in the executor"""
+        index_path = os.path.join(self._directory, "index.json")
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as index:
+            index.write(data)
+        os.replace(tmp_path, index_path)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(contents={len(self._sizes)}, records={len(self._records)}, fetched={self.fetched}, duplicates={self.duplicates})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def _spool(content: str, base64_encoded: bool) -> BodySpool:
+    """Decodes the content of a resource into a spool, runs in the executor"""
+    body = BodySpool()
+    for chunk in iter_decoded(content, base64_encoded):
+        body.write(chunk)
+    return body
+
+
+def _write_body(path: str, body: BodySpool) -> None:
+    """Atomically writes a content to the store, runs in the executor"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{id(body)}.tmp"
+    with open(tmp_path, "wb") as out:
+        for chunk in body.chunks():
+            out.write(chunk)
+    os.replace(tmp_path, path)
@@ -0,0 +1,517 @@
+import logging
+import os
+from asyncio import AbstractEventLoop, Future, gather, get_event_loop, shield
+from collections import OrderedDict
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING, Union
+
+from ujson import dumps, loads
+
+from .body_fetcher import paused_content_length
+from .interception import Decision, Rule
+from .streams import BodySpool, DEFAULT_CHUNK_SIZE, encode_body, iter_decoded
+from .warc import STRIPPED_RESPONSE_HEADERS
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+    from .interception import InterceptionEngine  # noqa: F401
+
+__all__ = ["CacheEntry", "ResponseCache"]
+
+logger = logging.getLogger(__name__)
+
+Headers = List[Dict[str, str]]
+VaryValues = Tuple[Tuple[str, str], ...]
+
+#: The number of request stage pause times remembered for requests
+#: whose response has not been paused yet
+MAX_PENDING: int = 10000
+
+PendingKey = Tuple[int, str]
+
+
+def _header(headers: Headers, name: str) -> Optional[str]:
+    """Returns the value of the named header in a list of name/value objects
+
+    :param headers: The list of headers
+    :param name: The lower case name of the header
+    :return: The value of the header if present
+    """
+    for header in headers:
+        if header["name"].lower() == name:
+            return header["value"]
+    return None
+
+
+def _vary_values(names: Tuple[str, ...], request_headers: Dict[str, str]) -> VaryValues:
+    """Returns the values of the request headers named by a responses Vary header
+
+    :param names: The lower case names of the Vary header
+    :param request_headers: The headers of the request
+    :return: The name value pairs of the varied headers
+    """
+    if not names:
+        return ()
+    lowered = {name.lower(): value for name, value in request_headers.items()}
+    return tuple((name, lowered.get(name, "")) for name in names)
+
+
+class CacheEntry:
+    """A cached response whose body is stored, by digest, in the cache directory"""
+
+    __slots__ = ["digest", "headers", "key", "latency", "size", "status", "vary"]
+
+    def __init__(
+        self,
+        key: str,
+        vary: VaryValues,
+        status: int,
+        headers: Headers,
+        digest: str,
+        size: int,
+        latency: float,
+    ) -> None:
+        self.key: str = key
+        self.vary: VaryValues = vary
+        self.status: int = status
+        self.headers: Headers = headers
+        self.digest: str = digest
+        self.size: int = size
+        #: The time taken, in seconds, to fetch the response from the network
+        self.latency: float = latency
+
+    def to_json(self) -> List:
+        return [
+            self.key,
+            [list(pair) for pair in self.vary],
+            self.status,
+            self.headers,
+            self.digest,
+            self.size,
+            self.latency,
+        ]
+
+    @classmethod
+    def from_json(cls, data: List) -> "CacheEntry":
+        key, vary, status, headers, digest, size, latency = data
+        return cls(
+            key, tuple(tuple(pair) for pair in vary), status, headers, digest, size, latency
+        )
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(key={self.key}, status={self.status}, size={self.size})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class ResponseCache:
+    """A content addressed on-disk cache of responses, keyed by method, URL
+    and the request headers named by the Vary header of the response.
+
+    Responses are added by intercepting them at the response stage with the
+    Fetch domain and replayed using Fetch.fulfillRequest. The total size of
+    the stored bodies is bounded, least recently used entries are evicted
+    once it is exceeded. Identical bodies are stored once.
+
+    A single cache can serve any number of clients and sessions, each
+    using its own InterceptionEngine with the rules returned by `rules`.
+    """
+
+    __slots__ = [
+        "_body_ops",
+        "_body_refs",
+        "_directory",
+        "_entries",
+        "_key_counts",
+        "_loop",
+        "_max_entry_size",
+        "_max_size",
+        "_pending",
+        "_vary",
+        "bytes_saved",
+        "evictions",
+        "hits",
+        "latency_saved",
+        "misses",
+        "size",
+        "stores",
+    ]
+
+    def __init__(
+        self,
+        directory: str,
+        max_size: int = 2 ** 30,
+        max_entry_size: int = 2 ** 25,
+        loop: Optional[AbstractEventLoop] = None,
+    ) -> None:
+        """Construct a new ResponseCache
+
+        :param directory: The directory the cache is stored in
+        :param max_size: Maximum total size, in bytes, of the stored bodies
+        :param max_entry_size: Maximum size, in bytes, of a cached body
+        :param loop: Optional event loop to use. Defaults to asyncio.get_event_loop
+        """
+        self._loop: AbstractEventLoop = loop if loop is not None else get_event_loop()
+        self._directory: str = directory
+        self._max_size: int = max_size
+        self._max_entry_size: int = max_entry_size
+        self._entries: "OrderedDict[Tuple[str, VaryValues], CacheEntry]" = OrderedDict()
+        self._vary: Dict[str, Tuple[str, ...]] = {}
+        #: cache key to the number of its entries, one per set of vary values
+        self._key_counts: Dict[str, int] = {}
+        self._body_refs: Dict[str, int] = {}
+        #: digest to a future resolved once the last write or removal of its body is done
+        self._body_ops: Dict[str, Future] = {}
+        self._pending: "OrderedDict[PendingKey, float]" = OrderedDict()
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.stores: int = 0
+        self.evictions: int = 0
+        self.bytes_saved: int = 0
+        self.latency_saved: float = 0.0
+
+    @staticmethod
+    def cache_key(method: str, url: str) -> str:
+        """Returns the primary cache key of a request
+
+        :param method: The HTTP method of the request
+        :param url: The URL of the request without its fragment
+        :return: The cache key
+        """
+        return f"{method.upper()} {url}"
+
+    @property
+    def directory(self) -> str:
+        """Returns the directory the cache is stored in"""
+        return self._directory
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def open(self) -> "ResponseCache":
+        """Create the cache directory and load its index if present"""
+        await self._loop.run_in_executor(None, self._load)
+        return self
+
+    async def save(self) -> None:
+        """Write the index of the cache to its directory"""
+        data = dumps(
+            [entry.to_json() for entry in self._entries.values()],
+            escape_forward_slashes=False,
+        )
+        await self._loop.run_in_executor(None, self._write_index, data)
+
+    def rules(self, client: Union["ConnectionType", "SessionType"]) -> List[Rule]:
+        """Returns the interception rules, one per request stage, that replay
+        and populate the cache for the requests of the supplied client
+
+        :param client: The client or session whose requests are intercepted
+        :return: The rules for the InterceptionEngine of the client
+        """
+        return [
+            Rule("http*", methods=["GET"], handler=partial(self._on_request, client)),
+            Rule(
+                "http*",
+                methods=["GET"],
+                stage="Response",
+                handler=partial(self._on_response, client),
+            ),
+        ]
+
+    def attach(self, engine: "InterceptionEngine") -> None:
+        """Add the rules of the cache to the supplied engine
+
+        :param engine: The engine intercepting the requests of a client or session
+        """
+        for rule in self.rules(engine.client):
+            engine.add_rule(rule)
+
+    def lookup(self, method: str, url: str, request_headers: Dict[str, str]) -> Optional[CacheEntry]:
+        """Returns the cached response for the supplied request if present
+
+        :param method: The HTTP method of the request
+        :param url: The URL of the request
+        :param request_headers: The headers of the request
+        :return: The cached response if present
+        """
+        key = self.cache_key(method, url)
+        names = self._vary.get(key)
+        if names is None:
+            return None
+        entry_key = (key, _vary_values(names, request_headers))
+        entry = self._entries.get(entry_key)
+        if entry is not None:
+            self._entries.move_to_end(entry_key)
+        return entry
+
+    def body_path(self, digest: str) -> str:
+        """Returns the path of the stored body with the supplied digest
+
+        :param digest: The hex SHA-1 digest of the body
+        :return: The path of the body
+        """
+        return os.path.join(self._directory, "bodies", digest[:2], digest)
+
+    async def store(
+        self,
+        method: str,
+        url: str,
+        request_headers: Dict[str, str],
+        status: int,
+        response_headers: Headers,
+        body: BodySpool,
+        latency: float = 0.0,
+    ) -> Optional[CacheEntry]:
+        """Store a response in the cache. The body is written, if not already
+        stored, in the default executor.
+
+        :param method: The HTTP method of the request
+        :param url: The URL of the request
+        :param request_headers: The headers of the request
+        :param status: The HTTP status of the response
+        :param response_headers: The headers of the response as a list of name/value objects
+        :param body: The decoded body of the response
+        :param latency: The time taken to fetch the response from the network
+        :return: The new entry or None if the response can not be cached
+        """
+        vary_header = _header(response_headers, "vary")
+        names: Tuple[str, ...] = ()
+        if vary_header:
+            names = tuple(
+                sorted(
+                    name.strip().lower() for name in vary_header.split(",") if name.strip()
+                )
+            )
+            if "*" in names:
+                return None
+        if body.length > self._max_entry_size:
+            return None
+        key = self.cache_key(method, url)
+        digest = body.digest.hex()
+        await self._body_op(digest, self._write_body, self.body_path(digest), body)
+        headers = [
+            header
+            for header in response_headers
+            if header["name"].lower() not in STRIPPED_RESPONSE_HEADERS
+        ]
+        entry = CacheEntry(
+            key, _vary_values(names, request_headers), status, headers, digest, body.length, latency
+        )
+        self._vary[key] = names
+        self._add(entry)
+        self.stores += 1
+        await self._evict()
+        return entry
+
+    async def read_body(self, entry: CacheEntry) -> str:
+        """Returns the base64 encoded body of the supplied entry, read in the default executor
+
+        :param entry: The cached response
+        :return: The base64 encoded body
+        """
+        return await self._loop.run_in_executor(
+            None, encode_body, self.body_path(entry.digest), DEFAULT_CHUNK_SIZE
+        )
+
+    def _add(self, entry: CacheEntry) -> None:
+        entry_key = (entry.key, entry.vary)
+        previous = self._entries.pop(entry_key, None)
+        if previous is not None:
+            self._release(previous)
+        else:
+            self._key_counts[entry.key] = self._key_counts.get(entry.key, 0) + 1
+        self._entries[entry_key] = entry
+        refs = self._body_refs.get(entry.digest, 0)
+        if refs == 0:
+            self.size += entry.size
+        self._body_refs[entry.digest] = refs + 1
+
+    def _remove(self, entry: CacheEntry) -> Optional[str]:
+        """Removes an entry from the cache
+
+        :param entry: The entry to be removed
+        :return: The digest of its body if it is no longer referenced
+        """
+        del self._entries[(entry.key, entry.vary)]
+        count = self._key_counts[entry.key] - 1
+        if count:
+            self._key_counts[entry.key] = count
+        else:
+            del self._key_counts[entry.key]
+            self._vary.pop(entry.key, None)
+        return self._release(entry)
+
+    def _release(self, entry: CacheEntry) -> Optional[str]:
+        """Drops a reference to the body of an entry that is no longer cached
+
+        :param entry: The removed entry
+        :return: The digest of the body if it is no longer referenced
+        """
+        refs = self._body_refs[entry.digest] - 1
+        if refs:
+            self._body_refs[entry.digest] = refs
+            return None
+        del self._body_refs[entry.digest]
+        self.size -= entry.size
+        return entry.digest
+
+    async def _evict(self) -> None:
+        """Evict the least recently used entries until the cache fits"""
+        unreferenced: List[str] = []
+        while self.size > self._max_size and self._entries:
+            entry = next(iter(self._entries.values()))
+            self.evictions += 1
+            digest = self._remove(entry)
+            if digest is not None:
+                unreferenced.append(digest)
+        if unreferenced:
+            await gather(
+                *[
+                    self._body_op(digest, _remove_file, self.body_path(digest))
+                    for digest in unreferenced
+                ]
+            )
+
+    async def _body_op(
+        self, digest: str, fn: Callable[[str, Any], None], path: str, *args: Any
+    ) -> None:
+        """Writes, or removes, the body with the supplied digest in the default
+        executor once the previous operation on it is done. A body is only
+        written if not referenced and only removed if still unreferenced, so
+        a body stored while its removal was pending is not lost.
+
+        :param digest: The digest of the body
+        :param fn: The function writing or removing the body
+        :param path: The path of the body
+        :param args: The remaining arguments of fn
+        """
+        previous = self._body_ops.get(digest)
+        done = self._body_ops[digest] = self._loop.create_future()
+        try:
+            if previous is not None:
+                await shield(previous)
+            if digest not in self._body_refs:
+                await self._loop.run_in_executor(None, fn, path, *args)
+        finally:
+            done.set_result(None)
+            if self._body_ops.get(digest) is done:
+                del self._body_ops[digest]
+
+    async def _on_request(
+        self, client: Union["ConnectionType", "SessionType"], event: Dict
+    ) -> Optional[Decision]:
+        request = event["request"]
+        entry = self.lookup(request["method"], request["url"], request.get("headers", {}))
+        if entry is None:
+            self.misses += 1
+            self._remember_pending(client, event)
+            return None
+        start = self._loop.time()
+        try:
+            body = await self.read_body(entry)
+        except OSError:
+            logger.exception(f"Could not read the body of {entry}")
+            # dropped so that the response is stored again
+            if self._entries.get((entry.key, entry.vary)) is entry:
+                self._remove(entry)
+            self.misses += 1
+            self._remember_pending(client, event)
+            return None
+        self.hits += 1
+        self.bytes_saved += entry.size
+        self.latency_saved += max(entry.latency - (self._loop.time() - start), 0.0)
+        return Decision.fulfill(entry.status, entry.headers, body)
+
+    def _remember_pending(
+        self, client: Union["ConnectionType", "SessionType"], event: Dict
+    ) -> None:
+        """Remembers when a request that missed the cache was paused, so its
+        response is stored and its latency known"""
+        self._pending[(id(client), event["requestId"])] = self._loop.time()
+        if len(self._pending) > MAX_PENDING:
+            self._pending.popitem(last=False)
+
+    async def _on_response(
+        self, client: Union["ConnectionType", "SessionType"], event: Dict
+    ) -> Optional[Decision]:
+        started = self._pending.pop((id(client), event["requestId"]), None)
+        if started is None or event.get("responseStatusCode") != 200:
+            return None
+        headers: Headers = event.get("responseHeaders") or []
+        cache_control = (_header(headers, "cache-control") or "").lower()
+        if "no-store" in cache_control or "private" in cache_control:
+            return None
+        content_length = paused_content_length(event)
+        if content_length is not None and content_length > self._max_entry_size:
+            return None
+        latency = self._loop.time() - started
+        result = await client.send(
+            "Fetch.getResponseBody", {"requestId": event["requestId"]}
+        )
+        body = BodySpool()
+        try:
+            for chunk in iter_decoded(
+                result.get("body", ""), result.get("base64Encoded", False)
+            ):
+                body.write(chunk)
+            request = event["request"]
+            await self.store(
+                request["method"],
+                request["url"],
+                request.get("headers", {}),
+                200,
+                headers,
+                body,
+                latency,
+            )
+        finally:
+            body.close()
+        return None
+
+    def _load(self) -> None:
+        """Creates the cache directory and loads the index, runs in the executor"""
+        os.makedirs(os.path.join(self._directory, "bodies"), exist_ok=True)
+        index_path = os.path.join(self._directory, "index.json")
+        if not os.path.exists(index_path):
+            return
+        with open(index_path, "r", encoding="utf-8") as index:
+            data = loads(index.read())
+        for item in data:
+            entry = CacheEntry.from_json(item)
+            if os.path.exists(self.body_path(entry.digest)):
+                self._vary[entry.key] = tuple(name for name, _ in entry.vary)
+                self._add(entry)
+
+    def _write_index(self, data: str) -> None:
+        """Atomically replaces the index of the cache, runs in the executor"""
+        index_path = os.path.join(self._directory, "index.json")
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as index:
+            index.write(data)
+        os.replace(tmp_path, index_path)
+
+    @staticmethod
+    def _write_body(path: str, body: BodySpool) -> None:
+        """Atomically writes a body to the cache, runs in the executor"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{id(body)}.tmp"
+        with open(tmp_path, "wb") as out:
+            for chunk in body.chunks():
+                out.write(chunk)
+        os.replace(tmp_path, path)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(entries={len(self._entries)}, size={self.size}, hits={self.hits}, misses={self.misses})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def _remove_file(path: str) -> None:
+    """Removes the supplied file ignoring a missing one, runs in the executor"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,312 @@
+import logging
+import os
+from asyncio import Event, Future, gather
+from binascii import a2b_base64
+from collections import deque
+from concurrent.futures import Executor
+from typing import Any, Deque, Dict, List, Optional, Set, TYPE_CHECKING, Tuple, Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["Screencast", "ScreencastFrame"]
+
+logger = logging.getLogger(__name__)
+
+
+class ScreencastFrame:
+    """A decoded frame of a screencast"""
+
+    __slots__ = ["data", "index", "metadata", "path"]
+
+    def __init__(
+        self, index: int, data: bytes, metadata: Dict, path: Optional[str] = None
+    ) -> None:
+        #: The position of the frame in the screencast, including dropped frames
+        self.index: int = index
+        self.data: bytes = data
+        #: The Page.ScreencastFrameMetadata of the frame
+        self.metadata: Dict = metadata
+        #: The path the frame was written to if the screencast has an output directory
+        self.path: Optional[str] = path
+
+    @property
+    def timestamp(self) -> Optional[float]:
+        """Returns the time, in seconds since the epoch, the frame was swapped"""
+        return self.metadata.get("timestamp")
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(index={self.index}, size={len(self.data)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class Screencast:
+    """An async iterator over the frames of Page.startScreencast.
+
+    Frames are acknowledged according to the pacing policy `ack`:
+     - "immediate": as soon as they are received, optionally delayed so that
+     no more than `max_fps` frames are requested per second
+     - "consumed": once taken from the queue, pacing the browser to the consumer
+
+    Received frames are base64 decoded, and written to `output_dir` as a
+    numbered image sequence, in an executor. At most `queue_size` frames wait
+    to be consumed, the oldest frame is dropped when a new frame arrives and
+    the queue is full.
+
+    Example:
+
+    ```python
+    async with Screencast(client, output_dir="frames") as screencast:
+        async for frame in screencast:
+            ...
+    ```
+    """
+
+    __slots__ = [
+        "_ack",
+        "_client",
+        "_executor",
+        "_first_time",
+        "_last_time",
+        "_min_interval",
+        "_next_ack",
+        "_output_dir",
+        "_params",
+        "_queue",
+        "_queue_size",
+        "_ready",
+        "_started",
+        "_writes",
+        "_written",
+        "acked",
+        "decoded",
+        "dropped",
+        "errors",
+        "received",
+    ]
+
+    ACK_IMMEDIATE: str = "immediate"
+    ACK_CONSUMED: str = "consumed"
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        format: str = "jpeg",
+        quality: Optional[int] = None,
+        max_width: Optional[int] = None,
+        max_height: Optional[int] = None,
+        every_nth_frame: Optional[int] = None,
+        queue_size: int = 8,
+        ack: str = "immediate",
+        max_fps: Optional[float] = None,
+        output_dir: Optional[str] = None,
+        executor: Optional[Executor] = None,
+    ) -> None:
+        """Construct a new Screencast
+
+        :param client: The client or session whose page is screencast
+        :param format: Image compression format, jpeg or png
+        :param quality: Compression quality from range [0..100] (jpeg only)
+        :param max_width: Maximum screenshot width
+        :param max_height: Maximum screenshot height
+        :param every_nth_frame: Send every n-th frame
+        :param queue_size: Maximum number of frames waiting to be consumed
+        :param ack: The pacing policy, immediate or consumed
+        :param max_fps: Maximum number of frames acknowledged per second by the immediate policy
+        :param output_dir: Optional directory the frames are written to
+        :param executor: The executor frames are decoded in. Defaults to the loops default executor
+        """
+        if ack not in (self.ACK_IMMEDIATE, self.ACK_CONSUMED):
+            raise ValueError(f"Unknown screencast pacing policy {ack}")
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._params: Dict[str, Any] = {"format": format}
+        for name, value in (
+            ("quality", quality),
+            ("maxWidth", max_width),
+            ("maxHeight", max_height),
+            ("everyNthFrame", every_nth_frame),
+        ):
+            if value is not None:
+                self._params[name] = value
+        self._queue_size: int = queue_size
+        self._ack: str = ack
+        self._min_interval: float = 1.0 / max_fps if max_fps else 0.0
+        self._next_ack: float = 0.0
+        self._output_dir: Optional[str] = output_dir
+        self._executor: Optional[Executor] = executor
+        self._queue: Deque[Tuple[Future, int]] = deque()
+        self._ready: Event = Event()
+        self._writes: Set[Future] = set()
+        self._written: List[Tuple[str, Optional[float]]] = []
+        self._started: bool = False
+        self._first_time: float = 0.0
+        self._last_time: float = 0.0
+        self.received: int = 0
+        self.acked: int = 0
+        self.decoded: int = 0
+        self.dropped: int = 0
+        self.errors: int = 0
+
+    @property
+    def fps(self) -> float:
+        """Returns the mean number of frames received per second"""
+        elapsed = self._last_time - self._first_time
+        return (self.received - 1) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of frames waiting to be consumed"""
+        return len(self._queue)
+
+    async def start(self) -> "Screencast":
+        """Start the screencast"""
+        if self._output_dir is not None:
+            os.makedirs(self._output_dir, exist_ok=True)
+        self._client.on("Page.screencastFrame", self._on_frame)
+        self._started = True
+        await self._client.send("Page.startScreencast", self._params)
+        return self
+
+    async def stop(self) -> None:
+        """Stop the screencast, waiting for received frames to be decoded and
+        written. Frames waiting to be consumed remain available."""
+        if not self._started:
+            return
+        self._started = False
+        self._client.remove_listener("Page.screencastFrame", self._on_frame)
+        self._ready.set()
+        try:
+            await self._client.send("Page.stopScreencast")
+        finally:
+            if self._writes:
+                await gather(*self._writes, return_exceptions=True)
+            if self._output_dir is not None and self._written:
+                await self._client.loop.run_in_executor(
+                    self._executor, self._write_concat
+                )
+
+    def _on_frame(self, event: Dict) -> None:
+        loop = self._client.loop
+        now = loop.time()
+        if self.received == 0:
+            self._first_time = now
+        self._last_time = now
+        index = self.received
+        self.received += 1
+        session_id = event["sessionId"]
+        future = loop.run_in_executor(
+            self._executor, self._decode, index, event["data"], event.get("metadata", {})
+        )
+        future.add_done_callback(self._on_decoded)
+        if self._output_dir is not None:
+            self._writes.add(future)
+            future.add_done_callback(self._writes.discard)
+        if self._ack == self.ACK_IMMEDIATE:
+            self._schedule_ack(session_id)
+            session_id = -1
+        if len(self._queue) >= self._queue_size:
+            _, dropped_session = self._queue.popleft()
+            self.dropped += 1
+            if dropped_session != -1:
+                self._send_ack(dropped_session)
+        self._queue.append((future, session_id))
+        self._ready.set()
+
+    def _on_decoded(self, future: Future) -> None:
+        if future.cancelled():
+            return
+        exception = future.exception()
+        if exception is not None:
+            self.errors += 1
+            logger.error(f"Failed to decode a screencast frame: {exception}")
+            return
+        self.decoded += 1
+        frame: ScreencastFrame = future.result()
+        if frame.path is not None:
+            self._written.append((os.path.basename(frame.path), frame.timestamp))
+
+    def _schedule_ack(self, session_id: int) -> None:
+        """Acknowledges a frame, delaying the acknowledgement if needed
+        so that at most max_fps frames are acknowledged per second
+
+        :param session_id: The session id of the frame
+        """
+        loop = self._client.loop
+        now = loop.time()
+        if not self._min_interval or now >= self._next_ack:
+            self._next_ack = now + self._min_interval
+            self._send_ack(session_id)
+            return
+        delay = self._next_ack - now
+        self._next_ack += self._min_interval
+        loop.call_later(delay, self._send_ack, session_id)
+
+    def _send_ack(self, session_id: int) -> None:
+        if not self._started:
+            return
+        self.acked += 1
+        self._client.send("Page.screencastFrameAck", {"sessionId": session_id})
+
+    def _decode(self, index: int, data: str, metadata: Dict) -> ScreencastFrame:
+        """Decodes, and writes, a frame. Runs in the executor
+
+        :param index: The position of the frame
+        :param data: The base64 encoded image
+        :param metadata: The metadata of the frame
+        :return: The decoded frame
+        """
+        frame = ScreencastFrame(index, a2b_base64(data), metadata)
+        if self._output_dir is not None:
+            frame.path = os.path.join(
+                self._output_dir, f"frame_{index:06d}.{self._params['format']}"
+            )
+            with open(frame.path, "wb") as out:
+                out.write(frame.data)
+        return frame
+
+    def _write_concat(self) -> None:
+        """Writes the ffconcat file of the image sequence, giving each
+        written frame its display duration. Runs in the executor"""
+        written = sorted(self._written)
+        lines = ["ffconcat version 1.0"]
+        for i, (name, timestamp) in enumerate(written):
+            lines.append(f"file '{name}'")
+            if i + 1 < len(written):
+                next_timestamp = written[i + 1][1]
+                if timestamp is not None and next_timestamp is not None:
+                    lines.append(f"duration {max(next_timestamp - timestamp, 0):.6f}")
+        with open(os.path.join(self._output_dir, "frames.ffconcat"), "w") as out:
+            out.write("\n".join(lines) + "\n")
+
+    def __aiter__(self) -> "Screencast":
+        return self
+
+    async def __anext__(self) -> ScreencastFrame:
+        while 1:
+            while not self._queue:
+                if not self._started:
+                    raise StopAsyncIteration
+                self._ready.clear()
+                await self._ready.wait()
+            future, session_id = self._queue.popleft()
+            if session_id != -1:
+                self._send_ack(session_id)
+            try:
+                return await future
+            except Exception:
+                # counted and logged by _on_decoded
+                continue
+
+    async def __aenter__(self) -> "Screencast":
+        return await self.start()
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        await self.stop()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(received={self.received}, dropped={self.dropped}, fps={self.fps:.2f})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,318 @@
+import re
+from typing import Any, Callable, Iterator, List, Optional, Pattern, Set, Tuple
+
+__all__ = ["Selector", "SelectorError", "compile_selector"]
+
+ELEMENT_NODE: int = 1
+
+TOKEN_RE: Pattern = re.compile(
+    r"""
+    \s*(?P<combinator>[>+~,])\s*
+    | (?P<space>\s+)
+    | (?P<type>\*|[-\w]+)
+    | \#(?P<id>[-\w]+)
+    | \.(?P<cls>[-\w]+)
+    | \[\s*(?P<attr>[-\w:]+)\s*
+        (?:(?P<op>[~|^$*]?=)\s*(?:"(?P<dq>[^"]*)"|'(?P<sq>[^']*)'|(?P<uq>[-\w]+))\s*(?P<flag>[iI])?\s*)?
+      \]
+    | :(?P<pseudo>[-\w]+)(?:\((?P<arg>[^()]*(?:\([^()]*\)[^()]*)*)\))?
+    """,
+    re.X,
+)
+TOKEN_KINDS: Tuple[str, ...] = ("combinator", "space", "type", "id", "cls", "attr", "pseudo")
+#: Pseudo-classes matching the live state of the page rather than the mirrored markup
+STATE_PSEUDO_CLASSES: Set[str] = {
+    "active",
+    "autofill",
+    "checked",
+    "default",
+    "disabled",
+    "enabled",
+    "focus",
+    "focus-visible",
+    "focus-within",
+    "hover",
+    "in-range",
+    "indeterminate",
+    "invalid",
+    "link",
+    "out-of-range",
+    "placeholder-shown",
+    "read-only",
+    "read-write",
+    "target",
+    "valid",
+    "visited",
+}
+NTH_RE: Pattern = re.compile(r"^(?:(?P<a>[+-]?\d*)n\s*(?:(?P<sign>[+-])\s*(?P<b>\d+))?|(?P<only>[+-]?\d+))$")
+
+#: A test of a single element, the node is any object with the attributes of a MirrorNode
+Predicate = Callable[[Any], bool]
+#: The tag as written or None for any, and the predicates of a compound selector
+Compound = Tuple[Optional[str], List[Predicate]]
+
+
+class SelectorError(ValueError):
+    """Raised for selectors that are invalid or not supported by the local engine"""
+
+
+def _is_html(node: Any) -> bool:
+    """Returns T/F indicating if the element is an HTML element of an HTML
+    document, whose names are case-insensitive. Their nodeName is their upper
+    cased localName, whereas SVG and XML elements keep the case of both"""
+    return node.node_name != node.local_name
+
+
+def _element_parent(node: Any) -> Any:
+    parent = node.parent
+    if parent is not None and parent.node_type == ELEMENT_NODE:
+        return parent
+    return None
+
+
+def _element_siblings(node: Any) -> List[Any]:
+    if node.parent is None:
+        return [node]
+    return [child for child in node.parent.children if child.node_type == ELEMENT_NODE]
+
+
+def _attribute(name: str, op: Optional[str], value: str, ignore_case: bool) -> Predicate:
+    html_name = name.lower()
+    if ignore_case:
+        value = value.lower()
+
+    def test(node: Any) -> bool:
+        actual = node.attributes.get(html_name if _is_html(node) else name)
+        if actual is None:
+            return False
+        if op is None:
+            return True
+        if ignore_case:
+            actual = actual.lower()
+        if op == "=":
+            return actual == value
+        if op == "~=":
+            return value in actual.split()
+        if op == "|=":
+            return actual == value or actual.startswith(value + "-")
+        if not value:
+            return False
+        if op == "^=":
+            return actual.startswith(value)
+        if op == "$=":
+            return actual.endswith(value)
+        return value in actual
+
+    return test
+
+
+def _nth(arg: str, last: bool) -> Predicate:
+    arg = arg.strip().lower()
+    if arg == "odd":
+        a, b = 2, 1
+    elif arg == "even":
+        a, b = 2, 0
+    else:
+        match = NTH_RE.match(arg.replace(" ", ""))
+        if match is None:
+            raise SelectorError(f"Invalid nth argument: {arg}")
+        if match.group("only") is not None:
+            a, b = 0, int(match.group("only"))
+        else:
+            sa = match.group("a")
+            a = -1 if sa == "-" else int(sa) if sa not in ("", "+") else 1
+            b = int(match.group("b") or 0) * (-1 if match.group("sign") == "-" else 1)
+
+    def test(node: Any) -> bool:
+        siblings = _element_siblings(node)
+        position = siblings.index(node)
+        position = len(siblings) - position if last else position + 1
+        if a == 0:
+            return position == b
+        return (position - b) % a == 0 and (position - b) // a >= 0
+
+    return test
+
+
+def _pseudo(name: str, arg: Optional[str]) -> Predicate:
+    name = name.lower()
+    if name == "not":
+        if arg is None:
+            raise SelectorError(":not requires an argument")
+        inner = compile_selector(arg)
+        return lambda node: not inner.match(node)
+    if name in ("nth-child", "nth-last-child"):
+        if arg is None:
+            raise SelectorError(f":{name} requires an argument")
+        return _nth(arg, name == "nth-last-child")
+    if arg is not None:
+        raise SelectorError(f"Unsupported pseudo-class :{name}()")
+    if name == "first-child":
+        return lambda node: _element_siblings(node)[0] is node
+    if name == "last-child":
+        return lambda node: _element_siblings(node)[-1] is node
+    if name == "only-child":
+        return lambda node: len(_element_siblings(node)) == 1
+    if name == "empty":
+        return lambda node: not any(
+            child.node_type == ELEMENT_NODE or child.node_value for child in node.children
+        )
+    if name == "root":
+        return lambda node: _element_parent(node) is None and node.parent is not None
+    if name in STATE_PSEUDO_CLASSES:
+        raise SelectorError(f"The pseudo-class :{name} depends on the state of the page")
+    raise SelectorError(f"Unsupported pseudo-class :{name}")
+
+
+class Selector:
+    """A compiled CSS selector list matched against mirrored element nodes.
+
+    Supports type, universal, id, class and attribute selectors, the
+    descendant, child, adjacent and general sibling combinators and the
+    structural pseudo-classes. Type selectors and attribute names are case
+    insensitive for HTML elements only. Anything else, including the
+    pseudo-classes matching the live state of the page such as :checked,
+    raises SelectorError when compiled so that the query can be sent to the
+    browser instead.
+    """
+
+    __slots__ = ["complexes", "text"]
+
+    def __init__(self, text: str, complexes: List[List[Tuple[str, Compound]]]) -> None:
+        self.text: str = text
+        #: Each complex selector as its compounds, preceded by their combinator, left to right
+        self.complexes: List[List[Tuple[str, Compound]]] = complexes
+
+    def match(self, node: Any) -> bool:
+        """Returns True if the element matches any selector of the list"""
+        if node.node_type != ELEMENT_NODE:
+            return False
+        for parts in self.complexes:
+            if self._match(node, parts, len(parts) - 1):
+                return True
+        return False
+
+    def select(self, root: Any) -> Iterator[Any]:
+        """Yields the descendant elements of root matching the selector, in document order"""
+        pending = list(reversed(root.children))
+        while pending:
+            node = pending.pop()
+            if node.node_type == ELEMENT_NODE and self.match(node):
+                yield node
+            if node.children:
+                pending.extend(reversed(node.children))
+
+    @staticmethod
+    def _match_compound(node: Any, compound: Compound) -> bool:
+        tag, predicates = compound
+        if tag is not None:
+            name = node.local_name or node.node_name
+            if _is_html(node):
+                if name.lower() != tag.lower():
+                    return False
+            elif name != tag:
+                return False
+        for predicate in predicates:
+            if not predicate(node):
+                return False
+        return True
+
+    def _match(self, node: Any, parts: List[Tuple[str, Compound]], i: int) -> bool:
+        combinator, compound = parts[i]
+        if not self._match_compound(node, compound):
+            return False
+        if i == 0:
+            return True
+        if combinator == ">":
+            parent = _element_parent(node)
+            return parent is not None and self._match(parent, parts, i - 1)
+        if combinator == " ":
+            ancestor = _element_parent(node)
+            while ancestor is not None:
+                if self._match(ancestor, parts, i - 1):
+                    return True
+                ancestor = _element_parent(ancestor)
+            return False
+        siblings = _element_siblings(node)
+        position = siblings.index(node)
+        if combinator == "+":
+            return position > 0 and self._match(siblings[position - 1], parts, i - 1)
+        for sibling in siblings[:position]:
+            if self._match(sibling, parts, i - 1):
+                return True
+        return False
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}({self.text})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+def compile_selector(text: str) -> Selector:
+    """Compile a CSS selector list
+
+    :param text: The selector list, e.g. `ul > li.item:not(.hidden), a[href^="https"]`
+    :return: The compiled selector
+    """
+    source = text.strip()
+    complexes: List[List[Tuple[str, Compound]]] = []
+    parts: List[Tuple[str, Compound]] = []
+    combinator = ""
+    tag: Optional[str] = None
+    predicates: List[Predicate] = []
+    empty = True
+    pos = 0
+
+    def close_compound() -> None:
+        if empty:
+            raise SelectorError(f"Invalid selector: {text}")
+        parts.append((combinator, (tag, predicates)))
+
+    while pos < len(source):
+        match = TOKEN_RE.match(source, pos)
+        if match is None or match.end() == pos:
+            raise SelectorError(f"Unsupported selector: {text}")
+        pos = match.end()
+        kind = next(name for name in TOKEN_KINDS if match.group(name) is not None)
+        if kind in ("combinator", "space"):
+            close_compound()
+            value = match.group("combinator") or " "
+            if value == ",":
+                complexes.append(parts)
+                parts = []
+                value = ""
+            combinator = value
+            tag = None
+            predicates = []
+            empty = True
+            continue
+        if kind == "type":
+            if not empty:
+                raise SelectorError(f"Invalid selector: {text}")
+            value = match.group("type")
+            tag = None if value == "*" else value
+        elif kind == "id":
+            predicates.append(_attribute("id", "=", match.group("id"), False))
+        elif kind == "cls":
+            predicates.append(_attribute("class", "~=", match.group("cls"), False))
+        elif kind == "attr":
+            value = match.group("dq")
+            if value is None:
+                value = match.group("sq")
+            if value is None:
+                value = match.group("uq") or ""
+            predicates.append(
+                _attribute(
+                    match.group("attr"),
+                    match.group("op"),
+                    value,
+                    match.group("flag") is not None,
+                )
+            )
+        else:
+            predicates.append(_pseudo(match.group("pseudo"), match.group("arg")))
+        empty = False
+    close_compound()
+    complexes.append(parts)
+    return Selector(text, complexes)
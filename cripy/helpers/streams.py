@@ -0,0 +1,365 @@
+from asyncio import Future
+from binascii import a2b_base64, b2a_base64
+from hashlib import sha1
+from tempfile import SpooledTemporaryFile
+from typing import Any, BinaryIO, Dict, Iterator, Optional, TYPE_CHECKING, Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = [
+    "BodySpool",
+    "DEFAULT_CHUNK_SIZE",
+    "DEFAULT_SPOOL_SIZE",
+    "IOStream",
+    "encode_body",
+    "iter_decoded",
+]
+
+#: The default number of bytes requested per IO.read
+DEFAULT_CHUNK_SIZE: int = 2 ** 16
+
+#: The default number of bytes a BodySpool keeps in memory before using disk
+DEFAULT_SPOOL_SIZE: int = 2 ** 20
+
+
+def iter_decoded(
+    data: str, base64_encoded: bool, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[bytes]:
+    """Decodes the supplied protocol string data in chunks so that the
+    decoded body is never materialized as a single bytes object.
+
+    :param data: The data to be decoded
+    :param base64_encoded: Is the data base64 encoded
+    :param chunk_size: The maximum number of bytes each decoded chunk contains
+    :return: An iterator yielding the decoded chunks
+    """
+    if not data:
+        return
+    if base64_encoded:
+        # four base64 characters encode three bytes
+        step = max(chunk_size // 3, 1) * 4
+        for i in range(0, len(data), step):
+            yield a2b_base64(data[i : i + step])
+        return
+    step = chunk_size
+    for i in range(0, len(data), step):
+        yield data[i : i + step].encode("utf-8")
+
+
+def encode_body(
+    source: Union[str, "BodySpool"], chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> str:
+    """Base64 encodes the body contained in the supplied spool or file
+    for use as a protocol binary parameter. Blocks, call it in an executor.
+
+    :param source: A BodySpool or the path of a file
+    :param chunk_size: The number of bytes encoded at a time
+    :return: The base64 encoded body
+    """
+    # a multiple of three bytes encodes without padding
+    step = max(chunk_size // 3, 1) * 3
+    if isinstance(source, BodySpool):
+        return "".join(
+            b2a_base64(chunk, newline=False).decode("ascii")
+            for chunk in source.chunks(step)
+        )
+    parts = []
+    with open(source, "rb") as body:
+        while 1:
+            chunk = body.read(step)
+            if not chunk:
+                break
+            parts.append(b2a_base64(chunk, newline=False).decode("ascii"))
+    return "".join(parts)
+
+
+def _decode(result: Dict) -> bytes:
+    """Returns the decoded data of an IO.read result
+
+    :param result: The result of IO.read
+    :return: The decoded data
+    """
+    data = result.get("data")
+    if not data:
+        return b""
+    if result.get("base64Encoded", False):
+        return a2b_base64(data)
+    return data.encode("utf-8")
+
+
+class IOStream:
+    """An async file like reader over the stream identified by an IO handle.
+
+    While a chunk is being consumed the next chunk is requested. Once the
+    stream is exhausted, or the reader is closed, the handle is closed using IO.close.
+
+    Example:
+
+    ```python
+    async with IOStream(client, handle) as stream:
+        async for chunk in stream:
+            sink.write(chunk)
+    ```
+    """
+
+    __slots__ = [
+        "_chunk",
+        "_chunk_size",
+        "_client",
+        "_closed",
+        "_eof",
+        "_handle",
+        "_next",
+        "_pos",
+        "_prefetch",
+        "_view",
+        "bytes_read",
+        "chunks_read",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        handle: str,
+        chunk_size: Optional[int] = DEFAULT_CHUNK_SIZE,
+        prefetch: bool = True,
+    ) -> None:
+        """Construct a new IOStream
+
+        :param client: The client or session the stream belongs to
+        :param handle: The stream handle
+        :param chunk_size: The number of bytes requested per IO.read. If None,
+        the size is left to the browser
+        :param prefetch: Should the next chunk be requested while the current is consumed
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._handle: str = handle
+        self._chunk_size: Optional[int] = chunk_size
+        self._prefetch: bool = prefetch
+        self._next: Optional[Future] = None
+        self._chunk: bytes = b""
+        self._view: memoryview = memoryview(self._chunk)
+        self._pos: int = 0
+        self._eof: bool = False
+        self._closed: bool = False
+        self.bytes_read: int = 0
+        self.chunks_read: int = 0
+
+    @property
+    def handle(self) -> str:
+        """Returns the handle of the stream"""
+        return self._handle
+
+    @property
+    def closed(self) -> bool:
+        """Returns T/F indicating if the handle of the stream has been closed"""
+        return self._closed
+
+    async def read(self, n: int = -1) -> bytes:
+        """Read up to n bytes from the stream, fewer are returned only if the
+        stream is exhausted
+
+        :param n: The number of bytes to read. If negative the remainder of
+        the stream is read
+        :return: The bytes read, empty once the stream is exhausted
+        """
+        if n < 0:
+            parts = []
+            async for chunk in self:
+                parts.append(chunk)
+            return b"".join(parts)
+        if not await self._fill():
+            return b""
+        available = len(self._chunk) - self._pos
+        if available >= n:
+            return self._take(n)
+        out = bytearray(self._view[self._pos :])
+        self._pos = len(self._chunk)
+        while len(out) < n and await self._fill():
+            out += self._take(n - len(out))
+        return bytes(out)
+
+    async def readinto(self, buffer: Any) -> int:
+        """Read bytes from the stream into the supplied writable buffer until it
+        is full or the stream is exhausted
+
+        :param buffer: A bytearray, memoryview or other writable buffer
+        :return: The number of bytes read into the buffer
+        """
+        target = memoryview(buffer).cast("B")
+        size = len(target)
+        filled = 0
+        while filled < size and await self._fill():
+            amount = min(size - filled, len(self._chunk) - self._pos)
+            target[filled : filled + amount] = self._view[self._pos : self._pos + amount]
+            self._pos += amount
+            filled += amount
+        return filled
+
+    async def copy_to(self, path_or_file: Union[str, BinaryIO]) -> int:
+        """Copy the remainder of the stream to the supplied file. File writes
+        are done in the default executor.
+
+        :param path_or_file: The path of the file or a binary file like object
+        :return: The number of bytes copied
+        """
+        run_in_executor = self._client.loop.run_in_executor
+        owned = isinstance(path_or_file, str)
+        out = (
+            await run_in_executor(None, open, path_or_file, "wb")
+            if owned
+            else path_or_file
+        )
+        copied = 0
+        try:
+            async for chunk in self:
+                await run_in_executor(None, out.write, chunk)
+                copied += len(chunk)
+        finally:
+            if owned:
+                await run_in_executor(None, out.close)
+        return copied
+
+    async def close(self) -> None:
+        """Close the handle of the stream"""
+        if self._closed:
+            return
+        self._closed = True
+        self._chunk = b""
+        self._view = memoryview(self._chunk)
+        self._pos = 0
+        if self._next is not None:
+            try:
+                await self._next
+            except Exception:
+                pass
+            self._next = None
+        try:
+            await self._client.send("IO.close", {"handle": self._handle})
+        except Exception:
+            pass
+
+    def _request(self) -> Future:
+        """Request the next chunk of the stream"""
+        params: Dict[str, Union[str, int]] = {"handle": self._handle}
+        if self._chunk_size is not None:
+            params["size"] = self._chunk_size
+        return self._client.send("IO.read", params)
+
+    def _take(self, n: int) -> bytes:
+        """Take at most n bytes from the current chunk. If the chunk is
+        taken whole it is returned without a copy.
+
+        :param n: The maximum number of bytes to take
+        :return: The bytes taken
+        """
+        pos = self._pos
+        if pos == 0 and n >= len(self._chunk):
+            self._pos = len(self._chunk)
+            return self._chunk
+        end = min(pos + n, len(self._chunk))
+        self._pos = end
+        return self._view[pos:end].tobytes()
+
+    async def _fill(self) -> bool:
+        """Ensure the current chunk has unconsumed bytes, reading the next
+        chunk if not. Closes the stream once exhausted.
+
+        :return: T/F indicating if there are bytes to be consumed
+        """
+        while self._pos >= len(self._chunk):
+            if self._eof or self._closed:
+                await self.close()
+                return False
+            future = self._next if self._next is not None else self._request()
+            self._next = None
+            try:
+                result = await future
+            except Exception:
+                self._eof = True
+                await self.close()
+                raise
+            self._eof = result.get("eof", True)
+            if not self._eof and self._prefetch:
+                self._next = self._request()
+            self._chunk = _decode(result)
+            self._view = memoryview(self._chunk)
+            self._pos = 0
+            self.bytes_read += len(self._chunk)
+            self.chunks_read += 1
+        return True
+
+    def __aiter__(self) -> "IOStream":
+        return self
+
+    async def __anext__(self) -> bytes:
+        if not await self._fill():
+            raise StopAsyncIteration
+        return self._take(len(self._chunk))
+
+    async def __aenter__(self) -> "IOStream":
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        await self.close()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(handle={self._handle}, read={self.bytes_read}, closed={self._closed})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class BodySpool:
+    """A write once, read many times container for bodies that stays in memory
+    while small and transparently moves to a temporary file when large.
+
+    The length and SHA-1 digest of the written data is computed as it is written.
+    """
+
+    __slots__ = ["_digest", "_file", "length"]
+
+    def __init__(self, max_size: int = DEFAULT_SPOOL_SIZE) -> None:
+        """Construct a new BodySpool
+
+        :param max_size: The number of bytes kept in memory before using disk
+        """
+        self._file: BinaryIO = SpooledTemporaryFile(max_size=max_size)
+        self._digest = sha1()
+        self.length: int = 0
+
+    @property
+    def digest(self) -> bytes:
+        """Returns the SHA-1 digest of the written data"""
+        return self._digest.digest()
+
+    def write(self, chunk: bytes) -> None:
+        """Write a chunk of data to the spool
+
+        :param chunk: The data to be written
+        """
+        self._file.write(chunk)
+        self._digest.update(chunk)
+        self.length += len(chunk)
+
+    def chunks(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+        """Iterate over the written data from the beginning
+
+        :param chunk_size: The maximum size of each chunk
+        :return: An iterator yielding the written data in chunks
+        """
+        self._file.seek(0)
+        read = self._file.read
+        while 1:
+            chunk = read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def close(self) -> None:
+        """Close the spool discarding its data"""
+        self._file.close()
+
+    def __len__(self) -> int:
+        return self.length
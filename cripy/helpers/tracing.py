@@ -0,0 +1,356 @@
+import re
+from asyncio import Future
+from codecs import getincrementaldecoder
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    TYPE_CHECKING,
+    Union,
+)
+from zlib import DEFLATED, compressobj, decompressobj
+
+from ujson import loads
+
+from .streams import DEFAULT_CHUNK_SIZE, IOStream
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["TraceEventParser", "TraceRecorder", "iter_trace_file"]
+
+TRACE_EVENTS_RE: Pattern = re.compile(r'"traceEvents"\s*:\s*\[')
+ELEMENT_RE: Pattern = re.compile(r"[{\]]")
+STRUCTURE_RE: Pattern = re.compile(r'[{}"]')
+STRING_RE: Pattern = re.compile(r'["\\]')
+
+
+class TraceEventParser:
+    """Incrementally parses a trace in the JSON Object or JSON Array format,
+    returning each trace event as soon as it has been fed completely.
+
+    Only the event currently being parsed is buffered. The braces and strings of
+    an event are scanned to find its end, once found the event is parsed on its own.
+    """
+
+    __slots__ = [
+        "_buffer",
+        "_decoder",
+        "_depth",
+        "_done",
+        "_head",
+        "_in_array",
+        "_in_string",
+        "_pos",
+        "_tail",
+        "events",
+        "metadata",
+    ]
+
+    def __init__(self) -> None:
+        self._decoder: Any = getincrementaldecoder("utf-8")()
+        self._buffer: str = ""
+        self._pos: int = 0
+        self._depth: int = 0
+        self._in_string: bool = False
+        self._in_array: bool = False
+        self._done: bool = False
+        self._head: str = ""
+        self._tail: List[str] = []
+        #: The number of events parsed
+        self.events: int = 0
+        #: The metadata of a JSON Object format trace, available once closed
+        self.metadata: Optional[Dict] = None
+
+    def feed(self, data: Union[bytes, str]) -> List[Dict]:
+        """Feed the next chunk of the trace
+
+        :param data: The chunk of the trace
+        :return: The events completed by the chunk
+        """
+        if isinstance(data, bytes):
+            data = self._decoder.decode(data)
+        if self._done:
+            self._tail.append(data)
+            return []
+        buf = self._buffer + data
+        pos = self._pos
+        if not self._in_array:
+            stripped = buf.lstrip()
+            if stripped.startswith("["):
+                pos = len(buf) - len(stripped) + 1
+            else:
+                match = TRACE_EVENTS_RE.search(buf)
+                if match is None:
+                    self._buffer = buf
+                    return []
+                # the keys preceding the events are parsed once closed
+                self._head = buf[: match.start()]
+                pos = match.end()
+            self._in_array = True
+        events: List[Dict] = []
+        start = 0
+        depth = self._depth
+        in_string = self._in_string
+        length = len(buf)
+        while pos < length:
+            if in_string:
+                match = STRING_RE.search(buf, pos)
+                if match is None:
+                    pos = length
+                    break
+                if match.group() == "\\":
+                    # the escaped character may be the first of the next chunk
+                    pos = match.end() + 1
+                else:
+                    in_string = False
+                    pos = match.end()
+            elif depth == 0:
+                match = ELEMENT_RE.search(buf, pos)
+                if match is None:
+                    pos = length
+                    break
+                if match.group() == "]":
+                    self._done = True
+                    self._tail.append(buf[match.end() :])
+                    buf = ""
+                    pos = 0
+                    break
+                start = match.start()
+                depth = 1
+                pos = match.end()
+            else:
+                match = STRUCTURE_RE.search(buf, pos)
+                if match is None:
+                    pos = length
+                    break
+                c = match.group()
+                pos = match.end()
+                if c == '"':
+                    in_string = True
+                elif c == "{":
+                    depth += 1
+                else:
+                    depth -= 1
+                    if depth == 0:
+                        events.append(loads(buf[start:pos]))
+                        start = pos
+        keep = start if depth > 0 else min(pos, len(buf))
+        self._buffer = buf[keep:]
+        self._pos = pos - keep
+        self._depth = depth
+        self._in_string = in_string
+        self.events += len(events)
+        return events
+
+    def close(self) -> Optional[Dict]:
+        """Finish parsing the trace
+
+        :return: The metadata of the trace if present
+        """
+        if self._depth or not self._done:
+            raise ValueError("The trace ended before its events were complete")
+        head = self._head.strip()[1:].strip().rstrip(",")
+        tail = "".join(self._tail).strip().lstrip(",").strip()
+        if tail.endswith("}"):
+            keys = ",".join(part for part in (head, tail[:-1].strip()) if part)
+            try:
+                self.metadata = loads("{" + keys + "}").get("metadata")
+            except ValueError:
+                self.metadata = None
+        return self.metadata
+
+
+def _iter_file_chunks(path: str, chunk_size: int) -> Iterator[bytes]:
+    """Yields the decompressed chunks of a, optionally gzipped, trace file"""
+    with open(path, "rb") as trace:
+        decompressor = None
+        first = True
+        while 1:
+            chunk = trace.read(chunk_size)
+            if not chunk:
+                break
+            if first:
+                first = False
+                if chunk[:2] == b"\x1f\x8b":
+                    decompressor = decompressobj(31)
+            yield decompressor.decompress(chunk) if decompressor is not None else chunk
+        if decompressor is not None:
+            yield decompressor.flush()
+
+
+def iter_trace_file(path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict]:
+    """Yields the events of a trace file, such as one written by
+    `TraceRecorder.save`, without loading the file into memory
+
+    :param path: The path of the trace file, gzipped or not
+    :param chunk_size: The number of bytes read at a time
+    :return: An iterator yielding the events of the trace
+    """
+    parser = TraceEventParser()
+    for chunk in _iter_file_chunks(path, chunk_size):
+        yield from parser.feed(chunk)
+    parser.close()
+
+
+class TraceRecorder:
+    """Records a trace using the ReturnAsStream transfer mode of Tracing.start.
+
+    Once tracing ends, the trace is read chunk by chunk from its stream and
+    either parsed incrementally, `events`, or written to disk gzip compressed,
+    `save`. The stream can only be read once.
+
+    Example:
+
+    ```python
+    recorder = TraceRecorder(client, ["devtools.timeline", "v8"])
+    await recorder.start()
+    await client.Page.navigate("https://example.com")
+    async for event in recorder.events():
+        ...
+    ```
+    """
+
+    __slots__ = [
+        "_chunk_size",
+        "_client",
+        "_complete",
+        "_params",
+        "_tracing",
+        "buffer_usage",
+        "bytes_read",
+        "metadata",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        categories: Optional[Iterable[str]] = None,
+        trace_config: Optional[Dict] = None,
+        compression: str = "none",
+        buffer_usage_interval: Optional[float] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        """Construct a new TraceRecorder
+
+        :param client: The client or session to be traced
+        :param categories: The categories to be included in the trace
+        :param trace_config: Optional Tracing.TraceConfig, overrides categories
+        :param compression: The compression of the stream, none or gzip
+        :param buffer_usage_interval: Optional interval, in milliseconds, of buffer usage reports
+        :param chunk_size: The number of bytes requested per IO.read
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._chunk_size: int = chunk_size
+        self._params: Dict[str, Any] = {
+            "transferMode": "ReturnAsStream",
+            "streamFormat": "json",
+            "streamCompression": compression,
+        }
+        if trace_config is not None:
+            self._params["traceConfig"] = trace_config
+        elif categories is not None:
+            self._params["traceConfig"] = {"includedCategories": list(categories)}
+        if buffer_usage_interval is not None:
+            self._params["bufferUsageReportingInterval"] = buffer_usage_interval
+        self._complete: Optional[Future] = None
+        self._tracing: bool = False
+        #: The most recently reported fullness of the trace buffer, from 0 to 1
+        self.buffer_usage: float = 0.0
+        self.bytes_read: int = 0
+        #: The metadata of the trace, available once its events have been read
+        self.metadata: Optional[Dict] = None
+
+    async def start(self) -> "TraceRecorder":
+        """Start tracing"""
+        self._complete = self._client.loop.create_future()
+        self._client.on("Tracing.tracingComplete", self._on_complete)
+        self._client.on("Tracing.bufferUsage", self._on_buffer_usage)
+        self._tracing = True
+        await self._client.send("Tracing.start", self._params)
+        return self
+
+    async def stop(self) -> Dict:
+        """Stop tracing and wait for the trace to be complete
+
+        :return: The Tracing.tracingComplete event
+        """
+        if self._complete is None:
+            raise RuntimeError("Tracing was not started")
+        if self._tracing:
+            self._tracing = False
+            await self._client.send("Tracing.end")
+        try:
+            return await self._complete
+        finally:
+            self._client.remove_listener("Tracing.tracingComplete", self._on_complete)
+            self._client.remove_listener("Tracing.bufferUsage", self._on_buffer_usage)
+
+    async def events(self) -> AsyncIterator[Dict]:
+        """Stop tracing, if not stopped, and yield the events of the trace as
+        they are read from its stream"""
+        complete = await self.stop()
+        parser = TraceEventParser()
+        decompressor = (
+            decompressobj(31) if complete.get("streamCompression") == "gzip" else None
+        )
+        async with IOStream(self._client, complete["stream"], self._chunk_size) as stream:
+            async for chunk in stream:
+                self.bytes_read += len(chunk)
+                if decompressor is not None:
+                    chunk = decompressor.decompress(chunk)
+                for event in parser.feed(chunk):
+                    yield event
+        if decompressor is not None:
+            for event in parser.feed(decompressor.flush()):
+                yield event
+        self.metadata = parser.close()
+
+    async def save(self, path: str) -> int:
+        """Stop tracing, if not stopped, and write the trace gzip compressed
+        to the supplied path. File writes are done in the default executor.
+
+        :param path: The path of the file
+        :return: The number of bytes written
+        """
+        complete = await self.stop()
+        run_in_executor = self._client.loop.run_in_executor
+        async with IOStream(self._client, complete["stream"], self._chunk_size) as stream:
+            if complete.get("streamCompression") == "gzip":
+                written = await stream.copy_to(path)
+                self.bytes_read += written
+                return written
+            compressor = compressobj(6, DEFLATED, 31)
+            out = await run_in_executor(None, open, path, "wb")
+            written = 0
+            try:
+                async for chunk in stream:
+                    self.bytes_read += len(chunk)
+                    data = compressor.compress(chunk)
+                    if data:
+                        await run_in_executor(None, out.write, data)
+                        written += len(data)
+                data = compressor.flush()
+                await run_in_executor(None, out.write, data)
+                written += len(data)
+            finally:
+                await run_in_executor(None, out.close)
+        return written
+
+    def _on_complete(self, event: Dict) -> None:
+        if self._complete is not None and not self._complete.done():
+            self._complete.set_result(event)
+
+    def _on_buffer_usage(self, event: Dict) -> None:
+        self.buffer_usage = event.get("percentFull", self.buffer_usage)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(tracing={self._tracing}, read={self.bytes_read})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
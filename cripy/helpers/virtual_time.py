@@ -0,0 +1,223 @@
+import logging
+from asyncio import Future, TimeoutError, wait_for
+from typing import Any, Callable, Dict, Optional, TYPE_CHECKING, Union
+
+from .network_tracker import NetworkTracker
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["VirtualTimeController", "VirtualTimeReport"]
+
+logger = logging.getLogger(__name__)
+
+
+class VirtualTimeReport:
+    """The virtual and wall-clock time taken by a run of the controller"""
+
+    __slots__ = ["budget_exhausted", "steps", "timed_out", "virtual_ms", "wall_ms"]
+
+    def __init__(self) -> None:
+        #: The milliseconds of virtual time granted and consumed
+        self.virtual_ms: float = 0.0
+        self.wall_ms: float = 0.0
+        self.steps: int = 0
+        self.budget_exhausted: bool = False
+        self.timed_out: bool = False
+
+    @property
+    def saved_ms(self) -> float:
+        """Returns the milliseconds of wall-clock time saved by fast forwarding"""
+        return max(self.virtual_ms - self.wall_ms, 0.0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "virtual_ms": self.virtual_ms,
+            "wall_ms": self.wall_ms,
+            "saved_ms": self.saved_ms,
+            "steps": self.steps,
+            "budget_exhausted": self.budget_exhausted,
+            "timed_out": self.timed_out,
+        }
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(virtual_ms={self.virtual_ms:.0f}, wall_ms={self.wall_ms:.0f}, steps={self.steps})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class VirtualTimeController:
+    """Drives the virtual time of a page with Emulation.setVirtualTimePolicy.
+
+    Virtual time is granted in steps, each ending with
+    Emulation.virtualTimeBudgetExpired, until the budget of the run is spent
+    or the `until` predicate returns True. With the default policy virtual
+    time does not advance while resource fetches are pending, so timers
+    cannot outrun the network and loads stay deterministic. Steps are kept
+    at min_step_ms while requests are in flight and doubled, up to
+    max_step_ms, while the network is quiet so that timer heavy pages are
+    fast forwarded with few round trips.
+
+    Example:
+
+    ```python
+    controller = await VirtualTimeController(client).start()
+    report = await controller.load("https://example.com", budget_ms=10000)
+    print(report.saved_ms)
+    ```
+    """
+
+    __slots__ = [
+        "_client",
+        "_expired",
+        "_owns_tracker",
+        "_tracker",
+        "max_step_ms",
+        "max_starvation",
+        "min_step_ms",
+        "pages",
+        "policy",
+        "total_saved_ms",
+    ]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        policy: str = "pauseIfNetworkFetchesPending",
+        min_step_ms: float = 100,
+        max_step_ms: float = 5000,
+        max_starvation: Optional[int] = None,
+        tracker: Optional[NetworkTracker] = None,
+    ) -> None:
+        """Construct a new VirtualTimeController
+
+        :param client: The client or session of the page
+        :param policy: The Emulation.VirtualTimePolicy used while granting budget
+        :param min_step_ms: The virtual milliseconds granted per step while requests are in flight
+        :param max_step_ms: The largest number of virtual milliseconds granted in a step
+        :param max_starvation: Optional maxVirtualTimeTaskStarvationCount
+        :param tracker: Optional tracker supplying the number of requests in flight. If not
+        supplied, one is created and managed by the controller
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self.policy: str = policy
+        self.min_step_ms: float = min_step_ms
+        self.max_step_ms: float = max_step_ms
+        self.max_starvation: Optional[int] = max_starvation
+        self._owns_tracker: bool = tracker is None
+        self._tracker: NetworkTracker = (
+            tracker
+            if tracker is not None
+            else NetworkTracker(client, retain_finished=False)
+        )
+        self._expired: Optional[Future] = None
+        self.pages: int = 0
+        self.total_saved_ms: float = 0.0
+
+    async def start(self) -> "VirtualTimeController":
+        """Start listening for the expiry of virtual time budgets"""
+        self._client.on("Emulation.virtualTimeBudgetExpired", self._on_budget_expired)
+        if self._owns_tracker:
+            self._tracker.start()
+            await self._client.send("Network.enable")
+        return self
+
+    def stop(self) -> None:
+        self._client.remove_listener(
+            "Emulation.virtualTimeBudgetExpired", self._on_budget_expired
+        )
+        if self._owns_tracker:
+            self._tracker.stop()
+
+    async def pause(self) -> None:
+        """Stop virtual time from advancing"""
+        await self._client.send("Emulation.setVirtualTimePolicy", {"policy": "pause"})
+
+    async def load(
+        self,
+        url: str,
+        budget_ms: float = 5000,
+        until: Optional[Callable[[], bool]] = None,
+        timeout: Optional[float] = None,
+    ) -> VirtualTimeReport:
+        """Navigate with virtual time paused, then run the budget from the
+        start of the navigation
+
+        :param url: The URL to navigate to
+        :param budget_ms: The total virtual milliseconds granted
+        :param until: Optional predicate checked after each step, stops the run when it returns True
+        :param timeout: Optional maximum wall-clock seconds of the run
+        :return: The report of the run
+        """
+        await self.pause()
+        await self._client.send("Page.navigate", {"url": url})
+        return await self.run(budget_ms, until, timeout, wait_for_navigation=True)
+
+    async def run(
+        self,
+        budget_ms: float = 5000,
+        until: Optional[Callable[[], bool]] = None,
+        timeout: Optional[float] = None,
+        wait_for_navigation: bool = False,
+    ) -> VirtualTimeReport:
+        """Grant virtual time in steps until budget_ms is spent
+
+        :param budget_ms: The total virtual milliseconds granted
+        :param until: Optional predicate checked after each step, stops the run when it returns True
+        :param timeout: Optional maximum wall-clock seconds of the run, virtual time
+        does not advance while a request hangs
+        :param wait_for_navigation: Do not start the first step until the pending navigation commits
+        :return: The report of the run
+        """
+        loop = self._client.loop
+        report = VirtualTimeReport()
+        started = loop.time()
+        step = self.min_step_ms
+        try:
+            while report.virtual_ms < budget_ms:
+                grant = min(step, budget_ms - report.virtual_ms)
+                params: Dict[str, Any] = {"policy": self.policy, "budget": grant}
+                if self.max_starvation is not None:
+                    params["maxVirtualTimeTaskStarvationCount"] = self.max_starvation
+                if wait_for_navigation and report.steps == 0:
+                    params["waitForNavigation"] = True
+                self._expired = loop.create_future()
+                await self._client.send("Emulation.setVirtualTimePolicy", params)
+                remaining = (
+                    max(timeout - (loop.time() - started), 0) if timeout is not None else None
+                )
+                try:
+                    await wait_for(self._expired, remaining)
+                except TimeoutError:
+                    report.timed_out = True
+                    # the granted budget would keep running, and expire during a later run
+                    await self.pause()
+                    break
+                report.virtual_ms += grant
+                report.steps += 1
+                if until is not None and until():
+                    break
+                if self._tracker.inflight:
+                    step = self.min_step_ms
+                else:
+                    step = min(step * 2, self.max_step_ms)
+            else:
+                report.budget_exhausted = True
+        finally:
+            self._expired = None
+            report.wall_ms = (loop.time() - started) * 1000
+        self.pages += 1
+        self.total_saved_ms += report.saved_ms
+        logger.debug(f"Virtual time run finished: {report}")
+        return report
+
+    def _on_budget_expired(self, event: Optional[Dict] = None) -> None:
+        if self._expired is not None and not self._expired.done():
+            self._expired.set_result(None)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(policy={self.policy}, pages={self.pages}, saved_ms={self.total_saved_ms:.0f})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,321 @@
+from asyncio import Future, TimerHandle, wait_for
+from typing import Any, Callable, Dict, List, Optional, Set, TYPE_CHECKING, Tuple, Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["PageWaiter"]
+
+#: The frameId and the name of a lifecycle event
+LifecycleKey = Tuple[str, str]
+
+
+class _IdleWaiter:
+    """A pending wait for the in-flight requests of a frame, or of all
+    frames, to stay at or below max_inflight for quiet seconds"""
+
+    __slots__ = ["frame_id", "future", "max_inflight", "quiet", "timer"]
+
+    def __init__(
+        self, frame_id: Optional[str], max_inflight: int, quiet: float, future: Future
+    ) -> None:
+        self.frame_id: Optional[str] = frame_id
+        self.max_inflight: int = max_inflight
+        self.quiet: float = quiet
+        self.future: Future = future
+        self.timer: Optional[TimerHandle] = None
+
+
+class PageWaiter:
+    """Waits for the lifecycle, navigation and network activity of a page
+    using a single set of event listeners shared by any number of waits.
+
+    The number of in-flight requests is counted per frame as the Network
+    events arrive and the lifecycle events reached by the current document of
+    each frame are recorded, so a wait that is already satisfied returns
+    immediately and the others are resolved by the event that satisfies them.
+
+    Example:
+
+    ```python
+    waiter = await PageWaiter(client).start()
+    navigation = waiter.wait_for_navigation()
+    await client.Page.navigate("https://example.com")
+    await navigation
+    await waiter.wait_for_network_idle(max_inflight=2, quiet_ms=500)
+    ```
+    """
+
+    __slots__ = [
+        "_client",
+        "_idle_waiters",
+        "_lifecycle",
+        "_lifecycle_waiters",
+        "_listeners",
+        "_navigation_waiters",
+        "_request_frames",
+        "frame_inflight",
+        "inflight",
+        "main_frame_id",
+    ]
+
+    def __init__(self, client: Union["ConnectionType", "SessionType"]) -> None:
+        """Construct a new PageWaiter
+
+        :param client: The client or session of the page
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        #: requestId to the frameId of the requests in flight
+        self._request_frames: Dict[str, str] = {}
+        #: frameId to the loaderId of its document and the lifecycle events it reached
+        self._lifecycle: Dict[str, Tuple[str, Set[str]]] = {}
+        self._lifecycle_waiters: Dict[LifecycleKey, List[Future]] = {}
+        self._navigation_waiters: Dict[str, List[Future]] = {}
+        self._idle_waiters: List[_IdleWaiter] = []
+        self._listeners: List[Tuple[str, Callable[[Dict], None]]] = [
+            ("Page.lifecycleEvent", self._on_lifecycle_event),
+            ("Page.loadEventFired", self._on_load_event_fired),
+            ("Page.domContentEventFired", self._on_dom_content_event_fired),
+            ("Page.frameNavigated", self._on_frame_navigated),
+            ("Page.navigatedWithinDocument", self._on_navigated_within_document),
+            ("Network.requestWillBeSent", self._on_request_will_be_sent),
+            ("Network.loadingFinished", self._on_request_done),
+            ("Network.loadingFailed", self._on_request_done),
+        ]
+        self.main_frame_id: Optional[str] = None
+        #: The number of requests in flight per frame
+        self.frame_inflight: Dict[str, int] = {}
+        self.inflight: int = 0
+
+    async def start(self, enable: bool = True) -> "PageWaiter":
+        """Start listening for the events of the page
+
+        :param enable: Enable the Page and Network domains and the lifecycle events
+        """
+        client_on = self._client.on
+        for event, listener in self._listeners:
+            client_on(event, listener)
+        if enable:
+            await self._client.send("Page.enable")
+            await self._client.send("Page.setLifecycleEventsEnabled", {"enabled": True})
+            await self._client.send("Network.enable")
+        result = await self._client.send("Page.getFrameTree")
+        frame = result["frameTree"]["frame"]
+        self.main_frame_id = frame["id"]
+        self._lifecycle.setdefault(frame["id"], (frame.get("loaderId", ""), set()))
+        return self
+
+    def stop(self) -> None:
+        """Stop listening, pending waits are cancelled"""
+        remove_listener = self._client.remove_listener
+        for event, listener in self._listeners:
+            remove_listener(event, listener)
+        for waiters in self._lifecycle_waiters.values():
+            for future in waiters:
+                future.cancel()
+        for waiters in self._navigation_waiters.values():
+            for future in waiters:
+                future.cancel()
+        for idle in self._idle_waiters:
+            idle.future.cancel()
+            if idle.timer is not None:
+                idle.timer.cancel()
+        self._lifecycle_waiters.clear()
+        self._navigation_waiters.clear()
+        self._idle_waiters.clear()
+
+    def reached(self, name: str, frame_id: Optional[str] = None) -> bool:
+        """Returns T/F indicating if the current document of a frame reached
+        the named lifecycle event, e.g. load, DOMContentLoaded or networkIdle"""
+        state = self._lifecycle.get(frame_id or self.main_frame_id)
+        return state is not None and name in state[1]
+
+    async def wait_for_lifecycle(
+        self, name: str, frame_id: Optional[str] = None, timeout: Optional[float] = None
+    ) -> None:
+        """Wait for the current document of a frame to reach a lifecycle event
+
+        :param name: The name of the lifecycle event, e.g. load or networkAlmostIdle
+        :param frame_id: The id of the frame, defaults to the main frame
+        :param timeout: Optional maximum number of seconds to wait
+        """
+        frame_id = frame_id or self.main_frame_id
+        if self.reached(name, frame_id):
+            return
+        await self._wait(self._lifecycle_waiters, (frame_id, name), timeout)
+
+    def wait_for_navigation(
+        self,
+        frame_id: Optional[str] = None,
+        lifecycle: Optional[str] = "load",
+        timeout: Optional[float] = None,
+    ) -> Future:
+        """Wait for the next navigation of a frame, and for its new document
+        to reach a lifecycle event. The wait is registered when called, so
+        call it before navigating and await the returned task afterwards.
+
+        :param frame_id: The id of the frame, defaults to the main frame
+        :param lifecycle: The lifecycle event awaited after navigating, None to not wait
+        :param timeout: Optional maximum number of seconds to wait for both
+        :return: A task resolving with the Page.Frame navigated or, for same
+        document navigations, the event
+        """
+        frame_id = frame_id or self.main_frame_id
+        future = self._register(self._navigation_waiters, frame_id)
+        return self._client.loop.create_task(
+            self._wait_for_navigation(future, frame_id, lifecycle, timeout)
+        )
+
+    async def _wait_for_navigation(
+        self,
+        future: Future,
+        frame_id: str,
+        lifecycle: Optional[str],
+        timeout: Optional[float],
+    ) -> Dict:
+        loop = self._client.loop
+        deadline = loop.time() + timeout if timeout is not None else None
+        frame = await self._await(self._navigation_waiters, frame_id, future, timeout)
+        if lifecycle is not None and "loaderId" in frame:
+            remaining = max(deadline - loop.time(), 0) if deadline is not None else None
+            await self.wait_for_lifecycle(lifecycle, frame_id, remaining)
+        return frame
+
+    async def wait_for_network_idle(
+        self,
+        max_inflight: int = 0,
+        quiet_ms: float = 500,
+        frame_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """Wait for at most max_inflight requests to be in flight for quiet_ms
+        milliseconds
+
+        :param max_inflight: The number of requests allowed in flight
+        :param quiet_ms: The number of milliseconds the requests must stay at or below max_inflight
+        :param frame_id: Optional id of the frame whose requests are counted, defaults to all frames
+        :param timeout: Optional maximum number of seconds to wait
+        """
+        idle = _IdleWaiter(
+            frame_id, max_inflight, quiet_ms / 1000, self._client.loop.create_future()
+        )
+        self._idle_waiters.append(idle)
+        self._check_idle(idle)
+        try:
+            await wait_for(idle.future, timeout)
+        finally:
+            if idle.timer is not None:
+                idle.timer.cancel()
+            if idle in self._idle_waiters:
+                self._idle_waiters.remove(idle)
+
+    async def _wait(self, waiters: Dict[Any, List[Future]], key: Any, timeout: Optional[float]) -> Any:
+        return await self._await(waiters, key, self._register(waiters, key), timeout)
+
+    def _register(self, waiters: Dict[Any, List[Future]], key: Any) -> Future:
+        future = self._client.loop.create_future()
+        waiters.setdefault(key, []).append(future)
+        return future
+
+    @staticmethod
+    async def _await(
+        waiters: Dict[Any, List[Future]], key: Any, future: Future, timeout: Optional[float]
+    ) -> Any:
+        try:
+            return await wait_for(future, timeout)
+        finally:
+            pending = waiters.get(key)
+            if pending is not None and future in pending:
+                pending.remove(future)
+                if not pending:
+                    del waiters[key]
+
+    @staticmethod
+    def _resolve(waiters: Dict[Any, List[Future]], key: Any, result: Any) -> None:
+        for future in waiters.pop(key, ()):
+            if not future.done():
+                future.set_result(result)
+
+    def _check_idle(self, idle: _IdleWaiter) -> None:
+        if idle.frame_id is None:
+            count = self.inflight
+        else:
+            count = self.frame_inflight.get(idle.frame_id, 0)
+        if count <= idle.max_inflight:
+            if idle.timer is None:
+                idle.timer = self._client.loop.call_later(
+                    idle.quiet, self._on_quiet, idle
+                )
+        elif idle.timer is not None:
+            idle.timer.cancel()
+            idle.timer = None
+
+    def _on_quiet(self, idle: _IdleWaiter) -> None:
+        idle.timer = None
+        if not idle.future.done():
+            idle.future.set_result(None)
+
+    def _reached(self, frame_id: str, loader_id: Optional[str], name: str) -> None:
+        state = self._lifecycle.get(frame_id)
+        if state is None or (loader_id is not None and state[0] != loader_id):
+            state = self._lifecycle[frame_id] = (loader_id or "", set())
+        state[1].add(name)
+        self._resolve(self._lifecycle_waiters, (frame_id, name), None)
+
+    def _on_lifecycle_event(self, event: Dict) -> None:
+        self._reached(event["frameId"], event.get("loaderId"), event["name"])
+
+    def _on_load_event_fired(self, event: Dict) -> None:
+        if self.main_frame_id is not None:
+            self._reached(self.main_frame_id, None, "load")
+
+    def _on_dom_content_event_fired(self, event: Dict) -> None:
+        if self.main_frame_id is not None:
+            self._reached(self.main_frame_id, None, "DOMContentLoaded")
+
+    def _on_frame_navigated(self, event: Dict) -> None:
+        frame = event["frame"]
+        frame_id = frame["id"]
+        if not frame.get("parentId"):
+            self.main_frame_id = frame_id
+        state = self._lifecycle.get(frame_id)
+        loader_id = frame.get("loaderId", "")
+        if state is None or state[0] != loader_id:
+            self._lifecycle[frame_id] = (loader_id, set())
+        self._resolve(self._navigation_waiters, frame_id, frame)
+
+    def _on_navigated_within_document(self, event: Dict) -> None:
+        self._resolve(self._navigation_waiters, event["frameId"], event)
+
+    def _on_request_will_be_sent(self, event: Dict) -> None:
+        request_id = event["requestId"]
+        if request_id in self._request_frames:
+            # a redirect, the request is still in flight
+            return
+        frame_id = event.get("frameId", "")
+        self._request_frames[request_id] = frame_id
+        self.frame_inflight[frame_id] = self.frame_inflight.get(frame_id, 0) + 1
+        self.inflight += 1
+        self._requests_changed()
+
+    def _on_request_done(self, event: Dict) -> None:
+        frame_id = self._request_frames.pop(event["requestId"], None)
+        if frame_id is None:
+            return
+        count = self.frame_inflight[frame_id] - 1
+        if count:
+            self.frame_inflight[frame_id] = count
+        else:
+            del self.frame_inflight[frame_id]
+        self.inflight -= 1
+        self._requests_changed()
+
+    def _requests_changed(self) -> None:
+        for idle in self._idle_waiters:
+            self._check_idle(idle)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(inflight={self.inflight}, main_frame={self.main_frame_id})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
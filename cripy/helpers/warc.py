@@ -0,0 +1,654 @@
+import logging
+import os
+from asyncio import (
+    AbstractEventLoop,
+    FIRST_COMPLETED,
+    Future,
+    Queue,
+    Task,
+    gather,
+    get_event_loop,
+    wait,
+)
+from base64 import b32encode
+from datetime import datetime, timezone
+from http.client import responses
+from typing import (
+    Any,
+    BinaryIO,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Set,
+    TYPE_CHECKING,
+    Tuple,
+    Union,
+)
+from urllib.parse import urlsplit
+from uuid import uuid4
+from zlib import DEFLATED, compressobj
+
+from .body_fetcher import (
+    BodyFetcher,
+    paused_content_length,
+    STRIPPED_RESPONSE_HEADERS,
+)
+from .network_tracker import NetworkTracker, RequestRecord
+from .streams import BodySpool, DEFAULT_CHUNK_SIZE, DEFAULT_SPOOL_SIZE, iter_decoded
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = [
+    "WARCArchiver",
+    "WARCRecord",
+    "WARCWriter",
+    "has_body",
+    "http_request_block",
+    "http_response_block",
+    "warc_date",
+]
+
+logger = logging.getLogger(__name__)
+
+WARCHeaders = List[Tuple[str, str]]
+RecordWrittenCallback = Callable[["WARCRecord"], Any]
+
+#: Status codes whose responses never have a body
+NO_BODY_STATUSES = {101, 204, 205, 304}
+
+SOFTWARE: str = "cripy"
+
+
+def warc_date(timestamp: Optional[float] = None) -> str:
+    """Returns the WARC-Date representation of the supplied unix timestamp
+
+    :param timestamp: Seconds since the epoch. Defaults to now
+    :return: The formatted date
+    """
+    if timestamp is None:
+        dt = datetime.now(timezone.utc)
+    else:
+        dt = datetime.fromtimestamp(timestamp, timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def has_body(status: int) -> bool:
+    """Returns T/F indicating if a response with the supplied status has a body
+
+    :param status: The HTTP status of the response
+    :return: T/F indicating if the response has a body
+    """
+    return status not in NO_BODY_STATUSES and not 300 <= status < 400
+
+
+def _header_lines(headers: Dict[str, str]) -> List[str]:
+    """Returns the HTTP header lines for the supplied protocol headers object.
+    Chrome joins repeated headers with a newline, these are split back into
+    separate lines.
+
+    :param headers: The protocol headers object
+    :return: The list of header lines
+    """
+    lines: List[str] = []
+    for name, value in headers.items():
+        if name.startswith(":"):
+            continue
+        for part in str(value).split("\n"):
+            lines.append(f"{name}: {part}")
+    return lines
+
+
+def http_request_block(record: RequestRecord) -> bytes:
+    """Returns the HTTP request message head for the supplied record
+
+    :param record: The record of the request
+    :return: The bytes of the HTTP request head
+    """
+    url = urlsplit(record.url)
+    path = url.path or "/"
+    if url.query:
+        path = f"{path}?{url.query}"
+    headers = record.request.get("headers", {})
+    if record.response is not None and record.response.get("requestHeaders"):
+        headers = record.response["requestHeaders"]
+    lines = [f"{record.method} {path} HTTP/1.1"]
+    if not any(name.lower() == "host" for name in headers):
+        lines.append(f"Host: {url.netloc}")
+    lines.extend(_header_lines(headers))
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+
+
+def http_response_block(record: RequestRecord, content_length: int) -> bytes:
+    """Returns the HTTP response message head for the supplied record.
+
+    The headers describing the transfer encoding of the body are removed
+    as the body supplied by the browser is already decoded.
+
+    :param record: The record of the request
+    :param content_length: The length of the decoded body
+    :return: The bytes of the HTTP response head
+    """
+    response = record.response
+    status = response.get("status", 200)
+    status_text = response.get("statusText") or responses.get(status, "")
+    lines = [f"HTTP/1.1 {status} {status_text}"]
+    lines.extend(
+        line
+        for line in _header_lines(response.get("headers", {}))
+        if line.split(":", 1)[0].lower() not in STRIPPED_RESPONSE_HEADERS
+    )
+    lines.append(f"Content-Length: {content_length}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+
+
+class WARCRecord:
+    """A WARC record whose block is composed of an optional HTTP message
+    head and an optional spooled body"""
+
+    __slots__ = [
+        "body",
+        "headers",
+        "http_head",
+        "length",
+        "offset",
+        "record_id",
+        "warc_type",
+    ]
+
+    def __init__(
+        self,
+        warc_type: str,
+        headers: WARCHeaders,
+        http_head: bytes = b"",
+        body: Optional[BodySpool] = None,
+        record_id: Optional[str] = None,
+    ) -> None:
+        """Construct a new WARCRecord
+
+        :param warc_type: The value of the WARC-Type header
+        :param headers: Additional WARC headers
+        :param http_head: The HTTP message head of the block
+        :param body: The body of the block
+        :param record_id: The WARC-Record-ID. Defaults to a new urn:uuid
+        """
+        self.warc_type: str = warc_type
+        self.headers: WARCHeaders = headers
+        self.http_head: bytes = http_head
+        self.body: Optional[BodySpool] = body
+        self.record_id: str = record_id or f"<urn:uuid:{uuid4()}>"
+        #: The offset and length of the record in the WARC once written
+        self.offset: int = -1
+        self.length: int = -1
+
+    @property
+    def content_length(self) -> int:
+        """Returns the length of the records block"""
+        body_length = self.body.length if self.body is not None else 0
+        return len(self.http_head) + body_length
+
+    def head(self) -> bytes:
+        """Returns the serialized WARC header of the record"""
+        lines = [
+            "WARC/1.0",
+            f"WARC-Type: {self.warc_type}",
+            f"WARC-Record-ID: {self.record_id}",
+        ]
+        lines.extend(f"{name}: {value}" for name, value in self.headers)
+        lines.append(f"Content-Length: {self.content_length}")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+
+    def close(self) -> None:
+        """Release the records body"""
+        if self.body is not None:
+            self.body.close()
+            self.body = None
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(type={self.warc_type}, id={self.record_id})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class WARCWriter:
+    """Writes WARC records to a file using a bounded write-behind queue.
+
+    Records are serialized and written in the default executor so that
+    writing to disk never blocks the event loop. Once the queue is full
+    `write` waits until there is room, providing back pressure to producers.
+    """
+
+    __slots__ = [
+        "_callbacks",
+        "_file",
+        "_gzip",
+        "_info",
+        "_loop",
+        "_path",
+        "_queue",
+        "_task",
+        "bytes_written",
+        "errors",
+        "records_written",
+    ]
+
+    def __init__(
+        self,
+        path: str,
+        gzip: bool = True,
+        queue_size: int = 32,
+        info: Optional[Dict[str, str]] = None,
+        loop: Optional[AbstractEventLoop] = None,
+    ) -> None:
+        """Construct a new WARCWriter
+
+        :param path: The path of the WARC file to be written
+        :param gzip: Should each record be written as its own gzip member
+        :param queue_size: Maximum number of records waiting to be written
+        :param info: Optional fields of the warcinfo record written on open
+        :param loop: Optional event loop to use. Defaults to asyncio.get_event_loop
+        """
+        self._loop: AbstractEventLoop = loop if loop is not None else get_event_loop()
+        self._path: str = path
+        self._gzip: bool = gzip
+        self._info: Optional[Dict[str, str]] = info
+        self._queue: Queue = Queue(maxsize=queue_size)
+        self._file: Optional[BinaryIO] = None
+        self._task: Optional[Task] = None
+        self._callbacks: List[RecordWrittenCallback] = []
+        self.records_written: int = 0
+        self.bytes_written: int = 0
+        self.errors: int = 0
+
+    @property
+    def path(self) -> str:
+        """Returns the path of the WARC file"""
+        return self._path
+
+    def on_record_written(self, callback: RecordWrittenCallback) -> None:
+        """Register a callback that is called with each record once it
+        has been written. The offset and length of the record are set.
+        Exceptions raised by the callback are logged.
+
+        :param callback: The callback to be registered
+        """
+        self._callbacks.append(callback)
+
+    async def open(self) -> "WARCWriter":
+        """Open the WARC file and start the writer task.
+        If info was supplied, the warcinfo record is written first"""
+        self._file = await self._loop.run_in_executor(None, open, self._path, "wb")
+        self._task = self._loop.create_task(self._write_loop())
+        fields = {"software": SOFTWARE, "format": "WARC File Format 1.0"}
+        if self._info is not None:
+            fields.update(self._info)
+            info = BodySpool()
+            info.write(
+                "".join(f"{name}: {value}\r\n" for name, value in fields.items()).encode(
+                    "utf-8"
+                )
+            )
+            await self.write(
+                WARCRecord(
+                    "warcinfo",
+                    [
+                        ("WARC-Date", warc_date()),
+                        ("WARC-Filename", os.path.basename(self._path)),
+                        ("Content-Type", "application/warc-fields"),
+                    ],
+                    body=info,
+                )
+            )
+        return self
+
+    async def write(self, record: WARCRecord) -> None:
+        """Queue the supplied record to be written, waiting if the
+        queue is full. Raises RuntimeError if the writer task stopped.
+
+        :param record: The record to be written
+        """
+        await self._put(record)
+
+    async def close(self) -> None:
+        """Write all queued records and close the WARC file"""
+        try:
+            if self._task is not None:
+                if not self._task.done():
+                    await self._put(None)
+                await self._task
+        finally:
+            self._task = None
+            if self._file is not None:
+                await self._loop.run_in_executor(None, self._file.close)
+                self._file = None
+
+    async def _put(self, item: Optional[WARCRecord]) -> None:
+        """Queues the supplied item unless the writer task stopped, in
+        which case nothing would ever dequeue it
+
+        :param item: The record to be written or None to stop the task
+        """
+        task = self._task
+        if task is None or task.done():
+            raise RuntimeError(f"The writer of {self._path} is not running")
+        if not self._queue.full():
+            self._queue.put_nowait(item)
+            return
+        put = self._loop.create_task(self._queue.put(item))
+        await wait((put, task), return_when=FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            raise RuntimeError(f"The writer of {self._path} stopped")
+
+    async def _write_loop(self) -> None:
+        """Writes the queued records until None is dequeued"""
+        run_in_executor = self._loop.run_in_executor
+        write_record = self._write_record
+        while 1:
+            record: Optional[WARCRecord] = await self._queue.get()
+            if record is None:
+                break
+            try:
+                await run_in_executor(None, write_record, record)
+            except Exception:
+                self.errors += 1
+                logger.exception(f"Failed to write {record}")
+                continue
+            finally:
+                record.close()
+            self.records_written += 1
+            self.bytes_written += record.length
+            for callback in self._callbacks:
+                try:
+                    callback(record)
+                except Exception:
+                    logger.exception(f"The callback {callback} failed for {record}")
+
+    def _write_record(self, record: WARCRecord) -> None:
+        """Serializes and writes the supplied record, runs in the executor
+
+        :param record: The record to be written
+        """
+        out = self._file
+        record.offset = out.tell()
+        if self._gzip:
+            compressor = compressobj(6, DEFLATED, 31)
+            compress = compressor.compress
+
+            def write(data: bytes) -> None:
+                out.write(compress(data))
+
+        else:
+            write = out.write
+        write(record.head())
+        write(record.http_head)
+        if record.body is not None:
+            for chunk in record.body.chunks():
+                write(chunk)
+        write(b"\r\n\r\n")
+        if self._gzip:
+            out.write(compressor.flush())
+        record.length = out.tell() - record.offset
+
+    async def __aenter__(self) -> "WARCWriter":
+        return await self.open()
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        await self.close()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(path={self._path}, records={self.records_written})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class WARCArchiver:
+    """Archives the requests made by a target as WARC request and response records.
+
+    Responses bodies are retrieved by a BodyFetcher once a request has finished.
+    When `use_fetch` is true, the bodies of the responses paused by the Fetch domain
+    at the response stage are retrieved before the response is released to the page,
+    large bodies being streamed and fulfilled. As fulfilling holds the whole body in
+    memory, responses whose Content-Length exceeds the `max_fulfill_size` of the
+    fetcher are continued and their body retrieved once finished, streamed bodies
+    of unknown size exceeding it are failed. Fetch must be enabled by the user with
+    `WARCArchiver.FETCH_PATTERNS` as the patterns.
+
+    Bodies are spooled chunk by chunk, to disk if large, and handed to the writer.
+    """
+
+    __slots__ = [
+        "_chunk_size",
+        "_client",
+        "_fetched",
+        "_fetcher",
+        "_owns_tracker",
+        "_remove_finalize",
+        "_spool_size",
+        "_tasks",
+        "_tracker",
+        "_use_fetch",
+        "_writer",
+        "errors",
+        "skipped",
+    ]
+
+    FETCH_PATTERNS: List[Dict[str, str]] = [{"urlPattern": "*", "requestStage": "Response"}]
+
+    def __init__(
+        self,
+        client: Union["ConnectionType", "SessionType"],
+        writer: WARCWriter,
+        tracker: Optional[NetworkTracker] = None,
+        max_concurrent_bodies: int = 4,
+        use_fetch: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        spool_size: int = DEFAULT_SPOOL_SIZE,
+        fetcher: Optional[BodyFetcher] = None,
+    ) -> None:
+        """Construct a new WARCArchiver
+
+        :param client: The client or session to be archived
+        :param writer: The writer the records are written to
+        :param tracker: Optional tracker supplying finalized requests. If not
+        supplied, one is created and managed by the archiver
+        :param max_concurrent_bodies: Maximum number of bodies retrieved concurrently,
+        ignored if a fetcher is supplied
+        :param use_fetch: Retrieve bodies of responses paused by the Fetch domain
+        :param chunk_size: The number of bytes read per chunk
+        :param spool_size: The number of bytes of a body kept in memory before using disk
+        :param fetcher: Optional fetcher used to retrieve the bodies
+        """
+        self._client: Union["ConnectionType", "SessionType"] = client
+        self._writer: WARCWriter = writer
+        self._owns_tracker: bool = tracker is None
+        self._tracker: NetworkTracker = (
+            tracker
+            if tracker is not None
+            else NetworkTracker(client, retain_finished=False)
+        )
+        self._fetcher: BodyFetcher = (
+            fetcher
+            if fetcher is not None
+            else BodyFetcher(client, workers=max_concurrent_bodies, chunk_size=chunk_size)
+        )
+        self._use_fetch: bool = use_fetch
+        self._chunk_size: int = chunk_size
+        self._spool_size: int = spool_size
+        self._fetched: Dict[str, BodySpool] = {}
+        self._tasks: Set[Future] = set()
+        self._remove_finalize: Optional[Callable[[], None]] = None
+        self.errors: int = 0
+        self.skipped: int = 0
+
+    @property
+    def tracker(self) -> NetworkTracker:
+        """Returns the tracker supplying the finalized requests"""
+        return self._tracker
+
+    def start(self) -> "WARCArchiver":
+        """Start archiving"""
+        if self._owns_tracker:
+            self._tracker.start()
+        self._remove_finalize = self._tracker.on_finalize(self._on_finalize)
+        if self._use_fetch:
+            self._client.on("Fetch.requestPaused", self._on_request_paused)
+        return self
+
+    def stop(self) -> None:
+        """Stop archiving, requests currently being archived are not affected"""
+        if self._remove_finalize is not None:
+            self._remove_finalize()
+            self._remove_finalize = None
+        if self._owns_tracker:
+            self._tracker.stop()
+        if self._use_fetch:
+            self._client.remove_listener("Fetch.requestPaused", self._on_request_paused)
+        # bodies of requests that will no longer be finalized
+        for spool in self._fetched.values():
+            spool.close()
+        self._fetched.clear()
+
+    async def drain(self) -> None:
+        """Wait for the requests currently being archived to be handed to the writer"""
+        while self._tasks:
+            await gather(*self._tasks, return_exceptions=True)
+
+    def _spawn(self, coro: Any) -> None:
+        """Runs the supplied coroutine tracking it for drain
+
+        :param coro: The coroutine to be run
+        """
+        task = self._client.loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _on_finalize(self, record: RequestRecord) -> None:
+        if record.failed or record.response is None or not record.url.startswith("http"):
+            self.skipped += 1
+            spool = self._fetched.pop(record.request_id, None)
+            if spool is not None:
+                spool.close()
+            return
+        self._spawn(self._archive(record))
+
+    def _on_request_paused(self, event: Dict) -> None:
+        if "responseStatusCode" not in event and "responseErrorReason" not in event:
+            self._spawn(self._continue_request(event["requestId"]))
+            return
+        self._spawn(self._stream_paused_body(event))
+
+    async def _stream_paused_body(self, event: Dict) -> None:
+        """Retrieves the body of a response paused at the response stage
+        and releases the request
+
+        :param event: The Fetch.requestPaused event
+        """
+        request_id = event["requestId"]
+        if "responseErrorReason" in event or not has_body(
+            event.get("responseStatusCode")
+        ):
+            await self._continue_request(request_id)
+            return
+        content_length = paused_content_length(event)
+        if (
+            content_length is not None
+            and content_length > self._fetcher.max_fulfill_size
+        ):
+            # retrieved with Network.getResponseBody once finished
+            await self._continue_request(request_id)
+            return
+        network_id = event.get("networkId")
+        spool = BodySpool(self._spool_size)
+        # registered before the request is released, as its loadingFinished
+        # may be received before the reply to Fetch.fulfillRequest
+        if network_id is not None:
+            self._fetched[network_id] = spool
+        try:
+            await self._fetcher.fetch_paused(event, spool, release="fulfill")
+        except Exception:
+            self.errors += 1
+            if network_id is not None and self._fetched.get(network_id) is spool:
+                del self._fetched[network_id]
+            spool.close()
+            logger.exception(f"Failed to stream the body of {request_id}")
+            return
+        if network_id is None:
+            spool.close()
+
+    async def _continue_request(self, request_id: str) -> None:
+        """Continues a paused request unmodified
+
+        :param request_id: The Fetch requestId of the request
+        """
+        try:
+            await self._client.send("Fetch.continueRequest", {"requestId": request_id})
+        except Exception as e:
+            # e.g. the target navigated and the request was cancelled
+            self.errors += 1
+            logger.debug(f"Could not continue the paused request {request_id}: {e}")
+
+    async def _archive(self, record: RequestRecord) -> None:
+        """Retrieves the body of the supplied record and writes its request
+        and response records
+
+        :param record: The finalized record to be archived
+        """
+        spool = self._fetched.pop(record.request_id, None)
+        if spool is None:
+            spool = BodySpool(self._spool_size)
+            if has_body(record.status):
+                try:
+                    await self._fetcher.fetch(record.request_id, spool)
+                except Exception as e:
+                    self.errors += 1
+                    spool.close()
+                    logger.info(f"Could not retrieve the body of {record}: {e}")
+                    return
+        response_id = f"<urn:uuid:{uuid4()}>"
+        date = warc_date(record.wall_time)
+        response_headers: WARCHeaders = [
+            ("WARC-Target-URI", record.url),
+            ("WARC-Date", date),
+            ("Content-Type", "application/http; msgtype=response"),
+            ("WARC-Payload-Digest", "sha1:" + b32encode(spool.digest).decode("ascii")),
+        ]
+        ip = record.response.get("remoteIPAddress")
+        if ip:
+            response_headers.append(("WARC-IP-Address", ip.strip("[]")))
+        response = WARCRecord(
+            "response",
+            response_headers,
+            http_response_block(record, spool.length),
+            spool,
+            response_id,
+        )
+        post_data = record.request.get("postData")
+        request_body = None
+        if post_data:
+            request_body = BodySpool(self._spool_size)
+            for chunk in iter_decoded(post_data, False, self._chunk_size):
+                request_body.write(chunk)
+        request = WARCRecord(
+            "request",
+            [
+                ("WARC-Target-URI", record.url),
+                ("WARC-Date", date),
+                ("WARC-Concurrent-To", response_id),
+                ("Content-Type", "application/http; msgtype=request"),
+            ],
+            http_request_block(record),
+            request_body,
+        )
+        await self._writer.write(response)
+        await self._writer.write(request)
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(writer={self._writer}, inflight={len(self._tasks)})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
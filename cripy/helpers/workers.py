@@ -0,0 +1,152 @@
+from asyncio import (
+    AbstractEventLoop,
+    CancelledError,
+    Future,
+    Queue,
+    Task,
+    gather,
+    get_event_loop,
+    wait,
+)
+from typing import Any, Awaitable, Callable, List, Optional
+
+__all__ = ["WorkerPool"]
+
+Job = Callable[..., Awaitable[Any]]
+
+
+class WorkerPool:
+    """A fixed number of worker tasks executing coroutine functions
+    taken from a bounded queue.
+
+    Once the queue is full, `submit` waits until there is room, providing
+    back pressure to the producers of jobs.
+    """
+
+    __slots__ = ["_loop", "_num_workers", "_queue", "_workers", "active", "completed"]
+
+    def __init__(
+        self,
+        workers: int = 4,
+        queue_size: int = 0,
+        loop: Optional[AbstractEventLoop] = None,
+    ) -> None:
+        """Construct a new WorkerPool
+
+        :param workers: The number of worker tasks
+        :param queue_size: Maximum number of queued jobs, 0 for unbounded
+        :param loop: Optional event loop to use. Defaults to asyncio.get_event_loop
+        """
+        self._loop: AbstractEventLoop = loop if loop is not None else get_event_loop()
+        self._num_workers: int = workers
+        self._queue: Queue = Queue(maxsize=queue_size)
+        self._workers: List[Task] = []
+        self.active: int = 0
+        self.completed: int = 0
+
+    @property
+    def pending(self) -> int:
+        """Returns the number of queued jobs"""
+        return self._queue.qsize()
+
+    @property
+    def running(self) -> bool:
+        """Returns T/F indicating if the workers have been started"""
+        return len(self._workers) != 0
+
+    def start(self) -> "WorkerPool":
+        """Start the workers, called automatically by submit"""
+        if not self._workers:
+            create_task = self._loop.create_task
+            self._workers = [
+                create_task(self._work()) for _ in range(self._num_workers)
+            ]
+        return self
+
+    async def submit(self, fn: Job, *args: Any) -> Future:
+        """Queue the supplied coroutine function to be called with args,
+        waiting if the queue is full
+
+        :param fn: The coroutine function to be executed
+        :param args: The arguments for the function
+        :return: A future resolving with the result of the function
+        """
+        self.start()
+        future = self._loop.create_future()
+        await self._queue.put((future, fn, args))
+        return future
+
+    def submit_nowait(self, fn: Job, *args: Any) -> Future:
+        """Queue the supplied coroutine function to be called with args
+        without waiting, raises asyncio.QueueFull if the queue is full
+
+        :param fn: The coroutine function to be executed
+        :param args: The arguments for the function
+        :return: A future resolving with the result of the function
+        """
+        self.start()
+        future = self._loop.create_future()
+        self._queue.put_nowait((future, fn, args))
+        return future
+
+    async def run(self, fn: Job, *args: Any) -> Any:
+        """Execute the supplied coroutine function using the pool and
+        wait for its result
+
+        :param fn: The coroutine function to be executed
+        :param args: The arguments for the function
+        :return: The result of the function
+        """
+        return await (await self.submit(fn, *args))
+
+    async def join(self) -> None:
+        """Wait for all queued jobs to complete"""
+        await self._queue.join()
+
+    async def close(self) -> None:
+        """Wait for all queued jobs to complete and stop the workers"""
+        if not self._workers:
+            return
+        await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _work(self) -> None:
+        """Executes jobs until cancelled. Each job runs as its own task so
+        that a job raising CancelledError, e.g. by awaiting a cancelled
+        future, is not mistaken for the cancellation of the worker."""
+        queue = self._queue
+        while 1:
+            future, fn, args = await queue.get()
+            self.active += 1
+            try:
+                if future.done():
+                    continue
+                job = self._loop.create_task(fn(*args))
+                try:
+                    await wait((job,))
+                except CancelledError:
+                    job.cancel()
+                    if not future.done():
+                        future.cancel()
+                    raise
+                if future.done():
+                    continue
+                if job.cancelled():
+                    future.cancel()
+                elif job.exception() is not None:
+                    future.set_exception(job.exception())
+                else:
+                    future.set_result(job.result())
+            finally:
+                self.active -= 1
+                self.completed += 1
+                queue.task_done()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(workers={self._num_workers}, active={self.active}, pending={self.pending})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
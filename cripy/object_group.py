@@ -0,0 +1,309 @@
+import logging
+from asyncio import CancelledError, Task, sleep
+from itertools import count
+from typing import Any, Dict, Iterator, List, Optional, Set, TYPE_CHECKING, Union
+
+if TYPE_CHECKING:  # pragma: no cover
+    from cripy import ConnectionType, SessionType  # noqa: F401
+
+__all__ = ["HandleTracker", "ObjectGroup"]
+
+logger = logging.getLogger(__name__)
+
+_tracker_ids: Iterator[int] = count(1)
+
+
+class ObjectGroup:
+    """A Runtime object group whose remote objects are released together.
+
+    The commands of the group pass its name as objectGroup and track the
+    objectIds of the remote objects they return. Releasing the group, done
+    automatically when used as an async context manager, releases them all
+    with a single Runtime.releaseObjectGroup.
+
+    Example:
+
+    ```python
+    async with client.object_group() as group:
+        body = await group.evaluate("document.body")
+        await group.call_function_on("function() { return this.childElementCount }", body["objectId"])
+    ```
+    """
+
+    __slots__ = ["_tracker", "created", "handles", "name", "released"]
+
+    def __init__(self, tracker: "HandleTracker", name: str) -> None:
+        """Construct a new ObjectGroup
+
+        :param tracker: The tracker of the session the group belongs to
+        :param name: The name of the object group
+        """
+        self._tracker: HandleTracker = tracker
+        self.name: str = name
+        #: The objectIds of the outstanding remote objects of the group
+        self.handles: Set[str] = set()
+        self.created: float = tracker.client.loop.time()
+        self.released: bool = False
+
+    @property
+    def client(self) -> Union["ConnectionType", "SessionType"]:
+        return self._tracker.client
+
+    def track(self, remote_object: Optional[Dict]) -> Optional[Dict]:
+        """Record the objectId of a Runtime.RemoteObject belonging to the group
+
+        :param remote_object: The remote object
+        :return: The remote object
+        """
+        if remote_object is not None and "objectId" in remote_object:
+            if self.released:
+                logger.warning(f"Object returned for released group {self.name}")
+            self.handles.add(remote_object["objectId"])
+        return remote_object
+
+    async def evaluate(self, expression: str, **params: Any) -> Dict:
+        """Evaluate an expression, see Runtime.evaluate
+
+        :param expression: The expression to evaluate
+        :param params: Any other parameters of Runtime.evaluate
+        :return: The result of Runtime.evaluate
+        """
+        params.update(expression=expression, objectGroup=self.name)
+        result = await self.client.send("Runtime.evaluate", params)
+        self.track(result.get("result"))
+        return result
+
+    async def call_function_on(
+        self,
+        function_declaration: str,
+        object_id: Optional[str] = None,
+        arguments: Optional[List[Dict]] = None,
+        **params: Any,
+    ) -> Dict:
+        """Call a function on a remote object, or in an execution context
+        if executionContextId is supplied, see Runtime.callFunctionOn
+
+        :param function_declaration: The declaration of the function to call
+        :param object_id: Optional id of the object the function is called on
+        :param arguments: Optional Runtime.CallArguments
+        :param params: Any other parameters of Runtime.callFunctionOn
+        :return: The result of Runtime.callFunctionOn
+        """
+        params.update(functionDeclaration=function_declaration, objectGroup=self.name)
+        if object_id is not None:
+            params["objectId"] = object_id
+        if arguments is not None:
+            params["arguments"] = arguments
+        result = await self.client.send("Runtime.callFunctionOn", params)
+        self.track(result.get("result"))
+        return result
+
+    async def resolve_node(
+        self, node_id: Optional[int] = None, backend_node_id: Optional[int] = None
+    ) -> Dict:
+        """Returns the remote object of a DOM node, see DOM.resolveNode
+
+        :param node_id: Optional id of the node
+        :param backend_node_id: Optional backend id of the node
+        :return: The Runtime.RemoteObject of the node
+        """
+        params: Dict[str, Any] = {"objectGroup": self.name}
+        if node_id is not None:
+            params["nodeId"] = node_id
+        if backend_node_id is not None:
+            params["backendNodeId"] = backend_node_id
+        result = await self.client.send("DOM.resolveNode", params)
+        return self.track(result.get("object"))
+
+    async def get_properties(self, object_id: str, **params: Any) -> Dict:
+        """Returns the properties of a remote object of the group, the remote
+        objects of the properties join its group, see Runtime.getProperties
+
+        :param object_id: The id of the object
+        :param params: Any other parameters of Runtime.getProperties
+        :return: The result of Runtime.getProperties
+        """
+        params["objectId"] = object_id
+        result = await self.client.send("Runtime.getProperties", params)
+        for descriptor in result.get("result", ()):
+            self.track(descriptor.get("value"))
+            self.track(descriptor.get("get"))
+            self.track(descriptor.get("set"))
+        for descriptor in result.get("internalProperties", ()):
+            self.track(descriptor.get("value"))
+        return result
+
+    async def release_object(self, object_id: str) -> None:
+        """Release a single remote object of the group"""
+        await self.client.send("Runtime.releaseObject", {"objectId": object_id})
+        self.handles.discard(object_id)
+        self._tracker.released_objects += 1
+
+    async def release(self) -> None:
+        """Release every remote object of the group"""
+        if self.released:
+            return
+        # the group stays tracked, with its handles, if the command fails
+        await self.client.send("Runtime.releaseObjectGroup", {"objectGroup": self.name})
+        if self.released:
+            return
+        self.released = True
+        self._tracker.forget(self)
+        self._tracker.released_objects += len(self.handles)
+        self.handles.clear()
+
+    async def __aenter__(self) -> "ObjectGroup":
+        return self
+
+    async def __aexit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
+        await self.release()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(name={self.name}, handles={len(self.handles)}, released={self.released})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
+
+
+class HandleTracker:
+    """Tracks the object groups of a client or session and their outstanding
+    remote objects. Groups kept longer than max_age seconds are considered
+    leaked and are released by the sweeper, see `start_sweeper`.
+
+    Execution contexts being cleared, e.g. by a navigation, releases every
+    remote object, so the handles of all groups are forgotten when it happens.
+    """
+
+    __slots__ = [
+        "_counter",
+        "_prefix",
+        "_sweeper",
+        "client",
+        "groups",
+        "leaked_groups",
+        "leaked_handles",
+        "max_age",
+        "released_groups",
+        "released_objects",
+    ]
+
+    def __init__(
+        self, client: Union["ConnectionType", "SessionType"], max_age: float = 300.0
+    ) -> None:
+        """Construct a new HandleTracker
+
+        :param client: The client or session whose remote objects are tracked
+        :param max_age: The number of seconds after which an unreleased group is considered leaked
+        """
+        self.client: Union["ConnectionType", "SessionType"] = client
+        self.max_age: float = max_age
+        self._prefix: str = f"cripy-{next(_tracker_ids)}"
+        self._counter: Iterator[int] = count(1)
+        self._sweeper: Optional[Task] = None
+        #: The unreleased groups by name
+        self.groups: Dict[str, ObjectGroup] = {}
+        self.released_groups: int = 0
+        self.released_objects: int = 0
+        #: The number of groups, and their handles, released by the sweeper
+        self.leaked_groups: int = 0
+        self.leaked_handles: int = 0
+        client.on("Runtime.executionContextsCleared", self._on_contexts_cleared)
+
+    @property
+    def outstanding(self) -> int:
+        """Returns the number of remote objects not yet released"""
+        return sum(len(group.handles) for group in self.groups.values())
+
+    def group(self, name: Optional[str] = None) -> ObjectGroup:
+        """Create a new object group
+
+        :param name: Optional name of the group, defaults to a unique generated name
+        :return: The new group
+        """
+        if name is None:
+            name = f"{self._prefix}-{next(self._counter)}"
+        group = self.groups.get(name)
+        if group is None or group.released:
+            group = self.groups[name] = ObjectGroup(self, name)
+        return group
+
+    def forget(self, group: ObjectGroup) -> None:
+        """Stop tracking a released group"""
+        if self.groups.get(group.name) is group:
+            del self.groups[group.name]
+            self.released_groups += 1
+
+    async def sweep(self) -> int:
+        """Release the groups older than max_age. A group failing to be
+        released is kept, and retried by the next sweep.
+
+        :return: The number of groups released
+        """
+        deadline = self.client.loop.time() - self.max_age
+        expired = [group for group in self.groups.values() if group.created <= deadline]
+        released = 0
+        for group in expired:
+            handles = len(group.handles)
+            logger.warning(
+                f"Releasing leaked object group {group.name} with {handles} objects"
+            )
+            try:
+                await group.release()
+            except CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Failed to release leaked object group {group.name}")
+                continue
+            released += 1
+            self.leaked_groups += 1
+            self.leaked_handles += handles
+        return released
+
+    async def release_all(self) -> None:
+        """Release every tracked group"""
+        for group in list(self.groups.values()):
+            await group.release()
+
+    def start_sweeper(self, interval: float = 30.0) -> None:
+        """Sweep for leaked groups every interval seconds until stopped"""
+        if self._sweeper is None:
+            self._sweeper = self.client.loop.create_task(self._sweep_loop(interval))
+
+    def stop(self) -> None:
+        """Stop tracking, the sweeper is cancelled and the listener removed.
+        Called when the client or session closes."""
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        self.client.remove_listener(
+            "Runtime.executionContextsCleared", self._on_contexts_cleared
+        )
+
+    async def stop_sweeper(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except CancelledError:
+                pass
+            self._sweeper = None
+
+    async def _sweep_loop(self, interval: float) -> None:
+        while 1:
+            await sleep(interval)
+            try:
+                await self.sweep()
+            except CancelledError:
+                raise
+            except Exception:
+                logger.exception("Failed to sweep object groups")
+
+    def _on_contexts_cleared(self, event: Optional[Dict] = None) -> None:
+        for group in self.groups.values():
+            group.handles.clear()
+
+    def __str__(self) -> str:
+        return f"{self.__class__.__name__}(groups={len(self.groups)}, outstanding={self.outstanding}, leaked={self.leaked_groups})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
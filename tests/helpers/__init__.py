@@ -1,4 +1,5 @@
 from .chrome import launch_chrome
+from .fake_client import FakeClient
 from .utils import (
     Cleaner,
     evaluation_result,
@@ -7,6 +8,7 @@ from .utils import (
 )
 
 __all__ = [
+    "FakeClient",
     "launch_chrome",
     "Cleaner",
     "evaluation_result",
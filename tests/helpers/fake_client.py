@@ -0,0 +1,55 @@
+from asyncio import AbstractEventLoop, ensure_future, get_event_loop
+from inspect import isawaitable
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pyee2 import EventEmitterS
+
+from cripy.cdp_result_future import CDPResultFuture
+from cripy.errors import ProtocolError
+
+__all__ = ["FakeClient"]
+
+Handler = Callable[[Dict], Any]
+
+
+class FakeClient(EventEmitterS):
+    """Stand-in for a Client or TargetSession that answers commands
+    using registered handlers rather than a remote browser"""
+
+    def __init__(self, loop: Optional[AbstractEventLoop] = None) -> None:
+        super().__init__(loop=loop if loop is not None else get_event_loop())
+        self.handlers: Dict[str, Handler] = {}
+        self.sent: List[Tuple[str, Dict]] = []
+
+    @property
+    def loop(self) -> AbstractEventLoop:
+        return self._loop
+
+    def handle(self, method: str, handler: Handler) -> None:
+        self.handlers[method] = handler
+
+    def sent_methods(self, method: str) -> List[Dict]:
+        return [params for m, params in self.sent if m == method]
+
+    def send(self, method: str, params: Optional[Dict] = None) -> CDPResultFuture:
+        if params is None:
+            params = {}
+        self.sent.append((method, params))
+        future = CDPResultFuture(method, loop=self._loop)
+        handler = self.handlers.get(method)
+        try:
+            result = handler(params) if handler is not None else {}
+        except ProtocolError as e:
+            future.set_exception(e)
+            return future
+        if isawaitable(result):
+            ensure_future(self._resolve(future, result), loop=self._loop)
+        else:
+            future.set_result(result)
+        return future
+
+    async def _resolve(self, future: CDPResultFuture, awaitable: Any) -> None:
+        try:
+            future.set_result(await awaitable)
+        except ProtocolError as e:
+            future.set_exception(e)
@@ -0,0 +1,103 @@
+import asyncio
+from typing import Dict
+
+import pytest
+from ujson import dumps
+
+from cripy import EvaluationError
+from cripy.helpers import BatchEvaluator
+from .helpers import FakeClient
+
+
+class TestBatchEvaluator:
+    @pytest.mark.asyncio
+    async def test_single_round_trip_demultiplexed(self):
+        client = FakeClient()
+        client.handle(
+            "Runtime.evaluate",
+            lambda params: {
+                "result": {
+                    "type": "string",
+                    "value": '[[0,"Example"],[0,3],[1,"TypeError: x is undefined"]]',
+                }
+            },
+        )
+        batch = BatchEvaluator(client, context_id=7)
+        title = batch.evaluate("document.title")
+        total = batch.call("(a, b) => a + b", 1, 2)
+        broken = batch.evaluate("x.y")
+        assert batch.pending == 3
+        assert await title == "Example" and await total == 3
+        with pytest.raises(EvaluationError, match="x is undefined"):
+            await broken
+        (params,) = client.sent_methods("Runtime.evaluate")
+        assert params["returnByValue"] and params["awaitPromise"] and params["contextId"] == 7
+        assert "document.title" in params["expression"] and '((a, b) => a + b)(1, 2)' in params["expression"]
+        assert batch.round_trips == 1 and batch.items == 3
+
+    @pytest.mark.asyncio
+    async def test_split_and_fallback(self):
+        client = FakeClient()
+
+        def evaluate(params: Dict) -> Dict:
+            expression = params["expression"]
+            if "let a" in expression and "results" in expression:
+                return {
+                    "result": {"type": "object"},
+                    "exceptionDetails": {"exception": {"className": "SyntaxError"}},
+                }
+            if expression.startswith("let a"):
+                return {
+                    "result": {"type": "object"},
+                    "exceptionDetails": {"exception": {"description": "SyntaxError: bad"}},
+                }
+            if "results" not in expression:
+                return {"result": {"type": "number", "value": int(expression)}}
+            count = expression.count("results[")
+            value = dumps([[0, i] for i in range(count // 2)])
+            return {"result": {"type": "string", "value": value}}
+
+        client.handle("Runtime.evaluate", evaluate)
+        batch = BatchEvaluator(client, max_items=2)
+        assert await batch.evaluate_many(["1", "2", "3"]) == [0, 1, 0]
+        assert batch.round_trips == 2 and batch.batches == 2
+        good = batch.evaluate("1")
+        bad = batch.evaluate("let a = 1")
+        await batch.flush()
+        assert await good == 1
+        with pytest.raises(EvaluationError, match="bad"):
+            await bad
+        assert batch.fallbacks == 1 and batch.round_trips == 5
+        await asyncio.sleep(0)
+        assert batch.pending == 0
+
+    @pytest.mark.asyncio
+    async def test_batch_that_ran_is_not_retried(self):
+        client = FakeClient()
+
+        def evaluate(params: Dict) -> Dict:
+            expression = params["expression"]
+            if "count++" in expression:
+                # the items ran but the result could not be returned
+                return {
+                    "result": {"type": "object"},
+                    "exceptionDetails": {"exception": {"description": "TypeError: tampered"}},
+                }
+            # only the first item reported
+            return {"result": {"type": "string", "value": '[[0,"first"]]'}}
+
+        client.handle("Runtime.evaluate", evaluate)
+        batch = BatchEvaluator(client)
+        items = [batch.evaluate("1"), batch.evaluate("2")]
+        await batch.flush()
+        for item in items:
+            with pytest.raises(EvaluationError, match="malformed"):
+                await item
+        items = [batch.evaluate("count++"), batch.evaluate("3")]
+        await batch.flush()
+        for item in items:
+            with pytest.raises(EvaluationError, match="tampered"):
+                await item
+        assert batch.fallbacks == 0 and batch.round_trips == 2 and batch.items == 4
+        (first, _) = client.sent_methods("Runtime.evaluate")
+        assert "results[1] = ok(await (2\n))" in first["expression"]
@@ -0,0 +1,39 @@
+import asyncio
+from base64 import b64encode
+from typing import Dict
+
+import pytest
+
+from cripy.helpers import BeginFrameController
+from .helpers import FakeClient
+
+
+class TestBeginFrameController:
+    @pytest.mark.asyncio
+    async def test_render_frames_on_demand(self):
+        client = FakeClient()
+        damage = iter([True, True, False, True])
+
+        def begin_frame(params: Dict) -> Dict:
+            result = {"hasDamage": next(damage, False)}
+            if "screenshot" in params and result["hasDamage"]:
+                result["screenshotData"] = b64encode(b"\x89PNG").decode()
+            return result
+
+        client.handle("HeadlessExperimental.beginFrame", begin_frame)
+        frames = await BeginFrameController(client, interval_ms=10, start_ticks=1000).start()
+        client.emit("HeadlessExperimental.needsBeginFramesChanged", {"needsBeginFrames": True})
+        assert frames.needs_begin_frames
+        assert await frames.settle() == 3
+        frame, other = await asyncio.gather(
+            frames.render_frame(screenshot=True),
+            frames.render_frame(screenshot=True, no_display_updates=True),
+        )
+        assert frame.screenshot == b"\x89PNG" and frame.index == 3 and other.screenshot is None
+        sent = client.sent_methods("HeadlessExperimental.beginFrame")
+        assert [params["frameTimeTicks"] for params in sent] == [1000, 1010, 1020, 1030, 1040]
+        assert sent[3]["screenshot"] == {"format": "png"} and sent[4]["noDisplayUpdates"]
+        assert frames.frames == 5 and frames.damaged == 3
+        assert frames.mean_ms >= 0 and frames.max_ms >= frames.mean_ms
+        await frames.stop()
+        assert client.sent_methods("HeadlessExperimental.disable") == [{}]
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from cripy.helpers import BindingChannel
+from .helpers import FakeClient
+
+
+class TestBindingChannel:
+    @pytest.mark.asyncio
+    async def test_batches_and_backpressure(self):
+        client = FakeClient()
+        client.handle("Page.addScriptToEvaluateOnNewDocument", lambda params: {"identifier": "7"})
+        channel = await BindingChannel(client, name="feed", max_count=10, queue_size=4).start()
+        assert client.sent_methods("Runtime.addBinding") == [{"name": "feed"}]
+        (injected,) = client.sent_methods("Page.addScriptToEvaluateOnNewDocument")
+        assert '"feedChannel"' in injected["source"] and "maxCount = 10" in injected["source"]
+        assert 'addEventListener("pagehide", () => flush(true))' in injected["source"]
+        assert client.sent_methods("Runtime.evaluate") == [{"expression": injected["source"]}]
+        client.emit("Runtime.bindingCalled", {"name": "other", "payload": "[0]", "executionContextId": 1})
+        client.emit("Runtime.bindingCalled", {"name": "feed", "payload": '[1,{"a":2}]', "executionContextId": 1})
+        client.emit("Runtime.bindingCalled", {"name": "feed", "payload": '["x",4]', "executionContextId": 1})
+        assert channel.paused and channel.pauses == 1 and channel.batches == 2
+        client.emit("Runtime.bindingCalled", {"name": "feed", "payload": "[5]", "executionContextId": 2})
+        await asyncio.sleep(0)
+        pauses = [params for params in client.sent_methods("Runtime.evaluate") if params["expression"].endswith(".pause()")]
+        assert sorted(params["contextId"] for params in pauses) == [1, 2]
+        assert await channel.get() == 1 and await channel.get() == {"a": 2}
+        assert channel.paused
+        assert await channel.get() == "x"
+        await asyncio.sleep(0)
+        assert not channel.paused
+        resumes = [params for params in client.sent_methods("Runtime.evaluate") if params["expression"].endswith(".resume()")]
+        assert len(resumes) == 2
+        await channel.close()
+        assert [message async for message in channel] == [4, 5]
+        assert client.sent_methods("Page.removeScriptToEvaluateOnNewDocument") == [{"identifier": "7"}]
+        assert channel.messages == 5
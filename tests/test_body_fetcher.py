@@ -0,0 +1,126 @@
+import asyncio
+import io
+from base64 import b64encode
+from pathlib import Path
+
+import pytest
+
+from cripy.errors import ProtocolError
+from cripy.helpers import BodyFetcher, BodySpool
+from .helpers import FakeClient
+
+
+def paused(content_length=None):
+    headers = [{"name": "Content-Type", "value": "video/mp4"}]
+    if content_length is not None:
+        headers.append({"name": "Content-Length", "value": str(content_length)})
+    return {
+        "requestId": "interception-1",
+        "networkId": "1",
+        "responseStatusCode": 200,
+        "responseHeaders": headers,
+    }
+
+
+class TestBodyFetcher:
+    @pytest.mark.asyncio
+    async def test_fetch_decodes_into_path(self, tmp_path: Path):
+        client = FakeClient()
+        body = bytes(range(256)) * 10
+        client.handle(
+            "Network.getResponseBody",
+            lambda params: {"body": b64encode(body).decode(), "base64Encoded": True},
+        )
+        fetcher = BodyFetcher(client, chunk_size=100)
+        path = tmp_path / "body"
+        metrics = await fetcher.fetch("1", str(path))
+        assert path.read_bytes() == body
+        assert metrics.size == len(body)
+        assert metrics.chunks == 26
+        assert not metrics.streamed
+        assert fetcher.bodies == 1 and fetcher.bytes == len(body)
+        await fetcher.close()
+
+    @pytest.mark.asyncio
+    async def test_small_paused_bodies_are_not_streamed(self):
+        client = FakeClient()
+        client.handle(
+            "Fetch.getResponseBody", lambda params: {"body": "abc", "base64Encoded": False}
+        )
+        fetcher = BodyFetcher(client)
+        sink = io.BytesIO()
+        metrics = await fetcher.fetch_paused(paused(3), sink, release="fail")
+        assert sink.getvalue() == b"abc"
+        assert not metrics.streamed
+        assert client.sent_methods("Fetch.continueRequest") == [
+            {"requestId": "interception-1"}
+        ]
+        await fetcher.close()
+
+    @pytest.mark.asyncio
+    async def test_large_paused_bodies_are_streamed(self):
+        client = FakeClient()
+        reads = iter(
+            [
+                {"data": "ab", "base64Encoded": False, "eof": False},
+                {"data": "cd", "base64Encoded": False, "eof": True},
+            ]
+        )
+        client.handle("Fetch.takeResponseBodyAsStream", lambda params: {"stream": "s"})
+        client.handle("IO.read", lambda params: next(reads))
+        fetcher = BodyFetcher(client, stream_threshold=1)
+        spool = BodySpool()
+        metrics = await fetcher.fetch_paused(paused(4), spool, release="fulfill")
+        assert metrics.streamed and metrics.size == 4 and metrics.chunks == 2
+        assert b"".join(spool.chunks()) == b"abcd"
+        fulfilled = client.sent_methods("Fetch.fulfillRequest")[0]
+        assert fulfilled["body"] == "YWJjZA=="
+        assert fulfilled["responseHeaders"] == [{"name": "Content-Type", "value": "video/mp4"}]
+        assert client.sent_methods("IO.close") == [{"handle": "s"}]
+        with pytest.raises(ValueError):
+            await fetcher.fetch_paused(paused(), io.BytesIO(), release="fulfill")
+        await fetcher.close()
+
+    @pytest.mark.asyncio
+    async def test_streamed_bodies_too_large_to_fulfill_are_failed(self):
+        client = FakeClient()
+        reads = iter([{"data": "abcd", "base64Encoded": False, "eof": True}])
+        client.handle("Fetch.takeResponseBodyAsStream", lambda params: {"stream": "s"})
+        client.handle("IO.read", lambda params: next(reads))
+        fetcher = BodyFetcher(client, max_fulfill_size=3)
+        spool = BodySpool()
+        metrics = await fetcher.fetch_paused(paused(), spool, release="fulfill")
+        assert metrics.size == 4 and b"".join(spool.chunks()) == b"abcd"
+        assert client.sent_methods("Fetch.fulfillRequest") == []
+        assert client.sent_methods("Fetch.failRequest") == [
+            {"requestId": "interception-1", "errorReason": "Aborted"}
+        ]
+        await fetcher.close()
+
+    @pytest.mark.asyncio
+    async def test_bounded_concurrency_and_errors(self):
+        client = FakeClient()
+        active = 0
+        max_active = 0
+
+        async def get_body(params):
+            nonlocal active, max_active
+            active += 1
+            max_active = max(max_active, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            if params["requestId"] == "bad":
+                raise ProtocolError("No resource with given identifier found")
+            return {"body": "x", "base64Encoded": False}
+
+        client.handle("Network.getResponseBody", get_body)
+        fetcher = BodyFetcher(client, workers=2)
+        results = await asyncio.gather(
+            *[fetcher.fetch(str(i), io.BytesIO()) for i in range(6)],
+            fetcher.fetch("bad", io.BytesIO()),
+            return_exceptions=True,
+        )
+        assert max_active == 2
+        assert isinstance(results[-1], ProtocolError)
+        assert fetcher.bodies == 6 and fetcher.errors == 1
+        await fetcher.close()
@@ -0,0 +1,79 @@
+import asyncio
+from typing import Dict
+
+import pytest
+
+from cripy.helpers import CoverageAggregator, IntervalSet
+from cripy.helpers.coverage import used_ranges
+from .helpers import FakeClient
+
+
+def function(*ranges) -> Dict:
+    return {
+        "functionName": "",
+        "isBlockCoverage": True,
+        "ranges": [{"startOffset": s, "endOffset": e, "count": c} for s, e, c in ranges],
+    }
+
+
+class TestIntervals:
+    def test_interval_set_union(self):
+        intervals = IntervalSet([(10, 20), (0, 5)])
+        intervals.add([(5, 8), (15, 30), (40, 40), (50, 60)])
+        assert list(intervals) == [(0, 8), (10, 30), (50, 60)]
+        assert intervals.size == 8 + 20 + 10 and len(intervals) == 3
+        intervals.add([(60, 70), (8, 10), (90, 95)])
+        assert list(intervals) == [(0, 30), (50, 70), (90, 95)]
+
+    def test_used_ranges_innermost_count_wins(self):
+        functions = [
+            function((0, 100, 1), (20, 40, 0), (60, 70, 0)),
+            function((25, 35, 2)),
+            function((80, 90, 0)),
+        ]
+        assert used_ranges(functions) == [(0, 20), (25, 35), (40, 60), (70, 80), (90, 100)]
+        assert used_ranges([function((0, 10, 0))]) == []
+
+
+class TestCoverageAggregator:
+    @pytest.mark.asyncio
+    async def test_merges_by_content_hash(self):
+        client = FakeClient()
+        takes = iter(
+            [
+                [{"scriptId": "1", "url": "a.js", "functions": [function((0, 100, 1), (50, 100, 0))]}],
+                [
+                    {"scriptId": "2", "url": "b.js", "functions": [function((0, 100, 1), (0, 50, 0))]},
+                    {"scriptId": "9", "url": "", "functions": [function((0, 5, 1))]},
+                ],
+            ]
+        )
+        client.handle("Profiler.takePreciseCoverage", lambda params: {"result": next(takes, [])})
+        css = iter(
+            [
+                [
+                    {"styleSheetId": "s1", "startOffset": 0, "endOffset": 10, "used": True},
+                    {"styleSheetId": "s1", "startOffset": 10, "endOffset": 20, "used": False},
+                ],
+                [{"styleSheetId": "s1", "startOffset": 30, "endOffset": 40, "used": True}],
+            ]
+        )
+        client.handle("CSS.takeCoverageDelta", lambda params: {"coverage": next(css, [])})
+        client.handle("CSS.getStyleSheetText", lambda params: {"text": "x" * 50})
+        aggregator = await CoverageAggregator(client).start()
+        assert client.sent_methods("Profiler.startPreciseCoverage") == [
+            {"callCount": False, "detailed": True}
+        ]
+        client.emit("Debugger.scriptParsed", {"scriptId": "1", "url": "a.js", "hash": "h", "length": 120})
+        client.emit("Debugger.scriptParsed", {"scriptId": "2", "url": "b.js", "hash": "h", "length": 120})
+        client.emit("CSS.styleSheetAdded", {"header": {"styleSheetId": "s1", "sourceURL": "a.css", "length": 50}})
+        assert await aggregator.poll() == 2
+        aggregator.start_polling(0.001)
+        await asyncio.sleep(0.01)
+        await aggregator.stop()
+        report = {item["type"]: item for item in aggregator.report()}
+        assert report["js"]["used"] == 100 and report["js"]["urls"] == ["a.js", "b.js"]
+        assert report["css"]["used"] == 20 and report["css"]["unused"] == 30
+        assert aggregator.polls >= 2 and len(client.sent_methods("CSS.getStyleSheetText")) == 1
+        assert client.sent_methods("CSS.stopRuleUsageTracking") == [{}]
+        assert client.sent_methods("Debugger.disable") == [{}]
@@ -0,0 +1,47 @@
+from pathlib import Path
+
+import pytest
+
+from cripy.helpers import CPUProfileStore
+
+
+def call_frame(name: str, url: str = "", line: int = -1) -> dict:
+    return {"functionName": name, "scriptId": "1", "url": url, "lineNumber": line, "columnNumber": 0}
+
+
+PROFILE = {
+    "nodes": [
+        {"id": 1, "callFrame": call_frame("(root)"), "children": [2]},
+        {"id": 2, "callFrame": call_frame("main", "a.js", 0), "children": [3]},
+        {"id": 3, "callFrame": call_frame("fib", "a.js", 2), "children": [4]},
+        {"id": 4, "callFrame": call_frame("fib", "a.js", 2)},
+    ],
+    "startTime": 0,
+    "endTime": 40,
+    "samples": [3, 4, 4, 2],
+    "timeDeltas": [0, 10, 10, 10],
+}
+
+
+class TestCPUProfileStore:
+    def test_self_and_total_times(self):
+        store = CPUProfileStore()
+        store.add(PROFILE)
+        assert store.frame_count == 3 and store.stack_count == 4
+        assert store.top(2) == [("fib a.js:3", 30, 30), ("main a.js:1", 10, 40)]
+        assert store.top(1, by="total") == [("(root)", 0, 40)]
+        store.add(PROFILE)
+        assert store.frame_count == 3 and store.profiles == 2 and store.samples == 8
+        assert store.top(1) == [("fib a.js:3", 60, 60)]
+
+    @pytest.mark.asyncio
+    async def test_export_collapsed(self, tmp_path: Path):
+        store = CPUProfileStore()
+        store.add(PROFILE)
+        path = str(tmp_path / "profile.collapsed")
+        assert await store.export_collapsed(path) == 3
+        assert Path(path).read_text().splitlines() == [
+            "(root);main a.js:1 10",
+            "(root);main a.js:1;fib a.js:3 10",
+            "(root);main a.js:1;fib a.js:3;fib a.js:3 20",
+        ]
@@ -0,0 +1,182 @@
+import asyncio
+from typing import Dict, List
+
+import pytest
+
+from cripy.helpers import DOMMirror, MirrorNode
+from cripy.helpers.selectors import SelectorError, compile_selector
+from .helpers import FakeClient
+
+
+def element(node_id: int, name: str, children: List[Dict] = (), **attributes) -> Dict:
+    flat = []
+    for key, value in attributes.items():
+        flat.extend([key.replace("_", "-"), value])
+    return {
+        "nodeId": node_id,
+        "backendNodeId": node_id + 100,
+        "nodeType": 1,
+        "nodeName": name.upper(),
+        "localName": name,
+        "attributes": flat,
+        "childNodeCount": len(children),
+        "children": list(children),
+    }
+
+
+def text(node_id: int, value: str) -> Dict:
+    return {
+        "nodeId": node_id,
+        "backendNodeId": node_id + 100,
+        "nodeType": 3,
+        "nodeName": "#text",
+        "nodeValue": value,
+    }
+
+
+def document() -> Dict:
+    return {
+        "nodeId": 1,
+        "backendNodeId": 101,
+        "nodeType": 9,
+        "nodeName": "#document",
+        "children": [
+            element(
+                2,
+                "html",
+                [
+                    element(
+                        3,
+                        "body",
+                        [
+                            element(
+                                4,
+                                "ul",
+                                [
+                                    element(5, "li", [text(6, "one")], **{"class": "item first"}),
+                                    element(7, "li", [text(8, "two")], **{"class": "item"}),
+                                    element(9, "li", [text(10, "three")], **{"class": "item hidden"}),
+                                ],
+                                id="menu",
+                            ),
+                            element(11, "a", [text(12, "next")], href="https://example.com/next", data_x="a-b"),
+                        ],
+                    )
+                ],
+            )
+        ],
+    }
+
+
+class TestSelectors:
+    @pytest.mark.asyncio
+    async def test_compile_and_match(self):
+        client = FakeClient()
+        client.handle("DOM.getDocument", lambda params: {"root": document()})
+        mirror = await DOMMirror(client).start()
+
+        def ids(selector: str) -> List[int]:
+            return [node.node_id for node in mirror.select(selector)]
+
+        assert ids("li") == [5, 7, 9]
+        assert ids("#menu > li.item:not(.hidden)") == [5, 7]
+        assert ids("body li:first-child, a[href^='https']") == [5, 11]
+        assert ids("li + li") == [7, 9]
+        assert ids("ul ~ a") == [11]
+        assert ids("li:nth-child(odd)") == [5, 9]
+        assert ids("li:nth-last-child(1)") == [9]
+        assert ids("[data-x|=a]") == [11]
+        assert ids('a[href*="example" i]') == [11]
+        assert ids("html > li") == []
+        assert ids("*:root") == [2]
+        assert mirror.select_one("ul li").text == "one"
+        for unsupported in ("li:hover", "li::before", "ul >", "li$", "input:checked", "a:disabled"):
+            with pytest.raises(SelectorError):
+                compile_selector(unsupported)
+
+    def test_case_sensitive_outside_html(self):
+        div = MirrorNode(element(1, "div", dataid="x"))
+        svg = MirrorNode(
+            {"nodeId": 2, "nodeType": 1, "nodeName": "svg", "localName": "svg", "attributes": ["viewBox", "0 0 1 1"]}
+        )
+        gradient = MirrorNode(
+            {"nodeId": 3, "nodeType": 1, "nodeName": "linearGradient", "localName": "linearGradient"}
+        )
+        assert compile_selector("DIV[DATAID]").match(div)
+        assert compile_selector("svg[viewBox]").match(svg)
+        assert not compile_selector("svg[viewbox]").match(svg)
+        assert compile_selector("linearGradient").match(gradient)
+        assert not compile_selector("lineargradient").match(gradient)
+
+
+class TestDOMMirror:
+    @pytest.mark.asyncio
+    async def test_applies_mutations(self):
+        client = FakeClient()
+        client.handle("DOM.getDocument", lambda params: {"root": document()})
+        mirror = await DOMMirror(client).start()
+        assert client.sent_methods("DOM.getDocument") == [{"depth": -1, "pierce": False}]
+        assert mirror.node(5).text == "one" and mirror.by_backend_id(111).node_id == 11
+        client.emit(
+            "DOM.childNodeInserted",
+            {"parentNodeId": 4, "previousNodeId": 5, "node": element(20, "li", [text(21, "new")])},
+        )
+        client.emit("DOM.childNodeRemoved", {"parentNodeId": 4, "nodeId": 9})
+        client.emit("DOM.attributeModified", {"nodeId": 7, "name": "class", "value": "item hidden"})
+        client.emit("DOM.attributeRemoved", {"nodeId": 11, "name": "href"})
+        client.emit("DOM.characterDataModified", {"nodeId": 6, "characterData": "uno"})
+        client.emit("DOM.setChildNodes", {"parentId": 20, "nodes": [text(22, "newer")]})
+        assert [node.node_id for node in mirror.select("li")] == [5, 20, 7]
+        assert mirror.node(9) is None and mirror.node(10) is None and mirror.node(21) is None
+        assert mirror.select("li.hidden")[0].node_id == 7
+        assert mirror.select("a[href]") == []
+        assert mirror.node(4).text == "unonewertwo"
+        assert mirror.updates == 6 and mirror.node(4).child_node_count == 3
+        client.handle("DOM.querySelectorAll", lambda params: {"nodeIds": [20, 7]})
+        found = await mirror.query_selector_all("li:hover")
+        assert [node.node_id for node in found] == [20, 7]
+        assert (await mirror.query_selector("#menu")).node_id == 4
+        assert mirror.remote_queries == 1 and mirror.local_queries == 4
+
+    @pytest.mark.asyncio
+    async def test_document_updated_reloads(self):
+        client = FakeClient()
+        documents = iter([document(), element(1, "html", [element(2, "p")])])
+        client.handle("DOM.getDocument", lambda params: {"root": next(documents)})
+        mirror = await DOMMirror(client).start()
+        client.emit("DOM.documentUpdated", {})
+        assert mirror.document is None and mirror.node(5) is None
+        client.emit("DOM.attributeModified", {"nodeId": 5, "name": "a", "value": "b"})
+        assert [node.node_id for node in await mirror.query_selector_all("p")] == [2]
+        await asyncio.sleep(0)
+        assert mirror.reloads == 2
+        mirror.stop()
+        client.emit("DOM.childNodeRemoved", {"parentNodeId": 1, "nodeId": 2})
+        assert mirror.node(2) is not None
+
+    @pytest.mark.asyncio
+    async def test_document_updated_during_reload(self):
+        client = FakeClient()
+        responses: List[asyncio.Future] = []
+
+        def get_document(params: Dict) -> asyncio.Future:
+            responses.append(client.loop.create_future())
+            return responses[-1]
+
+        client.handle("DOM.getDocument", lambda params: {"root": document()})
+        mirror = await DOMMirror(client).start()
+        client.handle("DOM.getDocument", get_document)
+        stale = asyncio.ensure_future(mirror.reload())
+        await asyncio.sleep(0)
+        client.emit("DOM.documentUpdated", {})
+        ready = asyncio.ensure_future(mirror.ready())
+        await asyncio.sleep(0)
+        assert len(responses) == 2
+        responses[0].set_result({"root": document()})
+        await asyncio.sleep(0)
+        assert not ready.done() and mirror.document is None
+        responses[1].set_result({"root": element(20, "html", [element(21, "p")])})
+        assert (await ready).node_id == 20
+        assert (await stale).node_id == 20
+        assert mirror.document.node_id == 20 and mirror.node(5) is None
+        assert mirror.reloads == 2
@@ -0,0 +1,91 @@
+import pytest
+
+from cripy.helpers import DocumentSnapshot
+from .helpers import FakeClient
+
+STRINGS = [
+    "#document",  # 0
+    "HTML",  # 1
+    "BODY",  # 2
+    "DIV",  # 3
+    "#text",  # 4
+    "hello ",  # 5
+    "A",  # 6
+    "href",  # 7
+    "/next",  # 8
+    "world",  # 9
+    "class",  # 10
+    "hidden",  # 11
+    "block",  # 12
+    "https://example.com/",  # 13
+]
+
+
+def capture_result():
+    # document > html > body > (div > #text, a > #text, div.hidden > #text)
+    return {
+        "strings": STRINGS,
+        "documents": [
+            {
+                "documentURL": 13,
+                "frameId": -1,
+                "nodes": {
+                    "parentIndex": [-1, 0, 1, 2, 3, 2, 5, 2, 7],
+                    "nodeType": [9, 1, 1, 1, 3, 1, 3, 1, 3],
+                    "nodeName": [0, 1, 2, 3, 4, 6, 4, 3, 4],
+                    "nodeValue": [-1, -1, -1, -1, 5, -1, 9, -1, 11],
+                    "backendNodeId": [1, 2, 3, 4, 5, 6, 7, 8, 9],
+                    "attributes": [[], [], [], [], [], [7, 8], [], [10, 11], []],
+                },
+                "layout": {
+                    "nodeIndex": [1, 2, 3, 4, 5, 6],
+                    "bounds": [
+                        [0, 0, 800, 600],
+                        [0, 0, 800, 600],
+                        [0, 0, 800, 20],
+                        [0, 0, 40, 20],
+                        [0, 20, 50, 20],
+                        [0, 20, 50, 20],
+                    ],
+                    "text": [-1, -1, -1, 5, -1, 9],
+                    "styles": [[12], [12], [12], [-1], [-1], [-1]],
+                },
+            }
+        ],
+    }
+
+
+class TestDocumentSnapshot:
+    @pytest.mark.asyncio
+    async def test_capture_and_accessors(self):
+        client = FakeClient()
+        client.handle("DOMSnapshot.captureSnapshot", lambda params: capture_result())
+        (document,) = await DocumentSnapshot.capture(client, ["display"])
+        assert client.sent_methods("DOMSnapshot.captureSnapshot") == [
+            {"computedStyles": ["display"]}
+        ]
+        assert len(document) == 9 and document.document_url == "https://example.com/"
+        assert document.name(5) == "A" and document.value(6) == "world"
+        assert document.attributes(5) == {"href": "/next"}
+        assert document.attribute(5, "href") == "/next"
+        assert document.attribute(3, "href") is None
+        assert document.bounds(5) == (0, 20, 50, 20) and document.bounds(7) is None
+        assert document.style(3, "display") == "block"
+        assert document.style(7, "display") is None
+        assert list(document.children(2)) == [3, 5, 7]
+        assert list(document.children(4)) == []
+        assert document.subtree(5) == range(5, 7)
+
+    def test_queries_and_text(self):
+        result = capture_result()
+        document = DocumentSnapshot(result["documents"][0], result["strings"])
+        assert document.find_by_name("DIV") == [3, 7]
+        assert document.find_by_name("SPAN") == []
+        assert document.find_by_attribute("href") == [5]
+        assert document.find_by_attribute("class", "hidden") == [7]
+        assert document.find_by_attribute("class", "shown") == []
+        assert document.find_in_rect(0, 25, 10, 10) == [1, 2, 5, 6]
+        assert document.find_in_rect(900, 0, 10, 10) == []
+        assert document.text() == "hello worldhidden"
+        assert document.text(5) == "world"
+        assert document.text(rendered=True) == "hello world"
@@ -0,0 +1,100 @@
+import asyncio
+from typing import Dict
+
+import pytest
+
+from cripy import EvaluationError
+from cripy.helpers import ExecutionContextRegistry
+from .helpers import FakeClient
+
+
+def created(context_id: int, frame_id: str, name: str = "", default: bool = True) -> Dict:
+    return {
+        "context": {
+            "id": context_id,
+            "origin": "https://example.com",
+            "name": name,
+            "auxData": {"frameId": frame_id, "isDefault": default},
+        }
+    }
+
+
+class TestExecutionContextRegistry:
+    @pytest.mark.asyncio
+    async def test_lookup_and_isolated_worlds(self):
+        client = FakeClient()
+        client.handle("Page.getFrameTree", lambda params: {"frameTree": {"frame": {"id": "main"}}})
+        next_id = iter(range(10, 20))
+
+        def create_world(params: Dict) -> Dict:
+            context_id = next(next_id)
+            client.emit(
+                "Runtime.executionContextCreated",
+                created(context_id, params["frameId"], params["worldName"], False),
+            )
+            return {"executionContextId": context_id}
+
+        client.handle("Page.createIsolatedWorld", create_world)
+        client.handle(
+            "Runtime.evaluate",
+            lambda params: {"result": {"type": "number", "value": params["contextId"]}},
+        )
+        contexts = await ExecutionContextRegistry(client).start()
+        client.emit("Runtime.executionContextCreated", created(1, "main"))
+        client.emit("Runtime.executionContextCreated", created(2, "child"))
+        assert contexts.get().id == 1 and contexts.get("child").id == 2
+        assert contexts.by_id(2).frame_id == "child" and len(contexts) == 2
+        first, second = await asyncio.gather(
+            contexts.evaluate("1", world="crawler"), contexts.evaluate("2", world="crawler")
+        )
+        assert first == second == 10 and contexts.isolated_worlds_created == 1
+        assert contexts.get(world="crawler").world == "crawler"
+        assert await contexts.evaluate("3", frame_id="child") == 2
+        client.emit("Runtime.executionContextDestroyed", {"executionContextId": 2})
+        assert contexts.get("child") is None
+        client.emit("Runtime.executionContextsCleared", {})
+        assert await contexts.evaluate("4", world="crawler") == 11
+        assert contexts.isolated_worlds_created == 2
+        client.handle(
+            "Runtime.evaluate",
+            lambda params: {
+                "result": {"type": "object"},
+                "exceptionDetails": {"exception": {"description": "ReferenceError: nope"}},
+            },
+        )
+        with pytest.raises(EvaluationError, match="nope"):
+            await contexts.evaluate("nope", world="crawler")
+
+    @pytest.mark.asyncio
+    async def test_wait_for_context(self):
+        client = FakeClient()
+        client.handle("Page.getFrameTree", lambda params: {"frameTree": {"frame": {"id": "main"}}})
+        contexts = await ExecutionContextRegistry(client).start()
+        waiter = asyncio.ensure_future(contexts.wait_for())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        client.emit("Page.frameNavigated", {"frame": {"id": "main2"}})
+        client.emit("Runtime.executionContextCreated", created(5, "main"))
+        client.emit("Runtime.executionContextCreated", created(6, "main2"))
+        assert (await waiter).id == 5
+        assert contexts.main_frame_id == "main2" and contexts.get().id == 6
+        with pytest.raises(asyncio.TimeoutError):
+            await contexts.wait_for("missing", timeout=0.01)
+        contexts.stop()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_caller_does_not_cancel_world_creation(self):
+        client = FakeClient()
+        client.handle("Page.getFrameTree", lambda params: {"frameTree": {"frame": {"id": "main"}}})
+        reply = client.loop.create_future()
+        client.handle("Page.createIsolatedWorld", lambda params: reply)
+        contexts = await ExecutionContextRegistry(client).start()
+        first = asyncio.ensure_future(contexts.isolated_world("crawler"))
+        second = asyncio.ensure_future(contexts.isolated_world("crawler"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        client.emit("Runtime.executionContextCreated", created(10, "main", "crawler", False))
+        reply.set_result({"executionContextId": 10})
+        assert (await second).id == 10
+        assert first.cancelled() and contexts.isolated_worlds_created == 1
@@ -0,0 +1,65 @@
+import io
+import os
+from base64 import b64encode
+from tempfile import TemporaryDirectory
+from typing import Dict
+
+import pytest
+
+from cripy.helpers import DocumentExporter
+from .helpers import FakeClient
+
+PDF = b"%PDF-1.4\n" + bytes(range(256)) * 64
+
+
+class TestDocumentExporter:
+    @pytest.mark.asyncio
+    async def test_print_to_pdf_reads_the_stream(self):
+        client = FakeClient()
+        chunks = iter([PDF[:5000], PDF[5000:]])
+
+        def read(params: Dict) -> Dict:
+            chunk = next(chunks, b"")
+            return {"data": b64encode(chunk).decode(), "base64Encoded": True, "eof": not chunk}
+
+        client.handle("Page.printToPDF", lambda params: {"stream": "pdf1", "data": ""})
+        client.handle("IO.read", read)
+        exporter = DocumentExporter(client, chunk_size=5000)
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "page.pdf")
+            result = await exporter.print_to_pdf(path, printBackground=True)
+            with open(path, "rb") as f:
+                assert f.read() == PDF
+        assert result.streamed and result.path == path and result.length == len(PDF)
+        sent = client.sent_methods("Page.printToPDF")[0]
+        assert sent == {"printBackground": True, "transferMode": "ReturnAsStream"}
+        assert client.sent_methods("IO.read")[0] == {"handle": "pdf1", "size": 5000}
+        assert client.sent_methods("IO.close") == [{"handle": "pdf1"}]
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_decoding_the_result(self):
+        client = FakeClient()
+        mhtml = "MIME-Version: 1.0\r\n\r\n" + "é" * 10000
+        client.handle("Page.printToPDF", lambda params: {"data": b64encode(PDF).decode()})
+        client.handle("Page.captureSnapshot", lambda params: {"data": mhtml})
+        exporter = DocumentExporter(client, stream=False, chunk_size=1000)
+        out = io.BytesIO()
+        result = await exporter.print_to_pdf(out)
+        assert out.getvalue() == PDF and not result.streamed and result.path is None
+        assert client.sent_methods("Page.printToPDF") == [{}]
+        out = io.BytesIO()
+        result = await exporter.capture_mhtml(out)
+        assert out.getvalue() == mhtml.encode("utf-8") and result.format == "mhtml"
+        assert client.sent_methods("Page.captureSnapshot") == [{"format": "mhtml"}]
+        assert exporter.exports == 2
+        assert exporter.total_bytes == len(PDF) + len(mhtml.encode("utf-8"))
+
+    @pytest.mark.asyncio
+    async def test_unopenable_destination_requests_nothing(self):
+        client = FakeClient()
+        client.handle("Page.printToPDF", lambda params: {"stream": "pdf1", "data": ""})
+        exporter = DocumentExporter(client)
+        with TemporaryDirectory() as tmp:
+            with pytest.raises(OSError):
+                await exporter.print_to_pdf(os.path.join(tmp, "missing", "page.pdf"))
+        assert client.sent_methods("Page.printToPDF") == [] and exporter.exports == 0
@@ -0,0 +1,186 @@
+import os
+import struct
+import zlib
+from base64 import b64encode
+from tempfile import TemporaryDirectory
+from typing import Dict, List
+
+import pytest
+
+from cripy.helpers import FullPageScreenshot, PNGStitcher
+from .helpers import FakeClient
+
+BPP = 3
+
+
+def chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def paeth(a: int, b: int, c: int) -> int:
+    p = a + b - c
+    pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    return b if pb <= pc else c
+
+
+def encode_png(rows: List[bytes], kind: int) -> bytes:
+    """Encodes RGB rows with every scanline using the filter type kind"""
+    width = len(rows[0]) // BPP
+    prior = bytes(len(rows[0]))
+    raw = bytearray()
+    for row in rows:
+        out = bytearray([kind])
+        for i, x in enumerate(row):
+            a = row[i - BPP] if i >= BPP else 0
+            b = prior[i]
+            c = prior[i - BPP] if i >= BPP else 0
+            predictor = (0, a, b, (a + b) >> 1, paeth(a, b, c))[kind]
+            out.append((x - predictor) & 0xFF)
+        raw += out
+        prior = row
+    header = struct.pack(">IIBBBBB", width, len(rows), 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(bytes(raw)))
+        + chunk(b"IEND", b"")
+    )
+
+
+def decode_png(data: bytes) -> List[bytes]:
+    width, height = struct.unpack_from(">II", data, 16)
+    offset, idat = 8, b""
+    while offset < len(data):
+        length, kind = struct.unpack_from(">I4s", data, offset)
+        body = data[offset + 8 : offset + 8 + length]
+        assert struct.unpack_from(">I", data, offset + 8 + length)[0] == zlib.crc32(kind + body)
+        if kind == b"IDAT":
+            idat += body
+        offset += length + 12
+    raw = zlib.decompress(idat)
+    size = width * BPP
+    rows, prior = [], bytes(size)
+    for y in range(height):
+        line = raw[y * (size + 1) : (y + 1) * (size + 1)]
+        kind, row = line[0], bytearray(line[1:])
+        for i in range(size):
+            a = row[i - BPP] if i >= BPP else 0
+            b = prior[i]
+            c = prior[i - BPP] if i >= BPP else 0
+            row[i] = (row[i] + (0, a, b, (a + b) >> 1, paeth(a, b, c))[kind]) & 0xFF
+        rows.append(bytes(row))
+        prior = row
+    return rows
+
+
+def page_rows(height: int, width: int = 5) -> List[bytes]:
+    return [
+        bytes((x * 31 + y * 17 + c * 7) % 256 for x in range(width) for c in range(BPP))
+        for y in range(height)
+    ]
+
+
+class TestPNGStitcher:
+    def test_stitches_tiles_of_every_filter_type(self):
+        rows = page_rows(10)
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "page.png")
+            with open(path, "wb") as out:
+                with PNGStitcher(out) as stitcher:
+                    for kind, start in enumerate(range(0, 10, 2)):
+                        stitcher.append(encode_png(rows[start : start + 2], kind))
+            with open(path, "rb") as f:
+                data = f.read()
+        assert (stitcher.width, stitcher.height, stitcher.tiles) == (5, 10, 5)
+        assert decode_png(data) == rows
+
+    def test_rejects_mismatched_tiles(self):
+        with TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "page.png"), "wb") as out:
+                stitcher = PNGStitcher(out)
+                stitcher.append(encode_png(page_rows(2), 0))
+                with pytest.raises(ValueError):
+                    stitcher.append(encode_png(page_rows(2, width=4), 0))
+
+
+class TestFullPageScreenshot:
+    @pytest.mark.asyncio
+    async def test_capture_stitches_tiles_in_order(self):
+        client = FakeClient()
+        rows = page_rows(11)
+
+        def capture(params: Dict) -> Dict:
+            clip = params["clip"]
+            tile = rows[clip["y"] : clip["y"] + clip["height"]]
+            return {"data": b64encode(encode_png(tile, clip["y"] % 5)).decode()}
+
+        client.handle(
+            "Page.getLayoutMetrics",
+            lambda params: {"contentSize": {"x": 0, "y": 0, "width": 5, "height": 10.5}},
+        )
+        client.handle("Page.captureScreenshot", capture)
+        screenshot = FullPageScreenshot(client, tile_height=3, concurrency=2)
+        with TemporaryDirectory() as tmp:
+            path = await screenshot.capture(os.path.join(tmp, "page.png"))
+            with open(path, "rb") as f:
+                assert decode_png(f.read()) == rows
+        clips = [params["clip"] for params in client.sent_methods("Page.captureScreenshot")]
+        assert [(clip["y"], clip["height"]) for clip in clips] == [(0, 3), (3, 3), (6, 3), (9, 2)]
+        assert (screenshot.width, screenshot.height, screenshot.tiles) == (5, 11, 4)
+        assert all(params["captureBeyondViewport"] for params in client.sent_methods("Page.captureScreenshot"))
+        assert client.sent_methods("Emulation.setDeviceMetricsOverride")[0]["height"] == 3
+        assert len(client.sent_methods("Emulation.clearDeviceMetricsOverride")) == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_capture_removes_the_partial_png(self):
+        client = FakeClient()
+        rows = page_rows(6)
+
+        def capture(params: Dict) -> Dict:
+            clip = params["clip"]
+            if clip["y"]:
+                return {"data": b64encode(encode_png(page_rows(3, width=4), 0)).decode()}
+            return {"data": b64encode(encode_png(rows[:3], 0)).decode()}
+
+        client.handle(
+            "Page.getLayoutMetrics",
+            lambda params: {"contentSize": {"x": 0, "y": 0, "width": 5, "height": 6}},
+        )
+        client.handle("Page.captureScreenshot", capture)
+        screenshot = FullPageScreenshot(client, tile_height=3)
+        with TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "page.png")
+            with pytest.raises(ValueError):
+                await screenshot.capture(path)
+            assert not os.path.exists(path)
+        assert len(client.sent_methods("Emulation.clearDeviceMetricsOverride")) == 1
+
+    @pytest.mark.asyncio
+    async def test_capture_tiles(self):
+        client = FakeClient()
+        client.handle(
+            "Page.getLayoutMetrics",
+            lambda params: {"contentSize": {"x": 0, "y": 0, "width": 800, "height": 5000}},
+        )
+        client.handle(
+            "Page.captureScreenshot",
+            lambda params: {"data": b64encode(str(params["clip"]["y"]).encode()).decode()},
+        )
+        screenshot = FullPageScreenshot(client, tile_height=2048, resize_viewport=False)
+        with TemporaryDirectory() as tmp:
+            paths = await screenshot.capture_tiles(tmp, quality=80)
+            contents = []
+            for path in paths:
+                with open(path, "rb") as f:
+                    contents.append(f.read())
+        assert [os.path.basename(path) for path in paths] == [
+            "tile-00000.jpg",
+            "tile-00001.jpg",
+            "tile-00002.jpg",
+        ]
+        assert contents == [b"0", b"2048", b"4096"]
+        sent = client.sent_methods("Page.captureScreenshot")
+        assert sent[0]["format"] == "jpeg" and sent[0]["quality"] == 80
+        assert client.sent_methods("Emulation.setDeviceMetricsOverride") == []
@@ -0,0 +1,105 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from cripy.helpers import HARExporter
+from .helpers import FakeClient
+
+TIMING = {
+    "requestTime": 10.0,
+    "proxyStart": -1,
+    "proxyEnd": -1,
+    "dnsStart": 1.0,
+    "dnsEnd": 3.0,
+    "connectStart": 3.0,
+    "connectEnd": 10.0,
+    "sslStart": 5.0,
+    "sslEnd": 10.0,
+    "workerStart": -1,
+    "workerReady": -1,
+    "sendStart": 10.0,
+    "sendEnd": 11.0,
+    "pushStart": 0,
+    "pushEnd": 0,
+    "receiveHeadersEnd": 20.0,
+}
+
+
+def emit_exchange(client: FakeClient, request_id: str, url: str, loader_id: str):
+    client.emit(
+        "Network.requestWillBeSent",
+        {
+            "requestId": request_id,
+            "loaderId": loader_id,
+            "frameId": "F1",
+            "request": {"url": url, "method": "GET", "headers": {}},
+            "timestamp": 10.0,
+            "wallTime": 1546300800.5,
+            "type": "Document",
+        },
+    )
+    client.emit(
+        "Network.responseReceived",
+        {
+            "requestId": request_id,
+            "timestamp": 10.02,
+            "response": {
+                "url": url,
+                "status": 200,
+                "statusText": "OK",
+                "protocol": "h2",
+                "headers": {"content-type": "text/html"},
+                "mimeType": "text/html",
+                "timing": TIMING,
+            },
+        },
+    )
+    client.emit(
+        "Network.dataReceived",
+        {"requestId": request_id, "timestamp": 10.03, "dataLength": 100},
+    )
+    client.emit(
+        "Network.loadingFinished",
+        {"requestId": request_id, "timestamp": 10.05, "encodedDataLength": 80},
+    )
+
+
+class TestHARExporter:
+    @pytest.mark.asyncio
+    async def test_streams_entries(self, tmp_path: Path):
+        client = FakeClient()
+        path = tmp_path / "out.har"
+        async with HARExporter(client, str(path)) as exporter:
+            emit_exchange(client, "W1", "https://example.com/worker.js", "")
+            emit_exchange(client, "L1", "https://example.com/?a=1&b=", "L1")
+            emit_exchange(client, "2", "https://example.com/app.js", "L1")
+            client.emit("Page.loadEventFired", {"timestamp": 11.0})
+            assert exporter.entries_written == 3
+        assert exporter.errors == 0
+        har = json.loads(path.read_text())["log"]
+        assert har["version"] == "1.2"
+        assert len(har["entries"]) == 3
+        # the worker's request belongs to no page of the log
+        assert "pageref" not in har["entries"].pop(0)
+        assert har["entries"][1]["pageref"] == "L1"
+        entry = har["entries"][0]
+        assert entry["startedDateTime"] == "2019-01-01T00:00:00.500Z"
+        assert entry["pageref"] == "L1"
+        assert entry["request"]["queryString"] == [
+            {"name": "a", "value": "1"},
+            {"name": "b", "value": ""},
+        ]
+        assert entry["response"]["httpVersion"] == "HTTP/2.0"
+        assert entry["response"]["content"]["size"] == 100
+        timings = entry["timings"]
+        assert timings["blocked"] == 1.0
+        assert timings["dns"] == 2.0
+        assert timings["connect"] == 7.0
+        assert timings["ssl"] == 5.0
+        assert timings["send"] == 1.0
+        assert timings["wait"] == 9.0
+        assert timings["receive"] == pytest.approx(30.0)
+        assert entry["time"] == pytest.approx(50.0)
+        assert har["pages"][0]["id"] == "L1"
+        assert har["pages"][0]["pageTimings"]["onLoad"] == pytest.approx(1000.0)
@@ -0,0 +1,116 @@
+import json
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+from cripy.helpers import HeapSnapshotParser, HeapSnapshotRecorder
+from cripy.helpers.heap_snapshot import parse_heap_snapshot
+from .helpers import FakeClient
+
+NODE_FIELDS = ["type", "name", "id", "self_size", "edge_count", "trace_node_id", "detachedness"]
+EDGE_FIELDS = ["type", "name_or_index", "to_node"]
+NODE_TYPES = ["hidden", "array", "string", "object", "code", "closure", "regexp", "number", "native", "synthetic"]
+EDGE_TYPES = ["context", "element", "property", "internal", "hidden", "shortcut", "weak"]
+
+# root -> A(Foo) -> B(Foo), root -> C(Bar) -> B, A -> D(Baz), C -weak-> D
+NODES = [
+    (9, 0, 1, 0, 2),
+    (3, 1, 3, 10, 2),
+    (3, 1, 5, 20, 0),
+    (3, 2, 7, 5, 2),
+    (3, 3, 9, 7, 0),
+]
+EDGES = [
+    (2, 5, 1), (2, 5, 3),
+    (2, 5, 2), (2, 5, 4),
+    (2, 5, 2), (6, 5, 4),
+]
+
+
+def snapshot_json() -> str:
+    nodes = [v for node in NODES for v in (*node, 0, 0)]
+    edges = [v for t, name, to in EDGES for v in (t, name, to * len(NODE_FIELDS))]
+    return json.dumps(
+        {
+            "snapshot": {
+                "meta": {
+                    "node_fields": NODE_FIELDS,
+                    "node_types": [NODE_TYPES] + ["string"] + ["number"] * 5,
+                    "edge_fields": EDGE_FIELDS,
+                    "edge_types": [EDGE_TYPES, "string_or_number", "node"],
+                },
+                "node_count": len(NODES),
+                "edge_count": len(EDGES),
+                "trace_function_count": 0,
+            },
+            "nodes": nodes,
+            "edges": edges,
+            "trace_function_infos": [],
+            "trace_tree": [[1, [2, "x]"]]],
+            "samples": [],
+            "locations": [],
+            "strings": ["(root)", "Foo", "Bar", "Baz", "ref", 'esc"aped\\ ✓'],
+        },
+        ensure_ascii=False,
+    )
+
+
+class TestHeapSnapshotParser:
+    @pytest.mark.parametrize("size", [1, 5, 13, 100000])
+    def test_parses_in_chunks(self, size: int):
+        data = snapshot_json().encode()
+        parser = HeapSnapshotParser()
+        for i in range(0, len(data), size):
+            parser.feed(data[i : i + size])
+        snapshot = parser.close()
+        assert snapshot.node_count == 5 and snapshot.edge_count == 6
+        assert snapshot.meta["node_count"] == 5
+        assert snapshot.strings[-1] == 'esc"aped\\ ✓'
+        assert snapshot.node_column("self_size").tolist() == [0, 10, 20, 5, 7]
+        assert snapshot.arrays["samples"].tolist() == []
+
+    def test_retained_sizes_and_top_constructors(self):
+        parser = HeapSnapshotParser()
+        parser.feed(snapshot_json())
+        snapshot = parser.close()
+        assert snapshot.dominators().tolist() == [0, 0, 0, 0, 1]
+        assert snapshot.retained_sizes().tolist() == [42, 17, 20, 5, 7]
+        assert snapshot.class_name(0) == "(synthetic)"
+        assert snapshot.top_constructors(3) == [
+            ("(synthetic)", 1, 0, 42),
+            ("Foo", 2, 30, 37),
+            ("Baz", 1, 7, 7),
+        ]
+
+    def test_truncated(self):
+        parser = HeapSnapshotParser()
+        parser.feed(snapshot_json()[:-20])
+        with pytest.raises(ValueError):
+            parser.close()
+
+
+class TestHeapSnapshotRecorder:
+    @pytest.mark.asyncio
+    async def test_writes_chunks_to_file(self, tmp_path: Path):
+        client = FakeClient()
+        data = snapshot_json()
+        progress = []
+
+        def take(params: Dict) -> Dict:
+            for i in range(0, len(data), 50):
+                client.emit("HeapProfiler.addHeapSnapshotChunk", {"chunk": data[i : i + 50]})
+                client.emit(
+                    "HeapProfiler.reportHeapSnapshotProgress",
+                    {"done": i + 50, "total": len(data)},
+                )
+            return {}
+
+        client.handle("HeapProfiler.takeHeapSnapshot", take)
+        recorder = HeapSnapshotRecorder(client, lambda done, total: progress.append(done))
+        path = str(tmp_path / "heap.heapsnapshot")
+        written = await recorder.take(path)
+        assert written == len(data.encode()) == Path(path).stat().st_size
+        assert recorder.chunks == len(progress) and recorder.total == len(data)
+        assert client.sent_methods("HeapProfiler.takeHeapSnapshot") == [{"reportProgress": True}]
+        assert parse_heap_snapshot(path, chunk_size=7).node_count == 5
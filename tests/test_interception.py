@@ -0,0 +1,124 @@
+import asyncio
+from typing import Dict
+
+import pytest
+
+from cripy.helpers import Decision, InterceptionEngine, Rule
+from cripy.helpers.interception import RuleIndex, compile_glob
+from .helpers import FakeClient
+
+
+def paused(request_id: str, url: str, method: str = "GET", resource_type: str = "Script", **kwargs) -> Dict:
+    event = {
+        "requestId": request_id,
+        "request": {"url": url, "method": method, "headers": {}},
+        "frameId": "F1",
+        "resourceType": resource_type,
+    }
+    event.update(kwargs)
+    return event
+
+
+class TestRuleIndex:
+    def test_compile_glob(self):
+        assert compile_glob("https://*.example.com/a?c").match("https://x.example.com/abc")
+        assert not compile_glob("https://example.com/a").match("https://example.com/ab")
+        assert compile_glob(r"https://example.com/\*").match("https://example.com/*")
+
+    def test_host_trie_and_precedence(self):
+        exact = Rule("https://example.com/static/*")
+        sub = Rule("*://*.example.com/*", decision=Decision.fail())
+        generic = Rule(regex=r".*\.png$", decision=Decision.fail())
+        other = Rule("https://other.org/*")
+        index = RuleIndex([exact, sub, generic, other])
+        assert exact.path_prefix == "/static/"
+        assert index.candidates("example.com") == [exact, generic]
+        assert index.candidates("cdn.example.com") == [sub, generic]
+        assert index.candidates("nope.net") == [generic]
+        match = index.match
+        assert match("https://example.com/static/a.png", "GET", "Image", "Request") is exact
+        assert match("https://example.com/a.png", "GET", "Image", "Request") is generic
+        assert match("http://a.b.example.com/x", "GET", "Image", "Request") is sub
+        assert match("https://example.com/x", "GET", "Image", "Request") is None
+        assert match("https://example.com/static/x", "GET", "Image", "Response") is None
+
+    def test_methods_and_resource_types(self):
+        rule = Rule("*", methods=["post"], resource_types=["XHR"])
+        index = RuleIndex([rule])
+        assert index.match("https://a.com/", "POST", "XHR", "Request") is rule
+        assert index.match("https://a.com/", "GET", "XHR", "Request") is None
+        assert index.match("https://a.com/", "POST", "Script", "Request") is None
+
+
+class TestInterceptionEngine:
+    @pytest.mark.asyncio
+    async def test_static_decisions(self):
+        client = FakeClient()
+        ads = Rule("*://*.ads.com/*", decision=Decision.fail())
+        engine = InterceptionEngine(client, [ads])
+        await engine.enable()
+        assert client.sent_methods("Fetch.enable") == [
+            {"patterns": [{"urlPattern": "*://*.ads.com/*", "requestStage": "Request"}]}
+        ]
+        client.emit("Fetch.requestPaused", paused("1", "https://x.ads.com/a.js"))
+        client.emit("Fetch.requestPaused", paused("2", "https://example.com/a.js"))
+        await asyncio.sleep(0)
+        assert client.sent_methods("Fetch.failRequest") == [
+            {"errorReason": "BlockedByClient", "requestId": "1"}
+        ]
+        assert client.sent_methods("Fetch.continueRequest") == [{"requestId": "2"}]
+        assert ads.hits == 1 and engine.unmatched == 1
+        assert engine.stats["fail"].count == 1
+        assert engine.stats["continue"].count == 1
+        await engine.disable()
+
+    @pytest.mark.asyncio
+    async def test_handlers_run_on_pool(self):
+        client = FakeClient()
+        active = 0
+        max_active = 0
+
+        async def handler(event: Dict):
+            nonlocal active, max_active
+            active += 1
+            max_active = max(max_active, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            if event["requestId"] == "0":
+                return None
+            return Decision.fulfill(204)
+
+        rule = Rule("https://api.com/*", handler=handler)
+        engine = InterceptionEngine(
+            client, [rule], default=Decision.fail("Aborted"), workers=2
+        )
+        await engine.enable()
+        assert client.sent_methods("Fetch.enable")[0]["patterns"] == [
+            {"urlPattern": "*", "requestStage": "Request"}
+        ]
+        for i in range(5):
+            client.emit("Fetch.requestPaused", paused(str(i), f"https://api.com/{i}"))
+        await engine.disable()
+        await asyncio.sleep(0)
+        assert max_active == 2
+        assert rule.hits == 5
+        assert len(client.sent_methods("Fetch.fulfillRequest")) == 4
+        assert client.sent_methods("Fetch.continueRequest") == [{"requestId": "0"}]
+        assert engine.stats["fulfill"].count == 4
+
+    @pytest.mark.asyncio
+    async def test_overflow_uses_rule_decision(self):
+        client = FakeClient()
+
+        async def handler(event: Dict):
+            return Decision.fulfill(200)
+
+        rule = Rule("*", handler=handler, decision=Decision.fail())
+        engine = InterceptionEngine(client, [rule], workers=1, queue_size=1)
+        await engine.enable()
+        for i in range(3):
+            client.emit("Fetch.requestPaused", paused(str(i), f"https://a.com/{i}"))
+        assert engine.overflowed == 2
+        assert len(client.sent_methods("Fetch.failRequest")) == 2
+        await engine.disable()
+        assert len(client.sent_methods("Fetch.fulfillRequest")) == 1
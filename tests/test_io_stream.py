@@ -0,0 +1,77 @@
+from base64 import b64encode
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from cripy.helpers import IOStream
+from .helpers import FakeClient
+
+
+def stream_client(chunks: List[bytes]) -> FakeClient:
+    client = FakeClient()
+    reads = iter(chunks)
+
+    def read(params: Dict) -> Dict:
+        chunk = next(reads)
+        return {
+            "data": b64encode(chunk).decode(),
+            "base64Encoded": True,
+            "eof": chunk == chunks[-1],
+        }
+
+    client.handle("IO.read", read)
+    return client
+
+
+class TestIOStream:
+    @pytest.mark.asyncio
+    async def test_read_spans_chunks(self):
+        client = stream_client([b"abc", b"def", b"g"])
+        stream = IOStream(client, "h1", chunk_size=3)
+        assert await stream.read(2) == b"ab"
+        assert await stream.read(3) == b"cde"
+        assert await stream.read() == b"fg"
+        assert await stream.read(1) == b""
+        assert stream.closed
+        assert client.sent_methods("IO.close") == [{"handle": "h1"}]
+        assert stream.bytes_read == 7 and stream.chunks_read == 3
+
+    @pytest.mark.asyncio
+    async def test_prefetches_next_chunk(self):
+        client = stream_client([b"abc", b"def"])
+        stream = IOStream(client, "h1", chunk_size=3)
+        assert await stream.read(1) == b"a"
+        assert len(client.sent_methods("IO.read")) == 2
+        assert client.sent_methods("IO.read")[0] == {"handle": "h1", "size": 3}
+
+    @pytest.mark.asyncio
+    async def test_readinto(self):
+        client = stream_client([b"abc", b"def"])
+        buffer = bytearray(4)
+        async with IOStream(client, "h1") as stream:
+            assert await stream.readinto(buffer) == 4
+            assert buffer == b"abcd"
+            assert await stream.readinto(buffer) == 2
+            assert buffer[:2] == b"ef"
+        assert client.sent_methods("IO.close") == [{"handle": "h1"}]
+
+    @pytest.mark.asyncio
+    async def test_iteration_and_copy_to(self, tmp_path: Path):
+        chunks = [b"abc", b"def", b"gh"]
+        async with IOStream(stream_client(chunks), "h1") as stream:
+            assert [chunk async for chunk in stream] == chunks
+        path = tmp_path / "copy"
+        stream = IOStream(stream_client(chunks), "h2")
+        assert await stream.copy_to(str(path)) == 8
+        assert path.read_bytes() == b"abcdefgh"
+        assert stream.closed
+
+    @pytest.mark.asyncio
+    async def test_close_early(self):
+        client = stream_client([b"abc", b"def", b"ghi"])
+        async with IOStream(client, "h1") as stream:
+            await stream.read(1)
+        assert stream.closed
+        assert await stream.read() == b""
+        assert len(client.sent_methods("IO.read")) == 2
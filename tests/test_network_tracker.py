@@ -0,0 +1,122 @@
+from typing import Dict, List
+
+import pytest
+
+from cripy.helpers import NetworkTracker, RequestRecord
+from .helpers import FakeClient
+
+
+def will_be_sent(request_id: str, url: str, frame_id: str = "F1", **kwargs) -> Dict:
+    event = {
+        "requestId": request_id,
+        "loaderId": "L1",
+        "frameId": frame_id,
+        "documentURL": url,
+        "request": {"url": url, "method": "GET", "headers": {}},
+        "timestamp": 1.0,
+        "wallTime": 1000.0,
+        "type": "Document",
+    }
+    event.update(kwargs)
+    return event
+
+
+class TestNetworkTracker:
+    @pytest.mark.asyncio
+    async def test_tracks_request_lifecycle(self):
+        client = FakeClient()
+        tracker = NetworkTracker(client).start()
+        finalized: List[RequestRecord] = []
+        tracker.on_finalize(finalized.append)
+        client.emit("Network.requestWillBeSent", will_be_sent("1", "http://a.com/"))
+        assert tracker.inflight == 1
+        client.emit(
+            "Network.responseReceived",
+            {
+                "requestId": "1",
+                "timestamp": 1.5,
+                "type": "Document",
+                "response": {"url": "http://a.com/", "status": 200},
+            },
+        )
+        client.emit(
+            "Network.dataReceived",
+            {"requestId": "1", "timestamp": 1.6, "dataLength": 10},
+        )
+        client.emit(
+            "Network.loadingFinished",
+            {"requestId": "1", "timestamp": 2.0, "encodedDataLength": 120},
+        )
+        record = tracker.get("1")
+        assert record.status == 200
+        assert record.data_length == 10
+        assert record.encoded_data_length == 120
+        assert record.finished
+        assert tracker.inflight == 0
+        assert finalized == [record]
+        assert tracker.by_frame("F1") == [record]
+        assert tracker.by_url("http://a.com/") == [record]
+
+    @pytest.mark.asyncio
+    async def test_redirect_chain(self):
+        client = FakeClient()
+        tracker = NetworkTracker(client).start()
+        finalized: List[RequestRecord] = []
+        tracker.on_finalize(finalized.append)
+        client.emit("Network.requestWillBeSent", will_be_sent("1", "http://a.com/"))
+        client.emit(
+            "Network.requestWillBeSent",
+            will_be_sent(
+                "1", "https://a.com/", redirectResponse={"status": 301, "url": "http://a.com/"}
+            ),
+        )
+        client.emit(
+            "Network.loadingFailed",
+            {"requestId": "1", "timestamp": 3.0, "errorText": "net::ERR_ABORTED"},
+        )
+        record = tracker.get("1")
+        assert record.url == "https://a.com/"
+        assert record.failed
+        assert [hop.status for hop in record.redirect_chain] == [301]
+        assert len(finalized) == 2
+        assert tracker.inflight == 0
+        assert tracker.by_url("http://a.com/")[0].status == 301
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        client = FakeClient()
+        tracker = NetworkTracker(client, max_records=2).start()
+        for rid in ("1", "2", "3"):
+            client.emit(
+                "Network.requestWillBeSent", will_be_sent(rid, f"http://a.com/{rid}")
+            )
+        assert len(tracker) == 2
+        assert "1" not in tracker
+        assert tracker.by_url("http://a.com/1") == []
+        assert tracker.evicted == 1
+        assert tracker.inflight == 2
+
+    @pytest.mark.asyncio
+    async def test_restarted_request_replaces_its_record(self):
+        client = FakeClient()
+        tracker = NetworkTracker(client).start()
+        client.emit("Network.requestWillBeSent", will_be_sent("1", "http://a.com/"))
+        client.emit("Network.requestWillBeSent", will_be_sent("1", "http://b.com/"))
+        assert tracker.inflight == 1
+        assert tracker.by_url("http://a.com/") == []
+        assert tracker.by_url("http://b.com/") == tracker.by_frame("F1") == [tracker.get("1")]
+        assert tracker.get("1").redirected_from is None
+
+    @pytest.mark.asyncio
+    async def test_drop_finished_and_stop(self):
+        client = FakeClient()
+        tracker = NetworkTracker(client, retain_finished=False).start()
+        client.emit("Network.requestWillBeSent", will_be_sent("1", "http://a.com/"))
+        client.emit(
+            "Network.loadingFinished", {"requestId": "1", "timestamp": 2.0}
+        )
+        assert len(tracker) == 0
+        assert tracker.by_frame("F1") == []
+        tracker.stop()
+        client.emit("Network.requestWillBeSent", will_be_sent("2", "http://a.com/"))
+        assert len(tracker) == 0
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from cripy import Connection
+from cripy.errors import ProtocolError
+from cripy.object_group import HandleTracker
+from .helpers import FakeClient
+
+
+class TestObjectGroups:
+    @pytest.mark.asyncio
+    async def test_group_releases_in_bulk(self):
+        client = FakeClient()
+        client.handle("Runtime.evaluate", lambda params: {"result": {"type": "object", "objectId": "1"}})
+        client.handle("DOM.resolveNode", lambda params: {"object": {"type": "object", "objectId": "2"}})
+        client.handle(
+            "Runtime.getProperties",
+            lambda params: {
+                "result": [
+                    {"name": "a", "value": {"type": "object", "objectId": "3"}},
+                    {"name": "b", "value": {"type": "number", "value": 1}},
+                ]
+            },
+        )
+        tracker = HandleTracker(client)
+        async with tracker.group() as group:
+            await group.evaluate("document.body", returnByValue=False)
+            await group.resolve_node(backend_node_id=12)
+            await group.get_properties("1", ownProperties=True)
+            assert group.handles == {"1", "2", "3"} and tracker.outstanding == 3
+            await group.release_object("3")
+        other = tracker.group()
+        assert group.name != other.name and group.name.startswith("cripy-")
+        assert client.sent_methods("Runtime.evaluate")[0]["objectGroup"] == group.name
+        assert client.sent_methods("DOM.resolveNode") == [{"objectGroup": group.name, "backendNodeId": 12}]
+        assert client.sent_methods("Runtime.releaseObjectGroup") == [{"objectGroup": group.name}]
+        assert tracker.released_objects == 3 and tracker.released_groups == 1
+        assert list(tracker.groups) == [other.name] and group.released
+
+    @pytest.mark.asyncio
+    async def test_sweeper_releases_leaked_groups(self):
+        client = FakeClient()
+        client.handle("Runtime.evaluate", lambda params: {"result": {"type": "object", "objectId": "9"}})
+        tracker = HandleTracker(client, max_age=0)
+        leaked = tracker.group("leaky")
+        await leaked.evaluate("window")
+        cleared = tracker.group()
+        await cleared.evaluate("window")
+        client.emit("Runtime.executionContextsCleared", {})
+        assert tracker.outstanding == 0
+        await cleared.evaluate("window")
+        tracker.start_sweeper(0.001)
+        await asyncio.sleep(0.01)
+        await tracker.stop_sweeper()
+        assert tracker.leaked_groups == 2 and tracker.leaked_handles == 1
+        assert tracker.groups == {}
+
+    @pytest.mark.asyncio
+    async def test_sweep_continues_past_failed_releases(self):
+        client = FakeClient()
+        client.handle("Runtime.evaluate", lambda params: {"result": {"type": "object", "objectId": "1"}})
+
+        def release(params):
+            if params["objectGroup"] == "stuck":
+                raise ProtocolError("Cannot find context with specified id")
+            return {}
+
+        client.handle("Runtime.releaseObjectGroup", release)
+        tracker = HandleTracker(client, max_age=0)
+        await tracker.group("stuck").evaluate("window")
+        await tracker.group("leaky").evaluate("window")
+        assert await tracker.sweep() == 1
+        assert await tracker.sweep() == 0
+        assert tracker.leaked_groups == 1 and tracker.leaked_handles == 1
+        assert list(tracker.groups) == ["stuck"]
+
+    @pytest.mark.asyncio
+    async def test_connection_object_group(self):
+        connection = Connection(loop=asyncio.get_event_loop())
+        group = connection.object_group("mine")
+        assert connection.handles.groups == {"mine": group}
+        assert connection.object_group("mine") is group
+
+    @pytest.mark.asyncio
+    async def test_failed_release_keeps_group_and_stop(self):
+        client = FakeClient()
+        client.handle("Runtime.evaluate", lambda params: {"result": {"type": "object", "objectId": "1"}})
+
+        def fail(params):
+            raise ProtocolError("Cannot find context with specified id")
+
+        client.handle("Runtime.releaseObjectGroup", fail)
+        tracker = HandleTracker(client)
+        group = tracker.group()
+        await group.evaluate("window")
+        with pytest.raises(ProtocolError):
+            await group.release()
+        assert not group.released and tracker.outstanding == 1
+        assert tracker.groups == {group.name: group} and tracker.released_objects == 0
+        client.handle("Runtime.releaseObjectGroup", lambda params: {})
+        await group.release()
+        assert group.released and tracker.released_objects == 1 and tracker.groups == {}
+        tracker.start_sweeper()
+        tracker.stop()
+        assert client.listeners("Runtime.executionContextsCleared") == []
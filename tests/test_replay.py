@@ -0,0 +1,164 @@
+import asyncio
+import gzip
+from base64 import b64decode, b64encode
+from pathlib import Path
+
+import pytest
+
+from cripy.helpers import (
+    CDXIndex,
+    CDXWriter,
+    InterceptionEngine,
+    NetworkTracker,
+    WARCArchiver,
+    WARCReplayer,
+    WARCWriter,
+)
+from cripy.helpers.replay import dechunk, read_response, surt
+from .helpers import FakeClient
+from .test_warc import emit_exchange
+
+
+async def write_warc(path: str, urls, cdx: CDXWriter = None) -> None:
+    client = FakeClient()
+    client.handle(
+        "Network.getResponseBody",
+        lambda params: {
+            "body": b64encode(params["requestId"].encode() * 5000).decode(),
+            "base64Encoded": True,
+        },
+    )
+    async with WARCWriter(path, info={"isPartOf": "test"}) as writer:
+        if cdx is not None:
+            cdx.attach(writer)
+        tracker = NetworkTracker(client).start()
+        archiver = WARCArchiver(client, writer, tracker=tracker, chunk_size=1000).start()
+        for i, url in enumerate(urls):
+            emit_exchange(client, f"r{i}", url)
+        await archiver.drain()
+        archiver.stop()
+
+
+class TestCDX:
+    def test_surt(self):
+        assert surt("https://www.Example.com/a?b=1&a=2#f") == "com,example)/a?a=2&b=1"
+        assert surt("http://example.com:8080") == "com,example:8080)/"
+        assert surt("http://example.com:80/a b") == "com,example)/a%20b"
+
+    @pytest.mark.asyncio
+    async def test_index_and_lookup(self, tmp_path: Path):
+        urls = [f"http://example.com/{i}" for i in range(50)]
+        gz = str(tmp_path / "a.warc.gz")
+        plain = str(tmp_path / "b.warc")
+        live = CDXWriter(str(tmp_path / "live.cdx"))
+        await write_warc(gz, urls, live)
+        client = FakeClient()
+        client.handle(
+            "Network.getResponseBody", lambda params: {"body": "plain", "base64Encoded": False}
+        )
+        async with WARCWriter(plain, gzip=False) as writer:
+            archiver = WARCArchiver(client, writer).start()
+            emit_exchange(client, "p", "http://example.com/7")
+            await archiver.drain()
+            archiver.stop()
+        cdx_path = str(tmp_path / "index.cdx")
+        scanned = CDXWriter(cdx_path)
+        assert await scanned.add_warc(gz) == 50
+        assert await scanned.add_warc(plain) == 1
+        await scanned.flush()
+        await live.flush()
+        with CDXIndex(cdx_path) as index, CDXIndex(str(tmp_path / "live.cdx")) as live_index:
+            for url in urls:
+                (entry,) = live_index.lookup(url)
+                (scanned_entry,) = [
+                    e for e in index.lookup(url) if e.filename == "a.warc.gz"
+                ]
+                assert (scanned_entry.offset, scanned_entry.length) == (
+                    entry.offset,
+                    entry.length,
+                )
+            captures = index.lookup("http://example.com/7")
+            assert sorted(e.filename for e in captures) == ["a.warc.gz", "b.warc"]
+            assert index.lookup("http://example.com/7x") == []
+            assert index.lookup("http://example.org/") == []
+            entry = index.closest("http://example.com/1")
+            assert entry.status == "200" and entry.mime == "text/plain"
+
+
+def chunked_record(body: bytes, encoding: bytes = b"") -> bytes:
+    head = (
+        b"HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\n"
+        + (b"Content-Encoding: " + encoding + b"\r\n" if encoding else b"")
+        + b"Transfer-Encoding: chunked\r\n\r\n"
+    )
+    return (
+        b"WARC/1.0\r\nWARC-Type: response\r\n"
+        + f"Content-Length: {len(head) + len(body)}\r\n\r\n".encode()
+        + head
+        + body
+        + b"\r\n\r\n"
+    )
+
+
+class TestWARCReplayer:
+    def test_read_response_dechunks_chunked_bodies(self, tmp_path: Path):
+        path = tmp_path / "chunked.warc"
+        record = chunked_record(b"5;ext=1\r\nhello\r\n1a\r\n" + b"x" * 26 + b"\r\n0\r\nX-Trailer: 1\r\n\r\n")
+        path.write_bytes(record)
+        status, _, headers, body = read_response(str(path), 0, len(record), chunk_size=4)
+        assert status == 200 and b64decode(body) == b"hello" + b"x" * 26
+        assert headers == [{"name": "Content-Type", "value": "text/plain"}]
+        # bodies stored without their chunk framing are passed through
+        assert b"".join(dechunk(iter([b"<html>\r\n", b"</html>"]))) == b"<html>\r\n</html>"
+
+    def test_read_response_decodes_content_encoding(self, tmp_path: Path):
+        path = tmp_path / "gzip.warc"
+        encoded = gzip.compress(b"hello" * 100)
+        record = chunked_record(b"%x\r\n" % len(encoded) + encoded + b"\r\n0\r\n\r\n", b"gzip")
+        path.write_bytes(record)
+        _, _, headers, body = read_response(str(path), 0, len(record), chunk_size=7)
+        assert b64decode(body) == b"hello" * 100
+        assert headers == [{"name": "Content-Type", "value": "text/plain"}]
+        with pytest.raises(ValueError):
+            read_response(str(path), 0, len(record), max_size=499)
+        path = tmp_path / "br.warc"
+        record = chunked_record(b"3\r\nabc\r\n0\r\n\r\n", b"br")
+        path.write_bytes(record)
+        _, _, headers, body = read_response(str(path), 0, len(record))
+        assert b64decode(body) == b"abc"
+        assert {"name": "Content-Encoding", "value": "br"} in headers
+
+    @pytest.mark.asyncio
+    async def test_replays_from_offsets(self, tmp_path: Path):
+        cdx = CDXWriter(str(tmp_path / "index.cdx"))
+        urls = ["http://example.com/", "http://example.com/x"]
+        await write_warc(str(tmp_path / "a.warc.gz"), urls, cdx)
+        await cdx.flush()
+        client = FakeClient()
+        with CDXIndex(cdx.path) as index:
+            replayer = WARCReplayer(index, str(tmp_path), chunk_size=1000)
+            engine = InterceptionEngine(client)
+            replayer.attach(engine)
+            await engine.enable()
+            for request_id, url in (("1", "http://example.com/x"), ("2", "http://other.com/")):
+                client.emit(
+                    "Fetch.requestPaused",
+                    {
+                        "requestId": request_id,
+                        "request": {"url": url, "method": "GET", "headers": {}},
+                        "frameId": "F1",
+                        "resourceType": "Document",
+                    },
+                )
+            await engine.disable()
+            await asyncio.sleep(0)
+        (fulfilled,) = client.sent_methods("Fetch.fulfillRequest")
+        assert fulfilled["requestId"] == "1"
+        assert fulfilled["responseCode"] == 200
+        assert b64decode(fulfilled["body"]) == b"r1" * 5000
+        assert {"name": "Content-Type", "value": "text/plain"} in fulfilled["responseHeaders"]
+        assert client.sent_methods("Fetch.failRequest") == [
+            {"errorReason": "InternetDisconnected", "requestId": "2"}
+        ]
+        assert replayer.served == 1 and replayer.missed == 1
+        assert replayer.bytes_served == 10000
@@ -0,0 +1,118 @@
+import os
+from base64 import b64encode
+from hashlib import sha1
+from tempfile import TemporaryDirectory
+from typing import Dict
+
+import pytest
+
+from cripy.errors import ProtocolError
+from cripy.helpers import ResourceDumper
+from .helpers import FakeClient
+
+CONTENTS = {
+    "https://a.com/": ("<html>a</html>", False),
+    "https://a.com/app.js": ("shared()", False),
+    "https://cdn.com/lib.js": ("shared()", False),
+    "https://a.com/logo.png": (b64encode(b"\x89PNG").decode(), True),
+    "https://frame.com/": ("<html>frame</html>", False),
+    "https://b.com/": ("<html>b</html>", False),
+}
+
+
+def resource_tree(main: str, child: bool) -> Dict:
+    child_frames = []
+    if child:
+        child_frames.append(
+            {
+                "frame": {"id": "f2", "url": "https://frame.com/", "mimeType": "text/html"},
+                "resources": [
+                    {"url": "https://a.com/app.js", "type": "Script", "mimeType": "text/javascript"}
+                ],
+            }
+        )
+    return {
+        "frameTree": {
+            "frame": {"id": "f1", "url": main, "mimeType": "text/html"},
+            "childFrames": child_frames,
+            "resources": [
+                {"url": "https://a.com/app.js", "type": "Script", "mimeType": "text/javascript"},
+                {"url": "https://cdn.com/lib.js", "type": "Script", "mimeType": "text/javascript"},
+                {"url": "https://a.com/logo.png", "type": "Image", "mimeType": "image/png"},
+                {"url": "https://a.com/missing.css", "type": "Stylesheet", "failed": True},
+                {"url": "https://a.com/evicted.css", "type": "Stylesheet"},
+            ],
+        }
+    }
+
+
+def get_content(params: Dict) -> Dict:
+    if params["url"] not in CONTENTS:
+        raise ProtocolError("No resource with given URL found")
+    content, base64_encoded = CONTENTS[params["url"]]
+    return {"content": content, "base64Encoded": base64_encoded}
+
+
+class TestResourceDumper:
+    @pytest.mark.asyncio
+    async def test_dump_dedups_by_url_and_content(self):
+        client = FakeClient()
+        client.handle("Page.getResourceTree", lambda params: resource_tree("https://a.com/", True))
+        client.handle("Page.getResourceContent", get_content)
+        with TemporaryDirectory() as tmp:
+            dumper = await ResourceDumper(tmp, concurrency=2, loop=client.loop).open()
+            records = await dumper.dump(client)
+            fetched = [params["url"] for params in client.sent_methods("Page.getResourceContent")]
+            assert sorted(fetched) == sorted(
+                [
+                    "https://a.com/",
+                    "https://a.com/app.js",
+                    "https://cdn.com/lib.js",
+                    "https://a.com/logo.png",
+                    "https://a.com/evicted.css",
+                    "https://frame.com/",
+                ]
+            )
+            assert dumper.failures == 1 and dumper.duplicates == 1 and dumper.stored == 4
+            scripts = [record for record in records if record.type == "Script"]
+            assert [(r.frame_id, r.url) for r in scripts] == [
+                ("f1", "https://a.com/app.js"),
+                ("f2", "https://a.com/app.js"),
+                ("f1", "https://cdn.com/lib.js"),
+            ]
+            assert len({record.digest for record in scripts}) == 1
+            logo = next(record for record in records if record.type == "Image")
+            with open(dumper.content_path(logo.digest), "rb") as f:
+                assert f.read() == b"\x89PNG"
+            assert all(record.page == "https://a.com/" for record in records)
+
+            client.handle("Page.getResourceTree", lambda params: resource_tree("https://b.com/", False))
+            client.sent.clear()
+            records = await dumper.dump(client)
+            fetched = [params["url"] for params in client.sent_methods("Page.getResourceContent")]
+            assert sorted(fetched) == ["https://a.com/evicted.css", "https://b.com/"]
+            assert dumper.reused == 3 and len(records) == 4
+            await dumper.close()
+            assert os.path.exists(os.path.join(tmp, "index.json"))
+
+            reopened = await ResourceDumper(tmp, loop=client.loop).open()
+            assert len(reopened) == len(dumper) == 5
+            assert len(reopened.records) == len(dumper.records) == 10
+            assert reopened.records[0].to_json() == dumper.records[0].to_json()
+
+    @pytest.mark.asyncio
+    async def test_failed_write_records_no_duplicates(self):
+        client = FakeClient()
+        client.handle("Page.getResourceTree", lambda params: resource_tree("https://a.com/", False))
+        client.handle("Page.getResourceContent", get_content)
+        with TemporaryDirectory() as tmp:
+            dumper = await ResourceDumper(tmp, concurrency=4, loop=client.loop).open()
+            # a directory in place of the content of both scripts makes its write fail
+            os.makedirs(dumper.content_path(sha1(b"shared()").hexdigest()))
+            records = await dumper.dump(client)
+            assert [record.url for record in records if record.type == "Script"] == []
+            assert dumper.duplicates == 0 and dumper.stored == 2
+            assert all(
+                os.path.isfile(dumper.content_path(record.digest)) for record in records
+            )
+            await dumper.close()
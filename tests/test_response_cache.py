@@ -0,0 +1,134 @@
+import asyncio
+import base64
+import os
+from typing import Dict
+
+import pytest
+
+from cripy.helpers import InterceptionEngine, ResponseCache
+from cripy.helpers.streams import BodySpool
+from .helpers import FakeClient
+
+
+def paused(request_id: str, url: str, headers: Dict = None, **kwargs) -> Dict:
+    event = {
+        "requestId": request_id,
+        "request": {"url": url, "method": "GET", "headers": headers or {}},
+        "frameId": "F1",
+        "resourceType": "Script",
+    }
+    event.update(kwargs)
+    return event
+
+
+def spool(data: bytes) -> BodySpool:
+    body = BodySpool()
+    body.write(data)
+    return body
+
+
+class TestResponseCache:
+    @pytest.mark.asyncio
+    async def test_populate_and_replay(self, tmp_path):
+        cache = await ResponseCache(str(tmp_path)).open()
+        client = FakeClient()
+        client.handle(
+            "Fetch.getResponseBody",
+            lambda params: {"body": base64.b64encode(b"var a;").decode(), "base64Encoded": True},
+        )
+        engine = InterceptionEngine(client)
+        cache.attach(engine)
+        await engine.enable()
+        assert client.sent_methods("Fetch.enable")[0]["patterns"] == [
+            {"urlPattern": "http*", "requestStage": "Request"},
+            {"urlPattern": "http*", "requestStage": "Response"},
+        ]
+        url = "https://example.com/a.js"
+        client.emit("Fetch.requestPaused", paused("1", url))
+        await asyncio.sleep(0.01)
+        headers = [
+            {"name": "Content-Type", "value": "text/javascript"},
+            {"name": "Content-Encoding", "value": "gzip"},
+        ]
+        client.emit(
+            "Fetch.requestPaused",
+            paused("1", url, responseStatusCode=200, responseHeaders=headers),
+        )
+        await asyncio.sleep(0.05)
+        assert len(cache) == 1 and cache.stores == 1 and cache.misses == 1
+        assert client.sent_methods("Fetch.continueRequest") == [
+            {"requestId": "1"},
+            {"requestId": "1"},
+        ]
+        # a second session sharing the cache is served from it
+        other = FakeClient()
+        other_engine = InterceptionEngine(other)
+        cache.attach(other_engine)
+        await other_engine.enable()
+        other.emit("Fetch.requestPaused", paused("9", url))
+        await other_engine.disable()
+        await asyncio.sleep(0)
+        (fulfilled,) = other.sent_methods("Fetch.fulfillRequest")
+        assert fulfilled["responseCode"] == 200
+        assert fulfilled["responseHeaders"] == [headers[0]]
+        assert base64.b64decode(fulfilled["body"]) == b"var a;"
+        assert cache.hits == 1 and cache.bytes_saved == 6
+        await engine.disable()
+        await cache.save()
+        reopened = await ResponseCache(str(tmp_path)).open()
+        assert len(reopened) == 1 and reopened.size == 6
+        assert reopened.lookup("GET", url, {}).status == 200
+
+    @pytest.mark.asyncio
+    async def test_vary_and_uncacheable(self, tmp_path):
+        cache = await ResponseCache(str(tmp_path)).open()
+        url = "https://example.com/"
+        vary = [{"name": "Vary", "value": "Accept-Language"}]
+        await cache.store("GET", url, {"Accept-Language": "en"}, 200, vary, spool(b"en"))
+        await cache.store("GET", url, {"Accept-Language": "fr"}, 200, vary, spool(b"fr"))
+        assert cache.lookup("GET", url, {"accept-language": "fr"}).size == 2
+        assert cache.lookup("GET", url, {"Accept-Language": "de"}) is None
+        assert cache.lookup("POST", url, {"Accept-Language": "en"}) is None
+        star = [{"name": "Vary", "value": "*"}]
+        assert await cache.store("GET", url + "x", {}, 200, star, spool(b"x")) is None
+
+    @pytest.mark.asyncio
+    async def test_lru_eviction_and_dedup(self, tmp_path):
+        cache = await ResponseCache(str(tmp_path), max_size=10).open()
+        a = await cache.store("GET", "https://a.com/1", {}, 200, [], spool(b"aaaaa"))
+        await cache.store("GET", "https://a.com/2", {}, 200, [], spool(b"aaaaa"))
+        assert cache.size == 5 and len(cache) == 2
+        b = await cache.store("GET", "https://a.com/3", {}, 200, [], spool(b"bbbbb"))
+        assert cache.lookup("GET", "https://a.com/1", {}) is not None
+        await cache.store("GET", "https://a.com/4", {}, 200, [], spool(b"ccccc"))
+        # /2 and /3 were the least recently used, the body of /1 is kept
+        assert cache.evictions == 2 and cache.size == 10
+        assert cache.lookup("GET", "https://a.com/2", {}) is None
+        assert cache.lookup("GET", "https://a.com/3", {}) is None
+        assert os.path.exists(cache.body_path(a.digest))
+        assert not os.path.exists(cache.body_path(b.digest))
+
+    @pytest.mark.asyncio
+    async def test_body_stored_while_its_removal_is_pending(self, tmp_path):
+        cache = await ResponseCache(str(tmp_path), max_size=5).open()
+        a = await cache.store("GET", "https://a.com/1", {}, 200, [], spool(b"aaaaa"))
+        evicting = asyncio.ensure_future(
+            cache.store("GET", "https://a.com/2", {}, 200, [], spool(b"bbbbb"))
+        )
+        while a.digest not in cache._body_ops:
+            await asyncio.sleep(0)
+        again = await cache.store("GET", "https://a.com/3", {}, 200, [], spool(b"aaaaa"))
+        await evicting
+        assert cache.lookup("GET", "https://a.com/3", {}) is again
+        assert os.path.exists(cache.body_path(again.digest))
+
+    @pytest.mark.asyncio
+    async def test_unreadable_entry_is_dropped(self, tmp_path):
+        cache = await ResponseCache(str(tmp_path)).open()
+        url = "https://example.com/a.js"
+        entry = await cache.store("GET", url, {}, 200, [], spool(b"var a;"))
+        os.remove(cache.body_path(entry.digest))
+        client = FakeClient()
+        assert await cache._on_request(client, paused("1", url)) is None
+        assert cache.lookup("GET", url, {}) is None and len(cache) == 0 and cache.size == 0
+        assert cache.misses == 1 and (id(client), "1") in cache._pending
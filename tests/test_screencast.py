@@ -0,0 +1,69 @@
+import asyncio
+from base64 import b64encode
+from pathlib import Path
+
+import pytest
+
+from cripy.helpers import Screencast
+from .helpers import FakeClient
+
+
+def frame_event(i: int) -> dict:
+    return {
+        "data": b64encode(f"frame{i}".encode()).decode(),
+        "metadata": {"timestamp": 100 + i * 0.04, "deviceWidth": 800, "deviceHeight": 600},
+        "sessionId": i,
+    }
+
+
+class TestScreencast:
+    @pytest.mark.asyncio
+    async def test_drops_oldest_and_writes_sequence(self, tmp_path: Path):
+        client = FakeClient()
+        out = tmp_path / "frames"
+        screencast = Screencast(client, quality=80, queue_size=2, output_dir=str(out))
+        await screencast.start()
+        assert client.sent_methods("Page.startScreencast") == [
+            {"format": "jpeg", "quality": 80}
+        ]
+        for i in range(5):
+            client.emit("Page.screencastFrame", frame_event(i))
+        assert screencast.dropped == 3 and screencast.acked == 5
+        await screencast.stop()
+        frames = [frame async for frame in screencast]
+        assert [f.index for f in frames] == [3, 4]
+        assert frames[0].data == b"frame3" and frames[0].timestamp == 100.12
+        assert screencast.decoded == 5
+        assert sorted(p.name for p in out.iterdir()) == [
+            "frame_000000.jpeg",
+            "frame_000001.jpeg",
+            "frame_000002.jpeg",
+            "frame_000003.jpeg",
+            "frame_000004.jpeg",
+            "frames.ffconcat",
+        ]
+        concat = (out / "frames.ffconcat").read_text().splitlines()
+        assert concat[:3] == ["ffconcat version 1.0", "file 'frame_000000.jpeg'", "duration 0.040000"]
+
+    @pytest.mark.asyncio
+    async def test_consumed_pacing(self):
+        client = FakeClient()
+        async with Screencast(client, format="png", ack="consumed") as screencast:
+            client.emit("Page.screencastFrame", frame_event(7))
+            assert client.sent_methods("Page.screencastFrameAck") == []
+            frame = await screencast.__anext__()
+            assert frame.data == b"frame7"
+            assert client.sent_methods("Page.screencastFrameAck") == [{"sessionId": 7}]
+
+    @pytest.mark.asyncio
+    async def test_max_fps_delays_acks(self):
+        client = FakeClient()
+        screencast = Screencast(client, max_fps=50)
+        await screencast.start()
+        for i in range(3):
+            client.emit("Page.screencastFrame", frame_event(i))
+        assert len(client.sent_methods("Page.screencastFrameAck")) == 1
+        await asyncio.sleep(0.05)
+        assert len(client.sent_methods("Page.screencastFrameAck")) == 3
+        await screencast.stop()
+        assert screencast.received == 3
@@ -0,0 +1,120 @@
+import gzip
+import json
+from base64 import b64encode
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from cripy.helpers import TraceEventParser, TraceRecorder
+from cripy.helpers.tracing import iter_trace_file
+from .helpers import FakeClient
+
+EVENTS = [
+    {"name": "a{b", "ph": "X", "args": {"data": {"s": 'q"}{\\'}}, "ts": 1},
+    {"name": "é✓", "ph": "B", "args": {}, "ts": 2},
+    {"name": "c", "ph": "E", "args": {"list": [{"x": 1}, "]"]}, "ts": 3},
+]
+TRACE = json.dumps(
+    {"traceEvents": EVENTS, "metadata": {"trace-config": "x"}}, ensure_ascii=False
+).encode()
+
+
+def split(data: bytes, size: int) -> List[bytes]:
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def tracing_client(chunks: List[bytes], compression: str = "none") -> FakeClient:
+    client = FakeClient()
+    position = 0
+
+    def read(params: Dict) -> Dict:
+        nonlocal position
+        chunk = chunks[position]
+        position += 1
+        return {
+            "data": b64encode(chunk).decode(),
+            "base64Encoded": True,
+            "eof": position == len(chunks),
+        }
+
+    def end(params: Dict) -> Dict:
+        client.emit(
+            "Tracing.tracingComplete",
+            {"stream": "s1", "traceFormat": "json", "streamCompression": compression},
+        )
+        return {}
+
+    client.handle("IO.read", read)
+    client.handle("Tracing.end", end)
+    return client
+
+
+class TestTraceEventParser:
+    @pytest.mark.parametrize("size", [1, 3, 7, 64, 4096])
+    def test_object_format_in_chunks(self, size: int):
+        parser = TraceEventParser()
+        events = []
+        for chunk in split(TRACE, size):
+            events.extend(parser.feed(chunk))
+        assert events == EVENTS
+        assert parser.close() == {"trace-config": "x"}
+        assert parser.events == 3
+
+    def test_metadata_preceding_the_events(self):
+        trace = json.dumps({"metadata": {"trace-config": "x"}, "traceEvents": EVENTS, "other": 1})
+        for size in (1, 64):
+            parser = TraceEventParser()
+            events = []
+            for chunk in split(trace.encode(), size):
+                events.extend(parser.feed(chunk))
+            assert events == EVENTS
+            assert parser.close() == {"trace-config": "x"}
+
+    def test_array_format_and_truncation(self):
+        parser = TraceEventParser()
+        data = json.dumps(EVENTS)
+        assert parser.feed(data[:20]) == []
+        assert parser.feed(data[20:]) == EVENTS
+        assert parser.close() is None
+        truncated = TraceEventParser()
+        truncated.feed(data[:-5])
+        with pytest.raises(ValueError):
+            truncated.close()
+
+
+class TestTraceRecorder:
+    @pytest.mark.asyncio
+    async def test_streams_events(self):
+        client = tracing_client(split(TRACE, 10))
+        recorder = await TraceRecorder(client, ["v8"], chunk_size=10).start()
+        assert client.sent_methods("Tracing.start") == [
+            {
+                "transferMode": "ReturnAsStream",
+                "streamFormat": "json",
+                "streamCompression": "none",
+                "traceConfig": {"includedCategories": ["v8"]},
+            }
+        ]
+        client.emit("Tracing.bufferUsage", {"percentFull": 0.5})
+        events = [event async for event in recorder.events()]
+        assert events == EVENTS
+        assert recorder.metadata == {"trace-config": "x"}
+        assert recorder.buffer_usage == 0.5 and recorder.bytes_read == len(TRACE)
+        assert client.sent_methods("IO.close") == [{"handle": "s1"}]
+
+    @pytest.mark.asyncio
+    async def test_gzip_stream_events(self):
+        client = tracing_client(split(gzip.compress(TRACE), 16), "gzip")
+        recorder = await TraceRecorder(client, compression="gzip").start()
+        assert [event async for event in recorder.events()] == EVENTS
+
+    @pytest.mark.asyncio
+    async def test_save_compresses(self, tmp_path: Path):
+        client = tracing_client(split(TRACE, 32))
+        recorder = await TraceRecorder(client).start()
+        path = str(tmp_path / "trace.json.gz")
+        written = await recorder.save(path)
+        assert written == Path(path).stat().st_size
+        assert gzip.decompress(Path(path).read_bytes()) == TRACE
+        assert list(iter_trace_file(path, chunk_size=5)) == EVENTS
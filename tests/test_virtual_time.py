@@ -0,0 +1,62 @@
+from typing import Dict
+
+import pytest
+
+from cripy.helpers import NetworkTracker, VirtualTimeController
+from .helpers import FakeClient
+
+
+def expiring_client() -> FakeClient:
+    client = FakeClient()
+
+    def set_policy(params: Dict) -> Dict:
+        if "budget" in params:
+            client.loop.call_soon(client.emit, "Emulation.virtualTimeBudgetExpired", {})
+        return {"virtualTimeTicksBase": 0}
+
+    client.handle("Emulation.setVirtualTimePolicy", set_policy)
+    return client
+
+
+class TestVirtualTimeController:
+    @pytest.mark.asyncio
+    async def test_steps_adapt_to_network(self):
+        client = expiring_client()
+        tracker = NetworkTracker(client, retain_finished=False).start()
+        controller = await VirtualTimeController(
+            client, min_step_ms=100, max_step_ms=400, tracker=tracker
+        ).start()
+        client.emit(
+            "Network.requestWillBeSent",
+            {"requestId": "1", "request": {"url": "https://example.com"}, "timestamp": 1},
+        )
+        steps = []
+
+        def until() -> bool:
+            steps.append(client.sent_methods("Emulation.setVirtualTimePolicy")[-1]["budget"])
+            if len(steps) == 2:
+                client.emit("Network.loadingFinished", {"requestId": "1", "timestamp": 2})
+            return False
+
+        report = await controller.load("https://example.com", budget_ms=1000, until=until)
+        policies = client.sent_methods("Emulation.setVirtualTimePolicy")
+        assert policies[0] == {"policy": "pause"}
+        assert policies[1]["waitForNavigation"] and "waitForNavigation" not in policies[2]
+        assert all(p["policy"] == "pauseIfNetworkFetchesPending" for p in policies[1:])
+        assert steps == [100, 100, 200, 400, 200]
+        assert report.virtual_ms == 1000 and report.budget_exhausted and not report.timed_out
+        assert report.saved_ms > 0 and controller.pages == 1
+        assert client.sent_methods("Network.enable") == []
+
+    @pytest.mark.asyncio
+    async def test_until_and_timeout(self):
+        client = expiring_client()
+        controller = await VirtualTimeController(client).start()
+        report = await controller.run(budget_ms=10000, until=lambda: True)
+        assert report.steps == 1 and not report.budget_exhausted
+        client.handle("Emulation.setVirtualTimePolicy", lambda params: {})
+        report = await controller.run(budget_ms=10000, timeout=0.01)
+        assert report.timed_out and report.virtual_ms == 0 and report.saved_ms == 0
+        assert client.sent_methods("Emulation.setVirtualTimePolicy")[-1] == {"policy": "pause"}
+        assert client.sent_methods("Network.enable") == [{}]
+        controller.stop()
@@ -0,0 +1,79 @@
+import asyncio
+from typing import Tuple
+
+import pytest
+
+from cripy.helpers import PageWaiter
+from .helpers import FakeClient
+
+
+async def started_waiter() -> Tuple[FakeClient, PageWaiter]:
+    client = FakeClient()
+    client.handle(
+        "Page.getFrameTree",
+        lambda params: {"frameTree": {"frame": {"id": "main", "loaderId": "l1"}}},
+    )
+    return client, await PageWaiter(client).start()
+
+
+def request(client: FakeClient, request_id: str, frame_id: str = "main", **extra) -> None:
+    client.emit(
+        "Network.requestWillBeSent",
+        dict(requestId=request_id, frameId=frame_id, request={"url": "https://example.com"}, **extra),
+    )
+
+
+class TestPageWaiter:
+    @pytest.mark.asyncio
+    async def test_lifecycle_and_navigation(self):
+        client, waiter = await started_waiter()
+        assert client.sent_methods("Page.setLifecycleEventsEnabled") == [{"enabled": True}]
+        client.emit("Page.lifecycleEvent", {"frameId": "main", "loaderId": "l1", "name": "load"})
+        await asyncio.wait_for(waiter.wait_for_lifecycle("load"), 1)
+        navigation = waiter.wait_for_navigation(timeout=1)
+        both = [asyncio.ensure_future(waiter.wait_for_lifecycle("DOMContentLoaded")) for _ in range(2)]
+        await asyncio.sleep(0)
+        client.emit("Page.frameNavigated", {"frame": {"id": "main", "loaderId": "l2", "url": "https://example.com/2"}})
+        assert not waiter.reached("load")
+        await asyncio.sleep(0)
+        assert not navigation.done()
+        client.emit("Page.lifecycleEvent", {"frameId": "main", "loaderId": "l2", "name": "DOMContentLoaded"})
+        client.emit("Page.lifecycleEvent", {"frameId": "main", "loaderId": "l2", "name": "load"})
+        assert (await navigation)["loaderId"] == "l2"
+        await asyncio.gather(*both)
+        with pytest.raises(asyncio.TimeoutError):
+            await waiter.wait_for_lifecycle("networkIdle", frame_id="child", timeout=0.01)
+        assert waiter._lifecycle_waiters == {}
+
+    @pytest.mark.asyncio
+    async def test_navigation_registered_before_navigating(self):
+        client, waiter = await started_waiter()
+        navigation = waiter.wait_for_navigation(lifecycle=None, timeout=1)
+        # the navigation commits before the waiting task first runs
+        client.emit("Page.frameNavigated", {"frame": {"id": "main", "loaderId": "l2", "url": "https://example.com/2"}})
+        assert (await navigation)["loaderId"] == "l2"
+        assert waiter._navigation_waiters == {}
+
+    @pytest.mark.asyncio
+    async def test_network_idle(self):
+        client, waiter = await started_waiter()
+        request(client, "1")
+        request(client, "1", redirectResponse={"status": 302})
+        request(client, "2", frame_id="child")
+        assert waiter.inflight == 2 and waiter.frame_inflight == {"main": 1, "child": 1}
+        idle = asyncio.ensure_future(waiter.wait_for_network_idle(quiet_ms=20))
+        almost = asyncio.ensure_future(waiter.wait_for_network_idle(max_inflight=1, quiet_ms=20))
+        child = asyncio.ensure_future(waiter.wait_for_network_idle(quiet_ms=20, frame_id="child"))
+        await asyncio.sleep(0.03)
+        assert not (almost.done() or idle.done() or child.done())
+        client.emit("Network.loadingFailed", {"requestId": "2"})
+        client.emit("Network.loadingFinished", {"requestId": "unknown"})
+        await asyncio.wait_for(asyncio.gather(almost, child), 1)
+        assert not idle.done()
+        request(client, "3")
+        client.emit("Network.loadingFinished", {"requestId": "1"})
+        await asyncio.sleep(0.01)
+        client.emit("Network.loadingFinished", {"requestId": "3"})
+        await asyncio.wait_for(idle, 1)
+        assert waiter.inflight == 0 and waiter.frame_inflight == {}
+        waiter.stop()
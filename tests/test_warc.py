@@ -0,0 +1,211 @@
+import asyncio
+import gzip
+from base64 import b64encode
+from pathlib import Path
+
+import pytest
+
+from cripy.helpers import BodyFetcher, NetworkTracker, WARCArchiver, WARCRecord, WARCWriter
+from .helpers import FakeClient
+
+
+def emit_exchange(client: FakeClient, request_id: str, url: str, status: int = 200):
+    client.emit(
+        "Network.requestWillBeSent",
+        {
+            "requestId": request_id,
+            "frameId": "F1",
+            "request": {"url": url, "method": "GET", "headers": {"Accept": "*/*"}},
+            "timestamp": 1.0,
+            "wallTime": 1546300800.0,
+        },
+    )
+    client.emit(
+        "Network.responseReceived",
+        {
+            "requestId": request_id,
+            "timestamp": 1.5,
+            "response": {
+                "url": url,
+                "status": status,
+                "statusText": "OK",
+                "headers": {
+                    "Content-Type": "text/plain",
+                    "Content-Encoding": "gzip",
+                    "Set-Cookie": "a=1\nb=2",
+                },
+                "remoteIPAddress": "[::1]",
+            },
+        },
+    )
+    client.emit("Network.loadingFinished", {"requestId": request_id, "timestamp": 2.0})
+
+
+class TestWARCArchiver:
+    @pytest.mark.asyncio
+    async def test_archives_network_responses(self, tmp_path: Path):
+        client = FakeClient()
+        body = b"hello world" * 1000
+        client.handle(
+            "Network.getResponseBody",
+            lambda params: {"body": b64encode(body).decode(), "base64Encoded": True},
+        )
+        path = str(tmp_path / "out.warc.gz")
+        written = []
+        async with WARCWriter(path, info={"isPartOf": "test"}) as writer:
+            writer.on_record_written(written.append)
+            archiver = WARCArchiver(client, writer, chunk_size=128).start()
+            emit_exchange(client, "1", "http://example.com/a?b=c")
+            await archiver.drain()
+            archiver.stop()
+        assert [r.warc_type for r in written] == ["warcinfo", "response", "request"]
+        assert all(r.offset >= 0 and r.length > 0 for r in written)
+        with gzip.open(path, "rb") as warc:
+            data = warc.read()
+        assert data.count(b"WARC/1.0\r\n") == 3
+        assert b"GET /a?b=c HTTP/1.1\r\nHost: example.com\r\n" in data
+        assert b"Content-Encoding" not in data
+        assert b"Set-Cookie: a=1\r\nSet-Cookie: b=2\r\n" in data
+        assert f"Content-Length: {len(body)}\r\n\r\n".encode() + body in data
+        assert b"WARC-IP-Address: ::1\r\n" in data
+
+    @pytest.mark.asyncio
+    async def test_uncompressed_and_skips_failed(self, tmp_path: Path):
+        client = FakeClient()
+        client.handle(
+            "Network.getResponseBody", lambda params: {"body": "abc", "base64Encoded": False}
+        )
+        path = str(tmp_path / "out.warc")
+        async with WARCWriter(path, gzip=False) as writer:
+            tracker = NetworkTracker(client).start()
+            archiver = WARCArchiver(client, writer, tracker=tracker).start()
+            emit_exchange(client, "1", "http://example.com/")
+            client.emit(
+                "Network.requestWillBeSent",
+                {
+                    "requestId": "2",
+                    "request": {"url": "http://example.com/x", "method": "GET"},
+                    "timestamp": 1.0,
+                    "wallTime": 1.0,
+                },
+            )
+            client.emit(
+                "Network.loadingFailed", {"requestId": "2", "timestamp": 1.0}
+            )
+            await archiver.drain()
+        assert archiver.skipped == 1
+        assert writer.records_written == 2
+        data = Path(path).read_bytes()
+        assert data.startswith(b"WARC/1.0\r\nWARC-Type: response\r\n")
+        assert b"Content-Length: 3\r\n\r\nabc\r\n\r\n" in data
+
+    @pytest.mark.asyncio
+    async def test_fetch_streamed_bodies(self, tmp_path: Path):
+        client = FakeClient()
+        chunks = iter(
+            [
+                {"data": b64encode(b"first").decode(), "base64Encoded": True, "eof": False},
+                {"data": "second", "base64Encoded": False, "eof": True},
+            ]
+        )
+        client.handle("Fetch.takeResponseBodyAsStream", lambda params: {"stream": "s1"})
+        client.handle("IO.read", lambda params: next(chunks))
+        path = str(tmp_path / "out.warc")
+        async with WARCWriter(path, gzip=False) as writer:
+            archiver = WARCArchiver(client, writer, use_fetch=True).start()
+            client.emit(
+                "Fetch.requestPaused",
+                {
+                    "requestId": "interception-1",
+                    "networkId": "1",
+                    "responseStatusCode": 200,
+                    "responseHeaders": [{"name": "Content-Type", "value": "text/plain"}],
+                },
+            )
+            await archiver.drain()
+            emit_exchange(client, "1", "http://example.com/")
+            await archiver.drain()
+        fulfilled = client.sent_methods("Fetch.fulfillRequest")
+        assert fulfilled[0]["body"] == b64encode(b"firstsecond").decode()
+        assert client.sent_methods("IO.close") == [{"handle": "s1"}]
+        assert client.sent_methods("Network.getResponseBody") == []
+        assert b"Content-Length: 11\r\n\r\nfirstsecond" in Path(path).read_bytes()
+
+    @pytest.mark.asyncio
+    async def test_loading_finished_before_fulfill_reply(self, tmp_path: Path):
+        client = FakeClient()
+        fulfilled = client.loop.create_future()
+        chunks = iter([{"data": "body", "base64Encoded": False, "eof": True}])
+        client.handle("Fetch.takeResponseBodyAsStream", lambda params: {"stream": "s1"})
+        client.handle("IO.read", lambda params: next(chunks))
+        client.handle("Fetch.fulfillRequest", lambda params: fulfilled)
+        path = str(tmp_path / "out.warc")
+        async with WARCWriter(path, gzip=False) as writer:
+            archiver = WARCArchiver(client, writer, use_fetch=True).start()
+            client.emit("Fetch.requestPaused", {"requestId": "interception-0"})
+            client.emit(
+                "Fetch.requestPaused",
+                {"requestId": "interception-1", "networkId": "1", "responseStatusCode": 200},
+            )
+            while not client.sent_methods("Fetch.fulfillRequest"):
+                await asyncio.sleep(0)
+            emit_exchange(client, "1", "http://example.com/")
+            fulfilled.set_result({})
+            await archiver.drain()
+            assert archiver._fetched == {}
+            archiver.stop()
+        assert client.sent_methods("Fetch.continueRequest") == [{"requestId": "interception-0"}]
+        assert client.sent_methods("Network.getResponseBody") == []
+        assert b"Content-Length: 4\r\n\r\nbody" in Path(path).read_bytes()
+
+    @pytest.mark.asyncio
+    async def test_bodies_too_large_to_fulfill_are_continued(self, tmp_path: Path):
+        client = FakeClient()
+        client.handle(
+            "Network.getResponseBody", lambda params: {"body": "large", "base64Encoded": False}
+        )
+        path = str(tmp_path / "out.warc")
+        async with WARCWriter(path, gzip=False) as writer:
+            fetcher = BodyFetcher(client, max_fulfill_size=4)
+            archiver = WARCArchiver(client, writer, use_fetch=True, fetcher=fetcher).start()
+            client.emit(
+                "Fetch.requestPaused",
+                {
+                    "requestId": "interception-1",
+                    "networkId": "1",
+                    "responseStatusCode": 200,
+                    "responseHeaders": [{"name": "Content-Length", "value": "5"}],
+                },
+            )
+            await archiver.drain()
+            emit_exchange(client, "1", "http://example.com/")
+            await archiver.drain()
+        assert client.sent_methods("Fetch.continueRequest") == [{"requestId": "interception-1"}]
+        assert client.sent_methods("Fetch.takeResponseBodyAsStream") == []
+        assert b"Content-Length: 5\r\n\r\nlarge" in Path(path).read_bytes()
+
+
+class TestWARCWriter:
+    @pytest.mark.asyncio
+    async def test_failing_callback_and_stopped_writer(self, tmp_path: Path):
+        path = str(tmp_path / "out.warc")
+        written = []
+
+        def fail(record):
+            raise ValueError("callback failed")
+
+        writer = await WARCWriter(path, gzip=False, queue_size=1, info={}).open()
+        writer.on_record_written(fail)
+        writer.on_record_written(written.append)
+        await writer.write(WARCRecord("metadata", []))
+        await writer.close()
+        assert [r.warc_type for r in written] == ["warcinfo", "metadata"]
+        assert b"WARC-Filename: out.warc\r\n" in Path(path).read_bytes()
+
+        writer = await WARCWriter(str(tmp_path / "stopped.warc"), queue_size=1).open()
+        writer._task.cancel()
+        await writer.write(WARCRecord("metadata", []))
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(writer.write(WARCRecord("metadata", [])), 1)
+        with pytest.raises(asyncio.CancelledError):
+            await writer.close()
@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from cripy.helpers import WorkerPool
+
+
+class TestWorkerPool:
+    @pytest.mark.asyncio
+    async def test_cancelled_job_keeps_worker(self):
+        loop = asyncio.get_event_loop()
+        pool = WorkerPool(workers=1, loop=loop)
+
+        async def cancelled_command() -> None:
+            command = loop.create_future()
+            command.cancel()
+            await command
+
+        async def double(value: int) -> int:
+            return value * 2
+
+        async def fail() -> None:
+            raise ValueError("failed")
+
+        with pytest.raises(asyncio.CancelledError):
+            await pool.run(cancelled_command)
+        with pytest.raises(ValueError):
+            await pool.run(fail)
+        assert await asyncio.wait_for(pool.run(double, 21), 1) == 42
+        assert pool.completed == 3 and pool.active == 0
+        await pool.close()
+        assert not pool.running
+
+    @pytest.mark.asyncio
+    async def test_cancelled_worker_cancels_its_job(self):
+        loop = asyncio.get_event_loop()
+        pool = WorkerPool(workers=2, loop=loop)
+        blocked = loop.create_future()
+
+        async def block() -> None:
+            await blocked
+
+        job = await pool.submit(block)
+        await asyncio.sleep(0)
+        assert pool.active == 1
+        for worker in pool._workers:
+            worker.cancel()
+        await asyncio.gather(*pool._workers, return_exceptions=True)
+        assert job.cancelled() and blocked.cancelled()